@@ -25,50 +25,6 @@ set_bdbcursor_move_error(TCBDB *bdb)
 }
 
 
-/* convert a Python sequence to a TCLIST */
-TCLIST *
-seq_to_tclist(PyObject *pyvalues)
-{
-    const char *msg = "a sequence is required";
-    PyObject *pyseq;
-    Py_ssize_t len, i;
-    TCLIST *values;
-    void *value;
-    int value_size;
-
-    if (PyBytes_Check(pyvalues) || PyUnicode_Check(pyvalues)) {
-        set_error(PyExc_TypeError, msg);
-        return NULL;
-    }
-    pyseq = PySequence_Fast(pyvalues, msg);
-    if (!pyseq) {
-        return NULL;
-    }
-    len = PySequence_Fast_GET_SIZE(pyseq);
-    if (check_py_ssize_t_len(len, pyseq)) {
-        Py_DECREF(pyseq);
-        return NULL;
-    }
-    values = tclistnew2((int)len);
-    if (!values) {
-        set_error(Error, "could not create TCLIST, memory issue?");
-        Py_DECREF(pyseq);
-        return NULL;
-    }
-    for (i = 0; i < len; i++) {
-        if (bytes_to_void(PySequence_Fast_GET_ITEM(pyseq, i), &value,
-                          &value_size)) {
-            Py_DECREF(pyseq);
-            tclistdel(values);
-            return NULL;
-        }
-        tclistpush(values, value, value_size);
-    }
-    Py_DECREF(pyseq);
-    return values;
-}
-
-
 /*******************************************************************************
 * BDBCursorType
 *******************************************************************************/
@@ -82,7 +38,9 @@ new_BDBCursor(PyTypeObject *type, BDB *bdb)
         return NULL;
     }
     /* self->cur */
+    Py_BEGIN_ALLOW_THREADS
     self->cur = tcbdbcurnew(bdb->bdb);
+    Py_END_ALLOW_THREADS
     if (!self->cur) {
         set_error(Error, "could not create BDBCursor, memory issue?");
         Py_DECREF(self);
@@ -134,7 +92,12 @@ Move to the first record.");
 static PyObject *
 BDBCursor_first(BDBCursor *self)
 {
-    if (!tcbdbcurfirst(self->cur)) {
+    bool result;
+
+    Py_BEGIN_ALLOW_THREADS
+    result = tcbdbcurfirst(self->cur);
+    Py_END_ALLOW_THREADS
+    if (!result) {
         return set_bdbcursor_move_error(self->bdb->bdb);
     }
     Py_RETURN_NONE;
@@ -150,7 +113,12 @@ Move to the last record.");
 static PyObject *
 BDBCursor_last(BDBCursor *self)
 {
-    if (!tcbdbcurlast(self->cur)) {
+    bool result;
+
+    Py_BEGIN_ALLOW_THREADS
+    result = tcbdbcurlast(self->cur);
+    Py_END_ALLOW_THREADS
+    if (!result) {
         return set_bdbcursor_move_error(self->bdb->bdb);
     }
     Py_RETURN_NONE;
@@ -167,17 +135,23 @@ is positioned to the next available record.");
 static PyObject *
 BDBCursor_jump(BDBCursor *self, PyObject *args)
 {
+    Py_buffer key_view;
     void *key;
     int key_size;
+    bool result;
     PyObject *pykey;
 
     if (!PyArg_ParseTuple(args, "O:jump", &pykey)) {
         return NULL;
     }
-    if (bytes_to_void(pykey, &key, &key_size)) {
+    if (bytes_to_void(pykey, &key_view, &key, &key_size)) {
         return NULL;
     }
-    if (!tcbdbcurjump(self->cur, key, key_size)) {
+    Py_BEGIN_ALLOW_THREADS
+    result = tcbdbcurjump(self->cur, key, key_size);
+    Py_END_ALLOW_THREADS
+    PyBuffer_Release(&key_view);
+    if (!result) {
         return set_bdbcursor_move_error(self->bdb->bdb);
     }
     Py_RETURN_NONE;
@@ -193,7 +167,12 @@ Move to the previous record.");
 static PyObject *
 BDBCursor_prev(BDBCursor *self)
 {
-    if (!tcbdbcurprev(self->cur)) {
+    bool result;
+
+    Py_BEGIN_ALLOW_THREADS
+    result = tcbdbcurprev(self->cur);
+    Py_END_ALLOW_THREADS
+    if (!result) {
         return set_bdbcursor_move_error(self->bdb->bdb);
     }
     Py_RETURN_NONE;
@@ -209,7 +188,12 @@ Move to the next record.");
 static PyObject *
 BDBCursor_next(BDBCursor *self)
 {
-    if (!tcbdbcurnext(self->cur)) {
+    bool result;
+
+    Py_BEGIN_ALLOW_THREADS
+    result = tcbdbcurnext(self->cur);
+    Py_END_ALLOW_THREADS
+    if (!result) {
         return set_bdbcursor_move_error(self->bdb->bdb);
     }
     Py_RETURN_NONE;
@@ -229,21 +213,29 @@ Store a value at/around the cursor's current position.\n\
 static PyObject *
 BDBCursor_put(BDBCursor *self, PyObject *args)
 {
+    Py_buffer value_view;
     void *value;
     int value_size;
     PyObject *pyvalue;
     int mode = BDBCPCURRENT;
+    bool result;
 
     if (!PyArg_ParseTuple(args, "O|i:put", &pyvalue, &mode)) {
         return NULL;
     }
-    if (bytes_to_void(pyvalue, &value, &value_size)) {
+    if (bytes_to_void(pyvalue, &value_view, &value, &value_size)) {
         return NULL;
     }
-    if (!tcbdbcurput(self->cur, value, value_size, mode)) {
+    Py_BEGIN_ALLOW_THREADS
+    result = tcbdbcurput(self->cur, value, value_size, mode);
+    Py_END_ALLOW_THREADS
+    DBCache_clear(self->bdb->cache);
+    PyBuffer_Release(&value_view);
+    if (!result) {
         return set_bdb_error(self->bdb->bdb, NULL);
     }
     self->bdb->changed = true;
+    self->bdb->version++;
     Py_RETURN_NONE;
 }
 
@@ -258,10 +250,17 @@ available record (if at all possible).");
 static PyObject *
 BDBCursor_remove(BDBCursor *self)
 {
-    if (!tcbdbcurout(self->cur)) {
+    bool result;
+
+    Py_BEGIN_ALLOW_THREADS
+    result = tcbdbcurout(self->cur);
+    Py_END_ALLOW_THREADS
+    DBCache_clear(self->bdb->cache);
+    if (!result) {
         return set_bdb_error(self->bdb->bdb, NULL);
     }
     self->bdb->changed = true;
+    self->bdb->version++;
     Py_RETURN_NONE;
 }
 
@@ -279,7 +278,9 @@ BDBCursor_key(BDBCursor *self)
     int key_size;
     PyObject *pykey;
 
+    Py_BEGIN_ALLOW_THREADS
     key = tcbdbcurkey(self->cur, &key_size);
+    Py_END_ALLOW_THREADS
     if (!key) {
         return set_bdb_error(self->bdb->bdb, NULL);
     }
@@ -302,7 +303,9 @@ BDBCursor_value(BDBCursor *self)
     int value_size;
     PyObject *pyvalue;
 
+    Py_BEGIN_ALLOW_THREADS
     value = tcbdbcurval(self->cur, &value_size);
+    Py_END_ALLOW_THREADS
     if (!value) {
         return set_bdb_error(self->bdb->bdb, NULL);
     }
@@ -322,11 +325,15 @@ static PyObject *
 BDBCursor_item(BDBCursor *self)
 {
     TCXSTR *key, *value;
+    bool result;
     PyObject *pykey, *pyvalue, *pyresult = NULL;
 
     key = tcxstrnew();
     value = tcxstrnew();
-    if (!tcbdbcurrec(self->cur, key, value)) {
+    Py_BEGIN_ALLOW_THREADS
+    result = tcbdbcurrec(self->cur, key, value);
+    Py_END_ALLOW_THREADS
+    if (!result) {
         set_bdb_error(self->bdb->bdb, NULL);
     }
     else {
@@ -401,21 +408,110 @@ static PyTypeObject BDBCursorType = {
 static PyObject *
 new_BDBIter(BDB *self, PyTypeObject *type)
 {
+    bool result;
     PyObject *iter = DBIter_tp_new(type, (PyObject *)self);
     if (!iter) {
         return NULL;
     }
-    if (!tcbdbcurfirst(self->cur)) {
+    Py_BEGIN_ALLOW_THREADS
+    result = tcbdbcurfirst(self->cur);
+    Py_END_ALLOW_THREADS
+    if (!result) {
         if (tcbdbecode(self->bdb) != TCENOREC) {
             Py_DECREF(iter);
             return set_bdb_error(self->bdb, NULL);
         }
     }
     self->changed = false;
+    ((DBIter *)iter)->version = self->version;
     return iter;
 }
 
 
+/* remember the last key yielded by a resumable iterator, counting the
+   duplicates yielded in a row */
+static void
+BDBIter_set_last(DBIter *self, const void *key, int key_size)
+{
+    TCBDB *bdb = ((BDB *)self->db)->bdb;
+
+    if (self->last_count &&
+        !tcbdbcmpfunc(bdb)(key, key_size, tcxstrptr(self->last),
+                           tcxstrsize(self->last), tcbdbcmpop(bdb))) {
+        self->last_count++;
+    }
+    else {
+        if (!self->last) {
+            self->last = tcxstrnew();
+        }
+        tcxstrclear(self->last);
+        tcxstrcat(self->last, key, key_size);
+        self->last_count = 1;
+    }
+}
+
+
+/* move the cursor after the last key yielded by a resumable iterator,
+   skipping as many records of that key as were yielded */
+static bool
+BDBIter_resume(DBIter *self)
+{
+    BDB *bdb = (BDB *)self->db;
+    TCCMP cmp = tcbdbcmpfunc(bdb->bdb);
+    void *op = tcbdbcmpop(bdb->bdb);
+    const void *last = tcxstrptr(self->last), *key;
+    int last_size = tcxstrsize(self->last), key_size;
+    long skip;
+
+    if (!self->last_count) {
+        return tcbdbcurfirst(bdb->cur) || tcbdbecode(bdb->bdb) == TCENOREC;
+    }
+    if (!tcbdbcurjump(bdb->cur, last, last_size)) {
+        return tcbdbecode(bdb->bdb) == TCENOREC;
+    }
+    for (skip = self->last_count; skip > 0; skip--) {
+        key = tcbdbcurkey3(bdb->cur, &key_size);
+        if (!key || cmp(key, key_size, last, last_size, op)) {
+            break;
+        }
+        tcbdbcurnext(bdb->cur);
+    }
+    return true;
+}
+
+
+/* check that the database did not change during the iteration, a resumable
+   iterator carries on after its last key instead */
+static int
+BDBIter_check(DBIter *self)
+{
+    BDB *bdb = (BDB *)self->db;
+    bool result;
+
+    if (!self->resumable) {
+        if (bdb->changed) {
+            set_error(Error, "BDB changed during iteration");
+            return -1;
+        }
+        return 0;
+    }
+    /* only jump back after the last key if there was a write since the last
+       step, the cursor is still in place otherwise */
+    if (self->version == bdb->version) {
+        return 0;
+    }
+    Py_BEGIN_ALLOW_THREADS
+    result = BDBIter_resume(self);
+    Py_END_ALLOW_THREADS
+    if (!result) {
+        set_bdb_error(bdb->bdb, NULL);
+        return -1;
+    }
+    self->version = bdb->version;
+    return 0;
+}
+
+
 /* BDBIterKeysType.tp_iternext */
 static PyObject *
 BDBIterKeys_tp_iternext(DBIter *self)
@@ -425,22 +521,29 @@ BDBIterKeys_tp_iternext(DBIter *self)
     int key_size;
     PyObject *pykey;
 
-    if (bdb->changed) {
-        return set_error(Error, "BDB changed during iteration");
+    if (BDBIter_check(self)) {
+        return NULL;
     }
+    Py_BEGIN_ALLOW_THREADS
     key = tcbdbcurkey(bdb->cur, &key_size);
+    Py_END_ALLOW_THREADS
     if (!key) {
         if (tcbdbecode(bdb->bdb) == TCENOREC) {
             return set_stopiteration_error();
         }
         return set_bdb_error(bdb->bdb, NULL);
     }
+    if (self->resumable) {
+        BDBIter_set_last(self, key, key_size);
+    }
     pykey = void_to_bytes(key, key_size);
     tcfree(key);
     if (!pykey) {
         return NULL;
     }
+    Py_BEGIN_ALLOW_THREADS
     tcbdbcurnext(bdb->cur);
+    Py_END_ALLOW_THREADS
     return pykey;
 }
 
@@ -490,7 +593,9 @@ BDBIterValues_tp_iternext(DBIter *self)
     if (bdb->changed) {
         return set_error(Error, "BDB changed during iteration");
     }
+    Py_BEGIN_ALLOW_THREADS
     value = tcbdbcurval(bdb->cur, &value_size);
+    Py_END_ALLOW_THREADS
     if (!value) {
         if (tcbdbecode(bdb->bdb) == TCENOREC) {
             return set_stopiteration_error();
@@ -502,7 +607,9 @@ BDBIterValues_tp_iternext(DBIter *self)
     if (!pyvalue) {
         return NULL;
     }
+    Py_BEGIN_ALLOW_THREADS
     tcbdbcurnext(bdb->cur);
+    Py_END_ALLOW_THREADS
     return pyvalue;
 }
 
@@ -546,14 +653,17 @@ BDBIterItems_tp_iternext(DBIter *self)
 {
     BDB *bdb = (BDB *)self->db;
     TCXSTR *key, *value;
+    bool result;
     PyObject *pykey, *pyvalue, *pyresult = NULL;
 
     if (bdb->changed) {
         return set_error(Error, "BDB changed during iteration");
     }
-    key = tcxstrnew();
-    value = tcxstrnew();
-    if (!tcbdbcurrec(bdb->cur, key, value)) {
+    DBIter_borrow_buffers(self, &key, &value);
+    Py_BEGIN_ALLOW_THREADS
+    result = tcbdbcurrec(bdb->cur, key, value);
+    Py_END_ALLOW_THREADS
+    if (!result) {
         if (tcbdbecode(bdb->bdb) == TCENOREC) {
             set_stopiteration_error();
         }
@@ -570,12 +680,13 @@ BDBIterItems_tp_iternext(DBIter *self)
         Py_XDECREF(pykey);
         Py_XDECREF(pyvalue);
     }
-    tcxstrdel(key);
-    tcxstrdel(value);
+    DBIter_return_buffers(self, key, value);
     if (!pyresult) {
         return NULL;
     }
+    Py_BEGIN_ALLOW_THREADS
     tcbdbcurnext(bdb->cur);
+    Py_END_ALLOW_THREADS
     return pyresult;
 }
 
@@ -613,6 +724,545 @@ static PyTypeObject BDBIterItemsType = {
 };
 
 
+/* BDBIterKeysBatchType.tp_iternext */
+static PyObject *
+BDBIterKeysBatch_tp_iternext(DBIter *self)
+{
+    BDB *bdb = (BDB *)self->db;
+    TCLIST *keys;
+    const void *key;
+    int key_size, len;
+    PyObject *pykeys = NULL;
+
+    if (BDBIter_check(self)) {
+        return NULL;
+    }
+    keys = tclistnew2(self->batch);
+    Py_BEGIN_ALLOW_THREADS
+    for (len = 0; len < self->batch; len++) {
+        key = tcbdbcurkey3(bdb->cur, &key_size);
+        if (!key) {
+            break;
+        }
+        tclistpush(keys, key, key_size);
+        if (self->resumable) {
+            BDBIter_set_last(self, key, key_size);
+        }
+        tcbdbcurnext(bdb->cur);
+    }
+    Py_END_ALLOW_THREADS
+    if (len < self->batch && tcbdbecode(bdb->bdb) != TCENOREC) {
+        set_bdb_error(bdb->bdb, NULL);
+    }
+    else if (!len) {
+        set_stopiteration_error();
+    }
+    else {
+        pykeys = tclist_to_list(keys);
+    }
+    tclistdel(keys);
+    return pykeys;
+}
+
+
+/* BDBIterKeysBatchType */
+static PyTypeObject BDBIterKeysBatchType = {
+    PyVarObject_HEAD_INIT(NULL, 0)
+    "tokyo.cabinet.BDBIterKeysBatch",         /*tp_name*/
+    sizeof(DBIter),                           /*tp_basicsize*/
+    0,                                        /*tp_itemsize*/
+    (destructor)DBIter_tp_dealloc,            /*tp_dealloc*/
+    0,                                        /*tp_print*/
+    0,                                        /*tp_getattr*/
+    0,                                        /*tp_setattr*/
+    0,                                        /*tp_compare*/
+    0,                                        /*tp_repr*/
+    0,                                        /*tp_as_number*/
+    0,                                        /*tp_as_sequence*/
+    0,                                        /*tp_as_mapping*/
+    0,                                        /*tp_hash */
+    0,                                        /*tp_call*/
+    0,                                        /*tp_str*/
+    0,                                        /*tp_getattro*/
+    0,                                        /*tp_setattro*/
+    0,                                        /*tp_as_buffer*/
+    Py_TPFLAGS_DEFAULT | Py_TPFLAGS_HAVE_GC,  /*tp_flags*/
+    0,                                        /*tp_doc*/
+    (traverseproc)DBIter_tp_traverse,         /*tp_traverse*/
+    (inquiry)DBIter_tp_clear,                 /*tp_clear*/
+    0,                                        /*tp_richcompare*/
+    0,                                        /*tp_weaklistoffset*/
+    PyObject_SelfIter,                        /*tp_iter*/
+    (iternextfunc)BDBIterKeysBatch_tp_iternext, /*tp_iternext*/
+    DBIterBatch_tp_methods,                   /*tp_methods*/
+};
+
+
+/* BDBIterItemsBatchType.tp_iternext */
+static PyObject *
+BDBIterItemsBatch_tp_iternext(DBIter *self)
+{
+    BDB *bdb = (BDB *)self->db;
+    TCLIST *keys, *values;
+    TCXSTR *key, *value;
+    int len;
+    PyObject *pyitems = NULL;
+
+    if (bdb->changed) {
+        return set_error(Error, "BDB changed during iteration");
+    }
+    keys = tclistnew2(self->batch);
+    values = tclistnew2(self->batch);
+    DBIter_borrow_buffers(self, &key, &value);
+    Py_BEGIN_ALLOW_THREADS
+    for (len = 0; len < self->batch; len++) {
+        if (!tcbdbcurrec(bdb->cur, key, value)) {
+            break;
+        }
+        tclistpush(keys, tcxstrptr(key), tcxstrsize(key));
+        tclistpush(values, tcxstrptr(value), tcxstrsize(value));
+        tcbdbcurnext(bdb->cur);
+    }
+    Py_END_ALLOW_THREADS
+    if (len < self->batch && tcbdbecode(bdb->bdb) != TCENOREC) {
+        set_bdb_error(bdb->bdb, NULL);
+    }
+    else if (!len) {
+        set_stopiteration_error();
+    }
+    else {
+        pyitems = tclists_to_items(keys, values);
+    }
+    DBIter_return_buffers(self, key, value);
+    tclistdel(keys);
+    tclistdel(values);
+    return pyitems;
+}
+
+
+/* BDBIterItemsBatchType */
+static PyTypeObject BDBIterItemsBatchType = {
+    PyVarObject_HEAD_INIT(NULL, 0)
+    "tokyo.cabinet.BDBIterItemsBatch",        /*tp_name*/
+    sizeof(DBIter),                           /*tp_basicsize*/
+    0,                                        /*tp_itemsize*/
+    (destructor)DBIter_tp_dealloc,            /*tp_dealloc*/
+    0,                                        /*tp_print*/
+    0,                                        /*tp_getattr*/
+    0,                                        /*tp_setattr*/
+    0,                                        /*tp_compare*/
+    0,                                        /*tp_repr*/
+    0,                                        /*tp_as_number*/
+    0,                                        /*tp_as_sequence*/
+    0,                                        /*tp_as_mapping*/
+    0,                                        /*tp_hash */
+    0,                                        /*tp_call*/
+    0,                                        /*tp_str*/
+    0,                                        /*tp_getattro*/
+    0,                                        /*tp_setattro*/
+    0,                                        /*tp_as_buffer*/
+    Py_TPFLAGS_DEFAULT | Py_TPFLAGS_HAVE_GC,  /*tp_flags*/
+    0,                                        /*tp_doc*/
+    (traverseproc)DBIter_tp_traverse,         /*tp_traverse*/
+    (inquiry)DBIter_tp_clear,                 /*tp_clear*/
+    0,                                        /*tp_richcompare*/
+    0,                                        /*tp_weaklistoffset*/
+    PyObject_SelfIter,                        /*tp_iter*/
+    (iternextfunc)BDBIterItemsBatch_tp_iternext, /*tp_iternext*/
+    DBIterBatch_tp_methods,                   /*tp_methods*/
+};
+
+
+/*******************************************************************************
+* BDBScanType
+*******************************************************************************/
+
+/* number of records a BDBScan reads at once */
+#define BDBSCAN_BATCH 256
+
+
+/* new_BDBScan */
+static BDBScan *
+new_BDBScan(PyTypeObject *type, BDB *bdb)
+{
+    BDBScan *self = (BDBScan *)type->tp_alloc(type, 0);
+    if (!self) {
+        return NULL;
+    }
+    /* self->cur */
+    Py_BEGIN_ALLOW_THREADS
+    self->cur = tcbdbcurnew(bdb->bdb);
+    Py_END_ALLOW_THREADS
+    if (!self->cur) {
+        set_error(Error, "could not create BDBScan, memory issue?");
+        Py_DECREF(self);
+        return NULL;
+    }
+    /* self->keys, self->values */
+    self->keys = tclistnew2(BDBSCAN_BATCH);
+    self->values = tclistnew2(BDBSCAN_BATCH);
+    /* self->bdb */
+    Py_INCREF(bdb);
+    self->bdb = bdb;
+    self->start_inclusive = true;
+    self->limit = -1;
+    return self;
+}
+
+
+/* BDBScanType.tp_traverse */
+static int
+BDBScan_tp_traverse(BDBScan *self, visitproc visit, void *arg)
+{
+    Py_VISIT(self->bdb);
+    return 0;
+}
+
+
+/* BDBScanType.tp_clear */
+static int
+BDBScan_tp_clear(BDBScan *self)
+{
+    Py_CLEAR(self->bdb);
+    return 0;
+}
+
+
+/* BDBScanType.tp_dealloc */
+static void
+BDBScan_tp_dealloc(BDBScan *self)
+{
+    if (self->cur) {
+        tcbdbcurdel(self->cur);
+    }
+    if (self->keys) {
+        tclistdel(self->keys);
+    }
+    if (self->values) {
+        tclistdel(self->values);
+    }
+    tcfree(self->start);
+    tcfree(self->stop);
+    tcfree(self->prefix);
+    BDBScan_tp_clear(self);
+    Py_TYPE(self)->tp_free((PyObject *)self);
+}
+
+
+/* compare two keys with the comparison function of the database */
+static int
+BDBScan_cmp(BDBScan *self, const void *a, int a_size, const void *b,
+            int b_size)
+{
+    TCBDB *bdb = self->bdb->bdb;
+
+    return tcbdbcmpfunc(bdb)((const char *)a, a_size, (const char *)b, b_size,
+                             tcbdbcmpop(bdb));
+}
+
+
+/* record the error of a failed cursor operation, the end of the database is
+   not an error */
+static void
+BDBScan_fail(BDBScan *self)
+{
+    int ecode = tcbdbecode(self->bdb->bdb);
+
+    if (ecode != TCENOREC) {
+        self->ecode = ecode;
+    }
+    self->done = true;
+}
+
+
+/* the smallest key greater than all the keys starting with prefix (in
+   lexical order), NULL if there is none */
+static void *
+prefix_successor(const void *prefix, int prefix_size, int *size)
+{
+    unsigned char *result;
+
+    while (prefix_size > 0 &&
+           ((const unsigned char *)prefix)[prefix_size - 1] == 0xff) {
+        prefix_size--;
+    }
+    if (!prefix_size) {
+        return NULL;
+    }
+    result = (unsigned char *)tcmemdup(prefix, prefix_size);
+    result[prefix_size - 1]++;
+    *size = prefix_size;
+    return result;
+}
+
+
+/* move the cursor to the first record of a forward scan */
+static bool
+BDBScan_position_forward(BDBScan *self)
+{
+    const void *key;
+    int key_size;
+    bool result;
+
+    if (self->start &&
+        (!self->prefix || BDBScan_cmp(self, self->start, self->start_size,
+                                      self->prefix, self->prefix_size) >= 0)) {
+        result = tcbdbcurjump(self->cur, self->start, self->start_size);
+    }
+    else if (self->prefix) {
+        result = tcbdbcurjump(self->cur, self->prefix, self->prefix_size);
+    }
+    else {
+        result = tcbdbcurfirst(self->cur);
+    }
+    /* skip an excluded start */
+    while (result && self->start && !self->start_inclusive) {
+        key = tcbdbcurkey3(self->cur, &key_size);
+        if (!key) {
+            return false;
+        }
+        if (BDBScan_cmp(self, key, key_size, self->start, self->start_size)) {
+            break;
+        }
+        result = tcbdbcurnext(self->cur);
+    }
+    return result;
+}
+
+
+/* move the cursor to the first record of a reverse scan (the last one of the
+   range) */
+static bool
+BDBScan_position_reverse(BDBScan *self)
+{
+    const void *key, *upper = self->stop;
+    void *successor = NULL;
+    int key_size, upper_size = self->stop_size, successor_size, cmp;
+    bool inclusive = self->stop_inclusive, result;
+
+    if (self->prefix) {
+        successor = prefix_successor(self->prefix, self->prefix_size,
+                                     &successor_size);
+        if (successor &&
+            (!upper || BDBScan_cmp(self, successor, successor_size,
+                                   upper, upper_size) <= 0)) {
+            upper = successor;
+            upper_size = successor_size;
+            inclusive = false;
+        }
+    }
+    if (upper) {
+        result = tcbdbcurjumpback(self->cur, upper, upper_size);
+    }
+    else {
+        result = tcbdbcurlast(self->cur);
+    }
+    /* skip the records after the upper bound */
+    while (result && upper) {
+        key = tcbdbcurkey3(self->cur, &key_size);
+        if (!key) {
+            result = false;
+            break;
+        }
+        cmp = BDBScan_cmp(self, key, key_size, upper, upper_size);
+        if (cmp < 0 || (!cmp && inclusive)) {
+            break;
+        }
+        result = tcbdbcurprev(self->cur);
+    }
+    tcfree(successor);
+    return result;
+}
+
+
+/* read the next batch of records, called with the GIL released */
+static void
+BDBScan_fill(BDBScan *self)
+{
+    const void *key, *value;
+    int key_size, value_size, cmp;
+    bool result;
+
+    tclistclear(self->keys);
+    tclistclear(self->values);
+    self->pos = 0;
+    if (!self->positioned) {
+        self->positioned = true;
+        result = self->reverse ? BDBScan_position_reverse(self)
+                               : BDBScan_position_forward(self);
+        if (!result) {
+            BDBScan_fail(self);
+            return;
+        }
+    }
+    while (tclistnum(self->keys) < BDBSCAN_BATCH) {
+        if (!self->limit) {
+            self->done = true;
+            return;
+        }
+        key = tcbdbcurkey3(self->cur, &key_size);
+        if (!key) {
+            BDBScan_fail(self);
+            return;
+        }
+        if (self->prefix && (key_size < self->prefix_size ||
+                             memcmp(key, self->prefix, self->prefix_size))) {
+            self->done = true;
+            return;
+        }
+        if (!self->reverse && self->stop) {
+            cmp = BDBScan_cmp(self, key, key_size, self->stop,
+                              self->stop_size);
+            if (cmp > 0 || (!cmp && !self->stop_inclusive)) {
+                self->done = true;
+                return;
+            }
+        }
+        else if (self->reverse && self->start) {
+            cmp = BDBScan_cmp(self, key, key_size, self->start,
+                              self->start_size);
+            if (cmp < 0 || (!cmp && !self->start_inclusive)) {
+                self->done = true;
+                return;
+            }
+        }
+        if (self->skip > 0) {
+            self->skip--;
+        }
+        else {
+            tclistpush(self->keys, key, key_size);
+            if (!self->keys_only) {
+                value = tcbdbcurval3(self->cur, &value_size);
+                if (!value) {
+                    tcfree(tclistpop(self->keys, &key_size));
+                    BDBScan_fail(self);
+                    return;
+                }
+                tclistpush(self->values, value, value_size);
+            }
+            if (self->limit > 0) {
+                self->limit--;
+            }
+        }
+        result = self->reverse ? tcbdbcurprev(self->cur)
+                               : tcbdbcurnext(self->cur);
+        if (!result) {
+            BDBScan_fail(self);
+            return;
+        }
+    }
+}
+
+
+/* BDBScanType.tp_iternext */
+static PyObject *
+BDBScan_tp_iternext(BDBScan *self)
+{
+    const void *key, *value;
+    int key_size, value_size;
+    PyObject *pykey, *pyvalue, *pyresult = NULL;
+
+    if (self->busy) {
+        return set_error(PyExc_ValueError, "BDBScan already executing");
+    }
+    if (self->pos >= tclistnum(self->keys)) {
+        if (self->done) {
+            if (self->ecode != TCESUCCESS) {
+                pyresult = set_error(Error, tcbdberrmsg(self->ecode));
+                self->ecode = TCESUCCESS;
+                return pyresult;
+            }
+            return set_stopiteration_error();
+        }
+        self->busy = true;
+        Py_BEGIN_ALLOW_THREADS
+        BDBScan_fill(self);
+        Py_END_ALLOW_THREADS
+        self->busy = false;
+        if (!tclistnum(self->keys)) {
+            return BDBScan_tp_iternext(self);
+        }
+    }
+    key = tclistval(self->keys, self->pos, &key_size);
+    if (self->keys_only) {
+        pyresult = void_to_bytes(key, key_size);
+    }
+    else if (self->values_only) {
+        value = tclistval(self->values, self->pos, &value_size);
+        pyresult = void_to_bytes(value, value_size);
+    }
+    else {
+        value = tclistval(self->values, self->pos, &value_size);
+        pykey = void_to_bytes(key, key_size);
+        pyvalue = void_to_bytes(value, value_size);
+        if (pykey && pyvalue) {
+            pyresult = PyTuple_Pack(2, pykey, pyvalue);
+        }
+        Py_XDECREF(pykey);
+        Py_XDECREF(pyvalue);
+    }
+    if (pyresult) {
+        self->pos++;
+    }
+    return pyresult;
+}
+
+
+/* convert the limit of a scan, None (unlimited) or a positive int */
+static int
+parse_scan_limit(PyObject *pylimit, int *limit)
+{
+    long result;
+
+    *limit = -1;
+    if (pylimit == Py_None) {
+        return 0;
+    }
+    result = PyLong_AsLong(pylimit);
+    if (result == -1 && PyErr_Occurred()) {
+        return -1;
+    }
+    if (result < 0) {
+        set_error(PyExc_ValueError, "limit must be positive or 0");
+        return -1;
+    }
+    *limit = (result > INT_MAX) ? INT_MAX : (int)result;
+    return 0;
+}
+
+
+/* BDBScanType */
+static PyTypeObject BDBScanType = {
+    PyVarObject_HEAD_INIT(NULL, 0)
+    "tokyo.cabinet.BDBScan",                  /*tp_name*/
+    sizeof(BDBScan),                          /*tp_basicsize*/
+    0,                                        /*tp_itemsize*/
+    (destructor)BDBScan_tp_dealloc,           /*tp_dealloc*/
+    0,                                        /*tp_print*/
+    0,                                        /*tp_getattr*/
+    0,                                        /*tp_setattr*/
+    0,                                        /*tp_compare*/
+    0,                                        /*tp_repr*/
+    0,                                        /*tp_as_number*/
+    0,                                        /*tp_as_sequence*/
+    0,                                        /*tp_as_mapping*/
+    0,                                        /*tp_hash */
+    0,                                        /*tp_call*/
+    0,                                        /*tp_str*/
+    0,                                        /*tp_getattro*/
+    0,                                        /*tp_setattro*/
+    0,                                        /*tp_as_buffer*/
+    Py_TPFLAGS_DEFAULT | Py_TPFLAGS_HAVE_GC,  /*tp_flags*/
+    0,                                        /*tp_doc*/
+    (traverseproc)BDBScan_tp_traverse,        /*tp_traverse*/
+    (inquiry)BDBScan_tp_clear,                /*tp_clear*/
+    0,                                        /*tp_richcompare*/
+    0,                                        /*tp_weaklistoffset*/
+    PyObject_SelfIter,                        /*tp_iter*/
+    (iternextfunc)BDBScan_tp_iternext,        /*tp_iternext*/
+};
+
+
 /*******************************************************************************
 * BDBType
 *******************************************************************************/
@@ -623,7 +1273,9 @@ BDB_cmp_cb(const char *a, int a_size, const char *b, int b_size, void *op)
 {
     PyObject *pyresult = NULL, *pya, *pyb, *callback = op;
     int result;
+    PyGILState_STATE gstate;
 
+    gstate = PyGILState_Ensure();
     pya = PyBytes_FromStringAndSize(a, (Py_ssize_t)a_size);
     pyb = PyBytes_FromStringAndSize(b, (Py_ssize_t)b_size);
     if (!(pya && pyb)) {
@@ -654,10 +1306,135 @@ finish:
     Py_XDECREF(pya);
     Py_XDECREF(pyb);
     Py_XDECREF(pyresult);
+    PyGILState_Release(gstate);
     return result;
 }
 
 
+/* compare keys of different sizes than the expected one of a fixed-width
+   comparator (shortest first, then lexically) */
+static int
+BDB_cmp_size(const char *a, int a_size, const char *b, int b_size)
+{
+    int result;
+
+    if (a_size != b_size) {
+        return (a_size < b_size) ? -1 : 1;
+    }
+    result = memcmp(a, b, (size_t)a_size);
+    return (result > 0) - (result < 0);
+}
+
+
+/* decode a big-endian (or little-endian) two's complement integer of size
+   bytes */
+static int64_t
+BDB_decode_int(const char *value, int size, bool big_endian)
+{
+    const unsigned char *bytes = (const unsigned char *)value;
+    uint64_t result = 0;
+    int i;
+
+    for (i = 0; i < size; i++) {
+        result = (result << 8) | bytes[big_endian ? i : size - 1 - i];
+    }
+    if (size < 8 && (result & ((uint64_t)1 << (size * 8 - 1)))) {
+        result |= ~(uint64_t)0 << (size * 8);
+    }
+    return (int64_t)result;
+}
+
+
+static int
+BDB_cmp_int(const char *a, int a_size, const char *b, int b_size, int size,
+            bool big_endian)
+{
+    int64_t a_num, b_num;
+
+    if (a_size != size || b_size != size) {
+        return BDB_cmp_size(a, a_size, b, b_size);
+    }
+    a_num = BDB_decode_int(a, size, big_endian);
+    b_num = BDB_decode_int(b, size, big_endian);
+    return (a_num > b_num) - (a_num < b_num);
+}
+
+
+static int
+BDB_cmp_int32be(const char *a, int a_size, const char *b, int b_size, void *op)
+{
+    return BDB_cmp_int(a, a_size, b, b_size, 4, true);
+}
+
+
+static int
+BDB_cmp_int32le(const char *a, int a_size, const char *b, int b_size, void *op)
+{
+    return BDB_cmp_int(a, a_size, b, b_size, 4, false);
+}
+
+
+static int
+BDB_cmp_int64be(const char *a, int a_size, const char *b, int b_size, void *op)
+{
+    return BDB_cmp_int(a, a_size, b, b_size, 8, true);
+}
+
+
+static int
+BDB_cmp_int64le(const char *a, int a_size, const char *b, int b_size, void *op)
+{
+    return BDB_cmp_int(a, a_size, b, b_size, 8, false);
+}
+
+
+/* native comparators selectable by name with setcmpfunc() */
+typedef struct {
+    const char *name;
+    TCCMP cmp;
+} BDBComparator;
+
+static BDBComparator BDB_comparators[] = {
+    {"lexical", tccmplexical},
+    {"decimal", tccmpdecimal},
+    {"int32", tccmpint32},
+    {"int64", tccmpint64},
+    {"int32be", BDB_cmp_int32be},
+    {"int32le", BDB_cmp_int32le},
+    {"int64be", BDB_cmp_int64be},
+    {"int64le", BDB_cmp_int64le},
+    {NULL, NULL}  /* Sentinel */
+};
+
+
+/* the reverse order of the BDBComparator op */
+static int
+BDB_cmp_reverse(const char *a, int a_size, const char *b, int b_size, void *op)
+{
+    return ((BDBComparator *)op)->cmp(b, b_size, a, a_size, NULL);
+}
+
+
+/* look up a native comparator by name ("reverse_" selects the reverse order),
+   return NULL if there is no such comparator */
+static BDBComparator *
+BDB_comparator(const char *name, bool *reverse)
+{
+    BDBComparator *comparator;
+
+    *reverse = !strncmp(name, "reverse_", 8);
+    if (*reverse) {
+        name += 8;
+    }
+    for (comparator = BDB_comparators; comparator->name; comparator++) {
+        if (!strcmp(comparator->name, name)) {
+            return comparator;
+        }
+    }
+    return NULL;
+}
+
+
 /* BDBType.tp_doc */
 PyDoc_STRVAR(BDB_tp_doc,
 "BDB()\n\
@@ -679,6 +1456,7 @@ BDB_tp_dealloc(BDB *self)
     if (self->bdb) {
         tcbdbdel(self->bdb);
     }
+    DBCache_del(self->cache);
     Py_TYPE(self)->tp_free((PyObject *)self);
 }
 
@@ -718,13 +1496,26 @@ BDB_tp_new(PyTypeObject *type, PyObject *args, PyObject *kwargs)
 static int
 BDB_Contains(BDB *self, PyObject *pykey)
 {
+    Py_buffer key_view;
     void *key, *value;
     int key_size, value_size;
+    unsigned long long version;
 
-    if (bytes_to_void(pykey, &key, &key_size)) {
+    if (bytes_to_void(pykey, &key_view, &key, &key_size)) {
         return -1;
     }
+    if (DBCache_get(self->cache, key, key_size, &value_size)) {
+        PyBuffer_Release(&key_view);
+        return 1;
+    }
+    version = self->version;
+    Py_BEGIN_ALLOW_THREADS
     value = tcbdbget(self->bdb, key, key_size, &value_size);
+    Py_END_ALLOW_THREADS
+    if (value) {
+        DBCache_fill(self->cache, version, key, key_size, value, value_size);
+    }
+    PyBuffer_Release(&key_view);
     if (!value) {
         if (tcbdbecode(self->bdb) == TCENOREC) {
             return 0;
@@ -754,57 +1545,108 @@ static PySequenceMethods BDB_tp_as_sequence = {
 static Py_ssize_t
 BDB_Length(BDB *self)
 {
-    return DB_Length(tcbdbrnum(self->bdb));
+    uint64_t len;
+
+    /* the GIL must be released around any call taking the lock of the
+       database, a Python compare callback may hold it while waiting for the
+       GIL */
+    Py_BEGIN_ALLOW_THREADS
+    len = tcbdbrnum(self->bdb);
+    Py_END_ALLOW_THREADS
+    return DB_Length(len);
 }
 
 
-/* BDB_tp_as_mapping.mp_subscript */
+/* retrieve a record, as a RecordView if view is true */
 static PyObject *
-BDB_GetItem(BDB *self, PyObject *pykey)
+BDB_Get(BDB *self, PyObject *pykey, bool view)
 {
+    Py_buffer key_view;
     void *key, *value;
     int key_size, value_size;
+    unsigned long long version;
+    const void *cached;
     PyObject *pyvalue;
 
-    if (bytes_to_void(pykey, &key, &key_size)) {
+    if (bytes_to_key(pykey, &key_view, &key, &key_size)) {
         return NULL;
     }
+    cached = DBCache_get(self->cache, key, key_size, &value_size);
+    if (cached) {
+        PyBuffer_Release(&key_view);
+        return DBCache_to_value(cached, value_size, view);
+    }
+    version = self->version;
+    Py_BEGIN_ALLOW_THREADS
     value = tcbdbget(self->bdb, key, key_size, &value_size);
+    Py_END_ALLOW_THREADS
     if (!value) {
-        return set_bdb_error(self->bdb, key);
+        set_bdb_error(self->bdb, key);
+        PyBuffer_Release(&key_view);
+        return NULL;
+    }
+    DBCache_fill(self->cache, version, key, key_size, value, value_size);
+    if (view) {
+        PyBuffer_Release(&key_view);
+        return void_to_view(value, value_size);
     }
     pyvalue = void_to_bytes(value, value_size);
     tcfree(value);
+    PyBuffer_Release(&key_view);
     return pyvalue;
 }
 
 
+/* BDB_tp_as_mapping.mp_subscript */
+static PyObject *
+BDB_GetItem(BDB *self, PyObject *pykey)
+{
+    return BDB_Get(self, pykey, false);
+}
+
+
 /* BDB_tp_as_mapping.mp_ass_subscript */
 static int
 BDB_SetItem(BDB *self, PyObject *pykey, PyObject *pyvalue)
 {
+    Py_buffer key_view, value_view;
     void *key, *value;
     int key_size, value_size;
+    bool result;
 
-    if (bytes_to_void(pykey, &key, &key_size)) {
+    if (bytes_to_key(pykey, &key_view, &key, &key_size)) {
         return -1;
     }
     if (pyvalue) {
-        if (bytes_to_void(pyvalue, &value, &value_size)) {
+        if (bytes_to_void(pyvalue, &value_view, &value, &value_size)) {
+            PyBuffer_Release(&key_view);
             return -1;
         }
-        if (!tcbdbput(self->bdb, key, key_size, value, value_size)) {
+        Py_BEGIN_ALLOW_THREADS
+        result = tcbdbput(self->bdb, key, key_size, value, value_size);
+        Py_END_ALLOW_THREADS
+        PyBuffer_Release(&value_view);
+        DBCache_out(self->cache, key, key_size);
+        if (!result) {
             set_bdb_error(self->bdb, NULL);
+            PyBuffer_Release(&key_view);
             return -1;
         }
     }
     else {
-        if (!tcbdbout(self->bdb, key, key_size)) {
+        Py_BEGIN_ALLOW_THREADS
+        result = tcbdbout(self->bdb, key, key_size);
+        Py_END_ALLOW_THREADS
+        DBCache_out(self->cache, key, key_size);
+        if (!result) {
             set_bdb_error(self->bdb, key);
+            PyBuffer_Release(&key_view);
             return -1;
         }
     }
     self->changed = true;
+    self->version++;
+    PyBuffer_Release(&key_view);
     return 0;
 }
 
@@ -838,11 +1680,16 @@ BDB_open(BDB *self, PyObject *args)
 {
     const char *path;
     int mode;
+    bool result;
 
     if (!PyArg_ParseTuple(args, "si:open", &path, &mode)) {
         return NULL;
     }
-    if (!tcbdbopen(self->bdb, path, mode)) {
+    Py_BEGIN_ALLOW_THREADS
+    result = tcbdbopen(self->bdb, path, mode);
+    Py_END_ALLOW_THREADS
+    DBCache_clear(self->cache);
+    if (!result) {
         return set_bdb_error(self->bdb, NULL);
     }
     Py_RETURN_NONE;
@@ -861,7 +1708,13 @@ BDBs are closed when garbage-collected.");
 static PyObject *
 BDB_close(BDB *self)
 {
-    if (!tcbdbclose(self->bdb)) {
+    bool result;
+
+    Py_BEGIN_ALLOW_THREADS
+    result = tcbdbclose(self->bdb);
+    Py_END_ALLOW_THREADS
+    DBCache_clear(self->cache);
+    if (!result) {
         return set_bdb_error(self->bdb, NULL);
     }
     Py_RETURN_NONE;
@@ -877,10 +1730,17 @@ Remove all records from the database.");
 static PyObject *
 BDB_clear(BDB *self)
 {
-    if (!tcbdbvanish(self->bdb)) {
+    bool result;
+
+    Py_BEGIN_ALLOW_THREADS
+    result = tcbdbvanish(self->bdb);
+    Py_END_ALLOW_THREADS
+    DBCache_clear(self->cache);
+    if (!result) {
         return set_bdb_error(self->bdb, NULL);
     }
     self->changed = true;
+    self->version++;
     Py_RETURN_NONE;
 }
 
@@ -896,6 +1756,7 @@ static PyObject *
 BDB_copy(BDB *self, PyObject *args)
 {
     const char *path;
+    bool result;
 
     if (!PyArg_ParseTuple(args, "s:copy", &path)) {
         return NULL;
@@ -905,7 +1766,10 @@ BDB_copy(BDB *self, PyObject *args)
         return set_error(PyExc_NotImplementedError,
                          "this feature is not supported");
     }
-    if (!tcbdbcopy(self->bdb, path)) {
+    Py_BEGIN_ALLOW_THREADS
+    result = tcbdbcopy(self->bdb, path);
+    Py_END_ALLOW_THREADS
+    if (!result) {
         return set_bdb_error(self->bdb, NULL);
     }
     Py_RETURN_NONE;
@@ -921,7 +1785,12 @@ Begin a transaction.");
 static PyObject *
 BDB_begin(BDB *self)
 {
-    if (!tcbdbtranbegin(self->bdb)) {
+    bool result;
+
+    Py_BEGIN_ALLOW_THREADS
+    result = tcbdbtranbegin(self->bdb);
+    Py_END_ALLOW_THREADS
+    if (!result) {
         return set_bdb_error(self->bdb, NULL);
     }
     Py_RETURN_NONE;
@@ -937,7 +1806,12 @@ Commit a transaction.");
 static PyObject *
 BDB_commit(BDB *self)
 {
-    if (!tcbdbtrancommit(self->bdb)) {
+    bool result;
+
+    Py_BEGIN_ALLOW_THREADS
+    result = tcbdbtrancommit(self->bdb);
+    Py_END_ALLOW_THREADS
+    if (!result) {
         return set_bdb_error(self->bdb, NULL);
     }
     Py_RETURN_NONE;
@@ -953,50 +1827,127 @@ Abort a transaction.");
 static PyObject *
 BDB_abort(BDB *self)
 {
-    if (!tcbdbtranabort(self->bdb)) {
+    bool result;
+
+    Py_BEGIN_ALLOW_THREADS
+    result = tcbdbtranabort(self->bdb);
+    Py_END_ALLOW_THREADS
+    DBCache_clear(self->cache);
+    if (!result) {
         return set_bdb_error(self->bdb, NULL);
     }
     Py_RETURN_NONE;
 }
 
 
-/* BDB.get(key[, duplicate=False]) */
+/* BDB.get(key[, duplicate=False[, view=False]]) */
 PyDoc_STRVAR(BDB_get_doc,
-"get(key[, duplicate=False])\n\
+"get(key[, duplicate=False[, view=False]])\n\
 \n\
-Retrieve records.");
+Retrieve records. If view is True, return a read-only RecordView supporting\n\
+the buffer protocol instead of copying the value to bytes (view cannot be\n\
+used with duplicate).");
 
 static PyObject *
 BDB_get(BDB *self, PyObject *args, PyObject *kwargs)
 {
-    PyObject *pykey, *pyresult, *duplicate = Py_False;
+    PyObject *pykey, *pyresult, *duplicate = Py_False, *view = Py_False;
+    Py_buffer key_view;
     void *key;
     int key_size;
     TCLIST *result;
 
-    static char *kwlist[] = {"key", "duplicate", NULL};
+    static char *kwlist[] = {"key", "duplicate", "view", NULL};
 
-    if (!PyArg_ParseTupleAndKeywords(args, kwargs, "O|O:get", kwlist,
-                                     &pykey, &duplicate)) {
+    if (!PyArg_ParseTupleAndKeywords(args, kwargs, "O|OO:get", kwlist,
+                                     &pykey, &duplicate, &view)) {
         return NULL;
     }
-    if (!PyBool_Check(duplicate)) {
+    if (!PyBool_Check(duplicate) || !PyBool_Check(view)) {
         return set_error(PyExc_TypeError, "a boolean is required");
     }
     if (duplicate == Py_False) {
-        return BDB_GetItem(self, pykey);
+        return BDB_Get(self, pykey, view == Py_True);
     }
-    if (bytes_to_void(pykey, &key, &key_size)) {
+    if (view == Py_True) {
+        return set_error(PyExc_ValueError,
+                         "view cannot be used with duplicate");
+    }
+    if (bytes_to_key(pykey, &key_view, &key, &key_size)) {
         return NULL;
     }
     Py_BEGIN_ALLOW_THREADS
     result = tcbdbget4(self->bdb, key, key_size);
     Py_END_ALLOW_THREADS
     if (!result) {
-        return set_bdb_error(self->bdb, key);
+        set_bdb_error(self->bdb, key);
+        PyBuffer_Release(&key_view);
+        return NULL;
     }
     pyresult = tclist_to_tuple(result);
     tclistdel(result);
+    PyBuffer_Release(&key_view);
+    return pyresult;
+}
+
+
+/* BDB.getmany(keys[, default=None]) -> list */
+PyDoc_STRVAR(BDB_getmany_doc,
+"getmany(keys[, default=None]) -> list\n\
+\n\
+Retrieve several records at once. Return a list of values in the same order as\n\
+keys, missing records are replaced by default.");
+
+static PyObject *
+BDB_getmany(BDB *self, PyObject *args, PyObject *kwargs)
+{
+    PyObject *pykeys, *pydefault = Py_None, *pyresult = NULL;
+    TCLIST *keys;
+    const void *key;
+    void **values;
+    int *value_sizes;
+    int key_size, len, i;
+
+    static char *kwlist[] = {"keys", "default", NULL};
+
+    if (!PyArg_ParseTupleAndKeywords(args, kwargs, "O|O:getmany", kwlist,
+                                     &pykeys, &pydefault)) {
+        return NULL;
+    }
+    keys = seq_to_tclist(pykeys);
+    if (!keys) {
+        return NULL;
+    }
+    len = tclistnum(keys);
+    values = PyMem_New(void *, len);
+    value_sizes = PyMem_New(int, len);
+    if (!values || !value_sizes) {
+        PyMem_Free(values);
+        PyMem_Free(value_sizes);
+        tclistdel(keys);
+        return PyErr_NoMemory();
+    }
+    Py_BEGIN_ALLOW_THREADS
+    for (i = 0; i < len; i++) {
+        key = tclistval(keys, i, &key_size);
+        values[i] = tcbdbget(self->bdb, key, key_size, &value_sizes[i]);
+        if (!values[i] && tcbdbecode(self->bdb) != TCENOREC) {
+            break;
+        }
+    }
+    Py_END_ALLOW_THREADS
+    if (i < len) {
+        set_bdb_error(self->bdb, NULL);
+        while (i--) {
+            tcfree(values[i]);
+        }
+    }
+    else {
+        pyresult = values_to_list(values, value_sizes, len, pydefault);
+    }
+    PyMem_Free(values);
+    PyMem_Free(value_sizes);
+    tclistdel(keys);
     return pyresult;
 }
 
@@ -1011,6 +1962,7 @@ static PyObject *
 BDB_remove(BDB *self, PyObject *args, PyObject *kwargs)
 {
     PyObject *pykey, *duplicate = Py_False;
+    Py_buffer key_view;
     void *key;
     int key_size;
     bool result;
@@ -1030,20 +1982,85 @@ BDB_remove(BDB *self, PyObject *args, PyObject *kwargs)
         }
         Py_RETURN_NONE;
     }
-    if (bytes_to_void(pykey, &key, &key_size)) {
+    if (bytes_to_key(pykey, &key_view, &key, &key_size)) {
         return NULL;
     }
     Py_BEGIN_ALLOW_THREADS
     result = tcbdbout3(self->bdb, key, key_size);
     Py_END_ALLOW_THREADS
+    DBCache_out(self->cache, key, key_size);
     if (!result) {
-        return set_bdb_error(self->bdb, key);
+        set_bdb_error(self->bdb, key);
+        PyBuffer_Release(&key_view);
+        return NULL;
     }
     self->changed = true;
+    self->version++;
+    PyBuffer_Release(&key_view);
     Py_RETURN_NONE;
 }
 
 
+/* BDB.removemany(keys[, missing_ok=True]) -> int */
+PyDoc_STRVAR(BDB_removemany_doc,
+"removemany(keys[, missing_ok=True]) -> int\n\
+\n\
+Remove several records at once and return the number of records removed.\n\
+If missing_ok is False, this method raises KeyError on the first key that is\n\
+not in the database (records removed before it stay removed).");
+
+static PyObject *
+BDB_removemany(BDB *self, PyObject *args, PyObject *kwargs)
+{
+    PyObject *pykeys, *pymissing_ok = Py_True;
+    TCLIST *keys;
+    const void *key;
+    int key_size, len, i;
+    long count = 0;
+    bool missing_ok, result;
+
+    static char *kwlist[] = {"keys", "missing_ok", NULL};
+
+    if (!PyArg_ParseTupleAndKeywords(args, kwargs, "O|O:removemany", kwlist,
+                                     &pykeys, &pymissing_ok)) {
+        return NULL;
+    }
+    if (!PyBool_Check(pymissing_ok)) {
+        return set_error(PyExc_TypeError, "a boolean is required");
+    }
+    missing_ok = (pymissing_ok == Py_True);
+    keys = seq_to_tclist(pykeys);
+    if (!keys) {
+        return NULL;
+    }
+    len = tclistnum(keys);
+    Py_BEGIN_ALLOW_THREADS
+    for (i = 0; i < len; i++) {
+        key = tclistval(keys, i, &key_size);
+        result = tcbdbout(self->bdb, key, key_size);
+        if (result) {
+            count++;
+        }
+        else if (!missing_ok || tcbdbecode(self->bdb) != TCENOREC) {
+            break;
+        }
+    }
+    Py_END_ALLOW_THREADS
+    DBCache_out_tclist(self->cache, keys, i < len ? i + 1 : len);
+    if (count) {
+        self->changed = true;
+        self->version++;
+    }
+    if (i < len) {
+        set_bdb_error(self->bdb, (const char *)key);
+        tclistdel(keys);
+        return NULL;
+    }
+    tclistdel(keys);
+    return PyInt_FromLong(count);
+}
+
+
 /* BDB.put(key, value[, duplicate=False]) */
 PyDoc_STRVAR(BDB_put_doc,
 "put(key, value[, duplicate=False])\n\
@@ -1054,8 +2071,10 @@ static PyObject *
 BDB_put(BDB *self, PyObject *args, PyObject *kwargs)
 {
     PyObject *pykey, *pyvalue, *duplicate = Py_False;
+    Py_buffer key_view, value_view;
     void *key, *value;
     int key_size, value_size;
+    bool result;
 
     static char *kwlist[] = {"key", "value", "duplicate", NULL};
 
@@ -1072,18 +2091,178 @@ BDB_put(BDB *self, PyObject *args, PyObject *kwargs)
         }
         Py_RETURN_NONE;
     }
-    if (bytes_to_void(pykey, &key, &key_size) ||
-        bytes_to_void(pyvalue, &value, &value_size)) {
+    if (bytes_to_void(pykey, &key_view, &key, &key_size) ||
+        bytes_to_void(pyvalue, &value_view, &value, &value_size)) {
+        PyBuffer_Release(&key_view);
         return NULL;
     }
-    if (!tcbdbputdup(self->bdb, key, key_size, value, value_size)) {
+    Py_BEGIN_ALLOW_THREADS
+    result = tcbdbputdup(self->bdb, key, key_size, value, value_size);
+    Py_END_ALLOW_THREADS
+    DBCache_out(self->cache, key, key_size);
+    PyBuffer_Release(&key_view);
+    PyBuffer_Release(&value_view);
+    if (!result) {
         return set_bdb_error(self->bdb, NULL);
     }
     self->changed = true;
+    self->version++;
     Py_RETURN_NONE;
 }
 
 
+/* BDB.putmany(items[, mode="put"[, transaction=False[, check_order=False]]])
+   -> int */
+PyDoc_STRVAR(BDB_putmany_doc,
+"putmany(items[, mode=\"put\"[, transaction=False[, check_order=False]]])\n\
+-> int\n\
+\n\
+Store several records at once and return the number of records stored.\n\
+'items': a dict or an iterable of (key, value) pairs.\n\
+'mode': one of \"put\", \"keep\" or \"cat\". In \"keep\" mode, records whose\n\
+        key is already in the database are skipped.\n\
+'transaction': if True, the records are stored in a single transaction which\n\
+               is aborted if any of them fails.\n\
+'check_order': if True, the keys must be sorted (according to the comparison\n\
+               function of the database, equal keys are allowed), a\n\
+               ValueError is raised as soon as a key sorts before the\n\
+               previous one.");
+
+static PyObject *
+BDB_putmany(BDB *self, PyObject *args, PyObject *kwargs)
+{
+    PyObject *pyitems, *pyiter, *transaction = Py_False;
+    PyObject *check_order = Py_False;
+    const char *smode = "put";
+    const void *key, *value;
+    int key_size, value_size, mode, len, i;
+    long count = 0;
+    TCLIST *keys, *values;
+    TCXSTR *last = NULL;
+    TCCMP cmpfunc = tcbdbcmpfunc(self->bdb);
+    void *cmpop = tcbdbcmpop(self->bdb);
+    bool result, first = true, sorted = true;
+
+    static char *kwlist[] = {"items", "mode", "transaction", "check_order",
+                             NULL};
+
+    if (!PyArg_ParseTupleAndKeywords(args, kwargs, "O|sOO:putmany", kwlist,
+                                     &pyitems, &smode, &transaction,
+                                     &check_order)) {
+        return NULL;
+    }
+    if (!PyBool_Check(transaction) || !PyBool_Check(check_order)) {
+        return set_error(PyExc_TypeError, "a boolean is required");
+    }
+    mode = str_to_put_mode(smode);
+    if (mode < 0) {
+        return NULL;
+    }
+    pyiter = items_to_iter(pyitems);
+    if (!pyiter) {
+        return NULL;
+    }
+    keys = tclistnew2(TK_PY_BATCH_SIZE);
+    values = tclistnew2(TK_PY_BATCH_SIZE);
+    if (transaction == Py_True) {
+        Py_BEGIN_ALLOW_THREADS
+        result = tcbdbtranbegin(self->bdb);
+        Py_END_ALLOW_THREADS
+        if (!result) {
+            Py_DECREF(pyiter);
+            tclistdel(keys);
+            tclistdel(values);
+            return set_bdb_error(self->bdb, NULL);
+        }
+    }
+    if (check_order == Py_True) {
+        last = tcxstrnew();
+    }
+    while ((len = iter_to_tclists(pyiter, keys, values,
+                                  TK_PY_BATCH_SIZE)) > 0) {
+        Py_BEGIN_ALLOW_THREADS
+        for (i = 0; i < len; i++) {
+            key = tclistval(keys, i, &key_size);
+            value = tclistval(values, i, &value_size);
+            if (last) {
+                if (!first && cmpfunc(key, key_size, tcxstrptr(last),
+                                      tcxstrsize(last), cmpop) < 0) {
+                    sorted = false;
+                    break;
+                }
+                first = false;
+                tcxstrclear(last);
+                tcxstrcat(last, key, key_size);
+            }
+            if (mode == TK_PY_PUTKEEP) {
+                result = tcbdbputkeep(self->bdb, key, key_size, value,
+                                      value_size);
+                if (!result && tcbdbecode(self->bdb) == TCEKEEP) {
+                    continue;
+                }
+            }
+            else if (mode == TK_PY_PUTCAT) {
+                result = tcbdbputcat(self->bdb, key, key_size, value,
+                                     value_size);
+            }
+            else {
+                result = tcbdbput(self->bdb, key, key_size, value,
+                                  value_size);
+            }
+            if (!result) {
+                break;
+            }
+            count++;
+        }
+        Py_END_ALLOW_THREADS
+        DBCache_out_tclist(self->cache, keys, i < len ? i + 1 : len);
+        tclistclear(keys);
+        tclistclear(values);
+        if (i < len) {
+            if (sorted) {
+                set_bdb_error(self->bdb, NULL);
+            }
+            else {
+                set_error(PyExc_ValueError, "keys are not sorted");
+            }
+            len = -1;
+            break;
+        }
+    }
+    if (last) {
+        tcxstrdel(last);
+    }
+    if (count) {
+        self->changed = true;
+        self->version++;
+    }
+    if (transaction == Py_True) {
+        Py_BEGIN_ALLOW_THREADS
+        if (len < 0) {
+            result = tcbdbtranabort(self->bdb);
+        }
+        else {
+            result = tcbdbtrancommit(self->bdb);
+        }
+        Py_END_ALLOW_THREADS
+        if (len < 0) {
+            DBCache_clear(self->cache);
+        }
+        if (len >= 0 && !result) {
+            set_bdb_error(self->bdb, NULL);
+            len = -1;
+        }
+    }
+    Py_DECREF(pyiter);
+    tclistdel(keys);
+    tclistdel(values);
+    if (len < 0) {
+        return NULL;
+    }
+    return PyInt_FromLong(count);
+}
+
+
 /* BDB.putkeep(key, value) */
 PyDoc_STRVAR(BDB_putkeep_doc,
 "putkeep(key, value)\n\
@@ -1094,21 +2273,33 @@ put), this method raises KeyError if key is already in the database.");
 static PyObject *
 BDB_putkeep(BDB *self, PyObject *args)
 {
+    Py_buffer key_view, value_view;
     void *key, *value;
     int key_size, value_size;
+    bool result;
     PyObject *pykey, *pyvalue;
 
     if (!PyArg_ParseTuple(args, "OO:putkeep", &pykey, &pyvalue)) {
         return NULL;
     }
-    if (bytes_to_void(pykey, &key, &key_size) ||
-        bytes_to_void(pyvalue, &value, &value_size)) {
+    if (bytes_to_key(pykey, &key_view, &key, &key_size) ||
+        bytes_to_void(pyvalue, &value_view, &value, &value_size)) {
+        PyBuffer_Release(&key_view);
         return NULL;
     }
-    if (!tcbdbputkeep(self->bdb, key, key_size, value, value_size)) {
-        return set_bdb_error(self->bdb, key);
+    Py_BEGIN_ALLOW_THREADS
+    result = tcbdbputkeep(self->bdb, key, key_size, value, value_size);
+    Py_END_ALLOW_THREADS
+    DBCache_out(self->cache, key, key_size);
+    PyBuffer_Release(&value_view);
+    if (!result) {
+        set_bdb_error(self->bdb, key);
+        PyBuffer_Release(&key_view);
+        return NULL;
     }
     self->changed = true;
+    self->version++;
+    PyBuffer_Release(&key_view);
     Py_RETURN_NONE;
 }
 
@@ -1123,21 +2314,31 @@ If there is no corresponding record, a new record is stored.");
 static PyObject *
 BDB_putcat(BDB *self, PyObject *args)
 {
+    Py_buffer key_view, value_view;
     void *key, *value;
     int key_size, value_size;
+    bool result;
     PyObject *pykey, *pyvalue;
 
     if (!PyArg_ParseTuple(args, "OO:putcat", &pykey, &pyvalue)) {
         return NULL;
     }
-    if (bytes_to_void(pykey, &key, &key_size) ||
-        bytes_to_void(pyvalue, &value, &value_size)) {
+    if (bytes_to_void(pykey, &key_view, &key, &key_size) ||
+        bytes_to_void(pyvalue, &value_view, &value, &value_size)) {
+        PyBuffer_Release(&key_view);
         return NULL;
     }
-    if (!tcbdbputcat(self->bdb, key, key_size, value, value_size)) {
+    Py_BEGIN_ALLOW_THREADS
+    result = tcbdbputcat(self->bdb, key, key_size, value, value_size);
+    Py_END_ALLOW_THREADS
+    DBCache_out(self->cache, key, key_size);
+    PyBuffer_Release(&key_view);
+    PyBuffer_Release(&value_view);
+    if (!result) {
         return set_bdb_error(self->bdb, NULL);
     }
     self->changed = true;
+    self->version++;
     Py_RETURN_NONE;
 }
 
@@ -1146,35 +2347,81 @@ BDB_putcat(BDB *self, PyObject *args)
 PyDoc_STRVAR(BDB_putdup_doc,
 "putdup(key, values)\n\
 \n\
-.");
+Store values as duplicates of key, after the values it already has. values can\n\
+be any iterable, it is consumed in batches (each one is stored with the GIL\n\
+released) so it is never copied as a whole.\n\
+\n\
+Note:\n\
+This is not atomic: if a value is invalid (or the iterable raises), the\n\
+batches before the one holding it are already stored when the error is raised\n\
+and none of that batch is (use begin() and abort() to undo them).");
 
 static PyObject *
 BDB_putdup(BDB *self, PyObject *args)
 {
+    Py_buffer key_view;
     void *key;
     int key_size;
     TCLIST *values;
-    PyObject *pykey, *pyvalues;
-    bool result;
+    PyObject *pykey, *pyvalues, *pyiter, *pyvalue;
+    bool result = true, stored = false;
 
     if (!PyArg_ParseTuple(args, "OO:putdup", &pykey, &pyvalues)) {
         return NULL;
     }
-    if (bytes_to_void(pykey, &key, &key_size)) {
+    if (PyBytes_Check(pyvalues) || PyUnicode_Check(pyvalues)) {
+        return set_error(PyExc_TypeError, "an iterable is required");
+    }
+    pyiter = PyObject_GetIter(pyvalues);
+    if (!pyiter) {
         return NULL;
     }
-    values = seq_to_tclist(pyvalues);
-    if (!values) {
+    if (bytes_to_void(pykey, &key_view, &key, &key_size)) {
+        Py_DECREF(pyiter);
         return NULL;
     }
-    Py_BEGIN_ALLOW_THREADS
-    result = tcbdbputdup3(self->bdb, key, key_size, values);
-    Py_END_ALLOW_THREADS
+    values = tclistnew2(TK_PY_BATCH_SIZE);
+    while (result) {
+        while (tclistnum(values) < TK_PY_BATCH_SIZE &&
+               (pyvalue = PyIter_Next(pyiter))) {
+            if (tclist_push_bytes(values, pyvalue)) {
+                Py_DECREF(pyvalue);
+                goto fail;
+            }
+            Py_DECREF(pyvalue);
+        }
+        if (PyErr_Occurred()) {
+            goto fail;
+        }
+        if (!tclistnum(values)) {
+            break;
+        }
+        Py_BEGIN_ALLOW_THREADS
+        result = tcbdbputdup3(self->bdb, key, key_size, values);
+        Py_END_ALLOW_THREADS
+        stored = true;
+        tclistclear(values);
+    }
+    if (!result) {
+        set_bdb_error(self->bdb, NULL);
+    }
+    goto finish;
+
+fail:
+    result = false;
+
+finish:
+    if (stored) {
+        DBCache_out(self->cache, key, key_size);
+        self->changed = true;
+        self->version++;
+    }
+    PyBuffer_Release(&key_view);
+    Py_DECREF(pyiter);
     tclistdel(values);
     if (!result) {
-        return set_bdb_error(self->bdb, NULL);
+        return NULL;
     }
-    self->changed = true;
     Py_RETURN_NONE;
 }
 
@@ -1188,7 +2435,12 @@ Flush modifications to the database file?");
 static PyObject *
 BDB_sync(BDB *self)
 {
-    if (!tcbdbsync(self->bdb)) {
+    bool result;
+
+    Py_BEGIN_ALLOW_THREADS
+    result = tcbdbsync(self->bdb);
+    Py_END_ALLOW_THREADS
+    if (!result) {
         return set_bdb_error(self->bdb, NULL);
     }
     Py_RETURN_NONE;
@@ -1206,6 +2458,7 @@ is applied.");
 static PyObject *
 BDB_searchkeys(BDB *self, PyObject *args)
 {
+    Py_buffer prefix_view;
     void *prefix;
     int prefix_size, max = -1;
     TCLIST *result;
@@ -1214,12 +2467,13 @@ BDB_searchkeys(BDB *self, PyObject *args)
     if (!PyArg_ParseTuple(args, "O|i:searchkeys", &pyprefix, &max)) {
         return NULL;
     }
-    if (bytes_to_void(pyprefix, &prefix, &prefix_size)) {
+    if (bytes_to_void(pyprefix, &prefix_view, &prefix, &prefix_size)) {
         return NULL;
     }
     Py_BEGIN_ALLOW_THREADS
     result = tcbdbfwmkeys(self->bdb, prefix, prefix_size, max);
     Py_END_ALLOW_THREADS
+    PyBuffer_Release(&prefix_view);
     pyresult = tclist_to_frozenset(result);
     tclistdel(result);
     return pyresult;
@@ -1235,6 +2489,7 @@ PyDoc_STRVAR(BDB_range_doc,
 static PyObject *
 BDB_range(BDB *self, PyObject *args, PyObject *kwargs)
 {
+    Py_buffer begin_view = {NULL}, end_view = {NULL};
     void *begin = NULL, *end = NULL;
     int begin_size, end_size, max = -1;
     TCLIST *result;
@@ -1247,12 +2502,13 @@ BDB_range(BDB *self, PyObject *args, PyObject *kwargs)
         return NULL;
     }
     if (pybegin != Py_None) {
-        if (bytes_to_void(pybegin, &begin, &begin_size)) {
+        if (bytes_to_void(pybegin, &begin_view, &begin, &begin_size)) {
             return NULL;
         }
     }
     if (pyend != Py_None) {
-        if (bytes_to_void(pyend, &end, &end_size)) {
+        if (bytes_to_void(pyend, &end_view, &end, &end_size)) {
+            PyBuffer_Release(&begin_view);
             return NULL;
         }
     }
@@ -1260,12 +2516,186 @@ BDB_range(BDB *self, PyObject *args, PyObject *kwargs)
     result = tcbdbrange(self->bdb, begin, begin_size, true,
                         end, end_size, true, max);
     Py_END_ALLOW_THREADS
+    PyBuffer_Release(&begin_view);
+    PyBuffer_Release(&end_view);
     pyresult = tclist_to_frozenset(result);
     tclistdel(result);
     return pyresult;
 }
 
 
+/* BDB.scan([start=None[, stop=None[, prefix=None[, reverse=False[, limit=None[, keys_only=False[, inclusive=(True, False)]]]]]]]) */
+PyDoc_STRVAR(BDB_scan_doc,
+"scan([start=None[, stop=None[, prefix=None[, reverse=False[, limit=None[, keys_only=False[, inclusive=(True, False)]]]]]]])\n\
+\n\
+Return an iterator over the items (or the keys if keys_only is True) whose\n\
+key is between start and stop, in the order of the database (or in reverse\n\
+order if reverse is True). inclusive tells whether start and stop themselves\n\
+are part of the range. If prefix is given, only the keys starting with prefix\n\
+are yielded (this requires the default lexical comparison function, a\n\
+ValueError is raised otherwise). If limit is given, at most limit records are\n\
+yielded. The records are read in batches with the GIL released.");
+
+static PyObject *
+BDB_scan(BDB *self, PyObject *args, PyObject *kwargs)
+{
+    PyObject *pystart = Py_None, *pystop = Py_None, *pyprefix = Py_None;
+    PyObject *reverse = Py_False, *pylimit = Py_None, *keys_only = Py_False;
+    PyObject *pyinclusive = NULL, *start_inclusive, *stop_inclusive;
+    PyObject *pybounds[3];
+    void **bounds[3];
+    int *bound_sizes[3];
+    Py_buffer view;
+    void *bound;
+    int bound_size, i, limit;
+    TCCMP cmp;
+    BDBScan *scan;
+
+    static char *kwlist[] = {"start", "stop", "prefix", "reverse", "limit",
+                             "keys_only", "inclusive", NULL};
+
+    if (!PyArg_ParseTupleAndKeywords(args, kwargs, "|OOOOOOO:scan", kwlist,
+                                     &pystart, &pystop, &pyprefix, &reverse,
+                                     &pylimit, &keys_only, &pyinclusive)) {
+        return NULL;
+    }
+    if (!PyBool_Check(reverse) || !PyBool_Check(keys_only)) {
+        return set_error(PyExc_TypeError, "a boolean is required");
+    }
+    start_inclusive = Py_True;
+    stop_inclusive = Py_False;
+    if (pyinclusive &&
+        (!PyTuple_Check(pyinclusive) ||
+         !PyArg_ParseTuple(pyinclusive, "OO", &start_inclusive,
+                           &stop_inclusive) ||
+         !PyBool_Check(start_inclusive) || !PyBool_Check(stop_inclusive))) {
+        PyErr_Clear();
+        return set_error(PyExc_TypeError,
+                         "inclusive must be a tuple of 2 booleans");
+    }
+    if (parse_scan_limit(pylimit, &limit)) {
+        return NULL;
+    }
+    /* the keys starting with prefix are only contiguous in lexical order */
+    cmp = tcbdbcmpfunc(self->bdb);
+    if (pyprefix != Py_None && cmp && cmp != tccmplexical) {
+        return set_error(PyExc_ValueError,
+                         "prefix requires the lexical comparison function");
+    }
+    scan = new_BDBScan(&BDBScanType, self);
+    if (!scan) {
+        return NULL;
+    }
+    pybounds[0] = pystart;
+    pybounds[1] = pystop;
+    pybounds[2] = pyprefix;
+    bounds[0] = &scan->start;
+    bounds[1] = &scan->stop;
+    bounds[2] = &scan->prefix;
+    bound_sizes[0] = &scan->start_size;
+    bound_sizes[1] = &scan->stop_size;
+    bound_sizes[2] = &scan->prefix_size;
+    for (i = 0; i < 3; i++) {
+        if (pybounds[i] == Py_None) {
+            continue;
+        }
+        if (bytes_to_void(pybounds[i], &view, &bound, &bound_size)) {
+            Py_DECREF(scan);
+            return NULL;
+        }
+        *bounds[i] = tcmemdup(bound, bound_size);
+        *bound_sizes[i] = bound_size;
+        PyBuffer_Release(&view);
+    }
+    scan->start_inclusive = (start_inclusive == Py_True);
+    scan->stop_inclusive = (stop_inclusive == Py_True);
+    scan->reverse = (reverse == Py_True);
+    scan->keys_only = (keys_only == Py_True);
+    scan->limit = limit;
+    return (PyObject *)scan;
+}
+
+
+/* BDB.iterdup(key[, skip=0[, limit=None]]) */
+PyDoc_STRVAR(BDB_iterdup_doc,
+"iterdup(key[, skip=0[, limit=None]])\n\
+\n\
+Return an iterator over the values of key (all its duplicates), skipping the\n\
+first skip ones and yielding at most limit ones if limit is given. The values\n\
+are read lazily, by batches, with a cursor of its own.");
+
+static PyObject *
+BDB_iterdup(BDB *self, PyObject *args, PyObject *kwargs)
+{
+    PyObject *pykey, *pylimit = Py_None;
+    Py_buffer key_view;
+    void *key;
+    int key_size, skip = 0, limit;
+    BDBScan *scan;
+
+    static char *kwlist[] = {"key", "skip", "limit", NULL};
+
+    if (!PyArg_ParseTupleAndKeywords(args, kwargs, "O|iO:iterdup", kwlist,
+                                     &pykey, &skip, &pylimit)) {
+        return NULL;
+    }
+    if (skip < 0) {
+        return set_error(PyExc_ValueError, "skip must be positive or 0");
+    }
+    if (parse_scan_limit(pylimit, &limit)) {
+        return NULL;
+    }
+    if (bytes_to_void(pykey, &key_view, &key, &key_size)) {
+        return NULL;
+    }
+    scan = new_BDBScan(&BDBScanType, self);
+    if (scan) {
+        scan->start = tcmemdup(key, key_size);
+        scan->start_size = key_size;
+        scan->stop = tcmemdup(key, key_size);
+        scan->stop_size = key_size;
+        scan->stop_inclusive = true;
+        scan->values_only = true;
+        scan->skip = skip;
+        scan->limit = limit;
+    }
+    PyBuffer_Release(&key_view);
+    return (PyObject *)scan;
+}
+
+
+/* BDB.countdup(key) -> int */
+PyDoc_STRVAR(BDB_countdup_doc,
+"countdup(key) -> int\n\
+\n\
+Return the number of values of key (1 plus its number of duplicates), 0 if key\n\
+is not in the database.");
+
+static PyObject *
+BDB_countdup(BDB *self, PyObject *args)
+{
+    Py_buffer key_view;
+    void *key;
+    int key_size, count;
+    PyObject *pykey;
+
+    if (!PyArg_ParseTuple(args, "O:countdup", &pykey)) {
+        return NULL;
+    }
+    if (bytes_to_void(pykey, &key_view, &key, &key_size)) {
+        return NULL;
+    }
+    Py_BEGIN_ALLOW_THREADS
+    count = tcbdbvnum(self->bdb, key, key_size);
+    Py_END_ALLOW_THREADS
+    PyBuffer_Release(&key_view);
+    if (!count && tcbdbecode(self->bdb) != TCENOREC) {
+        return set_bdb_error(self->bdb, NULL);
+    }
+    return PyInt_FromLong((long)count);
+}
+
+
 /* BDB.cursor() */
 PyDoc_STRVAR(BDB_cursor_doc,
 "cursor()\n\
@@ -1305,6 +2735,7 @@ BDB_optimize(BDB *self, PyObject *args, PyObject *kwargs)
     int iapow = -1, ifpow = -1;
     char apow, fpow;
     unsigned char opts = UINT8_MAX;
+    bool result;
 
     static char *kwlist[] = {"lmemb", "nmemb", "bnum", "apow", "fpow", "opts",
                              NULL};
@@ -1319,7 +2750,10 @@ BDB_optimize(BDB *self, PyObject *args, PyObject *kwargs)
     if ((apow == -1 || fpow == -1) && PyErr_Occurred()) {
         return NULL;
     }
-    if (!tcbdboptimize(self->bdb, lmemb, nmemb, bnum, apow, fpow, opts)) {
+    Py_BEGIN_ALLOW_THREADS
+    result = tcbdboptimize(self->bdb, lmemb, nmemb, bnum, apow, fpow, opts);
+    Py_END_ALLOW_THREADS
+    if (!result) {
         return set_bdb_error(self->bdb, NULL);
     }
     Py_RETURN_NONE;
@@ -1453,7 +2887,10 @@ BDB_setdfunit(BDB *self, PyObject *args)
 PyDoc_STRVAR(BDB_setcmpfunc_doc,
 "setcmpfunc(callback)\n\
 \n\
-");
+Set the compare function: a callable, one of the BDBCMP* constants or the\n\
+name of a native comparator ('lexical', 'decimal', 'int32', 'int64',\n\
+'int32be', 'int32le', 'int64be' or 'int64le', prefixed with 'reverse_' for\n\
+the reverse order).");
 
 static PyObject *
 BDB_setcmpfunc(BDB *self, PyObject *args)
@@ -1461,6 +2898,10 @@ BDB_setcmpfunc(BDB *self, PyObject *args)
     PyObject *pycb = NULL;
     TCCMP cb;
     int cmp;
+    const char *name;
+    BDBComparator *comparator;
+    bool reverse;
+    void *op;
 
     if (!PyArg_ParseTuple(args, "O:setcmpfunc", &pycb)) {
         return NULL;
@@ -1474,6 +2915,7 @@ BDB_setcmpfunc(BDB *self, PyObject *args)
         if (cmp == -1 && PyErr_Occurred()) {
             return NULL;
         }
+        op = NULL;
         switch (cmp) {
             case BDBCMPLEXICAL:
                cb = tccmplexical;
@@ -1492,19 +2934,91 @@ BDB_setcmpfunc(BDB *self, PyObject *args)
                                 "unknown compare callback constant");
         }
     }
+    else if (PyUnicode_Check(pycb) || PyBytes_Check(pycb)) {
+        name = PyUnicode_AsString(pycb);
+        if (!name) {
+            return NULL;
+        }
+        comparator = BDB_comparator(name, &reverse);
+        if (!comparator) {
+            return set_error(PyExc_ValueError, "unknown comparator name");
+        }
+        cb = reverse ? BDB_cmp_reverse : comparator->cmp;
+        op = comparator;
+    }
     else if (PyCallable_Check(pycb)) {
         cb = BDB_cmp_cb;
+        op = pycb;
     }
     else {
-        return set_error(PyExc_TypeError, "a callable or an int is required");
+        return set_error(PyExc_TypeError,
+                         "a callable, an int or a str is required");
     }
-    if (!tcbdbsetcmpfunc(self->bdb, cb, (void *)pycb)) {
+    if (!tcbdbsetcmpfunc(self->bdb, cb, op)) {
         return set_bdb_error(self->bdb, NULL);
     }
     Py_RETURN_NONE;
 }
 
 
+/* BDB.setreadcache(max_bytes) */
+PyDoc_STRVAR(BDB_setreadcache_doc,
+"setreadcache(max_bytes)\n\
+\n\
+Set the size of an in-process read-through cache in front of get() and\n\
+bdb[key] (setcache() tunes the page caches of Tokyo Cabinet instead).\n\
+'max_bytes': the maximum total size of the cached keys and values, least\n\
+             recently used records are evicted beyond it. 0 (the default)\n\
+             disables the cache and frees its records.\n\
+If the cache is already enabled, it is resized and keeps its records.\n\
+\n\
+Note:\n\
+The cache is invalidated by writes made through this object only, it is not\n\
+aware of other connections to the same database file.");
+
+static PyObject *
+BDB_setreadcache(BDB *self, PyObject *args, PyObject *kwargs)
+{
+    unsigned long long max_bytes;
+
+    if (parse_cache_max_bytes(args, kwargs, "L:setreadcache", &max_bytes)) {
+        return NULL;
+    }
+    if (!max_bytes) {
+        DBCache_del(self->cache);
+        self->cache = NULL;
+        self->version++;
+    }
+    else if (self->cache) {
+        self->cache->max_bytes = max_bytes;
+        DBCache_trim(self->cache);
+    }
+    else {
+        self->version++;
+        self->cache = DBCache_new(max_bytes, &self->version);
+        if (!self->cache) {
+            return NULL;
+        }
+    }
+    Py_RETURN_NONE;
+}
+
+
+/* BDB.cachestats() -> dict */
+PyDoc_STRVAR(BDB_cachestats_doc,
+"cachestats() -> dict\n\
+\n\
+Return the statistics of the cache set by setreadcache() as a dict with the\n\
+following keys: 'hits', 'misses', 'evictions', 'records', 'bytes' and\n\
+'max_bytes'. Return None if the cache is disabled.");
+
+static PyObject *
+BDB_cachestats(BDB *self)
+{
+    return DBCache_stats(self->cache);
+}
+
+
 /* BDB.addint(key, num) -> int */
 PyDoc_STRVAR(BDB_addint_doc,
 "addint(key, num) -> int\n\
@@ -1522,25 +3036,33 @@ static PyObject *
 BDB_addint(BDB *self, PyObject *args)
 {
     PyObject *pykey;
+    Py_buffer key_view;
     void *key;
     int key_size, num, result, ecode;
 
     if (!PyArg_ParseTuple(args, "Oi:addint", &pykey, &num)) {
         return NULL;
     }
-    if (bytes_to_void(pykey, &key, &key_size)) {
+    if (bytes_to_key(pykey, &key_view, &key, &key_size)) {
         return NULL;
     }
+    Py_BEGIN_ALLOW_THREADS
     result = tcbdbaddint(self->bdb, key, key_size, num);
+    Py_END_ALLOW_THREADS
+    DBCache_out(self->cache, key, key_size);
     if (result == INT_MIN) {
         ecode = tcbdbecode(self->bdb);
         if (ecode != TCESUCCESS && ecode != TCENOREC) {
-            return set_bdb_error(self->bdb, key);
+            set_bdb_error(self->bdb, key);
+            PyBuffer_Release(&key_view);
+            return NULL;
         }
     }
     if (num) {
         self->changed = true;
+        self->version++;
     }
+    PyBuffer_Release(&key_view);
     return PyInt_FromLong((long)result);
 }
 
@@ -1562,6 +3084,7 @@ static PyObject *
 BDB_adddouble(BDB *self, PyObject *args)
 {
     PyObject *pykey;
+    Py_buffer key_view;
     void *key;
     int key_size;
     double num, result;
@@ -1569,30 +3092,61 @@ BDB_adddouble(BDB *self, PyObject *args)
     if (!PyArg_ParseTuple(args, "Od:adddouble", &pykey, &num)) {
         return NULL;
     }
-    if (bytes_to_void(pykey, &key, &key_size)) {
+    if (bytes_to_key(pykey, &key_view, &key, &key_size)) {
         return NULL;
     }
+    Py_BEGIN_ALLOW_THREADS
     result = tcbdbadddouble(self->bdb, key, key_size, num);
+    Py_END_ALLOW_THREADS
+    DBCache_out(self->cache, key, key_size);
     if (Py_IS_NAN(result)) {
-        return set_bdb_error(self->bdb, key);
+        set_bdb_error(self->bdb, key);
+        PyBuffer_Release(&key_view);
+        return NULL;
     }
     if (num) {
         self->changed = true;
+        self->version++;
     }
+    PyBuffer_Release(&key_view);
     return PyFloat_FromDouble(result);
 }
 
 
-/* BDB.iterkeys() */
+/* BDB.iterkeys([batch=0[, resumable=False]]) */
 PyDoc_STRVAR(BDB_iterkeys_doc,
-"iterkeys()\n\
+"iterkeys([batch=0[, resumable=False]])\n\
 \n\
-Return an iterator over the database's keys.");
+Return an iterator over the database's keys. If batch is greater than 0,\n\
+the iterator yields lists of up to batch keys at a time. If resumable is True,\n\
+the iterator does not fail when the database changes but carries on after the\n\
+last key it yielded.");
 
 static PyObject *
-BDB_iterkeys(BDB *self)
+BDB_iterkeys(BDB *self, PyObject *args, PyObject *kwargs)
 {
-    return new_BDBIter(self, &BDBIterKeysType);
+    int batch = 0;
+    PyObject *resumable = Py_False;
+
+    static char *kwlist[] = {"batch", "resumable", NULL};
+
+    if (!PyArg_ParseTupleAndKeywords(args, kwargs, "|iO:iterkeys", kwlist,
+                                     &batch, &resumable)) {
+        return NULL;
+    }
+    if (check_batch(batch)) {
+        return NULL;
+    }
+    if (!PyBool_Check(resumable)) {
+        return set_error(PyExc_TypeError, "a boolean is required");
+    }
+    if (batch) {
+        return DBIter_set_resumable(
+            DBIter_set_batch(new_BDBIter(self, &BDBIterKeysBatchType), batch),
+            resumable == Py_True);
+    }
+    return DBIter_set_resumable(new_BDBIter(self, &BDBIterKeysType),
+                                resumable == Py_True);
 }
 
 
@@ -1609,15 +3163,25 @@ BDB_itervalues(BDB *self)
 }
 
 
-/* BDB.iteritems() */
+/* BDB.iteritems([batch=0]) */
 PyDoc_STRVAR(BDB_iteritems_doc,
-"iteritems()\n\
+"iteritems([batch=0])\n\
 \n\
-Return an iterator over the database's items.");
+Return an iterator over the database's items. If batch is greater than 0,\n\
+the iterator yields lists of up to batch items at a time.");
 
 static PyObject *
-BDB_iteritems(BDB *self)
+BDB_iteritems(BDB *self, PyObject *args, PyObject *kwargs)
 {
+    int batch = 0;
+
+    if (parse_batch(args, kwargs, "|i:iteritems", &batch)) {
+        return NULL;
+    }
+    if (batch) {
+        return DBIter_set_batch(new_BDBIter(self, &BDBIterItemsBatchType),
+                                batch);
+    }
     return new_BDBIter(self, &BDBIterItemsType);
 }
 
@@ -1632,17 +3196,28 @@ static PyMethodDef BDB_tp_methods[] = {
     {"commit", (PyCFunction)BDB_commit, METH_NOARGS, BDB_commit_doc},
     {"abort", (PyCFunction)BDB_abort, METH_NOARGS, BDB_abort_doc},
     {"get", (PyCFunction)BDB_get, METH_VARARGS | METH_KEYWORDS, BDB_get_doc},
+    {"getmany", (PyCFunction)BDB_getmany, METH_VARARGS | METH_KEYWORDS,
+     BDB_getmany_doc},
     {"remove", (PyCFunction)BDB_remove, METH_VARARGS | METH_KEYWORDS,
      BDB_remove_doc},
+    {"removemany", (PyCFunction)BDB_removemany, METH_VARARGS | METH_KEYWORDS,
+     BDB_removemany_doc},
     {"put", (PyCFunction)BDB_put, METH_VARARGS | METH_KEYWORDS, BDB_put_doc},
+    {"putmany", (PyCFunction)BDB_putmany, METH_VARARGS | METH_KEYWORDS,
+     BDB_putmany_doc},
     {"putkeep", (PyCFunction)BDB_putkeep, METH_VARARGS, BDB_putkeep_doc},
     {"putcat", (PyCFunction)BDB_putcat, METH_VARARGS, BDB_putcat_doc},
     {"putdup", (PyCFunction)BDB_putdup, METH_VARARGS, BDB_putdup_doc},
+    {"iterdup", (PyCFunction)BDB_iterdup, METH_VARARGS | METH_KEYWORDS,
+     BDB_iterdup_doc},
+    {"countdup", (PyCFunction)BDB_countdup, METH_VARARGS, BDB_countdup_doc},
     {"sync", (PyCFunction)BDB_sync, METH_NOARGS, BDB_sync_doc},
     {"searchkeys", (PyCFunction)BDB_searchkeys, METH_VARARGS,
      BDB_searchkeys_doc},
     {"range", (PyCFunction)BDB_range, METH_VARARGS | METH_KEYWORDS,
      BDB_range_doc},
+    {"scan", (PyCFunction)BDB_scan, METH_VARARGS | METH_KEYWORDS,
+     BDB_scan_doc},
     {"cursor", (PyCFunction)BDB_cursor, METH_NOARGS, BDB_cursor_doc},
     {"optimize", (PyCFunction)BDB_optimize, METH_VARARGS | METH_KEYWORDS,
      BDB_optimize_doc},
@@ -1651,11 +3226,17 @@ static PyMethodDef BDB_tp_methods[] = {
     {"setxmsiz", (PyCFunction)BDB_setxmsiz, METH_VARARGS, BDB_setxmsiz_doc},
     {"setdfunit", (PyCFunction)BDB_setdfunit, METH_VARARGS, BDB_setdfunit_doc},
     {"setcmpfunc", (PyCFunction)BDB_setcmpfunc, METH_VARARGS, BDB_setcmpfunc_doc},
+    {"setreadcache", (PyCFunction)BDB_setreadcache,
+     METH_VARARGS | METH_KEYWORDS, BDB_setreadcache_doc},
+    {"cachestats", (PyCFunction)BDB_cachestats, METH_NOARGS,
+     BDB_cachestats_doc},
     {"addint", (PyCFunction)BDB_addint, METH_VARARGS, BDB_addint_doc},
     {"adddouble", (PyCFunction)BDB_adddouble, METH_VARARGS, BDB_adddouble_doc},
-    {"iterkeys", (PyCFunction)BDB_iterkeys, METH_NOARGS, BDB_iterkeys_doc},
+    {"iterkeys", (PyCFunction)BDB_iterkeys, METH_VARARGS | METH_KEYWORDS,
+     BDB_iterkeys_doc},
     {"itervalues", (PyCFunction)BDB_itervalues, METH_NOARGS, BDB_itervalues_doc},
-    {"iteritems", (PyCFunction)BDB_iteritems, METH_NOARGS, BDB_iteritems_doc},
+    {"iteritems", (PyCFunction)BDB_iteritems, METH_VARARGS | METH_KEYWORDS,
+     BDB_iteritems_doc},
     {NULL}  /* Sentinel */
 };
 
@@ -1669,7 +3250,9 @@ BDB_path_get(BDB *self, void *closure)
 {
     const char *path;
 
+    Py_BEGIN_ALLOW_THREADS
     path = tcbdbpath(self->bdb);
+    Py_END_ALLOW_THREADS
     if (path) {
         return PyString_FromString(path);
     }
@@ -1684,7 +3267,12 @@ PyDoc_STRVAR(BDB_size_doc,
 static PyObject *
 BDB_size_get(BDB *self, void *closure)
 {
-    return PyLong_FromUnsignedLongLong(tcbdbfsiz(self->bdb));
+    uint64_t size;
+
+    Py_BEGIN_ALLOW_THREADS
+    size = tcbdbfsiz(self->bdb);
+    Py_END_ALLOW_THREADS
+    return PyLong_FromUnsignedLongLong(size);
 }
 
 
@@ -15,6 +15,79 @@ set_fdb_error(TCFDB *fdb, long long key)
 }
 
 
+/* convert a Python sequence of ints to an array of ids */
+long long *
+seq_to_ids(PyObject *pyids, int *len)
+{
+    const char *msg = "a sequence is required";
+    PyObject *pyseq;
+    Py_ssize_t pylen, i;
+    long long *ids;
+
+    pyseq = PySequence_Fast(pyids, msg);
+    if (!pyseq) {
+        return NULL;
+    }
+    pylen = PySequence_Fast_GET_SIZE(pyseq);
+    if (check_py_ssize_t_len(pylen, pyseq)) {
+        Py_DECREF(pyseq);
+        return NULL;
+    }
+    ids = PyMem_New(long long, pylen);
+    if (!ids) {
+        Py_DECREF(pyseq);
+        PyErr_NoMemory();
+        return NULL;
+    }
+    for (i = 0; i < pylen; i++) {
+        ids[i] = PyLong_AsLongLong(PySequence_Fast_GET_ITEM(pyseq, i));
+        if (ids[i] == -1 && PyErr_Occurred()) {
+            Py_DECREF(pyseq);
+            PyMem_Free(ids);
+            return NULL;
+        }
+    }
+    Py_DECREF(pyseq);
+    *len = (int)pylen;
+    return ids;
+}
+
+
+/* fill ids and values with at most max (id, value) pairs from an iterator,
+   return the number of pairs read or -1 on error */
+int
+iter_to_ids(PyObject *pyiter, long long *ids, TCLIST *values, int max)
+{
+    PyObject *pykey, *pyvalue;
+    Py_buffer value_view;
+    void *value;
+    int value_size, len = 0, next;
+
+    while (len < max) {
+        next = iter_next_pair(pyiter, &pykey, &pyvalue);
+        if (next < 0) {
+            return -1;
+        }
+        else if (!next) {
+            break;
+        }
+        ids[len] = PyLong_AsLongLong(pykey);
+        if ((ids[len] == -1 && PyErr_Occurred()) ||
+            bytes_to_void(pyvalue, &value_view, &value, &value_size)) {
+            Py_DECREF(pykey);
+            Py_DECREF(pyvalue);
+            return -1;
+        }
+        tclistpush(values, value, value_size);
+        PyBuffer_Release(&value_view);
+        Py_DECREF(pykey);
+        Py_DECREF(pyvalue);
+        len++;
+    }
+    return len;
+}
+
+
 /*******************************************************************************
 * FDB iterator types
 *******************************************************************************/
@@ -23,11 +96,15 @@ set_fdb_error(TCFDB *fdb, long long key)
 static PyObject *
 new_FDBIter(FDB *self, PyTypeObject *type)
 {
+    bool result;
     PyObject *iter = DBIter_tp_new(type, (PyObject *)self);
     if (!iter) {
         return NULL;
     }
-    if (!tcfdbiterinit(self->fdb)) {
+    Py_BEGIN_ALLOW_THREADS
+    result = tcfdbiterinit(self->fdb);
+    Py_END_ALLOW_THREADS
+    if (!result) {
         Py_DECREF(iter);
         return set_fdb_error(self->fdb, 0);
     }
@@ -41,13 +118,17 @@ static PyObject *
 FDBIterKeys_tp_iternext(DBIter *self)
 {
     FDB *fdb = (FDB *)self->db;
+    uint64_t id;
     long long key;
     PyObject *pykey;
 
     if (fdb->changed) {
         return set_error(Error, "FDB changed during iteration");
     }
-    key = uint64_to_int64(tcfdbiternext(fdb->fdb));
+    Py_BEGIN_ALLOW_THREADS
+    id = tcfdbiternext(fdb->fdb);
+    Py_END_ALLOW_THREADS
+    key = uint64_to_int64(id);
     if (key == -1) {
         return NULL;
     }
@@ -100,6 +181,7 @@ static PyObject *
 FDBIterValues_tp_iternext(DBIter *self)
 {
     FDB *fdb = (FDB *)self->db;
+    uint64_t id;
     long long key;
     void *value;
     int value_size;
@@ -108,7 +190,10 @@ FDBIterValues_tp_iternext(DBIter *self)
     if (fdb->changed) {
         return set_error(Error, "FDB changed during iteration");
     }
-    key = uint64_to_int64(tcfdbiternext(fdb->fdb));
+    Py_BEGIN_ALLOW_THREADS
+    id = tcfdbiternext(fdb->fdb);
+    Py_END_ALLOW_THREADS
+    key = uint64_to_int64(id);
     if (key == -1) {
         return NULL;
     }
@@ -118,7 +203,9 @@ FDBIterValues_tp_iternext(DBIter *self)
         }
         return set_fdb_error(fdb->fdb, 0);
     }
+    Py_BEGIN_ALLOW_THREADS
     value = tcfdbget(fdb->fdb, key, &value_size);
+    Py_END_ALLOW_THREADS
     pyvalue = void_to_bytes(value, value_size);
     tcfree(value);
     return pyvalue;
@@ -163,6 +250,7 @@ static PyObject *
 FDBIterItems_tp_iternext(DBIter *self)
 {
     FDB *fdb = (FDB *)self->db;
+    uint64_t id;
     long long key;
     void *value;
     int value_size;
@@ -171,7 +259,10 @@ FDBIterItems_tp_iternext(DBIter *self)
     if (fdb->changed) {
         return set_error(Error, "FDB changed during iteration");
     }
-    key = uint64_to_int64(tcfdbiternext(fdb->fdb));
+    Py_BEGIN_ALLOW_THREADS
+    id = tcfdbiternext(fdb->fdb);
+    Py_END_ALLOW_THREADS
+    key = uint64_to_int64(id);
     if (key == -1) {
         return NULL;
     }
@@ -181,7 +272,9 @@ FDBIterItems_tp_iternext(DBIter *self)
         }
         return set_fdb_error(fdb->fdb, 0);
     }
+    Py_BEGIN_ALLOW_THREADS
     value = tcfdbget(fdb->fdb, key, &value_size);
+    Py_END_ALLOW_THREADS
     pykey = PyLong_FromLongLong(key);
     pyvalue = void_to_bytes(value, value_size);
     if (pykey && pyvalue) {
@@ -227,6 +320,187 @@ static PyTypeObject FDBIterItemsType = {
 };
 
 
+/* FDBIterKeysBatchType.tp_iternext */
+static PyObject *
+FDBIterKeysBatch_tp_iternext(DBIter *self)
+{
+    FDB *fdb = (FDB *)self->db;
+    uint64_t *ids;
+    long long key;
+    int len, i;
+    PyObject *pykeys = NULL, *pykey;
+
+    if (fdb->changed) {
+        return set_error(Error, "FDB changed during iteration");
+    }
+    ids = PyMem_New(uint64_t, self->batch);
+    if (!ids) {
+        return PyErr_NoMemory();
+    }
+    Py_BEGIN_ALLOW_THREADS
+    for (len = 0; len < self->batch; len++) {
+        ids[len] = tcfdbiternext(fdb->fdb);
+        if (!ids[len]) {
+            break;
+        }
+    }
+    Py_END_ALLOW_THREADS
+    if (len < self->batch && tcfdbecode(fdb->fdb) != TCENOREC) {
+        set_fdb_error(fdb->fdb, 0);
+    }
+    else if (!len) {
+        set_stopiteration_error();
+    }
+    else if ((pykeys = PyList_New((Py_ssize_t)len))) {
+        for (i = 0; i < len; i++) {
+            key = uint64_to_int64(ids[i]);
+            if (key == -1 || !(pykey = PyLong_FromLongLong(key))) {
+                Py_CLEAR(pykeys);
+                break;
+            }
+            PyList_SET_ITEM(pykeys, (Py_ssize_t)i, pykey);
+        }
+    }
+    PyMem_Free(ids);
+    return pykeys;
+}
+
+
+/* FDBIterKeysBatchType */
+static PyTypeObject FDBIterKeysBatchType = {
+    PyVarObject_HEAD_INIT(NULL, 0)
+    "tokyo.cabinet.FDBIterKeysBatch",         /*tp_name*/
+    sizeof(DBIter),                           /*tp_basicsize*/
+    0,                                        /*tp_itemsize*/
+    (destructor)DBIter_tp_dealloc,            /*tp_dealloc*/
+    0,                                        /*tp_print*/
+    0,                                        /*tp_getattr*/
+    0,                                        /*tp_setattr*/
+    0,                                        /*tp_compare*/
+    0,                                        /*tp_repr*/
+    0,                                        /*tp_as_number*/
+    0,                                        /*tp_as_sequence*/
+    0,                                        /*tp_as_mapping*/
+    0,                                        /*tp_hash */
+    0,                                        /*tp_call*/
+    0,                                        /*tp_str*/
+    0,                                        /*tp_getattro*/
+    0,                                        /*tp_setattro*/
+    0,                                        /*tp_as_buffer*/
+    Py_TPFLAGS_DEFAULT | Py_TPFLAGS_HAVE_GC,  /*tp_flags*/
+    0,                                        /*tp_doc*/
+    (traverseproc)DBIter_tp_traverse,         /*tp_traverse*/
+    (inquiry)DBIter_tp_clear,                 /*tp_clear*/
+    0,                                        /*tp_richcompare*/
+    0,                                        /*tp_weaklistoffset*/
+    PyObject_SelfIter,                        /*tp_iter*/
+    (iternextfunc)FDBIterKeysBatch_tp_iternext, /*tp_iternext*/
+    DBIterBatch_tp_methods,                   /*tp_methods*/
+};
+
+
+/* FDBIterItemsBatchType.tp_iternext */
+static PyObject *
+FDBIterItemsBatch_tp_iternext(DBIter *self)
+{
+    FDB *fdb = (FDB *)self->db;
+    uint64_t *ids;
+    long long key;
+    TCLIST *values;
+    const void *value;
+    void *tmp;
+    int value_size, len, i;
+    PyObject *pyitems = NULL, *pykey, *pyvalue, *pyitem;
+
+    if (fdb->changed) {
+        return set_error(Error, "FDB changed during iteration");
+    }
+    ids = PyMem_New(uint64_t, self->batch);
+    if (!ids) {
+        return PyErr_NoMemory();
+    }
+    values = tclistnew2(self->batch);
+    Py_BEGIN_ALLOW_THREADS
+    for (len = 0; len < self->batch; len++) {
+        ids[len] = tcfdbiternext(fdb->fdb);
+        if (!ids[len]) {
+            break;
+        }
+        tmp = tcfdbget(fdb->fdb, (int64_t)ids[len], &value_size);
+        if (!tmp) {
+            break;
+        }
+        tclistpushmalloc(values, tmp, value_size);
+    }
+    Py_END_ALLOW_THREADS
+    if (len < self->batch && tcfdbecode(fdb->fdb) != TCENOREC) {
+        set_fdb_error(fdb->fdb, 0);
+    }
+    else if (!len) {
+        set_stopiteration_error();
+    }
+    else if ((pyitems = PyList_New((Py_ssize_t)len))) {
+        for (i = 0; i < len; i++) {
+            key = uint64_to_int64(ids[i]);
+            if (key == -1) {
+                Py_CLEAR(pyitems);
+                break;
+            }
+            value = tclistval(values, i, &value_size);
+            pykey = PyLong_FromLongLong(key);
+            pyvalue = void_to_bytes(value, value_size);
+            pyitem = NULL;
+            if (pykey && pyvalue) {
+                pyitem = PyTuple_Pack(2, pykey, pyvalue);
+            }
+            Py_XDECREF(pykey);
+            Py_XDECREF(pyvalue);
+            if (!pyitem) {
+                Py_CLEAR(pyitems);
+                break;
+            }
+            PyList_SET_ITEM(pyitems, (Py_ssize_t)i, pyitem);
+        }
+    }
+    tclistdel(values);
+    PyMem_Free(ids);
+    return pyitems;
+}
+
+
+/* FDBIterItemsBatchType */
+static PyTypeObject FDBIterItemsBatchType = {
+    PyVarObject_HEAD_INIT(NULL, 0)
+    "tokyo.cabinet.FDBIterItemsBatch",        /*tp_name*/
+    sizeof(DBIter),                           /*tp_basicsize*/
+    0,                                        /*tp_itemsize*/
+    (destructor)DBIter_tp_dealloc,            /*tp_dealloc*/
+    0,                                        /*tp_print*/
+    0,                                        /*tp_getattr*/
+    0,                                        /*tp_setattr*/
+    0,                                        /*tp_compare*/
+    0,                                        /*tp_repr*/
+    0,                                        /*tp_as_number*/
+    0,                                        /*tp_as_sequence*/
+    0,                                        /*tp_as_mapping*/
+    0,                                        /*tp_hash */
+    0,                                        /*tp_call*/
+    0,                                        /*tp_str*/
+    0,                                        /*tp_getattro*/
+    0,                                        /*tp_setattro*/
+    0,                                        /*tp_as_buffer*/
+    Py_TPFLAGS_DEFAULT | Py_TPFLAGS_HAVE_GC,  /*tp_flags*/
+    0,                                        /*tp_doc*/
+    (traverseproc)DBIter_tp_traverse,         /*tp_traverse*/
+    (inquiry)DBIter_tp_clear,                 /*tp_clear*/
+    0,                                        /*tp_richcompare*/
+    0,                                        /*tp_weaklistoffset*/
+    PyObject_SelfIter,                        /*tp_iter*/
+    (iternextfunc)FDBIterItemsBatch_tp_iternext, /*tp_iternext*/
+    DBIterBatch_tp_methods,                   /*tp_methods*/
+};
+
+
 /*******************************************************************************
 * FDBType
 *******************************************************************************/
@@ -289,7 +563,9 @@ FDB_Contains(FDB *self, PyObject *pykey)
     if (key == -1 && PyErr_Occurred()) {
         return -1;
     }
+    Py_BEGIN_ALLOW_THREADS
     value = tcfdbget(self->fdb, key, &value_size);
+    Py_END_ALLOW_THREADS
     if (!value) {
         if (tcfdbecode(self->fdb) == TCENOREC) {
             return 0;
@@ -323,9 +599,9 @@ FDB_Length(FDB *self)
 }
 
 
-/* FDB_tp_as_mapping.mp_subscript */
+/* retrieve a record, as a RecordView if view is true */
 static PyObject *
-FDB_GetItem(FDB *self, PyObject *pykey)
+FDB_Get(FDB *self, PyObject *pykey, bool view)
 {
     long long key;
     void *value;
@@ -336,39 +612,61 @@ FDB_GetItem(FDB *self, PyObject *pykey)
     if (key == -1 && PyErr_Occurred()) {
         return NULL;
     }
+    Py_BEGIN_ALLOW_THREADS
     value = tcfdbget(self->fdb, key, &value_size);
+    Py_END_ALLOW_THREADS
     if (!value) {
         return set_fdb_error(self->fdb, key);
     }
+    if (view) {
+        return void_to_view(value, value_size);
+    }
     pyvalue = void_to_bytes(value, value_size);
     tcfree(value);
     return pyvalue;
 }
 
 
+/* FDB_tp_as_mapping.mp_subscript */
+static PyObject *
+FDB_GetItem(FDB *self, PyObject *pykey)
+{
+    return FDB_Get(self, pykey, false);
+}
+
+
 /* FDB_tp_as_mapping.mp_ass_subscript */
 static int
 FDB_SetItem(FDB *self, PyObject *pykey, PyObject *pyvalue)
 {
     long long key;
+    Py_buffer value_view;
     void *value;
     int value_size;
+    bool result;
 
     key = PyLong_AsLongLong(pykey);
     if (key == -1 && PyErr_Occurred()) {
         return -1;
     }
     if (pyvalue) {
-        if (bytes_to_void(pyvalue, &value, &value_size)) {
+        if (bytes_to_void(pyvalue, &value_view, &value, &value_size)) {
             return -1;
         }
-        if (!tcfdbput(self->fdb, key, value, value_size)) {
+        Py_BEGIN_ALLOW_THREADS
+        result = tcfdbput(self->fdb, key, value, value_size);
+        Py_END_ALLOW_THREADS
+        PyBuffer_Release(&value_view);
+        if (!result) {
             set_fdb_error(self->fdb, 0);
             return -1;
         }
     }
     else {
-        if (!tcfdbout(self->fdb, key)) {
+        Py_BEGIN_ALLOW_THREADS
+        result = tcfdbout(self->fdb, key);
+        Py_END_ALLOW_THREADS
+        if (!result) {
             set_fdb_error(self->fdb, key);
             return -1;
         }
@@ -407,11 +705,15 @@ FDB_open(FDB *self, PyObject *args)
 {
     const char *path;
     int mode;
+    bool result;
 
     if (!PyArg_ParseTuple(args, "si:open", &path, &mode)) {
         return NULL;
     }
-    if (!tcfdbopen(self->fdb, path, mode)) {
+    Py_BEGIN_ALLOW_THREADS
+    result = tcfdbopen(self->fdb, path, mode);
+    Py_END_ALLOW_THREADS
+    if (!result) {
         return set_fdb_error(self->fdb, 0);
     }
     Py_RETURN_NONE;
@@ -430,7 +732,12 @@ FDBs are closed when garbage-collected.");
 static PyObject *
 FDB_close(FDB *self)
 {
-    if (!tcfdbclose(self->fdb)) {
+    bool result;
+
+    Py_BEGIN_ALLOW_THREADS
+    result = tcfdbclose(self->fdb);
+    Py_END_ALLOW_THREADS
+    if (!result) {
         return set_fdb_error(self->fdb, 0);
     }
     Py_RETURN_NONE;
@@ -446,7 +753,12 @@ Remove all records from the database.");
 static PyObject *
 FDB_clear(FDB *self)
 {
-    if (!tcfdbvanish(self->fdb)) {
+    bool result;
+
+    Py_BEGIN_ALLOW_THREADS
+    result = tcfdbvanish(self->fdb);
+    Py_END_ALLOW_THREADS
+    if (!result) {
         return set_fdb_error(self->fdb, 0);
     }
     self->changed = true;
@@ -465,6 +777,7 @@ static PyObject *
 FDB_copy(FDB *self, PyObject *args)
 {
     const char *path;
+    bool result;
 
     if (!PyArg_ParseTuple(args, "s:copy", &path)) {
         return NULL;
@@ -474,7 +787,10 @@ FDB_copy(FDB *self, PyObject *args)
         return set_error(PyExc_NotImplementedError,
                          "this feature is not supported");
     }
-    if (!tcfdbcopy(self->fdb, path)) {
+    Py_BEGIN_ALLOW_THREADS
+    result = tcfdbcopy(self->fdb, path);
+    Py_END_ALLOW_THREADS
+    if (!result) {
         return set_fdb_error(self->fdb, 0);
     }
     Py_RETURN_NONE;
@@ -490,7 +806,12 @@ Begin a transaction.");
 static PyObject *
 FDB_begin(FDB *self)
 {
-    if (!tcfdbtranbegin(self->fdb)) {
+    bool result;
+
+    Py_BEGIN_ALLOW_THREADS
+    result = tcfdbtranbegin(self->fdb);
+    Py_END_ALLOW_THREADS
+    if (!result) {
         return set_fdb_error(self->fdb, 0);
     }
     Py_RETURN_NONE;
@@ -506,7 +827,12 @@ Commit a transaction.");
 static PyObject *
 FDB_commit(FDB *self)
 {
-    if (!tcfdbtrancommit(self->fdb)) {
+    bool result;
+
+    Py_BEGIN_ALLOW_THREADS
+    result = tcfdbtrancommit(self->fdb);
+    Py_END_ALLOW_THREADS
+    if (!result) {
         return set_fdb_error(self->fdb, 0);
     }
     Py_RETURN_NONE;
@@ -522,28 +848,99 @@ Abort a transaction.");
 static PyObject *
 FDB_abort(FDB *self)
 {
-    if (!tcfdbtranabort(self->fdb)) {
+    bool result;
+
+    Py_BEGIN_ALLOW_THREADS
+    result = tcfdbtranabort(self->fdb);
+    Py_END_ALLOW_THREADS
+    if (!result) {
         return set_fdb_error(self->fdb, 0);
     }
     Py_RETURN_NONE;
 }
 
 
-/* FDB.get(key) */
+/* FDB.get(key[, view=False]) */
 PyDoc_STRVAR(FDB_get_doc,
-"get(key)\n\
+"get(key[, view=False])\n\
 \n\
-Retrieve a record from the database.");
+Retrieve a record from the database. If view is True, return a read-only\n\
+RecordView supporting the buffer protocol instead of copying the value to\n\
+bytes.");
 
 static PyObject *
-FDB_get(FDB *self, PyObject *args)
+FDB_get(FDB *self, PyObject *args, PyObject *kwargs)
 {
-    PyObject *pykey;
+    PyObject *pykey, *view = Py_False;
+
+    static char *kwlist[] = {"key", "view", NULL};
 
-    if (!PyArg_ParseTuple(args, "O:get", &pykey)) {
+    if (!PyArg_ParseTupleAndKeywords(args, kwargs, "O|O:get", kwlist,
+                                     &pykey, &view)) {
         return NULL;
     }
-    return FDB_GetItem(self, pykey);
+    if (!PyBool_Check(view)) {
+        return set_error(PyExc_TypeError, "a boolean is required");
+    }
+    return FDB_Get(self, pykey, view == Py_True);
+}
+
+
+/* FDB.getmany(keys[, default=None]) -> list */
+PyDoc_STRVAR(FDB_getmany_doc,
+"getmany(keys[, default=None]) -> list\n\
+\n\
+Retrieve several records at once. Return a list of values in the same order as\n\
+keys, missing records are replaced by default.");
+
+static PyObject *
+FDB_getmany(FDB *self, PyObject *args, PyObject *kwargs)
+{
+    PyObject *pykeys, *pydefault = Py_None, *pyresult = NULL;
+    long long *keys;
+    void **values;
+    int *value_sizes;
+    int len, i;
+
+    static char *kwlist[] = {"keys", "default", NULL};
+
+    if (!PyArg_ParseTupleAndKeywords(args, kwargs, "O|O:getmany", kwlist,
+                                     &pykeys, &pydefault)) {
+        return NULL;
+    }
+    keys = seq_to_ids(pykeys, &len);
+    if (!keys) {
+        return NULL;
+    }
+    values = PyMem_New(void *, len);
+    value_sizes = PyMem_New(int, len);
+    if (!values || !value_sizes) {
+        PyMem_Free(values);
+        PyMem_Free(value_sizes);
+        PyMem_Free(keys);
+        return PyErr_NoMemory();
+    }
+    Py_BEGIN_ALLOW_THREADS
+    for (i = 0; i < len; i++) {
+        values[i] = tcfdbget(self->fdb, keys[i], &value_sizes[i]);
+        if (!values[i] && tcfdbecode(self->fdb) != TCENOREC) {
+            break;
+        }
+    }
+    Py_END_ALLOW_THREADS
+    if (i < len) {
+        set_fdb_error(self->fdb, 0);
+        while (i--) {
+            tcfree(values[i]);
+        }
+    }
+    else {
+        pyresult = values_to_list(values, value_sizes, len, pydefault);
+    }
+    PyMem_Free(values);
+    PyMem_Free(value_sizes);
+    PyMem_Free(keys);
+    return pyresult;
 }
 
 
@@ -568,6 +965,61 @@ FDB_remove(FDB *self, PyObject *args)
 }
 
 
+/* FDB.removemany(keys[, missing_ok=True]) -> int */
+PyDoc_STRVAR(FDB_removemany_doc,
+"removemany(keys[, missing_ok=True]) -> int\n\
+\n\
+Remove several records at once and return the number of records removed.\n\
+If missing_ok is False, this method raises KeyError on the first key that is\n\
+not in the database (records removed before it stay removed).");
+
+static PyObject *
+FDB_removemany(FDB *self, PyObject *args, PyObject *kwargs)
+{
+    PyObject *pykeys, *pymissing_ok = Py_True;
+    long long *keys;
+    int len, i;
+    long count = 0;
+    bool missing_ok, result;
+
+    static char *kwlist[] = {"keys", "missing_ok", NULL};
+
+    if (!PyArg_ParseTupleAndKeywords(args, kwargs, "O|O:removemany", kwlist,
+                                     &pykeys, &pymissing_ok)) {
+        return NULL;
+    }
+    if (!PyBool_Check(pymissing_ok)) {
+        return set_error(PyExc_TypeError, "a boolean is required");
+    }
+    missing_ok = (pymissing_ok == Py_True);
+    keys = seq_to_ids(pykeys, &len);
+    if (!keys) {
+        return NULL;
+    }
+    Py_BEGIN_ALLOW_THREADS
+    for (i = 0; i < len; i++) {
+        result = tcfdbout(self->fdb, keys[i]);
+        if (result) {
+            count++;
+        }
+        else if (!missing_ok || tcfdbecode(self->fdb) != TCENOREC) {
+            break;
+        }
+    }
+    Py_END_ALLOW_THREADS
+    if (count) {
+        self->changed = true;
+    }
+    if (i < len) {
+        set_fdb_error(self->fdb, keys[i]);
+        PyMem_Free(keys);
+        return NULL;
+    }
+    PyMem_Free(keys);
+    return PyInt_FromLong(count);
+}
+
+
 /* FDB.put(key, value) */
 PyDoc_STRVAR(FDB_put_doc,
 "put(key, value)\n\
@@ -589,6 +1041,119 @@ FDB_put(FDB *self, PyObject *args)
 }
 
 
+/* FDB.putmany(items[, mode="put"[, transaction=False]]) -> int */
+PyDoc_STRVAR(FDB_putmany_doc,
+"putmany(items[, mode=\"put\"[, transaction=False]]) -> int\n\
+\n\
+Store several records at once and return the number of records stored.\n\
+'items': a dict or an iterable of (key, value) pairs, keys being ints.\n\
+'mode': one of \"put\", \"keep\" or \"cat\". In \"keep\" mode, records whose\n\
+        key is already in the database are skipped.\n\
+'transaction': if True, the records are stored in a single transaction which\n\
+               is aborted if any of them fails.");
+
+static PyObject *
+FDB_putmany(FDB *self, PyObject *args, PyObject *kwargs)
+{
+    PyObject *pyitems, *pyiter, *transaction = Py_False;
+    const char *smode = "put";
+    const void *value;
+    long long *keys;
+    int value_size, mode, len, i;
+    long count = 0;
+    TCLIST *values;
+    bool result;
+
+    static char *kwlist[] = {"items", "mode", "transaction", NULL};
+
+    if (!PyArg_ParseTupleAndKeywords(args, kwargs, "O|sO:putmany", kwlist,
+                                     &pyitems, &smode, &transaction)) {
+        return NULL;
+    }
+    if (!PyBool_Check(transaction)) {
+        return set_error(PyExc_TypeError, "a boolean is required");
+    }
+    mode = str_to_put_mode(smode);
+    if (mode < 0) {
+        return NULL;
+    }
+    pyiter = items_to_iter(pyitems);
+    if (!pyiter) {
+        return NULL;
+    }
+    keys = PyMem_New(long long, TK_PY_BATCH_SIZE);
+    if (!keys) {
+        Py_DECREF(pyiter);
+        return PyErr_NoMemory();
+    }
+    values = tclistnew2(TK_PY_BATCH_SIZE);
+    if (transaction == Py_True) {
+        Py_BEGIN_ALLOW_THREADS
+        result = tcfdbtranbegin(self->fdb);
+        Py_END_ALLOW_THREADS
+        if (!result) {
+            Py_DECREF(pyiter);
+            PyMem_Free(keys);
+            tclistdel(values);
+            return set_fdb_error(self->fdb, 0);
+        }
+    }
+    while ((len = iter_to_ids(pyiter, keys, values, TK_PY_BATCH_SIZE)) > 0) {
+        Py_BEGIN_ALLOW_THREADS
+        for (i = 0; i < len; i++) {
+            value = tclistval(values, i, &value_size);
+            if (mode == TK_PY_PUTKEEP) {
+                result = tcfdbputkeep(self->fdb, keys[i], value, value_size);
+                if (!result && tcfdbecode(self->fdb) == TCEKEEP) {
+                    continue;
+                }
+            }
+            else if (mode == TK_PY_PUTCAT) {
+                result = tcfdbputcat(self->fdb, keys[i], value, value_size);
+            }
+            else {
+                result = tcfdbput(self->fdb, keys[i], value, value_size);
+            }
+            if (!result) {
+                break;
+            }
+            count++;
+        }
+        Py_END_ALLOW_THREADS
+        tclistclear(values);
+        if (i < len) {
+            set_fdb_error(self->fdb, 0);
+            len = -1;
+            break;
+        }
+    }
+    if (count) {
+        self->changed = true;
+    }
+    if (transaction == Py_True) {
+        Py_BEGIN_ALLOW_THREADS
+        if (len < 0) {
+            result = tcfdbtranabort(self->fdb);
+        }
+        else {
+            result = tcfdbtrancommit(self->fdb);
+        }
+        Py_END_ALLOW_THREADS
+        if (len >= 0 && !result) {
+            set_fdb_error(self->fdb, 0);
+            len = -1;
+        }
+    }
+    Py_DECREF(pyiter);
+    PyMem_Free(keys);
+    tclistdel(values);
+    if (len < 0) {
+        return NULL;
+    }
+    return PyInt_FromLong(count);
+}
+
+
 /* FDB.putkeep(key, value) */
 PyDoc_STRVAR(FDB_putkeep_doc,
 "putkeep(key, value)\n\
@@ -600,17 +1165,23 @@ static PyObject *
 FDB_putkeep(FDB *self, PyObject *args)
 {
     long long key;
+    Py_buffer value_view;
     void *value;
     int value_size;
+    bool result;
     PyObject *pyvalue;
 
     if (!PyArg_ParseTuple(args, "LO:putkeep", &key, &pyvalue)) {
         return NULL;
     }
-    if (bytes_to_void(pyvalue, &value, &value_size)) {
+    if (bytes_to_void(pyvalue, &value_view, &value, &value_size)) {
         return NULL;
     }
-    if (!tcfdbputkeep(self->fdb, key, value, value_size)) {
+    Py_BEGIN_ALLOW_THREADS
+    result = tcfdbputkeep(self->fdb, key, value, value_size);
+    Py_END_ALLOW_THREADS
+    PyBuffer_Release(&value_view);
+    if (!result) {
         return set_fdb_error(self->fdb, key);
     }
     self->changed = true;
@@ -629,17 +1200,23 @@ static PyObject *
 FDB_putcat(FDB *self, PyObject *args)
 {
     long long key;
+    Py_buffer value_view;
     void *value;
     int value_size;
+    bool result;
     PyObject *pyvalue;
 
     if (!PyArg_ParseTuple(args, "LO:putcat", &key, &pyvalue)) {
         return NULL;
     }
-    if (bytes_to_void(pyvalue, &value, &value_size)) {
+    if (bytes_to_void(pyvalue, &value_view, &value, &value_size)) {
         return NULL;
     }
-    if (!tcfdbputcat(self->fdb, key, value, value_size)) {
+    Py_BEGIN_ALLOW_THREADS
+    result = tcfdbputcat(self->fdb, key, value, value_size);
+    Py_END_ALLOW_THREADS
+    PyBuffer_Release(&value_view);
+    if (!result) {
         return set_fdb_error(self->fdb, 0);
     }
     self->changed = true;
@@ -656,7 +1233,12 @@ Flush modifications to the database file?");
 static PyObject *
 FDB_sync(FDB *self)
 {
-    if (!tcfdbsync(self->fdb)) {
+    bool result;
+
+    Py_BEGIN_ALLOW_THREADS
+    result = tcfdbsync(self->fdb);
+    Py_END_ALLOW_THREADS
+    if (!result) {
         return set_fdb_error(self->fdb, 0);
     }
     Py_RETURN_NONE;
@@ -713,6 +1295,7 @@ FDB_optimize(FDB *self, PyObject *args, PyObject *kwargs)
 {
     long width = 0;
     long long size = 0;
+    bool result;
 
     static char *kwlist[] = {"width", "size", NULL};
 
@@ -720,7 +1303,10 @@ FDB_optimize(FDB *self, PyObject *args, PyObject *kwargs)
                                      &width, &size)) {
         return NULL;
     }
-    if (!tcfdboptimize(self->fdb, width, size)) {
+    Py_BEGIN_ALLOW_THREADS
+    result = tcfdboptimize(self->fdb, width, size);
+    Py_END_ALLOW_THREADS
+    if (!result) {
         return set_fdb_error(self->fdb, 0);
     }
     Py_RETURN_NONE;
@@ -778,7 +1364,9 @@ FDB_addint(FDB *self, PyObject *args)
     if (!PyArg_ParseTuple(args, "Li:addint", &key, &num)) {
         return NULL;
     }
+    Py_BEGIN_ALLOW_THREADS
     result = tcfdbaddint(self->fdb, key, num);
+    Py_END_ALLOW_THREADS
     if (result == INT_MIN) {
         ecode = tcfdbecode(self->fdb);
         if (ecode != TCESUCCESS && ecode != TCENOREC) {
@@ -814,7 +1402,9 @@ FDB_adddouble(FDB *self, PyObject *args)
     if (!PyArg_ParseTuple(args, "Ld:adddouble", &key, &num)) {
         return NULL;
     }
+    Py_BEGIN_ALLOW_THREADS
     result = tcfdbadddouble(self->fdb, key, num);
+    Py_END_ALLOW_THREADS
     if (Py_IS_NAN(result)) {
         return set_fdb_error(self->fdb, key);
     }
@@ -825,15 +1415,25 @@ FDB_adddouble(FDB *self, PyObject *args)
 }
 
 
-/* FDB.iterkeys() */
+/* FDB.iterkeys([batch=0]) */
 PyDoc_STRVAR(FDB_iterkeys_doc,
-"iterkeys()\n\
+"iterkeys([batch=0])\n\
 \n\
-Return an iterator over the database's keys.");
+Return an iterator over the database's keys. If batch is greater than 0,\n\
+the iterator yields lists of up to batch keys at a time.");
 
 static PyObject *
-FDB_iterkeys(FDB *self)
+FDB_iterkeys(FDB *self, PyObject *args, PyObject *kwargs)
 {
+    int batch = 0;
+
+    if (parse_batch(args, kwargs, "|i:iterkeys", &batch)) {
+        return NULL;
+    }
+    if (batch) {
+        return DBIter_set_batch(new_FDBIter(self, &FDBIterKeysBatchType),
+                                batch);
+    }
     return new_FDBIter(self, &FDBIterKeysType);
 }
 
@@ -851,15 +1451,25 @@ FDB_itervalues(FDB *self)
 }
 
 
-/* FDB.iteritems() */
+/* FDB.iteritems([batch=0]) */
 PyDoc_STRVAR(FDB_iteritems_doc,
-"iteritems()\n\
+"iteritems([batch=0])\n\
 \n\
-Return an iterator over the database's items.");
+Return an iterator over the database's items. If batch is greater than 0,\n\
+the iterator yields lists of up to batch items at a time.");
 
 static PyObject *
-FDB_iteritems(FDB *self)
+FDB_iteritems(FDB *self, PyObject *args, PyObject *kwargs)
 {
+    int batch = 0;
+
+    if (parse_batch(args, kwargs, "|i:iteritems", &batch)) {
+        return NULL;
+    }
+    if (batch) {
+        return DBIter_set_batch(new_FDBIter(self, &FDBIterItemsBatchType),
+                                batch);
+    }
     return new_FDBIter(self, &FDBIterItemsType);
 }
 
@@ -873,9 +1483,16 @@ static PyMethodDef FDB_tp_methods[] = {
     {"begin", (PyCFunction)FDB_begin, METH_NOARGS, FDB_begin_doc},
     {"commit", (PyCFunction)FDB_commit, METH_NOARGS, FDB_commit_doc},
     {"abort", (PyCFunction)FDB_abort, METH_NOARGS, FDB_abort_doc},
-    {"get", (PyCFunction)FDB_get, METH_VARARGS, FDB_get_doc},
+    {"get", (PyCFunction)FDB_get, METH_VARARGS | METH_KEYWORDS,
+     FDB_get_doc},
+    {"getmany", (PyCFunction)FDB_getmany, METH_VARARGS | METH_KEYWORDS,
+     FDB_getmany_doc},
     {"remove", (PyCFunction)FDB_remove, METH_VARARGS, FDB_remove_doc},
+    {"removemany", (PyCFunction)FDB_removemany, METH_VARARGS | METH_KEYWORDS,
+     FDB_removemany_doc},
     {"put", (PyCFunction)FDB_put, METH_VARARGS, FDB_put_doc},
+    {"putmany", (PyCFunction)FDB_putmany, METH_VARARGS | METH_KEYWORDS,
+     FDB_putmany_doc},
     {"putkeep", (PyCFunction)FDB_putkeep, METH_VARARGS, FDB_putkeep_doc},
     {"putcat", (PyCFunction)FDB_putcat, METH_VARARGS, FDB_putcat_doc},
     {"sync", (PyCFunction)FDB_sync, METH_NOARGS, FDB_sync_doc},
@@ -886,9 +1503,11 @@ static PyMethodDef FDB_tp_methods[] = {
     {"tune", (PyCFunction)FDB_tune, METH_VARARGS, FDB_tune_doc},
     {"addint", (PyCFunction)FDB_addint, METH_VARARGS, FDB_addint_doc},
     {"adddouble", (PyCFunction)FDB_adddouble, METH_VARARGS, FDB_adddouble_doc},
-    {"iterkeys", (PyCFunction)FDB_iterkeys, METH_NOARGS, FDB_iterkeys_doc},
+    {"iterkeys", (PyCFunction)FDB_iterkeys, METH_VARARGS | METH_KEYWORDS,
+     FDB_iterkeys_doc},
     {"itervalues", (PyCFunction)FDB_itervalues, METH_NOARGS, FDB_itervalues_doc},
-    {"iteritems", (PyCFunction)FDB_iteritems, METH_NOARGS, FDB_iteritems_doc},
+    {"iteritems", (PyCFunction)FDB_iteritems, METH_VARARGS | METH_KEYWORDS,
+     FDB_iteritems_doc},
     {NULL}  /* Sentinel */
 };
 
@@ -23,11 +23,15 @@ set_hdb_error(TCHDB *hdb, const char *key)
 static PyObject *
 new_HDBIter(HDB *self, PyTypeObject *type)
 {
+    bool result;
     PyObject *iter = DBIter_tp_new(type, (PyObject *)self);
     if (!iter) {
         return NULL;
     }
-    if (!tchdbiterinit(self->hdb)) {
+    Py_BEGIN_ALLOW_THREADS
+    result = tchdbiterinit(self->hdb);
+    Py_END_ALLOW_THREADS
+    if (!result) {
         Py_DECREF(iter);
         return set_hdb_error(self->hdb, NULL);
     }
@@ -36,6 +40,20 @@ new_HDBIter(HDB *self, PyTypeObject *type)
 }
 
 
+/* check that the database did not change during the iteration, a resumable
+   iterator carries on from the position of the iterator of the database
+   (records are walked in file order and removed ones are skipped) */
+static int
+HDBIter_check(DBIter *self)
+{
+    if (((HDB *)self->db)->changed && !self->resumable) {
+        set_error(Error, "HDB changed during iteration");
+        return -1;
+    }
+    return 0;
+}
+
+
 /* HDBIterKeysType.tp_iternext */
 static PyObject *
 HDBIterKeys_tp_iternext(DBIter *self)
@@ -45,10 +63,12 @@ HDBIterKeys_tp_iternext(DBIter *self)
     int key_size;
     PyObject *pykey;
 
-    if (hdb->changed) {
-        return set_error(Error, "HDB changed during iteration");
+    if (HDBIter_check(self)) {
+        return NULL;
     }
+    Py_BEGIN_ALLOW_THREADS
     key = tchdbiternext(hdb->hdb, &key_size);
+    Py_END_ALLOW_THREADS
     if (!key) {
         if (tchdbecode(hdb->hdb) == TCENOREC) {
             return set_stopiteration_error();
@@ -100,14 +120,17 @@ HDBIterValues_tp_iternext(DBIter *self)
 {
     HDB *hdb = (HDB *)self->db;
     TCXSTR *key, *value;
+    bool result;
     PyObject *pyvalue = NULL;
 
     if (hdb->changed) {
         return set_error(Error, "HDB changed during iteration");
     }
-    key = tcxstrnew();
-    value = tcxstrnew();
-    if (!tchdbiternext3(hdb->hdb, key, value)) {
+    DBIter_borrow_buffers(self, &key, &value);
+    Py_BEGIN_ALLOW_THREADS
+    result = tchdbiternext3(hdb->hdb, key, value);
+    Py_END_ALLOW_THREADS
+    if (!result) {
         if (tchdbecode(hdb->hdb) == TCENOREC) {
             set_stopiteration_error();
         }
@@ -118,8 +141,7 @@ HDBIterValues_tp_iternext(DBIter *self)
     else {
         pyvalue = tcxstr_to_bytes(value);
     }
-    tcxstrdel(key);
-    tcxstrdel(value);
+    DBIter_return_buffers(self, key, value);
     return pyvalue;
 }
 
@@ -163,14 +185,17 @@ HDBIterItems_tp_iternext(DBIter *self)
 {
     HDB *hdb = (HDB *)self->db;
     TCXSTR *key, *value;
+    bool result;
     PyObject *pykey, *pyvalue, *pyresult = NULL;
 
     if (hdb->changed) {
         return set_error(Error, "HDB changed during iteration");
     }
-    key = tcxstrnew();
-    value = tcxstrnew();
-    if (!tchdbiternext3(hdb->hdb, key, value)) {
+    DBIter_borrow_buffers(self, &key, &value);
+    Py_BEGIN_ALLOW_THREADS
+    result = tchdbiternext3(hdb->hdb, key, value);
+    Py_END_ALLOW_THREADS
+    if (!result) {
         if (tchdbecode(hdb->hdb) == TCENOREC) {
             set_stopiteration_error();
         }
@@ -187,8 +212,7 @@ HDBIterItems_tp_iternext(DBIter *self)
         Py_XDECREF(pykey);
         Py_XDECREF(pyvalue);
     }
-    tcxstrdel(key);
-    tcxstrdel(value);
+    DBIter_return_buffers(self, key, value);
     return pyresult;
 }
 
@@ -226,6 +250,150 @@ static PyTypeObject HDBIterItemsType = {
 };
 
 
+/* HDBIterKeysBatchType.tp_iternext */
+static PyObject *
+HDBIterKeysBatch_tp_iternext(DBIter *self)
+{
+    HDB *hdb = (HDB *)self->db;
+    TCLIST *keys;
+    void *key;
+    int key_size, len;
+    PyObject *pykeys = NULL;
+
+    if (HDBIter_check(self)) {
+        return NULL;
+    }
+    keys = tclistnew2(self->batch);
+    Py_BEGIN_ALLOW_THREADS
+    for (len = 0; len < self->batch; len++) {
+        key = tchdbiternext(hdb->hdb, &key_size);
+        if (!key) {
+            break;
+        }
+        tclistpushmalloc(keys, key, key_size);
+    }
+    Py_END_ALLOW_THREADS
+    if (len < self->batch && tchdbecode(hdb->hdb) != TCENOREC) {
+        set_hdb_error(hdb->hdb, NULL);
+    }
+    else if (!len) {
+        set_stopiteration_error();
+    }
+    else {
+        pykeys = tclist_to_list(keys);
+    }
+    tclistdel(keys);
+    return pykeys;
+}
+
+
+/* HDBIterKeysBatchType */
+static PyTypeObject HDBIterKeysBatchType = {
+    PyVarObject_HEAD_INIT(NULL, 0)
+    "tokyo.cabinet.HDBIterKeysBatch",         /*tp_name*/
+    sizeof(DBIter),                           /*tp_basicsize*/
+    0,                                        /*tp_itemsize*/
+    (destructor)DBIter_tp_dealloc,            /*tp_dealloc*/
+    0,                                        /*tp_print*/
+    0,                                        /*tp_getattr*/
+    0,                                        /*tp_setattr*/
+    0,                                        /*tp_compare*/
+    0,                                        /*tp_repr*/
+    0,                                        /*tp_as_number*/
+    0,                                        /*tp_as_sequence*/
+    0,                                        /*tp_as_mapping*/
+    0,                                        /*tp_hash */
+    0,                                        /*tp_call*/
+    0,                                        /*tp_str*/
+    0,                                        /*tp_getattro*/
+    0,                                        /*tp_setattro*/
+    0,                                        /*tp_as_buffer*/
+    Py_TPFLAGS_DEFAULT | Py_TPFLAGS_HAVE_GC,  /*tp_flags*/
+    0,                                        /*tp_doc*/
+    (traverseproc)DBIter_tp_traverse,         /*tp_traverse*/
+    (inquiry)DBIter_tp_clear,                 /*tp_clear*/
+    0,                                        /*tp_richcompare*/
+    0,                                        /*tp_weaklistoffset*/
+    PyObject_SelfIter,                        /*tp_iter*/
+    (iternextfunc)HDBIterKeysBatch_tp_iternext, /*tp_iternext*/
+    DBIterBatch_tp_methods,                   /*tp_methods*/
+};
+
+
+/* HDBIterItemsBatchType.tp_iternext */
+static PyObject *
+HDBIterItemsBatch_tp_iternext(DBIter *self)
+{
+    HDB *hdb = (HDB *)self->db;
+    TCLIST *keys, *values;
+    TCXSTR *key, *value;
+    int len;
+    PyObject *pyitems = NULL;
+
+    if (hdb->changed) {
+        return set_error(Error, "HDB changed during iteration");
+    }
+    keys = tclistnew2(self->batch);
+    values = tclistnew2(self->batch);
+    DBIter_borrow_buffers(self, &key, &value);
+    Py_BEGIN_ALLOW_THREADS
+    for (len = 0; len < self->batch; len++) {
+        if (!tchdbiternext3(hdb->hdb, key, value)) {
+            break;
+        }
+        tclistpush(keys, tcxstrptr(key), tcxstrsize(key));
+        tclistpush(values, tcxstrptr(value), tcxstrsize(value));
+    }
+    Py_END_ALLOW_THREADS
+    if (len < self->batch && tchdbecode(hdb->hdb) != TCENOREC) {
+        set_hdb_error(hdb->hdb, NULL);
+    }
+    else if (!len) {
+        set_stopiteration_error();
+    }
+    else {
+        pyitems = tclists_to_items(keys, values);
+    }
+    DBIter_return_buffers(self, key, value);
+    tclistdel(keys);
+    tclistdel(values);
+    return pyitems;
+}
+
+
+/* HDBIterItemsBatchType */
+static PyTypeObject HDBIterItemsBatchType = {
+    PyVarObject_HEAD_INIT(NULL, 0)
+    "tokyo.cabinet.HDBIterItemsBatch",        /*tp_name*/
+    sizeof(DBIter),                           /*tp_basicsize*/
+    0,                                        /*tp_itemsize*/
+    (destructor)DBIter_tp_dealloc,            /*tp_dealloc*/
+    0,                                        /*tp_print*/
+    0,                                        /*tp_getattr*/
+    0,                                        /*tp_setattr*/
+    0,                                        /*tp_compare*/
+    0,                                        /*tp_repr*/
+    0,                                        /*tp_as_number*/
+    0,                                        /*tp_as_sequence*/
+    0,                                        /*tp_as_mapping*/
+    0,                                        /*tp_hash */
+    0,                                        /*tp_call*/
+    0,                                        /*tp_str*/
+    0,                                        /*tp_getattro*/
+    0,                                        /*tp_setattro*/
+    0,                                        /*tp_as_buffer*/
+    Py_TPFLAGS_DEFAULT | Py_TPFLAGS_HAVE_GC,  /*tp_flags*/
+    0,                                        /*tp_doc*/
+    (traverseproc)DBIter_tp_traverse,         /*tp_traverse*/
+    (inquiry)DBIter_tp_clear,                 /*tp_clear*/
+    0,                                        /*tp_richcompare*/
+    0,                                        /*tp_weaklistoffset*/
+    PyObject_SelfIter,                        /*tp_iter*/
+    (iternextfunc)HDBIterItemsBatch_tp_iternext, /*tp_iternext*/
+    DBIterBatch_tp_methods,                   /*tp_methods*/
+};
+
+
 /*******************************************************************************
 * HDBType
 *******************************************************************************/
@@ -248,6 +416,7 @@ HDB_tp_dealloc(HDB *self)
     if (self->hdb) {
         tchdbdel(self->hdb);
     }
+    DBCache_del(self->cache);
     Py_TYPE(self)->tp_free((PyObject *)self);
 }
 
@@ -280,13 +449,26 @@ HDB_tp_new(PyTypeObject *type, PyObject *args, PyObject *kwargs)
 static int
 HDB_Contains(HDB *self, PyObject *pykey)
 {
+    Py_buffer key_view;
     void *key, *value;
     int key_size, value_size;
+    unsigned long long version;
 
-    if (bytes_to_void(pykey, &key, &key_size)) {
+    if (bytes_to_void(pykey, &key_view, &key, &key_size)) {
         return -1;
     }
+    if (DBCache_get(self->cache, key, key_size, &value_size)) {
+        PyBuffer_Release(&key_view);
+        return 1;
+    }
+    version = self->version;
+    Py_BEGIN_ALLOW_THREADS
     value = tchdbget(self->hdb, key, key_size, &value_size);
+    Py_END_ALLOW_THREADS
+    if (value) {
+        DBCache_fill(self->cache, version, key, key_size, value, value_size);
+    }
+    PyBuffer_Release(&key_view);
     if (!value) {
         if (tchdbecode(self->hdb) == TCENOREC) {
             return 0;
@@ -320,53 +502,95 @@ HDB_Length(HDB *self)
 }
 
 
-/* HDB_tp_as_mapping.mp_subscript */
+/* retrieve a record, as a RecordView if view is true */
 static PyObject *
-HDB_GetItem(HDB *self, PyObject *pykey)
+HDB_Get(HDB *self, PyObject *pykey, bool view)
 {
+    Py_buffer key_view;
     void *key, *value;
     int key_size, value_size;
+    unsigned long long version;
+    const void *cached;
     PyObject *pyvalue;
 
-    if (bytes_to_void(pykey, &key, &key_size)) {
+    if (bytes_to_key(pykey, &key_view, &key, &key_size)) {
         return NULL;
     }
+    cached = DBCache_get(self->cache, key, key_size, &value_size);
+    if (cached) {
+        PyBuffer_Release(&key_view);
+        return DBCache_to_value(cached, value_size, view);
+    }
+    version = self->version;
+    Py_BEGIN_ALLOW_THREADS
     value = tchdbget(self->hdb, key, key_size, &value_size);
+    Py_END_ALLOW_THREADS
     if (!value) {
-        return set_hdb_error(self->hdb, key);
+        set_hdb_error(self->hdb, key);
+        PyBuffer_Release(&key_view);
+        return NULL;
+    }
+    DBCache_fill(self->cache, version, key, key_size, value, value_size);
+    if (view) {
+        PyBuffer_Release(&key_view);
+        return void_to_view(value, value_size);
     }
     pyvalue = void_to_bytes(value, value_size);
     tcfree(value);
+    PyBuffer_Release(&key_view);
     return pyvalue;
 }
 
 
+/* HDB_tp_as_mapping.mp_subscript */
+static PyObject *
+HDB_GetItem(HDB *self, PyObject *pykey)
+{
+    return HDB_Get(self, pykey, false);
+}
+
+
 /* HDB_tp_as_mapping.mp_ass_subscript */
 static int
 HDB_SetItem(HDB *self, PyObject *pykey, PyObject *pyvalue)
 {
+    Py_buffer key_view, value_view;
     void *key, *value;
     int key_size, value_size;
+    bool result;
 
-    if (bytes_to_void(pykey, &key, &key_size)) {
+    if (bytes_to_key(pykey, &key_view, &key, &key_size)) {
         return -1;
     }
     if (pyvalue) {
-        if (bytes_to_void(pyvalue, &value, &value_size)) {
+        if (bytes_to_void(pyvalue, &value_view, &value, &value_size)) {
+            PyBuffer_Release(&key_view);
             return -1;
         }
-        if (!tchdbput(self->hdb, key, key_size, value, value_size)) {
+        Py_BEGIN_ALLOW_THREADS
+        result = tchdbput(self->hdb, key, key_size, value, value_size);
+        Py_END_ALLOW_THREADS
+        PyBuffer_Release(&value_view);
+        DBCache_out(self->cache, key, key_size);
+        if (!result) {
             set_hdb_error(self->hdb, NULL);
+            PyBuffer_Release(&key_view);
             return -1;
         }
     }
     else {
-        if (!tchdbout(self->hdb, key, key_size)) {
+        Py_BEGIN_ALLOW_THREADS
+        result = tchdbout(self->hdb, key, key_size);
+        Py_END_ALLOW_THREADS
+        DBCache_out(self->cache, key, key_size);
+        if (!result) {
             set_hdb_error(self->hdb, key);
+            PyBuffer_Release(&key_view);
             return -1;
         }
     }
     self->changed = true;
+    PyBuffer_Release(&key_view);
     return 0;
 }
 
@@ -400,11 +624,16 @@ HDB_open(HDB *self, PyObject *args)
 {
     const char *path;
     int mode;
+    bool result;
 
     if (!PyArg_ParseTuple(args, "si:open", &path, &mode)) {
         return NULL;
     }
-    if (!tchdbopen(self->hdb, path, mode)) {
+    Py_BEGIN_ALLOW_THREADS
+    result = tchdbopen(self->hdb, path, mode);
+    Py_END_ALLOW_THREADS
+    DBCache_clear(self->cache);
+    if (!result) {
         return set_hdb_error(self->hdb, NULL);
     }
     Py_RETURN_NONE;
@@ -423,7 +652,13 @@ HDBs are closed when garbage-collected.");
 static PyObject *
 HDB_close(HDB *self)
 {
-    if (!tchdbclose(self->hdb)) {
+    bool result;
+
+    Py_BEGIN_ALLOW_THREADS
+    result = tchdbclose(self->hdb);
+    Py_END_ALLOW_THREADS
+    DBCache_clear(self->cache);
+    if (!result) {
         return set_hdb_error(self->hdb, NULL);
     }
     Py_RETURN_NONE;
@@ -439,7 +674,13 @@ Remove all records from the database.");
 static PyObject *
 HDB_clear(HDB *self)
 {
-    if (!tchdbvanish(self->hdb)) {
+    bool result;
+
+    Py_BEGIN_ALLOW_THREADS
+    result = tchdbvanish(self->hdb);
+    Py_END_ALLOW_THREADS
+    DBCache_clear(self->cache);
+    if (!result) {
         return set_hdb_error(self->hdb, NULL);
     }
     self->changed = true;
@@ -458,6 +699,7 @@ static PyObject *
 HDB_copy(HDB *self, PyObject *args)
 {
     const char *path;
+    bool result;
 
     if (!PyArg_ParseTuple(args, "s:copy", &path)) {
         return NULL;
@@ -467,7 +709,10 @@ HDB_copy(HDB *self, PyObject *args)
         return set_error(PyExc_NotImplementedError,
                          "this feature is not supported");
     }
-    if (!tchdbcopy(self->hdb, path)) {
+    Py_BEGIN_ALLOW_THREADS
+    result = tchdbcopy(self->hdb, path);
+    Py_END_ALLOW_THREADS
+    if (!result) {
         return set_hdb_error(self->hdb, NULL);
     }
     Py_RETURN_NONE;
@@ -483,7 +728,12 @@ Begin a transaction.");
 static PyObject *
 HDB_begin(HDB *self)
 {
-    if (!tchdbtranbegin(self->hdb)) {
+    bool result;
+
+    Py_BEGIN_ALLOW_THREADS
+    result = tchdbtranbegin(self->hdb);
+    Py_END_ALLOW_THREADS
+    if (!result) {
         return set_hdb_error(self->hdb, NULL);
     }
     Py_RETURN_NONE;
@@ -499,7 +749,12 @@ Commit a transaction.");
 static PyObject *
 HDB_commit(HDB *self)
 {
-    if (!tchdbtrancommit(self->hdb)) {
+    bool result;
+
+    Py_BEGIN_ALLOW_THREADS
+    result = tchdbtrancommit(self->hdb);
+    Py_END_ALLOW_THREADS
+    if (!result) {
         return set_hdb_error(self->hdb, NULL);
     }
     Py_RETURN_NONE;
@@ -515,28 +770,103 @@ Abort a transaction.");
 static PyObject *
 HDB_abort(HDB *self)
 {
-    if (!tchdbtranabort(self->hdb)) {
+    bool result;
+
+    Py_BEGIN_ALLOW_THREADS
+    result = tchdbtranabort(self->hdb);
+    Py_END_ALLOW_THREADS
+    DBCache_clear(self->cache);
+    if (!result) {
         return set_hdb_error(self->hdb, NULL);
     }
     Py_RETURN_NONE;
 }
 
 
-/* HDB.get(key) */
+/* HDB.get(key[, view=False]) */
 PyDoc_STRVAR(HDB_get_doc,
-"get(key)\n\
+"get(key[, view=False])\n\
 \n\
-Retrieve a record from the database.");
+Retrieve a record from the database. If view is True, return a read-only\n\
+RecordView supporting the buffer protocol instead of copying the value to\n\
+bytes.");
 
 static PyObject *
-HDB_get(HDB *self, PyObject *args)
+HDB_get(HDB *self, PyObject *args, PyObject *kwargs)
 {
-    PyObject *pykey;
+    PyObject *pykey, *view = Py_False;
+
+    static char *kwlist[] = {"key", "view", NULL};
+
+    if (!PyArg_ParseTupleAndKeywords(args, kwargs, "O|O:get", kwlist,
+                                     &pykey, &view)) {
+        return NULL;
+    }
+    if (!PyBool_Check(view)) {
+        return set_error(PyExc_TypeError, "a boolean is required");
+    }
+    return HDB_Get(self, pykey, view == Py_True);
+}
+
+
+/* HDB.getmany(keys[, default=None]) -> list */
+PyDoc_STRVAR(HDB_getmany_doc,
+"getmany(keys[, default=None]) -> list\n\
+\n\
+Retrieve several records at once. Return a list of values in the same order as\n\
+keys, missing records are replaced by default.");
+
+static PyObject *
+HDB_getmany(HDB *self, PyObject *args, PyObject *kwargs)
+{
+    PyObject *pykeys, *pydefault = Py_None, *pyresult = NULL;
+    TCLIST *keys;
+    const void *key;
+    void **values;
+    int *value_sizes;
+    int key_size, len, i;
+
+    static char *kwlist[] = {"keys", "default", NULL};
 
-    if (!PyArg_ParseTuple(args, "O:get", &pykey)) {
+    if (!PyArg_ParseTupleAndKeywords(args, kwargs, "O|O:getmany", kwlist,
+                                     &pykeys, &pydefault)) {
         return NULL;
     }
-    return HDB_GetItem(self, pykey);
+    keys = seq_to_tclist(pykeys);
+    if (!keys) {
+        return NULL;
+    }
+    len = tclistnum(keys);
+    values = PyMem_New(void *, len);
+    value_sizes = PyMem_New(int, len);
+    if (!values || !value_sizes) {
+        PyMem_Free(values);
+        PyMem_Free(value_sizes);
+        tclistdel(keys);
+        return PyErr_NoMemory();
+    }
+    Py_BEGIN_ALLOW_THREADS
+    for (i = 0; i < len; i++) {
+        key = tclistval(keys, i, &key_size);
+        values[i] = tchdbget(self->hdb, key, key_size, &value_sizes[i]);
+        if (!values[i] && tchdbecode(self->hdb) != TCENOREC) {
+            break;
+        }
+    }
+    Py_END_ALLOW_THREADS
+    if (i < len) {
+        set_hdb_error(self->hdb, NULL);
+        while (i--) {
+            tcfree(values[i]);
+        }
+    }
+    else {
+        pyresult = values_to_list(values, value_sizes, len, pydefault);
+    }
+    PyMem_Free(values);
+    PyMem_Free(value_sizes);
+    tclistdel(keys);
+    return pyresult;
 }
 
 
@@ -561,6 +891,65 @@ HDB_remove(HDB *self, PyObject *args)
 }
 
 
+/* HDB.removemany(keys[, missing_ok=True]) -> int */
+PyDoc_STRVAR(HDB_removemany_doc,
+"removemany(keys[, missing_ok=True]) -> int\n\
+\n\
+Remove several records at once and return the number of records removed.\n\
+If missing_ok is False, this method raises KeyError on the first key that is\n\
+not in the database (records removed before it stay removed).");
+
+static PyObject *
+HDB_removemany(HDB *self, PyObject *args, PyObject *kwargs)
+{
+    PyObject *pykeys, *pymissing_ok = Py_True;
+    TCLIST *keys;
+    const void *key;
+    int key_size, len, i;
+    long count = 0;
+    bool missing_ok, result;
+
+    static char *kwlist[] = {"keys", "missing_ok", NULL};
+
+    if (!PyArg_ParseTupleAndKeywords(args, kwargs, "O|O:removemany", kwlist,
+                                     &pykeys, &pymissing_ok)) {
+        return NULL;
+    }
+    if (!PyBool_Check(pymissing_ok)) {
+        return set_error(PyExc_TypeError, "a boolean is required");
+    }
+    missing_ok = (pymissing_ok == Py_True);
+    keys = seq_to_tclist(pykeys);
+    if (!keys) {
+        return NULL;
+    }
+    len = tclistnum(keys);
+    Py_BEGIN_ALLOW_THREADS
+    for (i = 0; i < len; i++) {
+        key = tclistval(keys, i, &key_size);
+        result = tchdbout(self->hdb, key, key_size);
+        if (result) {
+            count++;
+        }
+        else if (!missing_ok || tchdbecode(self->hdb) != TCENOREC) {
+            break;
+        }
+    }
+    Py_END_ALLOW_THREADS
+    DBCache_out_tclist(self->cache, keys, i < len ? i + 1 : len);
+    if (count) {
+        self->changed = true;
+    }
+    if (i < len) {
+        set_hdb_error(self->hdb, (const char *)key);
+        tclistdel(keys);
+        return NULL;
+    }
+    tclistdel(keys);
+    return PyInt_FromLong(count);
+}
+
+
 /* HDB.put(key, value) */
 PyDoc_STRVAR(HDB_put_doc,
 "put(key, value)\n\
@@ -582,6 +971,124 @@ HDB_put(HDB *self, PyObject *args)
 }
 
 
+/* HDB.putmany(items[, mode="put"[, transaction=False]]) -> int */
+PyDoc_STRVAR(HDB_putmany_doc,
+"putmany(items[, mode=\"put\"[, transaction=False]]) -> int\n\
+\n\
+Store several records at once and return the number of records stored.\n\
+'items': a dict or an iterable of (key, value) pairs.\n\
+'mode': one of \"put\", \"keep\" or \"cat\". In \"keep\" mode, records whose\n\
+        key is already in the database are skipped.\n\
+'transaction': if True, the records are stored in a single transaction which\n\
+               is aborted if any of them fails.");
+
+static PyObject *
+HDB_putmany(HDB *self, PyObject *args, PyObject *kwargs)
+{
+    PyObject *pyitems, *pyiter, *transaction = Py_False;
+    const char *smode = "put";
+    const void *key, *value;
+    int key_size, value_size, mode, len, i;
+    long count = 0;
+    TCLIST *keys, *values;
+    bool result;
+
+    static char *kwlist[] = {"items", "mode", "transaction", NULL};
+
+    if (!PyArg_ParseTupleAndKeywords(args, kwargs, "O|sO:putmany", kwlist,
+                                     &pyitems, &smode, &transaction)) {
+        return NULL;
+    }
+    if (!PyBool_Check(transaction)) {
+        return set_error(PyExc_TypeError, "a boolean is required");
+    }
+    mode = str_to_put_mode(smode);
+    if (mode < 0) {
+        return NULL;
+    }
+    pyiter = items_to_iter(pyitems);
+    if (!pyiter) {
+        return NULL;
+    }
+    keys = tclistnew2(TK_PY_BATCH_SIZE);
+    values = tclistnew2(TK_PY_BATCH_SIZE);
+    if (transaction == Py_True) {
+        Py_BEGIN_ALLOW_THREADS
+        result = tchdbtranbegin(self->hdb);
+        Py_END_ALLOW_THREADS
+        if (!result) {
+            Py_DECREF(pyiter);
+            tclistdel(keys);
+            tclistdel(values);
+            return set_hdb_error(self->hdb, NULL);
+        }
+    }
+    while ((len = iter_to_tclists(pyiter, keys, values,
+                                  TK_PY_BATCH_SIZE)) > 0) {
+        Py_BEGIN_ALLOW_THREADS
+        for (i = 0; i < len; i++) {
+            key = tclistval(keys, i, &key_size);
+            value = tclistval(values, i, &value_size);
+            if (mode == TK_PY_PUTKEEP) {
+                result = tchdbputkeep(self->hdb, key, key_size, value,
+                                      value_size);
+                if (!result && tchdbecode(self->hdb) == TCEKEEP) {
+                    continue;
+                }
+            }
+            else if (mode == TK_PY_PUTCAT) {
+                result = tchdbputcat(self->hdb, key, key_size, value,
+                                     value_size);
+            }
+            else {
+                result = tchdbput(self->hdb, key, key_size, value,
+                                  value_size);
+            }
+            if (!result) {
+                break;
+            }
+            count++;
+        }
+        Py_END_ALLOW_THREADS
+        DBCache_out_tclist(self->cache, keys, i < len ? i + 1 : len);
+        tclistclear(keys);
+        tclistclear(values);
+        if (i < len) {
+            set_hdb_error(self->hdb, NULL);
+            len = -1;
+            break;
+        }
+    }
+    if (count) {
+        self->changed = true;
+    }
+    if (transaction == Py_True) {
+        Py_BEGIN_ALLOW_THREADS
+        if (len < 0) {
+            result = tchdbtranabort(self->hdb);
+        }
+        else {
+            result = tchdbtrancommit(self->hdb);
+        }
+        Py_END_ALLOW_THREADS
+        if (len < 0) {
+            DBCache_clear(self->cache);
+        }
+        if (len >= 0 && !result) {
+            set_hdb_error(self->hdb, NULL);
+            len = -1;
+        }
+    }
+    Py_DECREF(pyiter);
+    tclistdel(keys);
+    tclistdel(values);
+    if (len < 0) {
+        return NULL;
+    }
+    return PyInt_FromLong(count);
+}
+
+
 /* HDB.putkeep(key, value) */
 PyDoc_STRVAR(HDB_putkeep_doc,
 "putkeep(key, value)\n\
@@ -592,21 +1099,32 @@ put), this method raises KeyError if key is already in the database.");
 static PyObject *
 HDB_putkeep(HDB *self, PyObject *args)
 {
+    Py_buffer key_view, value_view;
     void *key, *value;
     int key_size, value_size;
+    bool result;
     PyObject *pykey, *pyvalue;
 
     if (!PyArg_ParseTuple(args, "OO:putkeep", &pykey, &pyvalue)) {
         return NULL;
     }
-    if (bytes_to_void(pykey, &key, &key_size) ||
-        bytes_to_void(pyvalue, &value, &value_size)) {
+    if (bytes_to_key(pykey, &key_view, &key, &key_size) ||
+        bytes_to_void(pyvalue, &value_view, &value, &value_size)) {
+        PyBuffer_Release(&key_view);
         return NULL;
     }
-    if (!tchdbputkeep(self->hdb, key, key_size, value, value_size)) {
-        return set_hdb_error(self->hdb, key);
+    Py_BEGIN_ALLOW_THREADS
+    result = tchdbputkeep(self->hdb, key, key_size, value, value_size);
+    Py_END_ALLOW_THREADS
+    DBCache_out(self->cache, key, key_size);
+    PyBuffer_Release(&value_view);
+    if (!result) {
+        set_hdb_error(self->hdb, key);
+        PyBuffer_Release(&key_view);
+        return NULL;
     }
     self->changed = true;
+    PyBuffer_Release(&key_view);
     Py_RETURN_NONE;
 }
 
@@ -621,18 +1139,27 @@ If there is no corresponding record, a new record is stored.");
 static PyObject *
 HDB_putcat(HDB *self, PyObject *args)
 {
+    Py_buffer key_view, value_view;
     void *key, *value;
     int key_size, value_size;
+    bool result;
     PyObject *pykey, *pyvalue;
 
     if (!PyArg_ParseTuple(args, "OO:putcat", &pykey, &pyvalue)) {
         return NULL;
     }
-    if (bytes_to_void(pykey, &key, &key_size) ||
-        bytes_to_void(pyvalue, &value, &value_size)) {
+    if (bytes_to_void(pykey, &key_view, &key, &key_size) ||
+        bytes_to_void(pyvalue, &value_view, &value, &value_size)) {
+        PyBuffer_Release(&key_view);
         return NULL;
     }
-    if (!tchdbputcat(self->hdb, key, key_size, value, value_size)) {
+    Py_BEGIN_ALLOW_THREADS
+    result = tchdbputcat(self->hdb, key, key_size, value, value_size);
+    Py_END_ALLOW_THREADS
+    DBCache_out(self->cache, key, key_size);
+    PyBuffer_Release(&key_view);
+    PyBuffer_Release(&value_view);
+    if (!result) {
         return set_hdb_error(self->hdb, NULL);
     }
     self->changed = true;
@@ -651,18 +1178,27 @@ into the file at a ?blast? (when?, relation to sync()?).");
 static PyObject *
 HDB_putasync(HDB *self, PyObject *args)
 {
+    Py_buffer key_view, value_view;
     void *key, *value;
     int key_size, value_size;
+    bool result;
     PyObject *pykey, *pyvalue;
 
     if (!PyArg_ParseTuple(args, "OO:putasync", &pykey, &pyvalue)) {
         return NULL;
     }
-    if (bytes_to_void(pykey, &key, &key_size) ||
-        bytes_to_void(pyvalue, &value, &value_size)) {
+    if (bytes_to_void(pykey, &key_view, &key, &key_size) ||
+        bytes_to_void(pyvalue, &value_view, &value, &value_size)) {
+        PyBuffer_Release(&key_view);
         return NULL;
     }
-    if (!tchdbputasync(self->hdb, key, key_size, value, value_size)) {
+    Py_BEGIN_ALLOW_THREADS
+    result = tchdbputasync(self->hdb, key, key_size, value, value_size);
+    Py_END_ALLOW_THREADS
+    DBCache_out(self->cache, key, key_size);
+    PyBuffer_Release(&key_view);
+    PyBuffer_Release(&value_view);
+    if (!result) {
         return set_hdb_error(self->hdb, NULL);
     }
     self->changed = true;
@@ -679,7 +1215,12 @@ Flush modifications to the database file?");
 static PyObject *
 HDB_sync(HDB *self)
 {
-    if (!tchdbsync(self->hdb)) {
+    bool result;
+
+    Py_BEGIN_ALLOW_THREADS
+    result = tchdbsync(self->hdb);
+    Py_END_ALLOW_THREADS
+    if (!result) {
         return set_hdb_error(self->hdb, NULL);
     }
     Py_RETURN_NONE;
@@ -697,6 +1238,7 @@ is applied.");
 static PyObject *
 HDB_searchkeys(HDB *self, PyObject *args)
 {
+    Py_buffer prefix_view;
     void *prefix;
     int prefix_size, max = -1;
     TCLIST *result;
@@ -705,12 +1247,13 @@ HDB_searchkeys(HDB *self, PyObject *args)
     if (!PyArg_ParseTuple(args, "O|i:searchkeys", &pyprefix, &max)) {
         return NULL;
     }
-    if (bytes_to_void(pyprefix, &prefix, &prefix_size)) {
+    if (bytes_to_void(pyprefix, &prefix_view, &prefix, &prefix_size)) {
         return NULL;
     }
     Py_BEGIN_ALLOW_THREADS
     result = tchdbfwmkeys(self->hdb, prefix, prefix_size, max);
     Py_END_ALLOW_THREADS
+    PyBuffer_Release(&prefix_view);
     pyresult = tclist_to_frozenset(result);
     tclistdel(result);
     return pyresult;
@@ -739,6 +1282,7 @@ HDB_optimize(HDB *self, PyObject *args, PyObject *kwargs)
     int iapow = -1, ifpow = -1;
     char apow, fpow;
     unsigned char opts = UINT8_MAX;
+    bool result;
 
     static char *kwlist[] = {"bnum", "apow", "fpow", "opts", NULL};
 
@@ -751,7 +1295,10 @@ HDB_optimize(HDB *self, PyObject *args, PyObject *kwargs)
     if ((apow == -1 || fpow == -1) && PyErr_Occurred()) {
         return NULL;
     }
-    if (!tchdboptimize(self->hdb, bnum, apow, fpow, opts)) {
+    Py_BEGIN_ALLOW_THREADS
+    result = tchdboptimize(self->hdb, bnum, apow, fpow, opts);
+    Py_END_ALLOW_THREADS
+    if (!result) {
         return set_hdb_error(self->hdb, NULL);
     }
     Py_RETURN_NONE;
@@ -874,6 +1421,64 @@ HDB_setdfunit(HDB *self, PyObject *args)
 }
 
 
+/* HDB.setreadcache(max_bytes) */
+PyDoc_STRVAR(HDB_setreadcache_doc,
+"setreadcache(max_bytes)\n\
+\n\
+Set the size of an in-process read-through cache in front of get() and\n\
+hdb[key] (setcache() tunes the record cache of Tokyo Cabinet instead).\n\
+'max_bytes': the maximum total size of the cached keys and values, least\n\
+             recently used records are evicted beyond it. 0 (the default)\n\
+             disables the cache and frees its records.\n\
+If the cache is already enabled, it is resized and keeps its records.\n\
+\n\
+Note:\n\
+The cache is invalidated by writes made through this object only, it is not\n\
+aware of other connections to the same database file.");
+
+static PyObject *
+HDB_setreadcache(HDB *self, PyObject *args, PyObject *kwargs)
+{
+    unsigned long long max_bytes;
+
+    if (parse_cache_max_bytes(args, kwargs, "L:setreadcache", &max_bytes)) {
+        return NULL;
+    }
+    if (!max_bytes) {
+        DBCache_del(self->cache);
+        self->cache = NULL;
+        self->version++;
+    }
+    else if (self->cache) {
+        self->cache->max_bytes = max_bytes;
+        DBCache_trim(self->cache);
+    }
+    else {
+        self->version++;
+        self->cache = DBCache_new(max_bytes, &self->version);
+        if (!self->cache) {
+            return NULL;
+        }
+    }
+    Py_RETURN_NONE;
+}
+
+
+/* HDB.cachestats() -> dict */
+PyDoc_STRVAR(HDB_cachestats_doc,
+"cachestats() -> dict\n\
+\n\
+Return the statistics of the cache set by setreadcache() as a dict with the\n\
+following keys: 'hits', 'misses', 'evictions', 'records', 'bytes' and\n\
+'max_bytes'. Return None if the cache is disabled.");
+
+static PyObject *
+HDB_cachestats(HDB *self)
+{
+    return DBCache_stats(self->cache);
+}
+
+
 /* HDB.addint(key, num) -> int */
 PyDoc_STRVAR(HDB_addint_doc,
 "addint(key, num) -> int\n\
@@ -891,22 +1496,29 @@ static PyObject *
 HDB_addint(HDB *self, PyObject *args)
 {
     PyObject *pykey;
+    Py_buffer key_view;
     void *key;
     int key_size, num, result;
 
     if (!PyArg_ParseTuple(args, "Oi:addint", &pykey, &num)) {
         return NULL;
     }
-    if (bytes_to_void(pykey, &key, &key_size)) {
+    if (bytes_to_key(pykey, &key_view, &key, &key_size)) {
         return NULL;
     }
+    Py_BEGIN_ALLOW_THREADS
     result = tchdbaddint(self->hdb, key, key_size, num);
+    Py_END_ALLOW_THREADS
+    DBCache_out(self->cache, key, key_size);
     if (result == INT_MIN && tchdbecode(self->hdb) != TCESUCCESS) {
-        return set_hdb_error(self->hdb, key);
+        set_hdb_error(self->hdb, key);
+        PyBuffer_Release(&key_view);
+        return NULL;
     }
     if (num) {
         self->changed = true;
     }
+    PyBuffer_Release(&key_view);
     return PyInt_FromLong((long)result);
 }
 
@@ -928,6 +1540,7 @@ static PyObject *
 HDB_adddouble(HDB *self, PyObject *args)
 {
     PyObject *pykey;
+    Py_buffer key_view;
     void *key;
     int key_size;
     double num, result;
@@ -935,30 +1548,61 @@ HDB_adddouble(HDB *self, PyObject *args)
     if (!PyArg_ParseTuple(args, "Od:adddouble", &pykey, &num)) {
         return NULL;
     }
-    if (bytes_to_void(pykey, &key, &key_size)) {
+    if (bytes_to_key(pykey, &key_view, &key, &key_size)) {
         return NULL;
     }
+    Py_BEGIN_ALLOW_THREADS
     result = tchdbadddouble(self->hdb, key, key_size, num);
+    Py_END_ALLOW_THREADS
+    DBCache_out(self->cache, key, key_size);
     if (Py_IS_NAN(result)) {
-        return set_hdb_error(self->hdb, key);
+        set_hdb_error(self->hdb, key);
+        PyBuffer_Release(&key_view);
+        return NULL;
     }
     if (num) {
         self->changed = true;
     }
+    PyBuffer_Release(&key_view);
     return PyFloat_FromDouble(result);
 }
 
 
-/* HDB.iterkeys() */
+/* HDB.iterkeys([batch=0[, resumable=False]]) */
 PyDoc_STRVAR(HDB_iterkeys_doc,
-"iterkeys()\n\
+"iterkeys([batch=0[, resumable=False]])\n\
 \n\
-Return an iterator over the database's keys.");
+Return an iterator over the database's keys. If batch is greater than 0,\n\
+the iterator yields lists of up to batch keys at a time. If resumable is True,\n\
+the iterator does not fail when the database changes but carries on from where\n\
+it is (records moved by a write, e.g. one growing a value, can be yielded\n\
+again).");
 
 static PyObject *
-HDB_iterkeys(HDB *self)
+HDB_iterkeys(HDB *self, PyObject *args, PyObject *kwargs)
 {
-    return new_HDBIter(self, &HDBIterKeysType);
+    int batch = 0;
+    PyObject *resumable = Py_False;
+
+    static char *kwlist[] = {"batch", "resumable", NULL};
+
+    if (!PyArg_ParseTupleAndKeywords(args, kwargs, "|iO:iterkeys", kwlist,
+                                     &batch, &resumable)) {
+        return NULL;
+    }
+    if (check_batch(batch)) {
+        return NULL;
+    }
+    if (!PyBool_Check(resumable)) {
+        return set_error(PyExc_TypeError, "a boolean is required");
+    }
+    if (batch) {
+        return DBIter_set_resumable(
+            DBIter_set_batch(new_HDBIter(self, &HDBIterKeysBatchType), batch),
+            resumable == Py_True);
+    }
+    return DBIter_set_resumable(new_HDBIter(self, &HDBIterKeysType),
+                                resumable == Py_True);
 }
 
 
@@ -975,15 +1619,25 @@ HDB_itervalues(HDB *self)
 }
 
 
-/* HDB.iteritems() */
+/* HDB.iteritems([batch=0]) */
 PyDoc_STRVAR(HDB_iteritems_doc,
-"iteritems()\n\
+"iteritems([batch=0])\n\
 \n\
-Return an iterator over the database's items.");
+Return an iterator over the database's items. If batch is greater than 0,\n\
+the iterator yields lists of up to batch items at a time.");
 
 static PyObject *
-HDB_iteritems(HDB *self)
+HDB_iteritems(HDB *self, PyObject *args, PyObject *kwargs)
 {
+    int batch = 0;
+
+    if (parse_batch(args, kwargs, "|i:iteritems", &batch)) {
+        return NULL;
+    }
+    if (batch) {
+        return DBIter_set_batch(new_HDBIter(self, &HDBIterItemsBatchType),
+                                batch);
+    }
     return new_HDBIter(self, &HDBIterItemsType);
 }
 
@@ -997,9 +1651,16 @@ static PyMethodDef HDB_tp_methods[] = {
     {"begin", (PyCFunction)HDB_begin, METH_NOARGS, HDB_begin_doc},
     {"commit", (PyCFunction)HDB_commit, METH_NOARGS, HDB_commit_doc},
     {"abort", (PyCFunction)HDB_abort, METH_NOARGS, HDB_abort_doc},
-    {"get", (PyCFunction)HDB_get, METH_VARARGS, HDB_get_doc},
+    {"get", (PyCFunction)HDB_get, METH_VARARGS | METH_KEYWORDS,
+     HDB_get_doc},
+    {"getmany", (PyCFunction)HDB_getmany, METH_VARARGS | METH_KEYWORDS,
+     HDB_getmany_doc},
     {"remove", (PyCFunction)HDB_remove, METH_VARARGS, HDB_remove_doc},
+    {"removemany", (PyCFunction)HDB_removemany, METH_VARARGS | METH_KEYWORDS,
+     HDB_removemany_doc},
     {"put", (PyCFunction)HDB_put, METH_VARARGS, HDB_put_doc},
+    {"putmany", (PyCFunction)HDB_putmany, METH_VARARGS | METH_KEYWORDS,
+     HDB_putmany_doc},
     {"putkeep", (PyCFunction)HDB_putkeep, METH_VARARGS, HDB_putkeep_doc},
     {"putcat", (PyCFunction)HDB_putcat, METH_VARARGS, HDB_putcat_doc},
     {"putasync", (PyCFunction)HDB_putasync, METH_VARARGS, HDB_putasync_doc},
@@ -1012,11 +1673,17 @@ static PyMethodDef HDB_tp_methods[] = {
     {"setcache", (PyCFunction)HDB_setcache, METH_VARARGS, HDB_setcache_doc},
     {"setxmsiz", (PyCFunction)HDB_setxmsiz, METH_VARARGS, HDB_setxmsiz_doc},
     {"setdfunit", (PyCFunction)HDB_setdfunit, METH_VARARGS, HDB_setdfunit_doc},
+    {"setreadcache", (PyCFunction)HDB_setreadcache,
+     METH_VARARGS | METH_KEYWORDS, HDB_setreadcache_doc},
+    {"cachestats", (PyCFunction)HDB_cachestats, METH_NOARGS,
+     HDB_cachestats_doc},
     {"addint", (PyCFunction)HDB_addint, METH_VARARGS, HDB_addint_doc},
     {"adddouble", (PyCFunction)HDB_adddouble, METH_VARARGS, HDB_adddouble_doc},
-    {"iterkeys", (PyCFunction)HDB_iterkeys, METH_NOARGS, HDB_iterkeys_doc},
+    {"iterkeys", (PyCFunction)HDB_iterkeys, METH_VARARGS | METH_KEYWORDS,
+     HDB_iterkeys_doc},
     {"itervalues", (PyCFunction)HDB_itervalues, METH_NOARGS, HDB_itervalues_doc},
-    {"iteritems", (PyCFunction)HDB_iteritems, METH_NOARGS, HDB_iteritems_doc},
+    {"iteritems", (PyCFunction)HDB_iteritems, METH_VARARGS | METH_KEYWORDS,
+     HDB_iteritems_doc},
     {NULL}  /* Sentinel */
 };
 
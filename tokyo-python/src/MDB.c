@@ -191,6 +191,149 @@ static PyTypeObject MDBIterItemsType = {
 };
 
 
+/* MDBIterKeysBatchType.tp_iternext */
+static PyObject *
+MDBIterKeysBatch_tp_iternext(DBIter *self)
+{
+    MDB *mdb = (MDB *)self->db;
+    TCLIST *keys;
+    void *key;
+    int key_size, len;
+    PyObject *pykeys = NULL;
+
+    if (mdb->changed) {
+        return set_error(Error, "MDB changed during iteration");
+    }
+    keys = tclistnew2(self->batch);
+    Py_BEGIN_ALLOW_THREADS
+    for (len = 0; len < self->batch; len++) {
+        key = tcmdbiternext(mdb->mdb, &key_size);
+        if (!key) {
+            break;
+        }
+        tclistpushmalloc(keys, key, key_size);
+    }
+    Py_END_ALLOW_THREADS
+    if (!len) {
+        set_stopiteration_error();
+    }
+    else {
+        pykeys = tclist_to_list(keys);
+    }
+    tclistdel(keys);
+    return pykeys;
+}
+
+
+/* MDBIterKeysBatchType */
+static PyTypeObject MDBIterKeysBatchType = {
+    PyVarObject_HEAD_INIT(NULL, 0)
+    "tokyo.cabinet.MDBIterKeysBatch",         /*tp_name*/
+    sizeof(DBIter),                           /*tp_basicsize*/
+    0,                                        /*tp_itemsize*/
+    (destructor)DBIter_tp_dealloc,            /*tp_dealloc*/
+    0,                                        /*tp_print*/
+    0,                                        /*tp_getattr*/
+    0,                                        /*tp_setattr*/
+    0,                                        /*tp_compare*/
+    0,                                        /*tp_repr*/
+    0,                                        /*tp_as_number*/
+    0,                                        /*tp_as_sequence*/
+    0,                                        /*tp_as_mapping*/
+    0,                                        /*tp_hash */
+    0,                                        /*tp_call*/
+    0,                                        /*tp_str*/
+    0,                                        /*tp_getattro*/
+    0,                                        /*tp_setattro*/
+    0,                                        /*tp_as_buffer*/
+    Py_TPFLAGS_DEFAULT | Py_TPFLAGS_HAVE_GC,  /*tp_flags*/
+    0,                                        /*tp_doc*/
+    (traverseproc)DBIter_tp_traverse,         /*tp_traverse*/
+    (inquiry)DBIter_tp_clear,                 /*tp_clear*/
+    0,                                        /*tp_richcompare*/
+    0,                                        /*tp_weaklistoffset*/
+    PyObject_SelfIter,                        /*tp_iter*/
+    (iternextfunc)MDBIterKeysBatch_tp_iternext, /*tp_iternext*/
+    DBIterBatch_tp_methods,                   /*tp_methods*/
+};
+
+
+/* MDBIterItemsBatchType.tp_iternext */
+static PyObject *
+MDBIterItemsBatch_tp_iternext(DBIter *self)
+{
+    MDB *mdb = (MDB *)self->db;
+    TCLIST *keys, *values;
+    void *key, *value;
+    int key_size, value_size;
+    PyObject *pyitems = NULL;
+
+    if (mdb->changed) {
+        return set_error(Error, "MDB changed during iteration");
+    }
+    keys = tclistnew2(self->batch);
+    values = tclistnew2(self->batch);
+    Py_BEGIN_ALLOW_THREADS
+    while (tclistnum(keys) < self->batch) {
+        key = tcmdbiternext(mdb->mdb, &key_size);
+        if (!key) {
+            break;
+        }
+        value = tcmdbget(mdb->mdb, key, key_size, &value_size);
+        if (!value) {
+            /* removed by another thread */
+            tcfree(key);
+            continue;
+        }
+        tclistpushmalloc(keys, key, key_size);
+        tclistpushmalloc(values, value, value_size);
+    }
+    Py_END_ALLOW_THREADS
+    if (!tclistnum(keys)) {
+        set_stopiteration_error();
+    }
+    else {
+        pyitems = tclists_to_items(keys, values);
+    }
+    tclistdel(keys);
+    tclistdel(values);
+    return pyitems;
+}
+
+
+/* MDBIterItemsBatchType */
+static PyTypeObject MDBIterItemsBatchType = {
+    PyVarObject_HEAD_INIT(NULL, 0)
+    "tokyo.cabinet.MDBIterItemsBatch",        /*tp_name*/
+    sizeof(DBIter),                           /*tp_basicsize*/
+    0,                                        /*tp_itemsize*/
+    (destructor)DBIter_tp_dealloc,            /*tp_dealloc*/
+    0,                                        /*tp_print*/
+    0,                                        /*tp_getattr*/
+    0,                                        /*tp_setattr*/
+    0,                                        /*tp_compare*/
+    0,                                        /*tp_repr*/
+    0,                                        /*tp_as_number*/
+    0,                                        /*tp_as_sequence*/
+    0,                                        /*tp_as_mapping*/
+    0,                                        /*tp_hash */
+    0,                                        /*tp_call*/
+    0,                                        /*tp_str*/
+    0,                                        /*tp_getattro*/
+    0,                                        /*tp_setattro*/
+    0,                                        /*tp_as_buffer*/
+    Py_TPFLAGS_DEFAULT | Py_TPFLAGS_HAVE_GC,  /*tp_flags*/
+    0,                                        /*tp_doc*/
+    (traverseproc)DBIter_tp_traverse,         /*tp_traverse*/
+    (inquiry)DBIter_tp_clear,                 /*tp_clear*/
+    0,                                        /*tp_richcompare*/
+    0,                                        /*tp_weaklistoffset*/
+    PyObject_SelfIter,                        /*tp_iter*/
+    (iternextfunc)MDBIterItemsBatch_tp_iternext, /*tp_iternext*/
+    DBIterBatch_tp_methods,                   /*tp_methods*/
+};
+
+
 /*******************************************************************************
 * MDBType
 *******************************************************************************/
@@ -253,13 +396,15 @@ MDB_tp_new(PyTypeObject *type, PyObject *args, PyObject *kwargs)
 static int
 MDB_Contains(MDB *self, PyObject *pykey)
 {
+    Py_buffer key_view;
     void *key, *value;
     int key_size, value_size;
 
-    if (bytes_to_void(pykey, &key, &key_size)) {
+    if (bytes_to_void(pykey, &key_view, &key, &key_size)) {
         return -1;
     }
     value = tcmdbget(self->mdb, key, key_size, &value_size);
+    PyBuffer_Release(&key_view);
     if (!value) {
         return 0;
     }
@@ -289,50 +434,71 @@ MDB_Length(MDB *self)
 }
 
 
-/* MDB_tp_as_mapping.mp_subscript */
+/* retrieve a record, as a RecordView if view is true */
 static PyObject *
-MDB_GetItem(MDB *self, PyObject *pykey)
+MDB_Get(MDB *self, PyObject *pykey, bool view)
 {
+    Py_buffer key_view;
     void *key, *value;
     int key_size, value_size;
     PyObject *pyvalue;
 
-    if (bytes_to_void(pykey, &key, &key_size)) {
+    if (bytes_to_key(pykey, &key_view, &key, &key_size)) {
         return NULL;
     }
     value = tcmdbget(self->mdb, key, key_size, &value_size);
     if (!value) {
-        return set_key_error(key);
+        set_key_error(key);
+        PyBuffer_Release(&key_view);
+        return NULL;
+    }
+    if (view) {
+        PyBuffer_Release(&key_view);
+        return void_to_view(value, value_size);
     }
     pyvalue = void_to_bytes(value, value_size);
     tcfree(value);
+    PyBuffer_Release(&key_view);
     return pyvalue;
 }
 
 
+/* MDB_tp_as_mapping.mp_subscript */
+static PyObject *
+MDB_GetItem(MDB *self, PyObject *pykey)
+{
+    return MDB_Get(self, pykey, false);
+}
+
+
 /* MDB_tp_as_mapping.mp_ass_subscript */
 static int
 MDB_SetItem(MDB *self, PyObject *pykey, PyObject *pyvalue)
 {
+    Py_buffer key_view, value_view;
     void *key, *value;
     int key_size, value_size;
 
-    if (bytes_to_void(pykey, &key, &key_size)) {
+    if (bytes_to_key(pykey, &key_view, &key, &key_size)) {
         return -1;
     }
     if (pyvalue) {
-        if (bytes_to_void(pyvalue, &value, &value_size)) {
+        if (bytes_to_void(pyvalue, &value_view, &value, &value_size)) {
+            PyBuffer_Release(&key_view);
             return -1;
         }
         tcmdbput(self->mdb, key, key_size, value, value_size);
+        PyBuffer_Release(&value_view);
     }
     else {
         if (!tcmdbout(self->mdb, key, key_size)) {
             set_key_error(key);
+            PyBuffer_Release(&key_view);
             return -1;
         }
     }
     self->changed = true;
+    PyBuffer_Release(&key_view);
     return 0;
 }
 
@@ -368,21 +534,79 @@ MDB_clear(MDB *self)
 }
 
 
-/* MDB.get(key) */
+/* MDB.get(key[, view=False]) */
 PyDoc_STRVAR(MDB_get_doc,
-"get(key)\n\
+"get(key[, view=False])\n\
 \n\
-Retrieve a record from the database.");
+Retrieve a record from the database. If view is True, return a read-only\n\
+RecordView supporting the buffer protocol instead of copying the value to\n\
+bytes.");
 
 static PyObject *
-MDB_get(MDB *self, PyObject *args)
+MDB_get(MDB *self, PyObject *args, PyObject *kwargs)
 {
-    PyObject *pykey;
+    PyObject *pykey, *view = Py_False;
+
+    static char *kwlist[] = {"key", "view", NULL};
+
+    if (!PyArg_ParseTupleAndKeywords(args, kwargs, "O|O:get", kwlist,
+                                     &pykey, &view)) {
+        return NULL;
+    }
+    if (!PyBool_Check(view)) {
+        return set_error(PyExc_TypeError, "a boolean is required");
+    }
+    return MDB_Get(self, pykey, view == Py_True);
+}
+
+
+/* MDB.getmany(keys[, default=None]) -> list */
+PyDoc_STRVAR(MDB_getmany_doc,
+"getmany(keys[, default=None]) -> list\n\
+\n\
+Retrieve several records at once. Return a list of values in the same order as\n\
+keys, missing records are replaced by default.");
+
+static PyObject *
+MDB_getmany(MDB *self, PyObject *args, PyObject *kwargs)
+{
+    PyObject *pykeys, *pydefault = Py_None, *pyresult = NULL;
+    TCLIST *keys;
+    const void *key;
+    void **values;
+    int *value_sizes;
+    int key_size, len, i;
 
-    if (!PyArg_ParseTuple(args, "O:get", &pykey)) {
+    static char *kwlist[] = {"keys", "default", NULL};
+
+    if (!PyArg_ParseTupleAndKeywords(args, kwargs, "O|O:getmany", kwlist,
+                                     &pykeys, &pydefault)) {
+        return NULL;
+    }
+    keys = seq_to_tclist(pykeys);
+    if (!keys) {
         return NULL;
     }
-    return MDB_GetItem(self, pykey);
+    len = tclistnum(keys);
+    values = PyMem_New(void *, len);
+    value_sizes = PyMem_New(int, len);
+    if (!values || !value_sizes) {
+        PyMem_Free(values);
+        PyMem_Free(value_sizes);
+        tclistdel(keys);
+        return PyErr_NoMemory();
+    }
+    Py_BEGIN_ALLOW_THREADS
+    for (i = 0; i < len; i++) {
+        key = tclistval(keys, i, &key_size);
+        values[i] = tcmdbget(self->mdb, key, key_size, &value_sizes[i]);
+    }
+    Py_END_ALLOW_THREADS
+    pyresult = values_to_list(values, value_sizes, len, pydefault);
+    PyMem_Free(values);
+    PyMem_Free(value_sizes);
+    tclistdel(keys);
+    return pyresult;
 }
 
 
@@ -407,6 +631,64 @@ MDB_remove(MDB *self, PyObject *args)
 }
 
 
+/* MDB.removemany(keys[, missing_ok=True]) -> int */
+PyDoc_STRVAR(MDB_removemany_doc,
+"removemany(keys[, missing_ok=True]) -> int\n\
+\n\
+Remove several records at once and return the number of records removed.\n\
+If missing_ok is False, this method raises KeyError on the first key that is\n\
+not in the database (records removed before it stay removed).");
+
+static PyObject *
+MDB_removemany(MDB *self, PyObject *args, PyObject *kwargs)
+{
+    PyObject *pykeys, *pymissing_ok = Py_True;
+    TCLIST *keys;
+    const void *key;
+    int key_size, len, i;
+    long count = 0;
+    bool missing_ok, result;
+
+    static char *kwlist[] = {"keys", "missing_ok", NULL};
+
+    if (!PyArg_ParseTupleAndKeywords(args, kwargs, "O|O:removemany", kwlist,
+                                     &pykeys, &pymissing_ok)) {
+        return NULL;
+    }
+    if (!PyBool_Check(pymissing_ok)) {
+        return set_error(PyExc_TypeError, "a boolean is required");
+    }
+    missing_ok = (pymissing_ok == Py_True);
+    keys = seq_to_tclist(pykeys);
+    if (!keys) {
+        return NULL;
+    }
+    len = tclistnum(keys);
+    Py_BEGIN_ALLOW_THREADS
+    for (i = 0; i < len; i++) {
+        key = tclistval(keys, i, &key_size);
+        result = tcmdbout(self->mdb, key, key_size);
+        if (result) {
+            count++;
+        }
+        else if (!missing_ok) {
+            break;
+        }
+    }
+    Py_END_ALLOW_THREADS
+    if (count) {
+        self->changed = true;
+    }
+    if (i < len) {
+        set_key_error((const char *)key);
+        tclistdel(keys);
+        return NULL;
+    }
+    tclistdel(keys);
+    return PyInt_FromLong(count);
+}
+
+
 /* MDB.put(key, value) */
 PyDoc_STRVAR(MDB_put_doc,
 "put(key, value)\n\
@@ -438,6 +720,7 @@ put), this method raises KeyError if key is already in the database.");
 static PyObject *
 MDB_putkeep(MDB *self, PyObject *args)
 {
+    Py_buffer key_view, value_view;
     void *key, *value;
     int key_size, value_size;
     PyObject *pykey, *pyvalue;
@@ -445,14 +728,20 @@ MDB_putkeep(MDB *self, PyObject *args)
     if (!PyArg_ParseTuple(args, "OO:putkeep", &pykey, &pyvalue)) {
         return NULL;
     }
-    if (bytes_to_void(pykey, &key, &key_size) ||
-        bytes_to_void(pyvalue, &value, &value_size)) {
+    if (bytes_to_key(pykey, &key_view, &key, &key_size) ||
+        bytes_to_void(pyvalue, &value_view, &value, &value_size)) {
+        PyBuffer_Release(&key_view);
         return NULL;
     }
     if (!tcmdbputkeep(self->mdb, key, key_size, value, value_size)) {
-        return set_key_error(key);
+        set_key_error(key);
+        PyBuffer_Release(&key_view);
+        PyBuffer_Release(&value_view);
+        return NULL;
     }
     self->changed = true;
+    PyBuffer_Release(&key_view);
+    PyBuffer_Release(&value_view);
     Py_RETURN_NONE;
 }
 
@@ -467,6 +756,7 @@ If there is no corresponding record, a new record is stored.");
 static PyObject *
 MDB_putcat(MDB *self, PyObject *args)
 {
+    Py_buffer key_view, value_view;
     void *key, *value;
     int key_size, value_size;
     PyObject *pykey, *pyvalue;
@@ -474,11 +764,14 @@ MDB_putcat(MDB *self, PyObject *args)
     if (!PyArg_ParseTuple(args, "OO:putcat", &pykey, &pyvalue)) {
         return NULL;
     }
-    if (bytes_to_void(pykey, &key, &key_size) ||
-        bytes_to_void(pyvalue, &value, &value_size)) {
+    if (bytes_to_void(pykey, &key_view, &key, &key_size) ||
+        bytes_to_void(pyvalue, &value_view, &value, &value_size)) {
+        PyBuffer_Release(&key_view);
         return NULL;
     }
     tcmdbputcat(self->mdb, key, key_size, value, value_size);
+    PyBuffer_Release(&key_view);
+    PyBuffer_Release(&value_view);
     self->changed = true;
     Py_RETURN_NONE;
 }
@@ -495,6 +788,7 @@ is applied.");
 static PyObject *
 MDB_searchkeys(MDB *self, PyObject *args)
 {
+    Py_buffer prefix_view;
     void *prefix;
     int prefix_size, max = -1;
     TCLIST *result;
@@ -503,27 +797,38 @@ MDB_searchkeys(MDB *self, PyObject *args)
     if (!PyArg_ParseTuple(args, "O|i:searchkeys", &pyprefix, &max)) {
         return NULL;
     }
-    if (bytes_to_void(pyprefix, &prefix, &prefix_size)) {
+    if (bytes_to_void(pyprefix, &prefix_view, &prefix, &prefix_size)) {
         return NULL;
     }
     Py_BEGIN_ALLOW_THREADS
     result = tcmdbfwmkeys(self->mdb, prefix, prefix_size, max);
     Py_END_ALLOW_THREADS
+    PyBuffer_Release(&prefix_view);
     pyresult = tclist_to_frozenset(result);
     tclistdel(result);
     return pyresult;
 }
 
 
-/* MDB.iterkeys() */
+/* MDB.iterkeys([batch=0]) */
 PyDoc_STRVAR(MDB_iterkeys_doc,
-"iterkeys()\n\
+"iterkeys([batch=0])\n\
 \n\
-Return an iterator over the database's keys.");
+Return an iterator over the database's keys. If batch is greater than 0,\n\
+the iterator yields lists of up to batch keys at a time.");
 
 static PyObject *
-MDB_iterkeys(MDB *self)
+MDB_iterkeys(MDB *self, PyObject *args, PyObject *kwargs)
 {
+    int batch = 0;
+
+    if (parse_batch(args, kwargs, "|i:iterkeys", &batch)) {
+        return NULL;
+    }
+    if (batch) {
+        return DBIter_set_batch(new_MDBIter(self, &MDBIterKeysBatchType),
+                                batch);
+    }
     return new_MDBIter(self, &MDBIterKeysType);
 }
 
@@ -541,15 +846,25 @@ MDB_itervalues(MDB *self)
 }
 
 
-/* MDB.iteritems() */
+/* MDB.iteritems([batch=0]) */
 PyDoc_STRVAR(MDB_iteritems_doc,
-"iteritems()\n\
+"iteritems([batch=0])\n\
 \n\
-Return an iterator over the database's items.");
+Return an iterator over the database's items. If batch is greater than 0,\n\
+the iterator yields lists of up to batch items at a time.");
 
 static PyObject *
-MDB_iteritems(MDB *self)
+MDB_iteritems(MDB *self, PyObject *args, PyObject *kwargs)
 {
+    int batch = 0;
+
+    if (parse_batch(args, kwargs, "|i:iteritems", &batch)) {
+        return NULL;
+    }
+    if (batch) {
+        return DBIter_set_batch(new_MDBIter(self, &MDBIterItemsBatchType),
+                                batch);
+    }
     return new_MDBIter(self, &MDBIterItemsType);
 }
 
@@ -557,16 +872,23 @@ MDB_iteritems(MDB *self)
 /* MDBType.tp_methods */
 static PyMethodDef MDB_tp_methods[] = {
     {"clear", (PyCFunction)MDB_clear, METH_NOARGS, MDB_clear_doc},
-    {"get", (PyCFunction)MDB_get, METH_VARARGS, MDB_get_doc},
+    {"get", (PyCFunction)MDB_get, METH_VARARGS | METH_KEYWORDS,
+     MDB_get_doc},
+    {"getmany", (PyCFunction)MDB_getmany, METH_VARARGS | METH_KEYWORDS,
+     MDB_getmany_doc},
     {"remove", (PyCFunction)MDB_remove, METH_VARARGS, MDB_remove_doc},
+    {"removemany", (PyCFunction)MDB_removemany, METH_VARARGS | METH_KEYWORDS,
+     MDB_removemany_doc},
     {"put", (PyCFunction)MDB_put, METH_VARARGS, MDB_put_doc},
     {"putkeep", (PyCFunction)MDB_putkeep, METH_VARARGS, MDB_putkeep_doc},
     {"putcat", (PyCFunction)MDB_putcat, METH_VARARGS, MDB_putcat_doc},
     {"searchkeys", (PyCFunction)MDB_searchkeys, METH_VARARGS,
      MDB_searchkeys_doc},
-    {"iterkeys", (PyCFunction)MDB_iterkeys, METH_NOARGS, MDB_iterkeys_doc},
+    {"iterkeys", (PyCFunction)MDB_iterkeys, METH_VARARGS | METH_KEYWORDS,
+     MDB_iterkeys_doc},
     {"itervalues", (PyCFunction)MDB_itervalues, METH_NOARGS, MDB_itervalues_doc},
-    {"iteritems", (PyCFunction)MDB_iteritems, METH_NOARGS, MDB_iteritems_doc},
+    {"iteritems", (PyCFunction)MDB_iteritems, METH_VARARGS | METH_KEYWORDS,
+     MDB_iteritems_doc},
     {NULL}  /* Sentinel */
 };
 
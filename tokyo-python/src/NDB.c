@@ -191,6 +191,149 @@ static PyTypeObject NDBIterItemsType = {
 };
 
 
+/* NDBIterKeysBatchType.tp_iternext */
+static PyObject *
+NDBIterKeysBatch_tp_iternext(DBIter *self)
+{
+    NDB *ndb = (NDB *)self->db;
+    TCLIST *keys;
+    void *key;
+    int key_size, len;
+    PyObject *pykeys = NULL;
+
+    if (ndb->changed) {
+        return set_error(Error, "NDB changed during iteration");
+    }
+    keys = tclistnew2(self->batch);
+    Py_BEGIN_ALLOW_THREADS
+    for (len = 0; len < self->batch; len++) {
+        key = tcndbiternext(ndb->ndb, &key_size);
+        if (!key) {
+            break;
+        }
+        tclistpushmalloc(keys, key, key_size);
+    }
+    Py_END_ALLOW_THREADS
+    if (!len) {
+        set_stopiteration_error();
+    }
+    else {
+        pykeys = tclist_to_list(keys);
+    }
+    tclistdel(keys);
+    return pykeys;
+}
+
+
+/* NDBIterKeysBatchType */
+static PyTypeObject NDBIterKeysBatchType = {
+    PyVarObject_HEAD_INIT(NULL, 0)
+    "tokyo.cabinet.NDBIterKeysBatch",         /*tp_name*/
+    sizeof(DBIter),                           /*tp_basicsize*/
+    0,                                        /*tp_itemsize*/
+    (destructor)DBIter_tp_dealloc,            /*tp_dealloc*/
+    0,                                        /*tp_print*/
+    0,                                        /*tp_getattr*/
+    0,                                        /*tp_setattr*/
+    0,                                        /*tp_compare*/
+    0,                                        /*tp_repr*/
+    0,                                        /*tp_as_number*/
+    0,                                        /*tp_as_sequence*/
+    0,                                        /*tp_as_mapping*/
+    0,                                        /*tp_hash */
+    0,                                        /*tp_call*/
+    0,                                        /*tp_str*/
+    0,                                        /*tp_getattro*/
+    0,                                        /*tp_setattro*/
+    0,                                        /*tp_as_buffer*/
+    Py_TPFLAGS_DEFAULT | Py_TPFLAGS_HAVE_GC,  /*tp_flags*/
+    0,                                        /*tp_doc*/
+    (traverseproc)DBIter_tp_traverse,         /*tp_traverse*/
+    (inquiry)DBIter_tp_clear,                 /*tp_clear*/
+    0,                                        /*tp_richcompare*/
+    0,                                        /*tp_weaklistoffset*/
+    PyObject_SelfIter,                        /*tp_iter*/
+    (iternextfunc)NDBIterKeysBatch_tp_iternext, /*tp_iternext*/
+    DBIterBatch_tp_methods,                   /*tp_methods*/
+};
+
+
+/* NDBIterItemsBatchType.tp_iternext */
+static PyObject *
+NDBIterItemsBatch_tp_iternext(DBIter *self)
+{
+    NDB *ndb = (NDB *)self->db;
+    TCLIST *keys, *values;
+    void *key, *value;
+    int key_size, value_size;
+    PyObject *pyitems = NULL;
+
+    if (ndb->changed) {
+        return set_error(Error, "NDB changed during iteration");
+    }
+    keys = tclistnew2(self->batch);
+    values = tclistnew2(self->batch);
+    Py_BEGIN_ALLOW_THREADS
+    while (tclistnum(keys) < self->batch) {
+        key = tcndbiternext(ndb->ndb, &key_size);
+        if (!key) {
+            break;
+        }
+        value = tcndbget(ndb->ndb, key, key_size, &value_size);
+        if (!value) {
+            /* removed by another thread */
+            tcfree(key);
+            continue;
+        }
+        tclistpushmalloc(keys, key, key_size);
+        tclistpushmalloc(values, value, value_size);
+    }
+    Py_END_ALLOW_THREADS
+    if (!tclistnum(keys)) {
+        set_stopiteration_error();
+    }
+    else {
+        pyitems = tclists_to_items(keys, values);
+    }
+    tclistdel(keys);
+    tclistdel(values);
+    return pyitems;
+}
+
+
+/* NDBIterItemsBatchType */
+static PyTypeObject NDBIterItemsBatchType = {
+    PyVarObject_HEAD_INIT(NULL, 0)
+    "tokyo.cabinet.NDBIterItemsBatch",        /*tp_name*/
+    sizeof(DBIter),                           /*tp_basicsize*/
+    0,                                        /*tp_itemsize*/
+    (destructor)DBIter_tp_dealloc,            /*tp_dealloc*/
+    0,                                        /*tp_print*/
+    0,                                        /*tp_getattr*/
+    0,                                        /*tp_setattr*/
+    0,                                        /*tp_compare*/
+    0,                                        /*tp_repr*/
+    0,                                        /*tp_as_number*/
+    0,                                        /*tp_as_sequence*/
+    0,                                        /*tp_as_mapping*/
+    0,                                        /*tp_hash */
+    0,                                        /*tp_call*/
+    0,                                        /*tp_str*/
+    0,                                        /*tp_getattro*/
+    0,                                        /*tp_setattro*/
+    0,                                        /*tp_as_buffer*/
+    Py_TPFLAGS_DEFAULT | Py_TPFLAGS_HAVE_GC,  /*tp_flags*/
+    0,                                        /*tp_doc*/
+    (traverseproc)DBIter_tp_traverse,         /*tp_traverse*/
+    (inquiry)DBIter_tp_clear,                 /*tp_clear*/
+    0,                                        /*tp_richcompare*/
+    0,                                        /*tp_weaklistoffset*/
+    PyObject_SelfIter,                        /*tp_iter*/
+    (iternextfunc)NDBIterItemsBatch_tp_iternext, /*tp_iternext*/
+    DBIterBatch_tp_methods,                   /*tp_methods*/
+};
+
+
 /*******************************************************************************
 * NDBType
 *******************************************************************************/
@@ -240,13 +383,15 @@ NDB_tp_new(PyTypeObject *type, PyObject *args, PyObject *kwargs)
 static int
 NDB_Contains(NDB *self, PyObject *pykey)
 {
+    Py_buffer key_view;
     void *key, *value;
     int key_size, value_size;
 
-    if (bytes_to_void(pykey, &key, &key_size)) {
+    if (bytes_to_void(pykey, &key_view, &key, &key_size)) {
         return -1;
     }
     value = tcndbget(self->ndb, key, key_size, &value_size);
+    PyBuffer_Release(&key_view);
     if (!value) {
         return 0;
     }
@@ -280,19 +425,23 @@ NDB_Length(NDB *self)
 static PyObject *
 NDB_GetItem(NDB *self, PyObject *pykey)
 {
+    Py_buffer key_view;
     void *key, *value;
     int key_size, value_size;
     PyObject *pyvalue;
 
-    if (bytes_to_void(pykey, &key, &key_size)) {
+    if (bytes_to_key(pykey, &key_view, &key, &key_size)) {
         return NULL;
     }
     value = tcndbget(self->ndb, key, key_size, &value_size);
     if (!value) {
-        return set_key_error(key);
+        set_key_error(key);
+        PyBuffer_Release(&key_view);
+        return NULL;
     }
     pyvalue = void_to_bytes(value, value_size);
     tcfree(value);
+    PyBuffer_Release(&key_view);
     return pyvalue;
 }
 
@@ -301,25 +450,30 @@ NDB_GetItem(NDB *self, PyObject *pykey)
 static int
 NDB_SetItem(NDB *self, PyObject *pykey, PyObject *pyvalue)
 {
+    Py_buffer key_view, value_view;
     void *key, *value;
     int key_size, value_size;
 
-    if (bytes_to_void(pykey, &key, &key_size)) {
+    if (bytes_to_key(pykey, &key_view, &key, &key_size)) {
         return -1;
     }
     if (pyvalue) {
-        if (bytes_to_void(pyvalue, &value, &value_size)) {
+        if (bytes_to_void(pyvalue, &value_view, &value, &value_size)) {
+            PyBuffer_Release(&key_view);
             return -1;
         }
         tcndbput(self->ndb, key, key_size, value, value_size);
+        PyBuffer_Release(&value_view);
     }
     else {
         if (!tcndbout(self->ndb, key, key_size)) {
             set_key_error(key);
+            PyBuffer_Release(&key_view);
             return -1;
         }
     }
     self->changed = true;
+    PyBuffer_Release(&key_view);
     return 0;
 }
 
@@ -373,6 +527,56 @@ NDB_get(NDB *self, PyObject *args)
 }
 
 
+/* NDB.getmany(keys[, default=None]) -> list */
+PyDoc_STRVAR(NDB_getmany_doc,
+"getmany(keys[, default=None]) -> list\n\
+\n\
+Retrieve several records at once. Return a list of values in the same order as\n\
+keys, missing records are replaced by default.");
+
+static PyObject *
+NDB_getmany(NDB *self, PyObject *args, PyObject *kwargs)
+{
+    PyObject *pykeys, *pydefault = Py_None, *pyresult = NULL;
+    TCLIST *keys;
+    const void *key;
+    void **values;
+    int *value_sizes;
+    int key_size, len, i;
+
+    static char *kwlist[] = {"keys", "default", NULL};
+
+    if (!PyArg_ParseTupleAndKeywords(args, kwargs, "O|O:getmany", kwlist,
+                                     &pykeys, &pydefault)) {
+        return NULL;
+    }
+    keys = seq_to_tclist(pykeys);
+    if (!keys) {
+        return NULL;
+    }
+    len = tclistnum(keys);
+    values = PyMem_New(void *, len);
+    value_sizes = PyMem_New(int, len);
+    if (!values || !value_sizes) {
+        PyMem_Free(values);
+        PyMem_Free(value_sizes);
+        tclistdel(keys);
+        return PyErr_NoMemory();
+    }
+    Py_BEGIN_ALLOW_THREADS
+    for (i = 0; i < len; i++) {
+        key = tclistval(keys, i, &key_size);
+        values[i] = tcndbget(self->ndb, key, key_size, &value_sizes[i]);
+    }
+    Py_END_ALLOW_THREADS
+    pyresult = values_to_list(values, value_sizes, len, pydefault);
+    PyMem_Free(values);
+    PyMem_Free(value_sizes);
+    tclistdel(keys);
+    return pyresult;
+}
+
+
 /* NDB.remove(key) */
 PyDoc_STRVAR(NDB_remove_doc,
 "remove(key)\n\
@@ -394,6 +598,64 @@ NDB_remove(NDB *self, PyObject *args)
 }
 
 
+/* NDB.removemany(keys[, missing_ok=True]) -> int */
+PyDoc_STRVAR(NDB_removemany_doc,
+"removemany(keys[, missing_ok=True]) -> int\n\
+\n\
+Remove several records at once and return the number of records removed.\n\
+If missing_ok is False, this method raises KeyError on the first key that is\n\
+not in the database (records removed before it stay removed).");
+
+static PyObject *
+NDB_removemany(NDB *self, PyObject *args, PyObject *kwargs)
+{
+    PyObject *pykeys, *pymissing_ok = Py_True;
+    TCLIST *keys;
+    const void *key;
+    int key_size, len, i;
+    long count = 0;
+    bool missing_ok, result;
+
+    static char *kwlist[] = {"keys", "missing_ok", NULL};
+
+    if (!PyArg_ParseTupleAndKeywords(args, kwargs, "O|O:removemany", kwlist,
+                                     &pykeys, &pymissing_ok)) {
+        return NULL;
+    }
+    if (!PyBool_Check(pymissing_ok)) {
+        return set_error(PyExc_TypeError, "a boolean is required");
+    }
+    missing_ok = (pymissing_ok == Py_True);
+    keys = seq_to_tclist(pykeys);
+    if (!keys) {
+        return NULL;
+    }
+    len = tclistnum(keys);
+    Py_BEGIN_ALLOW_THREADS
+    for (i = 0; i < len; i++) {
+        key = tclistval(keys, i, &key_size);
+        result = tcndbout(self->ndb, key, key_size);
+        if (result) {
+            count++;
+        }
+        else if (!missing_ok) {
+            break;
+        }
+    }
+    Py_END_ALLOW_THREADS
+    if (count) {
+        self->changed = true;
+    }
+    if (i < len) {
+        set_key_error((const char *)key);
+        tclistdel(keys);
+        return NULL;
+    }
+    tclistdel(keys);
+    return PyInt_FromLong(count);
+}
+
+
 /* NDB.put(key, value) */
 PyDoc_STRVAR(NDB_put_doc,
 "put(key, value)\n\
@@ -425,6 +687,7 @@ put), this method raises KeyError if key is already in the database.");
 static PyObject *
 NDB_putkeep(NDB *self, PyObject *args)
 {
+    Py_buffer key_view, value_view;
     void *key, *value;
     int key_size, value_size;
     PyObject *pykey, *pyvalue;
@@ -432,14 +695,20 @@ NDB_putkeep(NDB *self, PyObject *args)
     if (!PyArg_ParseTuple(args, "OO:putkeep", &pykey, &pyvalue)) {
         return NULL;
     }
-    if (bytes_to_void(pykey, &key, &key_size) ||
-        bytes_to_void(pyvalue, &value, &value_size)) {
+    if (bytes_to_key(pykey, &key_view, &key, &key_size) ||
+        bytes_to_void(pyvalue, &value_view, &value, &value_size)) {
+        PyBuffer_Release(&key_view);
         return NULL;
     }
     if (!tcndbputkeep(self->ndb, key, key_size, value, value_size)) {
-        return set_key_error(key);
+        set_key_error(key);
+        PyBuffer_Release(&key_view);
+        PyBuffer_Release(&value_view);
+        return NULL;
     }
     self->changed = true;
+    PyBuffer_Release(&key_view);
+    PyBuffer_Release(&value_view);
     Py_RETURN_NONE;
 }
 
@@ -454,6 +723,7 @@ If there is no corresponding record, a new record is stored.");
 static PyObject *
 NDB_putcat(NDB *self, PyObject *args)
 {
+    Py_buffer key_view, value_view;
     void *key, *value;
     int key_size, value_size;
     PyObject *pykey, *pyvalue;
@@ -461,11 +731,14 @@ NDB_putcat(NDB *self, PyObject *args)
     if (!PyArg_ParseTuple(args, "OO:putcat", &pykey, &pyvalue)) {
         return NULL;
     }
-    if (bytes_to_void(pykey, &key, &key_size) ||
-        bytes_to_void(pyvalue, &value, &value_size)) {
+    if (bytes_to_void(pykey, &key_view, &key, &key_size) ||
+        bytes_to_void(pyvalue, &value_view, &value, &value_size)) {
+        PyBuffer_Release(&key_view);
         return NULL;
     }
     tcndbputcat(self->ndb, key, key_size, value, value_size);
+    PyBuffer_Release(&key_view);
+    PyBuffer_Release(&value_view);
     self->changed = true;
     Py_RETURN_NONE;
 }
@@ -482,6 +755,7 @@ is applied.");
 static PyObject *
 NDB_searchkeys(NDB *self, PyObject *args)
 {
+    Py_buffer prefix_view;
     void *prefix;
     int prefix_size, max = -1;
     TCLIST *result;
@@ -490,27 +764,38 @@ NDB_searchkeys(NDB *self, PyObject *args)
     if (!PyArg_ParseTuple(args, "O|i:searchkeys", &pyprefix, &max)) {
         return NULL;
     }
-    if (bytes_to_void(pyprefix, &prefix, &prefix_size)) {
+    if (bytes_to_void(pyprefix, &prefix_view, &prefix, &prefix_size)) {
         return NULL;
     }
     Py_BEGIN_ALLOW_THREADS
     result = tcndbfwmkeys(self->ndb, prefix, prefix_size, max);
     Py_END_ALLOW_THREADS
+    PyBuffer_Release(&prefix_view);
     pyresult = tclist_to_frozenset(result);
     tclistdel(result);
     return pyresult;
 }
 
 
-/* NDB.iterkeys() */
+/* NDB.iterkeys([batch=0]) */
 PyDoc_STRVAR(NDB_iterkeys_doc,
-"iterkeys()\n\
+"iterkeys([batch=0])\n\
 \n\
-Return an iterator over the database's keys.");
+Return an iterator over the database's keys. If batch is greater than 0,\n\
+the iterator yields lists of up to batch keys at a time.");
 
 static PyObject *
-NDB_iterkeys(NDB *self)
+NDB_iterkeys(NDB *self, PyObject *args, PyObject *kwargs)
 {
+    int batch = 0;
+
+    if (parse_batch(args, kwargs, "|i:iterkeys", &batch)) {
+        return NULL;
+    }
+    if (batch) {
+        return DBIter_set_batch(new_NDBIter(self, &NDBIterKeysBatchType),
+                                batch);
+    }
     return new_NDBIter(self, &NDBIterKeysType);
 }
 
@@ -528,15 +813,25 @@ NDB_itervalues(NDB *self)
 }
 
 
-/* NDB.iteritems() */
+/* NDB.iteritems([batch=0]) */
 PyDoc_STRVAR(NDB_iteritems_doc,
-"iteritems()\n\
+"iteritems([batch=0])\n\
 \n\
-Return an iterator over the database's items.");
+Return an iterator over the database's items. If batch is greater than 0,\n\
+the iterator yields lists of up to batch items at a time.");
 
 static PyObject *
-NDB_iteritems(NDB *self)
+NDB_iteritems(NDB *self, PyObject *args, PyObject *kwargs)
 {
+    int batch = 0;
+
+    if (parse_batch(args, kwargs, "|i:iteritems", &batch)) {
+        return NULL;
+    }
+    if (batch) {
+        return DBIter_set_batch(new_NDBIter(self, &NDBIterItemsBatchType),
+                                batch);
+    }
     return new_NDBIter(self, &NDBIterItemsType);
 }
 
@@ -545,15 +840,21 @@ NDB_iteritems(NDB *self)
 static PyMethodDef NDB_tp_methods[] = {
     {"clear", (PyCFunction)NDB_clear, METH_NOARGS, NDB_clear_doc},
     {"get", (PyCFunction)NDB_get, METH_VARARGS, NDB_get_doc},
+    {"getmany", (PyCFunction)NDB_getmany, METH_VARARGS | METH_KEYWORDS,
+     NDB_getmany_doc},
     {"remove", (PyCFunction)NDB_remove, METH_VARARGS, NDB_remove_doc},
+    {"removemany", (PyCFunction)NDB_removemany, METH_VARARGS | METH_KEYWORDS,
+     NDB_removemany_doc},
     {"put", (PyCFunction)NDB_put, METH_VARARGS, NDB_put_doc},
     {"putkeep", (PyCFunction)NDB_putkeep, METH_VARARGS, NDB_putkeep_doc},
     {"putcat", (PyCFunction)NDB_putcat, METH_VARARGS, NDB_putcat_doc},
     {"searchkeys", (PyCFunction)NDB_searchkeys, METH_VARARGS,
      NDB_searchkeys_doc},
-    {"iterkeys", (PyCFunction)NDB_iterkeys, METH_NOARGS, NDB_iterkeys_doc},
+    {"iterkeys", (PyCFunction)NDB_iterkeys, METH_VARARGS | METH_KEYWORDS,
+     NDB_iterkeys_doc},
     {"itervalues", (PyCFunction)NDB_itervalues, METH_NOARGS, NDB_itervalues_doc},
-    {"iteritems", (PyCFunction)NDB_iteritems, METH_NOARGS, NDB_iteritems_doc},
+    {"iteritems", (PyCFunction)NDB_iteritems, METH_VARARGS | METH_KEYWORDS,
+     NDB_iteritems_doc},
     {NULL}  /* Sentinel */
 };
 
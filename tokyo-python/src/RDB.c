@@ -155,16 +155,18 @@ http://fallabs.com/tokyotyrant/spex.html#tcrdbapi");
 static int
 RDB_Contains(RDB *self, PyObject *pykey)
 {
+    Py_buffer key_view;
     void *key, *value;
     int key_size, value_size;
     RDBBase *rdbbase = (RDBBase *)self;
 
-    if (bytes_to_void(pykey, &key, &key_size)) {
+    if (bytes_to_void(pykey, &key_view, &key, &key_size)) {
         return -1;
     }
     Py_BEGIN_ALLOW_THREADS
     value = tcrdbget(rdbbase->rdb, key, key_size, &value_size);
     Py_END_ALLOW_THREADS
+    PyBuffer_Release(&key_view);
     if (!value) {
         if (tcrdbecode(rdbbase->rdb) == TTENOREC) {
             return 0;
@@ -194,22 +196,26 @@ static PySequenceMethods RDB_tp_as_sequence = {
 static PyObject *
 RDB_GetItem(RDB *self, PyObject *pykey)
 {
+    Py_buffer key_view;
     void *key, *value;
     int key_size, value_size;
     PyObject *pyvalue;
     RDBBase *rdbbase = (RDBBase *)self;
 
-    if (bytes_to_void(pykey, &key, &key_size)) {
+    if (bytes_to_key(pykey, &key_view, &key, &key_size)) {
         return NULL;
     }
     Py_BEGIN_ALLOW_THREADS
     value = tcrdbget(rdbbase->rdb, key, key_size, &value_size);
     Py_END_ALLOW_THREADS
     if (!value) {
-        return set_rdb_error(rdbbase->rdb, key);
+        set_rdb_error(rdbbase->rdb, key);
+        PyBuffer_Release(&key_view);
+        return NULL;
     }
     pyvalue = void_to_bytes(value, value_size);
     tcfree(value);
+    PyBuffer_Release(&key_view);
     return pyvalue;
 }
 
@@ -218,23 +224,27 @@ RDB_GetItem(RDB *self, PyObject *pykey)
 static int
 RDB_SetItem(RDB *self, PyObject *pykey, PyObject *pyvalue)
 {
+    Py_buffer key_view, value_view;
     void *key, *value;
     int key_size, value_size;
     bool result;
     RDBBase *rdbbase = (RDBBase *)self;
 
-    if (bytes_to_void(pykey, &key, &key_size)) {
+    if (bytes_to_key(pykey, &key_view, &key, &key_size)) {
         return -1;
     }
     if (pyvalue) {
-        if (bytes_to_void(pyvalue, &value, &value_size)) {
+        if (bytes_to_void(pyvalue, &value_view, &value, &value_size)) {
+            PyBuffer_Release(&key_view);
             return -1;
         }
         Py_BEGIN_ALLOW_THREADS
         result = tcrdbput(rdbbase->rdb, key, key_size, value, value_size);
         Py_END_ALLOW_THREADS
+        PyBuffer_Release(&value_view);
         if (!result) {
             set_rdb_error(rdbbase->rdb, NULL);
+            PyBuffer_Release(&key_view);
             return -1;
         }
     }
@@ -244,10 +254,12 @@ RDB_SetItem(RDB *self, PyObject *pykey, PyObject *pyvalue)
         Py_END_ALLOW_THREADS
         if (!result) {
             set_rdb_error(rdbbase->rdb, key);
+            PyBuffer_Release(&key_view);
             return -1;
         }
     }
     rdbbase->changed = true;
+    PyBuffer_Release(&key_view);
     return 0;
 }
 
@@ -354,6 +366,7 @@ put), this method raises KeyError if key is already in the database.");
 static PyObject *
 RDB_putkeep(RDB *self, PyObject *args)
 {
+    Py_buffer key_view, value_view;
     void *key, *value;
     int key_size, value_size;
     PyObject *pykey, *pyvalue;
@@ -363,17 +376,22 @@ RDB_putkeep(RDB *self, PyObject *args)
     if (!PyArg_ParseTuple(args, "OO:putkeep", &pykey, &pyvalue)) {
         return NULL;
     }
-    if (bytes_to_void(pykey, &key, &key_size) ||
-        bytes_to_void(pyvalue, &value, &value_size)) {
+    if (bytes_to_key(pykey, &key_view, &key, &key_size) ||
+        bytes_to_void(pyvalue, &value_view, &value, &value_size)) {
+        PyBuffer_Release(&key_view);
         return NULL;
     }
     Py_BEGIN_ALLOW_THREADS
     result = tcrdbputkeep(rdbbase->rdb, key, key_size, value, value_size);
     Py_END_ALLOW_THREADS
+    PyBuffer_Release(&value_view);
     if (!result) {
-        return set_rdb_error(rdbbase->rdb, key);
+        set_rdb_error(rdbbase->rdb, key);
+        PyBuffer_Release(&key_view);
+        return NULL;
     }
     rdbbase->changed = true;
+    PyBuffer_Release(&key_view);
     Py_RETURN_NONE;
 }
 
@@ -388,6 +406,7 @@ If there is no corresponding record, a new record is stored.");
 static PyObject *
 RDB_putcat(RDB *self, PyObject *args)
 {
+    Py_buffer key_view, value_view;
     void *key, *value;
     int key_size, value_size;
     PyObject *pykey, *pyvalue;
@@ -397,13 +416,16 @@ RDB_putcat(RDB *self, PyObject *args)
     if (!PyArg_ParseTuple(args, "OO:putcat", &pykey, &pyvalue)) {
         return NULL;
     }
-    if (bytes_to_void(pykey, &key, &key_size) ||
-        bytes_to_void(pyvalue, &value, &value_size)) {
+    if (bytes_to_void(pykey, &key_view, &key, &key_size) ||
+        bytes_to_void(pyvalue, &value_view, &value, &value_size)) {
+        PyBuffer_Release(&key_view);
         return NULL;
     }
     Py_BEGIN_ALLOW_THREADS
     result = tcrdbputcat(rdbbase->rdb, key, key_size, value, value_size);
     Py_END_ALLOW_THREADS
+    PyBuffer_Release(&key_view);
+    PyBuffer_Release(&value_view);
     if (!result) {
         return set_rdb_error(rdbbase->rdb, NULL);
     }
@@ -422,6 +444,7 @@ respond (non-blocking).");
 static PyObject *
 RDB_putnb(RDB *self, PyObject *args)
 {
+    Py_buffer key_view, value_view;
     void *key, *value;
     int key_size, value_size;
     PyObject *pykey, *pyvalue;
@@ -430,14 +453,19 @@ RDB_putnb(RDB *self, PyObject *args)
     if (!PyArg_ParseTuple(args, "OO:putnb", &pykey, &pyvalue)) {
         return NULL;
     }
-    if (bytes_to_void(pykey, &key, &key_size) ||
-        bytes_to_void(pyvalue, &value, &value_size)) {
+    if (bytes_to_void(pykey, &key_view, &key, &key_size) ||
+        bytes_to_void(pyvalue, &value_view, &value, &value_size)) {
+        PyBuffer_Release(&key_view);
         return NULL;
     }
     if (!tcrdbputnr(rdbbase->rdb, key, key_size, value, value_size)) {
+        PyBuffer_Release(&key_view);
+        PyBuffer_Release(&value_view);
         return set_rdb_error(rdbbase->rdb, NULL);
     }
     rdbbase->changed = true;
+    PyBuffer_Release(&key_view);
+    PyBuffer_Release(&value_view);
     Py_RETURN_NONE;
 }
 
@@ -459,6 +487,7 @@ static PyObject *
 RDB_addint(RDB *self, PyObject *args)
 {
     PyObject *pykey;
+    Py_buffer key_view;
     void *key, *value;
     int key_size, value_size, num, result;
     RDBBase *rdbbase = (RDBBase *)self;
@@ -466,7 +495,7 @@ RDB_addint(RDB *self, PyObject *args)
     if (!PyArg_ParseTuple(args, "Oi:addint", &pykey, &num)) {
         return NULL;
     }
-    if (bytes_to_void(pykey, &key, &key_size)) {
+    if (bytes_to_key(pykey, &key_view, &key, &key_size)) {
         return NULL;
     }
     Py_BEGIN_ALLOW_THREADS
@@ -487,12 +516,15 @@ RDB_addint(RDB *self, PyObject *args)
         value = tcrdbget(rdbbase->rdb, key, key_size, &value_size);
         Py_END_ALLOW_THREADS
         if (strcmp((char *)value, "")) {
-            return set_rdb_error(rdbbase->rdb, key);
+            set_rdb_error(rdbbase->rdb, key);
+            PyBuffer_Release(&key_view);
+            return NULL;
         }
     }
     if (num) {
         rdbbase->changed = true;
     }
+    PyBuffer_Release(&key_view);
     return PyInt_FromLong((long)result);
 }
 
@@ -514,6 +546,7 @@ static PyObject *
 RDB_adddouble(RDB *self, PyObject *args)
 {
     PyObject *pykey;
+    Py_buffer key_view;
     void *key;
     int key_size;
     double num, result;
@@ -522,18 +555,21 @@ RDB_adddouble(RDB *self, PyObject *args)
     if (!PyArg_ParseTuple(args, "Od:adddouble", &pykey, &num)) {
         return NULL;
     }
-    if (bytes_to_void(pykey, &key, &key_size)) {
+    if (bytes_to_key(pykey, &key_view, &key, &key_size)) {
         return NULL;
     }
     Py_BEGIN_ALLOW_THREADS
     result = tcrdbadddouble(rdbbase->rdb, key, key_size, num);
     Py_END_ALLOW_THREADS
     if (Py_IS_NAN(result)) {
-        return set_rdb_error(rdbbase->rdb, key);
+        set_rdb_error(rdbbase->rdb, key);
+        PyBuffer_Release(&key_view);
+        return NULL;
     }
     if (num) {
         rdbbase->changed = true;
     }
+    PyBuffer_Release(&key_view);
     return PyFloat_FromDouble(result);
 }
 
@@ -440,6 +440,7 @@ is applied.");
 static PyObject *
 RDBBase_searchkeys(RDBBase *self, PyObject *args)
 {
+    Py_buffer prefix_view;
     void *prefix;
     int prefix_size, max = -1;
     TCLIST *result;
@@ -448,12 +449,13 @@ RDBBase_searchkeys(RDBBase *self, PyObject *args)
     if (!PyArg_ParseTuple(args, "O|i:searchkeys", &pyprefix, &max)) {
         return NULL;
     }
-    if (bytes_to_void(pyprefix, &prefix, &prefix_size)) {
+    if (bytes_to_void(pyprefix, &prefix_view, &prefix, &prefix_size)) {
         return NULL;
     }
     Py_BEGIN_ALLOW_THREADS
     result = tcrdbfwmkeys(self->rdb, prefix, prefix_size, max);
     Py_END_ALLOW_THREADS
+    PyBuffer_Release(&prefix_view);
     pyresult = tclist_to_frozenset(result);
     tclistdel(result);
     return pyresult;
@@ -1,3 +1,81 @@
+/*******************************************************************************
+* RTDBQueryIterType
+*******************************************************************************/
+
+/* RTDBQueryIterType.tp_iternext */
+static PyObject *
+RTDBQueryIter_tp_iternext(QueryIter *self)
+{
+    TCRDB *rdb = ((RDBBase *)self->db)->rdb;
+    void *key;
+    int key_size;
+    TCMAP *value;
+    PyObject *pykey, *pyvalue, *pyresult = NULL;
+
+    while ((key = tclistshift(self->result, &key_size))) {
+        if (!self->values) {
+            pykey = void_to_bytes(key, key_size);
+            tcfree(key);
+            return pykey;
+        }
+        Py_BEGIN_ALLOW_THREADS
+        value = tcrdbtblget(rdb, key, key_size);
+        Py_END_ALLOW_THREADS
+        if (value) {
+            pykey = void_to_bytes(key, key_size);
+            pyvalue = tcmap_to_dict(value);
+            if (pykey && pyvalue) {
+                pyresult = PyTuple_Pack(2, pykey, pyvalue);
+            }
+            Py_XDECREF(pykey);
+            Py_XDECREF(pyvalue);
+            tcmapdel(value);
+            tcfree(key);
+            return pyresult;
+        }
+        tcfree(key);
+        /* skip records removed since the query was executed */
+        if (tcrdbecode(rdb) != TTENOREC) {
+            return set_rdb_error(rdb, NULL);
+        }
+    }
+    return set_stopiteration_error();
+}
+
+
+/* RTDBQueryIterType */
+static PyTypeObject RTDBQueryIterType = {
+    PyVarObject_HEAD_INIT(NULL, 0)
+    "tokyo.tyrant.RTDBQueryIter",             /*tp_name*/
+    sizeof(QueryIter),                        /*tp_basicsize*/
+    0,                                        /*tp_itemsize*/
+    (destructor)QueryIter_tp_dealloc,         /*tp_dealloc*/
+    0,                                        /*tp_print*/
+    0,                                        /*tp_getattr*/
+    0,                                        /*tp_setattr*/
+    0,                                        /*tp_compare*/
+    0,                                        /*tp_repr*/
+    0,                                        /*tp_as_number*/
+    0,                                        /*tp_as_sequence*/
+    0,                                        /*tp_as_mapping*/
+    0,                                        /*tp_hash */
+    0,                                        /*tp_call*/
+    0,                                        /*tp_str*/
+    0,                                        /*tp_getattro*/
+    0,                                        /*tp_setattro*/
+    0,                                        /*tp_as_buffer*/
+    Py_TPFLAGS_DEFAULT | Py_TPFLAGS_HAVE_GC,  /*tp_flags*/
+    0,                                        /*tp_doc*/
+    (traverseproc)QueryIter_tp_traverse,      /*tp_traverse*/
+    (inquiry)QueryIter_tp_clear,              /*tp_clear*/
+    0,                                        /*tp_richcompare*/
+    0,                                        /*tp_weaklistoffset*/
+    PyObject_SelfIter,                        /*tp_iter*/
+    (iternextfunc)RTDBQueryIter_tp_iternext,  /*tp_iternext*/
+    QueryIter_tp_methods,                     /*tp_methods*/
+};
+
+
 /*******************************************************************************
 * RTDBQueryType
 *******************************************************************************/
@@ -75,6 +153,32 @@ RTDBQuery_search(RTDBQuery *self)
 }
 
 
+/* RTDBQuery.iter([values=False]) */
+PyDoc_STRVAR(RTDBQuery_iter_doc,
+"iter([values=False])\n\
+\n\
+Execute the query and return an iterator over the primary keys found, keys are\n\
+converted one at a time as the iterator is consumed. If values is True, the\n\
+iterator yields (key, value) tuples, each record being read from the database\n\
+when it is reached (records removed in the meantime are skipped).");
+
+static PyObject *
+RTDBQuery_iter(RTDBQuery *self, PyObject *args, PyObject *kwargs)
+{
+    TCLIST *result;
+    bool values;
+
+    if (parse_query_iter_values(args, kwargs, "|O:iter", &values)) {
+        return NULL;
+    }
+    Py_BEGIN_ALLOW_THREADS
+    result = tcrdbqrysearch(self->rqry);
+    Py_END_ALLOW_THREADS
+    return new_QueryIter(&RTDBQueryIterType, (PyObject *)self->rtdb, result,
+                         values);
+}
+
+
 /* RTDBQuery.remove() */
 PyDoc_STRVAR(RTDBQuery_remove_doc,
 "remove()\n\
@@ -190,6 +294,8 @@ RTDBQuery_count(RTDBQuery *self)
 /* RTDBQueryType.tp_methods */
 static PyMethodDef RTDBQuery_tp_methods[] = {
     {"search", (PyCFunction)RTDBQuery_search, METH_NOARGS, RTDBQuery_search_doc},
+    {"iter", (PyCFunction)RTDBQuery_iter, METH_VARARGS | METH_KEYWORDS,
+     RTDBQuery_iter_doc},
     {"remove", (PyCFunction)RTDBQuery_remove, METH_NOARGS, RTDBQuery_remove_doc},
     {"sort", (PyCFunction)RTDBQuery_sort, METH_VARARGS, RTDBQuery_sort_doc},
     {"limit", (PyCFunction)RTDBQuery_limit, METH_VARARGS, RTDBQuery_limit_doc},
@@ -546,17 +652,19 @@ http://fallabs.com/tokyotyrant/spex.html#tcrdbapi_apitbl");
 static int
 RTDB_Contains(RTDB *self, PyObject *pykey)
 {
+    Py_buffer key_view;
     void *key;
     int key_size;
     TCMAP *value;
     RDBBase *rdbbase = (RDBBase *)self;
 
-    if (bytes_to_void(pykey, &key, &key_size)) {
+    if (bytes_to_void(pykey, &key_view, &key, &key_size)) {
         return -1;
     }
     Py_BEGIN_ALLOW_THREADS
     value = tcrdbtblget(rdbbase->rdb, key, key_size);
     Py_END_ALLOW_THREADS
+    PyBuffer_Release(&key_view);
     if (!value) {
         if (tcrdbecode(rdbbase->rdb) == TTENOREC) {
             return 0;
@@ -586,23 +694,27 @@ static PySequenceMethods RTDB_tp_as_sequence = {
 static PyObject *
 RTDB_GetItem(RTDB *self, PyObject *pykey)
 {
+    Py_buffer key_view;
     void *key;
     int key_size;
     TCMAP *value;
     PyObject *pyvalue;
     RDBBase *rdbbase = (RDBBase *)self;
 
-    if (bytes_to_void(pykey, &key, &key_size)) {
+    if (bytes_to_key(pykey, &key_view, &key, &key_size)) {
         return NULL;
     }
     Py_BEGIN_ALLOW_THREADS
     value = tcrdbtblget(rdbbase->rdb, key, key_size);
     Py_END_ALLOW_THREADS
     if (!value) {
-        return set_rdb_error(rdbbase->rdb, key);
+        set_rdb_error(rdbbase->rdb, key);
+        PyBuffer_Release(&key_view);
+        return NULL;
     }
     pyvalue = tcmap_to_dict(value);
     tcmapdel(value);
+    PyBuffer_Release(&key_view);
     return pyvalue;
 }
 
@@ -611,18 +723,20 @@ RTDB_GetItem(RTDB *self, PyObject *pykey)
 static int
 RTDB_SetItem(RTDB *self, PyObject *pykey, PyObject *pyvalue)
 {
+    Py_buffer key_view;
     void *key;
     int key_size;
     TCMAP *value;
     bool result;
     RDBBase *rdbbase = (RDBBase *)self;
 
-    if (bytes_to_void(pykey, &key, &key_size)) {
+    if (bytes_to_key(pykey, &key_view, &key, &key_size)) {
         return -1;
     }
     if (pyvalue) {
         value = dict_to_tcmap(pyvalue);
         if (!value) {
+            PyBuffer_Release(&key_view);
             return -1;
         }
         Py_BEGIN_ALLOW_THREADS
@@ -631,6 +745,7 @@ RTDB_SetItem(RTDB *self, PyObject *pykey, PyObject *pyvalue)
         if (!result) {
             tcmapdel(value);
             set_rdb_error(rdbbase->rdb, NULL);
+            PyBuffer_Release(&key_view);
             return -1;
         }
         tcmapdel(value);
@@ -641,10 +756,12 @@ RTDB_SetItem(RTDB *self, PyObject *pykey, PyObject *pyvalue)
         Py_END_ALLOW_THREADS
         if (!result) {
             set_rdb_error(rdbbase->rdb, key);
+            PyBuffer_Release(&key_view);
             return -1;
         }
     }
     rdbbase->changed = true;
+    PyBuffer_Release(&key_view);
     return 0;
 }
 
@@ -756,6 +873,7 @@ put), this method raises KeyError if key is already in the database.");
 static PyObject *
 RTDB_putkeep(RTDB *self, PyObject *args, PyObject *kwargs)
 {
+    Py_buffer key_view;
     void *key;
     int key_size;
     TCMAP *value;
@@ -771,11 +889,12 @@ RTDB_putkeep(RTDB *self, PyObject *args, PyObject *kwargs)
     if (!pyvalue) {
         return NULL;
     }
-    if (bytes_to_void(pykey, &key, &key_size)) {
+    if (bytes_to_key(pykey, &key_view, &key, &key_size)) {
         return NULL;
     }
     value = dict_to_tcmap(pyvalue);
     if (!value) {
+        PyBuffer_Release(&key_view);
         return NULL;
     }
     Py_BEGIN_ALLOW_THREADS
@@ -783,9 +902,12 @@ RTDB_putkeep(RTDB *self, PyObject *args, PyObject *kwargs)
     tcmapdel(value);
     Py_END_ALLOW_THREADS
     if (!result) {
-        return set_rdb_error(rdbbase->rdb, key);
+        set_rdb_error(rdbbase->rdb, key);
+        PyBuffer_Release(&key_view);
+        return NULL;
     }
     rdbbase->changed = true;
+    PyBuffer_Release(&key_view);
     Py_RETURN_NONE;
 }
 
@@ -800,6 +922,7 @@ value. If there is no corresponding record, a new record is stored.");
 static PyObject *
 RTDB_putcat(RTDB *self, PyObject *args, PyObject *kwargs)
 {
+    Py_buffer key_view;
     void *key;
     int key_size;
     TCMAP *value;
@@ -815,17 +938,19 @@ RTDB_putcat(RTDB *self, PyObject *args, PyObject *kwargs)
     if (!pyvalue) {
         return NULL;
     }
-    if (bytes_to_void(pykey, &key, &key_size)) {
+    if (bytes_to_void(pykey, &key_view, &key, &key_size)) {
         return NULL;
     }
     value = dict_to_tcmap(pyvalue);
     if (!value) {
+        PyBuffer_Release(&key_view);
         return NULL;
     }
     Py_BEGIN_ALLOW_THREADS
     result = tcrdbtblputcat(rdbbase->rdb, key, key_size, value);
     tcmapdel(value);
     Py_END_ALLOW_THREADS
+    PyBuffer_Release(&key_view);
     if (!result) {
         return set_rdb_error(rdbbase->rdb, NULL);
     }
@@ -15,34 +15,866 @@ set_tdb_error(TCTDB *tdb, const char *key)
 }
 
 
-/* same as tctdbiternext3 without adding primary key */
-TCMAP *pytctdbiternext3(TCTDB *tdb){
-    assert(tdb);
-    TCXSTR *kstr = tcxstrnew();
-    TCXSTR *vstr = tcxstrnew();
-    TCMAP *cols = NULL;
-    if(tchdbiternext3(tdb->hdb, kstr, vstr)){
-        cols = tcmapload(TCXSTRPTR(vstr), TCXSTRSIZE(vstr));
+/* fill keys and values with at most max (key, value) pairs from an iterator,
+   return the number of pairs read or -1 on error (values are TCMAPs that must
+   be freed by the caller) */
+int
+iter_to_tcmaps(PyObject *pyiter, TCLIST *keys, TCMAP **values, int max)
+{
+    PyObject *pykey, *pyvalue;
+    int len = 0, next;
+
+    while (len < max) {
+        next = iter_next_pair(pyiter, &pykey, &pyvalue);
+        if (next < 0) {
+            break;
+        }
+        else if (!next) {
+            return len;
+        }
+        if (tclist_push_bytes(keys, pykey) ||
+            !(values[len] = dict_to_tcmap(pyvalue))) {
+            Py_DECREF(pykey);
+            Py_DECREF(pyvalue);
+            break;
+        }
+        Py_DECREF(pykey);
+        Py_DECREF(pyvalue);
+        len++;
     }
-    tcxstrdel(vstr);
-    tcxstrdel(kstr);
-    return cols;
+    if (PyErr_Occurred()) {
+        while (len--) {
+            tcmapdel(values[len]);
+        }
+        return -1;
+    }
+    return len;
 }
 
 
-/* same as above but keep the key */
-TCMAP *pytctdbiternext4(TCTDB *tdb, TCXSTR *kstr){
-    assert(tdb && kstr);
-    TCXSTR *vstr = tcxstrnew();
+/* same as tctdbiternext3 without adding primary key, the key and the
+   serialized columns are read into kstr and vstr */
+TCMAP *pytctdbiternext3(TCTDB *tdb, TCXSTR *kstr, TCXSTR *vstr){
+    assert(tdb && kstr && vstr);
     TCMAP *cols = NULL;
     if(tchdbiternext3(tdb->hdb, kstr, vstr)){
         cols = tcmapload(TCXSTRPTR(vstr), TCXSTRSIZE(vstr));
     }
-    tcxstrdel(vstr);
     return cols;
 }
 
 
+/*******************************************************************************
+* query profiler
+*******************************************************************************/
+
+static const char *query_cond_names[] = {
+    "STREQ", "STRINC", "STRBW", "STREW", "STRAND", "STROR", "STROREQ", "STRRX",
+    "NUMEQ", "NUMGT", "NUMGE", "NUMLT", "NUMLE", "NUMBT", "NUMOREQ",
+    "FTSPH", "FTSAND", "FTSOR", "FTSEX"
+};
+
+static const char *query_order_names[] = {
+    "STRASC", "STRDESC", "NUMASC", "NUMDESC"
+};
+
+
+/* statistics of a query shape */
+typedef struct {
+    uint64_t calls;
+    uint64_t indexed;
+    uint64_t full_scans;
+    uint64_t scanned;
+    uint64_t returned;
+    uint64_t cached; /* calls answered by the query cache */
+    double time;
+    double max_time;
+} TDBProfileStat;
+
+
+/* rows scanned by queries that could have used an index on a column */
+typedef struct {
+    uint64_t calls;
+    uint64_t scanned;
+} TDBAdviceStat;
+
+
+/* the index type that could serve a condition, -1 if none */
+static int
+query_cond_index_type(int op)
+{
+    if (op & (TDBQCNEGATE | TDBQCNOIDX)) {
+        return -1;
+    }
+    switch (op) {
+        case TDBQCSTREQ:
+        case TDBQCSTRBW:
+        case TDBQCSTROREQ:
+            return TDBITLEXICAL;
+        case TDBQCNUMEQ:
+        case TDBQCNUMGT:
+        case TDBQCNUMGE:
+        case TDBQCNUMLT:
+        case TDBQCNUMLE:
+        case TDBQCNUMBT:
+        case TDBQCNUMOREQ:
+            return TDBITDECIMAL;
+        case TDBQCSTRAND:
+        case TDBQCSTROR:
+            return TDBITTOKEN;
+        case TDBQCFTSPH:
+        case TDBQCFTSAND:
+        case TDBQCFTSOR:
+        case TDBQCFTSEX:
+            return TDBITQGRAM;
+        default:
+            return -1;
+    }
+}
+
+
+/* describe a query shape: its conditions (without expressions) and order */
+static void
+query_shape(TCXSTR *shape, TCLIST *columns, const int *ops, const char *order,
+            int order_type)
+{
+    const char *column;
+    int op, i;
+
+    for (i = 0; i < tclistnum(columns); i++) {
+        column = tclistval2(columns, i);
+        op = ops[i] & ~(TDBQCNEGATE | TDBQCNOIDX);
+        tcxstrprintf(shape, "%s%s\"%s\" %s%s", i ? " AND " : "",
+                     (ops[i] & TDBQCNEGATE) ? "NOT " : "", column,
+                     (op >= 0 && op <= TDBQCFTSEX) ? query_cond_names[op] : "?",
+                     (ops[i] & TDBQCNOIDX) ? " NOIDX" : "");
+    }
+    if (!i) {
+        tcxstrcat2(shape, "ALL");
+    }
+    if (order) {
+        tcxstrprintf(shape, " ORDER BY \"%s\" %s", order,
+                     (order_type >= 0 && order_type <= TDBQONUMDESC) ?
+                     query_order_names[order_type] : "?");
+    }
+}
+
+
+/* add the rows scanned by a query to the advice entry of a column */
+static void
+advise_index(TCMAP *advice, TCMAP *seen, const char *column, int type,
+             uint64_t scanned)
+{
+    TDBAdviceStat stat;
+    TCXSTR *key;
+    const void *value;
+    int value_size;
+
+    if (!column[0] || type < 0) {
+        return; /* primary key or condition that cannot use an index */
+    }
+    key = tcxstrnew();
+    tcxstrcat(key, &type, sizeof(int));
+    tcxstrcat2(key, column);
+    if (tcmapputkeep(seen, tcxstrptr(key), tcxstrsize(key), "", 0)) {
+        value = tcmapget(advice, tcxstrptr(key), tcxstrsize(key), &value_size);
+        if (value) {
+            memcpy(&stat, value, sizeof(TDBAdviceStat));
+        }
+        else {
+            memset(&stat, 0, sizeof(TDBAdviceStat));
+        }
+        stat.calls++;
+        stat.scanned += scanned;
+        tcmapput(advice, tcxstrptr(key), tcxstrsize(key), &stat,
+                 sizeof(TDBAdviceStat));
+    }
+    tcxstrdel(key);
+}
+
+
+/* record an executed query in the profile of tdb, rows scanned and index use
+   are read from the query hint, which is NULL for a search answered by the
+   query cache (nothing is scanned then) */
+static void
+profile_query(TDB *tdb, TCLIST *columns, const int *ops, const char *order,
+              int order_type, const char *hint, double time, int returned)
+{
+    TDBProfileStat stat;
+    TCXSTR *shape;
+    TCMAP *indexed, *seen;
+    const char *start, *end;
+    const void *value;
+    long long aux_size = -1;
+    uint64_t scanned;
+    bool full_scan;
+    int value_size, i;
+
+    /* columns served by an index */
+    indexed = tcmapnew2(8);
+    if (!hint) {
+        full_scan = false;
+        scanned = 0;
+    }
+    else {
+        start = hint;
+        while ((start = strstr(start, "index: \""))) {
+            start += 8;
+            end = strchr(start, '"');
+            if (!end) {
+                break;
+            }
+            tcmapput(indexed, start, (int)(end - start), "", 0);
+            start = end + 1;
+        }
+        full_scan = (strstr(hint, "scanning the whole table") != NULL);
+        start = strstr(hint, "auxiliary result set size: ");
+        if (start) {
+            aux_size = strtoll(start + 27, NULL, 10);
+        }
+        if (full_scan) {
+            Py_BEGIN_ALLOW_THREADS
+            scanned = tctdbrnum(tdb->tdb);
+            Py_END_ALLOW_THREADS
+        }
+        else if (aux_size >= 0) {
+            scanned = (uint64_t)aux_size;
+        }
+        else {
+            scanned = (uint64_t)returned;
+        }
+    }
+    /* statistics of the shape */
+    shape = tcxstrnew();
+    query_shape(shape, columns, ops, order, order_type);
+    value = tcmapget(tdb->profile, tcxstrptr(shape), tcxstrsize(shape),
+                     &value_size);
+    if (value) {
+        memcpy(&stat, value, sizeof(TDBProfileStat));
+    }
+    else {
+        memset(&stat, 0, sizeof(TDBProfileStat));
+    }
+    stat.calls++;
+    stat.indexed += (tcmaprnum(indexed) > 0);
+    stat.full_scans += full_scan;
+    stat.scanned += scanned;
+    stat.returned += returned;
+    stat.cached += !hint;
+    stat.time += time;
+    if (time > stat.max_time) {
+        stat.max_time = time;
+    }
+    tcmapput(tdb->profile, tcxstrptr(shape), tcxstrsize(shape), &stat,
+             sizeof(TDBProfileStat));
+    tcxstrdel(shape);
+    if (!hint) {
+        tcmapdel(indexed);
+        return;
+    }
+    /* columns that could have used an index */
+    seen = tcmapnew2(8);
+    for (i = 0; i < tclistnum(columns); i++) {
+        start = tclistval2(columns, i);
+        if (!tcmapget(indexed, start, (int)strlen(start), &value_size)) {
+            advise_index(tdb->advice, seen, start,
+                         query_cond_index_type(ops[i]), scanned);
+        }
+    }
+    if (order && !tcmapget(indexed, order, (int)strlen(order), &value_size)) {
+        advise_index(tdb->advice, seen, order,
+                     (order_type <= TDBQOSTRDESC) ? TDBITLEXICAL
+                                                  : TDBITDECIMAL,
+                     scanned);
+    }
+    tcmapdel(seen);
+    tcmapdel(indexed);
+}
+
+
+/* convert the profile of a TDB to a dict */
+static PyObject *
+profile_to_dict(TCMAP *profile)
+{
+    TDBProfileStat stat;
+    const char *shape;
+    int shape_size, value_size;
+    PyObject *pyresult, *pystat;
+
+    pyresult = PyDict_New();
+    if (!pyresult) {
+        return NULL;
+    }
+    tcmapiterinit(profile);
+    while ((shape = tcmapiternext(profile, &shape_size))) {
+        memcpy(&stat, tcmapget(profile, shape, shape_size, &value_size),
+               sizeof(TDBProfileStat));
+        pystat = Py_BuildValue("{s:K,s:K,s:K,s:K,s:K,s:K,s:d,s:d}",
+                               "calls", (unsigned long long)stat.calls,
+                               "indexed", (unsigned long long)stat.indexed,
+                               "full_scans",
+                               (unsigned long long)stat.full_scans,
+                               "scanned", (unsigned long long)stat.scanned,
+                               "returned", (unsigned long long)stat.returned,
+                               "cached", (unsigned long long)stat.cached,
+                               "time", stat.time, "max_time", stat.max_time);
+        if (!pystat || PyDict_SetItemString(pyresult, shape, pystat)) {
+            Py_XDECREF(pystat);
+            Py_DECREF(pyresult);
+            return NULL;
+        }
+        Py_DECREF(pystat);
+    }
+    return pyresult;
+}
+
+
+/* an indexadvice() entry */
+typedef struct {
+    const char *key;
+    int key_size;
+    TDBAdviceStat stat;
+} TDBAdvice;
+
+
+static int
+compare_advice(const void *a, const void *b)
+{
+    uint64_t scanned_a = ((const TDBAdvice *)a)->stat.scanned;
+    uint64_t scanned_b = ((const TDBAdvice *)b)->stat.scanned;
+
+    return (scanned_a < scanned_b) - (scanned_a > scanned_b);
+}
+
+
+/* convert the index advice of a TDB to a list of (column, type, scanned, calls)
+   tuples, the columns with the most rows scanned first */
+static PyObject *
+advice_to_list(TCMAP *advice)
+{
+    TDBAdvice *entries;
+    const char *key;
+    int key_size, value_size, type, len = 0, i;
+    PyObject *pyresult = NULL, *pyentry;
+
+    entries = PyMem_New(TDBAdvice, tcmaprnum(advice));
+    if (!entries) {
+        return PyErr_NoMemory();
+    }
+    tcmapiterinit(advice);
+    while ((key = tcmapiternext(advice, &key_size))) {
+        entries[len].key = key;
+        entries[len].key_size = key_size;
+        memcpy(&entries[len].stat,
+               tcmapget(advice, key, key_size, &value_size),
+               sizeof(TDBAdviceStat));
+        len++;
+    }
+    qsort(entries, len, sizeof(TDBAdvice), compare_advice);
+    pyresult = PyList_New((Py_ssize_t)len);
+    if (!pyresult) {
+        goto finish;
+    }
+    for (i = 0; i < len; i++) {
+        memcpy(&type, entries[i].key, sizeof(int));
+#if PY_MAJOR_VERSION >= 3
+        pyentry = Py_BuildValue("(y#iKK)",
+#else
+        pyentry = Py_BuildValue("(s#iKK)",
+#endif
+                                entries[i].key + sizeof(int),
+                                (Py_ssize_t)(entries[i].key_size - sizeof(int)),
+                                type,
+                                (unsigned long long)entries[i].stat.scanned,
+                                (unsigned long long)entries[i].stat.calls);
+        if (!pyentry) {
+            Py_CLEAR(pyresult);
+            goto finish;
+        }
+        PyList_SET_ITEM(pyresult, (Py_ssize_t)i, pyentry);
+    }
+
+finish:
+    PyMem_Free(entries);
+    return pyresult;
+}
+
+
+/*******************************************************************************
+* query cache
+*******************************************************************************/
+
+/* serialize a query (conditions, order and limit) into a query cache key */
+static void
+query_cache_key(TCXSTR *key, TCLIST *columns, const int *ops, TCLIST *exprs,
+                const char *order, int order_type, int max, int skip)
+{
+    const void *value;
+    int value_size, num = tclistnum(columns), i;
+
+    tcxstrcat(key, &num, sizeof(int));
+    for (i = 0; i < num; i++) {
+        /* TCLIST values are NUL-terminated */
+        value = tclistval(columns, i, &value_size);
+        tcxstrcat(key, value, value_size + 1);
+        tcxstrcat(key, &ops[i], sizeof(int));
+        value = tclistval(exprs, i, &value_size);
+        tcxstrcat(key, value, value_size + 1);
+    }
+    if (order) {
+        tcxstrcat(key, order, (int)strlen(order) + 1);
+        tcxstrcat(key, &order_type, sizeof(int));
+    }
+    else {
+        tcxstrcat(key, "", 1);
+    }
+    tcxstrcat(key, &max, sizeof(int));
+    tcxstrcat(key, &skip, sizeof(int));
+}
+
+
+/* look up the result of a query, return NULL if it is not cached, the cache is
+   emptied first if the database was modified since it was filled */
+static TCLIST *
+query_cache_get(TDB *tdb, TCXSTR *key)
+{
+    const void *value;
+    int value_size;
+
+    if (!tdb->query_cache) {
+        return NULL;
+    }
+    if (tdb->query_cache_version != tdb->version) {
+        DBCache_clear(tdb->query_cache);
+        tdb->query_cache_version = tdb->version;
+    }
+    value = DBCache_get(tdb->query_cache, tcxstrptr(key), tcxstrsize(key),
+                        &value_size);
+    return value ? tclistload(value, value_size) : NULL;
+}
+
+
+/* store the result of a query that started while the database was at version
+   (it is not stored if the database was modified since) */
+static void
+query_cache_put(TDB *tdb, TCXSTR *key, TCLIST *result,
+                unsigned long long version)
+{
+    void *value;
+    int value_size;
+
+    if (!tdb->query_cache || version != tdb->version) {
+        return;
+    }
+    if (tdb->query_cache_version != version) {
+        DBCache_clear(tdb->query_cache);
+        tdb->query_cache_version = version;
+    }
+    value = tclistdump(result, &value_size);
+    DBCache_put(tdb->query_cache, tcxstrptr(key), tcxstrsize(key), value,
+                value_size);
+    tcfree(value);
+}
+
+
+/*******************************************************************************
+* parallel metasearch
+*******************************************************************************/
+
+/* a sub-query of a parallel metasearch, searched by its own thread unless it
+   is the same query as an earlier one (same is the index of the latter) */
+typedef struct {
+    TDBQRY *qry;
+    TCLIST *result;
+    pthread_t thread;
+    bool started;
+    int same;
+} TDBMetasearchJob;
+
+
+/* a key of the combined result with the value of the order column */
+typedef struct {
+    const char *key;
+    int key_size;
+    char *value;
+    int value_size;
+    double num;
+    int index;
+} TDBMetasearchRecord;
+
+
+static void *
+metasearch_worker(void *arg)
+{
+    TDBMetasearchJob *job = (TDBMetasearchJob *)arg;
+
+    job->result = tctdbqrysearch(job->qry);
+    return NULL;
+}
+
+
+/* search all the sub-queries at once, the first one is searched by the calling
+   thread (as is any sub-query whose thread could not be started) */
+static void
+metasearch_run(TDBMetasearchJob *jobs, int num)
+{
+    int i;
+
+    for (i = 1; i < num; i++) {
+        if (jobs[i].same < 0) {
+            jobs[i].started = !pthread_create(&jobs[i].thread, NULL,
+                                              metasearch_worker, &jobs[i]);
+        }
+    }
+    metasearch_worker(&jobs[0]);
+    for (i = 1; i < num; i++) {
+        if (jobs[i].started) {
+            pthread_join(jobs[i].thread, NULL);
+        }
+        else if (jobs[i].same < 0) {
+            metasearch_worker(&jobs[i]);
+        }
+    }
+    for (i = 1; i < num; i++) {
+        if (jobs[i].same >= 0) {
+            jobs[i].result = tclistdup(jobs[jobs[i].same].result);
+        }
+    }
+}
+
+
+/* combine the results of the sub-queries with the semantics of
+   tctdbmetasearch(): keys are kept in the order they are first found */
+static TCLIST *
+metasearch_combine(TDBMetasearchJob *jobs, int num, int type)
+{
+    TCLIST *result = tclistnew();
+    TCMAP *seen = tcmapnew();
+    const char *key;
+    int key_size, count, i, j;
+
+    if (type == TDBMSUNION) {
+        for (i = 0; i < num; i++) {
+            for (j = 0; j < tclistnum(jobs[i].result); j++) {
+                key = tclistval(jobs[i].result, j, &key_size);
+                if (tcmapputkeep(seen, key, key_size, "", 0)) {
+                    tclistpush(result, key, key_size);
+                }
+            }
+        }
+    }
+    else {
+        /* count the sub-queries (but the first one) finding each key, keys
+           are unique within a result */
+        for (i = 1; i < num; i++) {
+            for (j = 0; j < tclistnum(jobs[i].result); j++) {
+                key = tclistval(jobs[i].result, j, &key_size);
+                tcmapaddint(seen, key, key_size, 1);
+            }
+        }
+        count = (type == TDBMSISECT) ? num - 1 : 0;
+        for (j = 0; j < tclistnum(jobs[0].result); j++) {
+            key = tclistval(jobs[0].result, j, &key_size);
+            if (tcmapaddint(seen, key, key_size, 0) == count) {
+                tclistpush(result, key, key_size);
+            }
+        }
+    }
+    tcmapdel(seen);
+    return result;
+}
+
+
+/* comparison functions of the order types, keys without the order column are
+   sorted last (metasearch_cmp_missing() is called if one of them is) */
+static int
+metasearch_cmp_missing(const TDBMetasearchRecord *a,
+                       const TDBMetasearchRecord *b)
+{
+    if (a->value || b->value) {
+        return a->value ? -1 : 1;
+    }
+    return a->index - b->index;
+}
+
+
+static int
+metasearch_cmp_str(const void *pa, const void *pb, bool desc)
+{
+    const TDBMetasearchRecord *a = pa, *b = pb;
+    int result;
+
+    if (!a->value || !b->value) {
+        return metasearch_cmp_missing(a, b);
+    }
+    result = tccmplexical(a->value, a->value_size, b->value, b->value_size,
+                          NULL);
+    if (desc) {
+        result = -result;
+    }
+    return result ? result : a->index - b->index;
+}
+
+
+static int
+metasearch_cmp_strasc(const void *pa, const void *pb)
+{
+    return metasearch_cmp_str(pa, pb, false);
+}
+
+
+static int
+metasearch_cmp_strdesc(const void *pa, const void *pb)
+{
+    return metasearch_cmp_str(pa, pb, true);
+}
+
+
+static int
+metasearch_cmp_num(const void *pa, const void *pb, bool desc)
+{
+    const TDBMetasearchRecord *a = pa, *b = pb;
+    int result;
+
+    if (!a->value || !b->value) {
+        return metasearch_cmp_missing(a, b);
+    }
+    result = (a->num > b->num) - (a->num < b->num);
+    if (desc) {
+        result = -result;
+    }
+    return result ? result : a->index - b->index;
+}
+
+
+static int
+metasearch_cmp_numasc(const void *pa, const void *pb)
+{
+    return metasearch_cmp_num(pa, pb, false);
+}
+
+
+static int
+metasearch_cmp_numdesc(const void *pa, const void *pb)
+{
+    return metasearch_cmp_num(pa, pb, true);
+}
+
+
+/* return the keys sorted by the order column of the first sub-query */
+static TCLIST *
+metasearch_order(TCLIST *keys, TCTDB *tdb, const char *order, int order_type)
+{
+    TDBMetasearchRecord *records;
+    TCLIST *result;
+    TCMAP *record;
+    const char *value;
+    int num = tclistnum(keys), value_size, i;
+    int (*cmp)(const void *, const void *);
+
+    switch (order_type) {
+        case TDBQOSTRASC:
+            cmp = metasearch_cmp_strasc;
+            break;
+        case TDBQOSTRDESC:
+            cmp = metasearch_cmp_strdesc;
+            break;
+        case TDBQONUMASC:
+            cmp = metasearch_cmp_numasc;
+            break;
+        case TDBQONUMDESC:
+            cmp = metasearch_cmp_numdesc;
+            break;
+        default:
+            return tclistdup(keys);
+    }
+    records = (TDBMetasearchRecord *)tcmalloc(
+        (size_t)(num ? num : 1) * sizeof(TDBMetasearchRecord));
+    for (i = 0; i < num; i++) {
+        records[i].key = tclistval(keys, i, &records[i].key_size);
+        records[i].value = NULL;
+        records[i].value_size = 0;
+        records[i].num = 0.0;
+        records[i].index = i;
+        record = tctdbget(tdb, records[i].key, records[i].key_size);
+        if (record) {
+            value = tcmapget(record, order, (int)strlen(order), &value_size);
+            if (value) {
+                records[i].value = tcmemdup(value, value_size);
+                records[i].value_size = value_size;
+                records[i].num = tcatof(records[i].value);
+            }
+            tcmapdel(record);
+        }
+    }
+    qsort(records, (size_t)num, sizeof(TDBMetasearchRecord), cmp);
+    result = tclistnew2(num);
+    for (i = 0; i < num; i++) {
+        tclistpush(result, records[i].key, records[i].key_size);
+        tcfree(records[i].value);
+    }
+    tcfree(records);
+    return result;
+}
+
+
+/* search the queries in parallel and combine their results like
+   tctdbmetasearch(): the result is sorted by the order of the first query and
+   the limit of the first query applies to it, the first query is searched
+   without skipping records. If limit is not negative, at most limit keys are
+   returned and, for TDBMSUNION, sub-queries sorted like the first one (or all
+   of them if the first one is not sorted) stop after limit keys. */
+static TCLIST *
+metasearch_parallel(TDBQuery **queries, int num, int type, int limit)
+{
+    TDBQuery *first = queries[0], *query;
+    TDBMetasearchJob *jobs;
+    TCLIST *result, *sorted;
+    int max = first->max, cap = -1, qmax, qskip, size, i, j;
+
+    if (limit >= 0 && (max < 0 || limit < max)) {
+        max = limit;
+    }
+    if (type == TDBMSUNION && max >= 0) {
+        cap = max + first->skip;
+    }
+    jobs = (TDBMetasearchJob *)tcmalloc((size_t)num *
+                                        sizeof(TDBMetasearchJob));
+    for (i = 0; i < num; i++) {
+        query = queries[i];
+        jobs[i].qry = query->qry;
+        jobs[i].result = NULL;
+        jobs[i].started = false;
+        jobs[i].same = -1;
+        for (j = 0; j < i; j++) {
+            if (jobs[j].qry == jobs[i].qry) {
+                jobs[i].same = j;
+                break;
+            }
+        }
+        if (jobs[i].same >= 0) {
+            continue;
+        }
+        qmax = query->max;
+        qskip = query->skip;
+        if (query == first) {
+            if (qmax >= 0) {
+                qmax += qskip;
+            }
+            qskip = 0;
+        }
+        if (cap >= 0 && (qmax < 0 || cap < qmax) &&
+            (!first->order ||
+             (query->order && !strcmp(query->order, first->order) &&
+              query->order_type == first->order_type))) {
+            qmax = cap;
+        }
+        tctdbqrysetlimit(query->qry, qmax, qskip);
+    }
+    metasearch_run(jobs, num);
+    result = metasearch_combine(jobs, num, type);
+    for (i = 0; i < num; i++) {
+        tclistdel(jobs[i].result);
+        if (jobs[i].same < 0) {
+            tctdbqrysetlimit(queries[i]->qry, queries[i]->max,
+                             queries[i]->skip);
+        }
+    }
+    tcfree(jobs);
+    if (first->order) {
+        sorted = metasearch_order(result, first->tdb->tdb, first->order,
+                                  first->order_type);
+        tclistdel(result);
+        result = sorted;
+    }
+    for (i = 0; i < first->skip && tclistnum(result); i++) {
+        tcfree(tclistshift(result, &size));
+    }
+    while (max >= 0 && tclistnum(result) > max) {
+        tcfree(tclistpop(result, &size));
+    }
+    return result;
+}
+
+
+/*******************************************************************************
+* TDBQueryIterType
+*******************************************************************************/
+
+/* TDBQueryIterType.tp_iternext */
+static PyObject *
+TDBQueryIter_tp_iternext(QueryIter *self)
+{
+    TDB *tdb = (TDB *)self->db;
+    void *key;
+    int key_size;
+    TCMAP *value;
+    PyObject *pykey, *pyvalue, *pyresult = NULL;
+
+    while ((key = tclistshift(self->result, &key_size))) {
+        if (!self->values) {
+            pykey = void_to_bytes(key, key_size);
+            tcfree(key);
+            return pykey;
+        }
+        Py_BEGIN_ALLOW_THREADS
+        value = tctdbget(tdb->tdb, key, key_size);
+        Py_END_ALLOW_THREADS
+        if (value) {
+            pykey = void_to_bytes(key, key_size);
+            pyvalue = tcmap_to_dict(value);
+            if (pykey && pyvalue) {
+                pyresult = PyTuple_Pack(2, pykey, pyvalue);
+            }
+            Py_XDECREF(pykey);
+            Py_XDECREF(pyvalue);
+            tcmapdel(value);
+            tcfree(key);
+            return pyresult;
+        }
+        tcfree(key);
+        /* skip records removed since the query was executed */
+        if (tctdbecode(tdb->tdb) != TCENOREC) {
+            return set_tdb_error(tdb->tdb, NULL);
+        }
+    }
+    return set_stopiteration_error();
+}
+
+
+/* TDBQueryIterType */
+static PyTypeObject TDBQueryIterType = {
+    PyVarObject_HEAD_INIT(NULL, 0)
+    "tokyo.cabinet.TDBQueryIter",             /*tp_name*/
+    sizeof(QueryIter),                        /*tp_basicsize*/
+    0,                                        /*tp_itemsize*/
+    (destructor)QueryIter_tp_dealloc,         /*tp_dealloc*/
+    0,                                        /*tp_print*/
+    0,                                        /*tp_getattr*/
+    0,                                        /*tp_setattr*/
+    0,                                        /*tp_compare*/
+    0,                                        /*tp_repr*/
+    0,                                        /*tp_as_number*/
+    0,                                        /*tp_as_sequence*/
+    0,                                        /*tp_as_mapping*/
+    0,                                        /*tp_hash */
+    0,                                        /*tp_call*/
+    0,                                        /*tp_str*/
+    0,                                        /*tp_getattro*/
+    0,                                        /*tp_setattro*/
+    0,                                        /*tp_as_buffer*/
+    Py_TPFLAGS_DEFAULT | Py_TPFLAGS_HAVE_GC,  /*tp_flags*/
+    0,                                        /*tp_doc*/
+    (traverseproc)QueryIter_tp_traverse,      /*tp_traverse*/
+    (inquiry)QueryIter_tp_clear,              /*tp_clear*/
+    0,                                        /*tp_richcompare*/
+    0,                                        /*tp_weaklistoffset*/
+    PyObject_SelfIter,                        /*tp_iter*/
+    (iternextfunc)TDBQueryIter_tp_iternext,   /*tp_iternext*/
+    QueryIter_tp_methods,                     /*tp_methods*/
+};
+
+
 /*******************************************************************************
 * TDBQueryType
 *******************************************************************************/
@@ -105,6 +937,331 @@ fail:
 }
 
 
+/* TDBQuery update operation */
+typedef struct {
+    TCMAP *set;
+    TCMAP *incr; /* column -> TDBQueryIncr */
+    TCLIST *unset;
+    int count;
+} TDBQueryUpdate;
+
+
+typedef struct {
+    bool is_double;
+    int64_t i;
+    double d;
+} TDBQueryIncr;
+
+
+/* format a double with the shortest representation that reads back exactly */
+static void
+double_to_str(double value, char *buf, size_t buf_size)
+{
+    int precision;
+
+    for (precision = 15; precision < 17; precision++) {
+        snprintf(buf, buf_size, "%.*g", precision, value);
+        if (strtod(buf, NULL) == value) {
+            return;
+        }
+    }
+    snprintf(buf, buf_size, "%.17g", value);
+}
+
+
+/* whether a column value is an integer (missing values count as 0) */
+static bool
+str_is_int(const char *str)
+{
+    if (!str) {
+        return true;
+    }
+    while (*str == ' ' || (*str >= '\t' && *str <= '\r')) {
+        str++;
+    }
+    if (*str == '-' || *str == '+') {
+        str++;
+    }
+    if (*str < '0' || *str > '9') {
+        return false;
+    }
+    while (*str >= '0' && *str <= '9') {
+        str++;
+    }
+    return *str == '\0';
+}
+
+
+/* TDBQuery update callback, runs without the GIL */
+static int
+TDBQuery_update_cb(const void *key, int key_size, TCMAP *value, void *op)
+{
+    TDBQueryUpdate *update = op;
+    TDBQueryIncr incr;
+    const void *column, *column_value;
+    int column_size, column_value_size, i;
+    char buf[64];
+
+    tcmapiterinit(update->set);
+    while ((column = tcmapiternext(update->set, &column_size))) {
+        column_value = tcmapget(update->set, column, column_size,
+                                &column_value_size);
+        tcmapput(value, column, column_size, column_value, column_value_size);
+    }
+    tcmapiterinit(update->incr);
+    while ((column = tcmapiternext(update->incr, &column_size))) {
+        memcpy(&incr, tcmapget(update->incr, column, column_size,
+                               &column_value_size), sizeof(TDBQueryIncr));
+        /* TCMAP values are always NUL-terminated */
+        column_value = tcmapget(value, column, column_size,
+                                &column_value_size);
+        /* an integer increment of a non-integer value (e.g. "1.5") uses
+           double arithmetic, rather than truncating the value */
+        if (incr.is_double || !str_is_int(column_value)) {
+            double_to_str((column_value ? tcatof(column_value) : 0.0) +
+                          (incr.is_double ? incr.d : (double)incr.i),
+                          buf, sizeof(buf));
+        }
+        else {
+            snprintf(buf, sizeof(buf), "%lld",
+                     (long long)((column_value ? tcatoi(column_value) : 0) +
+                                 incr.i));
+        }
+        tcmapput(value, column, column_size, buf, (int)strlen(buf));
+    }
+    for (i = 0; i < tclistnum(update->unset); i++) {
+        column = tclistval(update->unset, i, &column_size);
+        tcmapout(value, column, column_size);
+    }
+    update->count++;
+    return TDBQPPUT;
+}
+
+
+/* convert a dict of column increments to a TCMAP of TDBQueryIncr */
+static TCMAP *
+dict_to_incr_tcmap(PyObject *pyitems)
+{
+    TCMAP *items;
+    TDBQueryIncr incr;
+    PyObject *pykey, *pyvalue;
+    Py_ssize_t pos = 0;
+    Py_buffer key_view;
+    void *key;
+    int key_size;
+
+    if (!PyDict_Check(pyitems)) {
+        set_error(PyExc_TypeError, "a dict is required");
+        return NULL;
+    }
+    items = tcmapnew();
+    if (!items) {
+        set_error(Error, "could not create TCMAP, memory issue?");
+        return NULL;
+    }
+    while (PyDict_Next(pyitems, &pos, &pykey, &pyvalue)) {
+        memset(&incr, 0, sizeof(TDBQueryIncr));
+        if (PyFloat_Check(pyvalue)) {
+            incr.is_double = true;
+            incr.d = PyFloat_AsDouble(pyvalue);
+        }
+#if PY_MAJOR_VERSION >= 3
+        else if (PyLong_Check(pyvalue)) {
+#else
+        else if (PyInt_Check(pyvalue) || PyLong_Check(pyvalue)) {
+#endif
+            incr.i = PyLong_AsLongLong(pyvalue);
+            if (incr.i == -1 && PyErr_Occurred()) {
+                tcmapdel(items);
+                return NULL;
+            }
+        }
+        else {
+            set_error(PyExc_TypeError, "an int or a float is required");
+            tcmapdel(items);
+            return NULL;
+        }
+        if (bytes_to_void(pykey, &key_view, &key, &key_size)) {
+            tcmapdel(items);
+            return NULL;
+        }
+        tcmapput(items, key, key_size, &incr, sizeof(TDBQueryIncr));
+        PyBuffer_Release(&key_view);
+    }
+    return items;
+}
+
+
+/* aggregated values of a column (stats[0].n holds the number of records) */
+typedef struct {
+    int64_t n;
+    double sum, min, max;
+} TDBAggStat;
+
+
+/* add a record to its group, groups maps "\1<value>" (or "\0" if the record
+   has no group_by column) to an array of ncolumns + 1 TDBAggStat */
+static void
+aggregate_record(TCMAP *groups, TCMAP *record, const char *group_by,
+                 int group_by_size, TCLIST *columns, TDBAggStat *stats,
+                 TCXSTR *group)
+{
+    const void *value;
+    const char *column_value;
+    char *end;
+    int value_size, ncolumns = tclistnum(columns), i;
+    size_t stats_size = sizeof(TDBAggStat) * (ncolumns + 1);
+    double number;
+
+    tcxstrclear(group);
+    value = group_by ? tcmapget(record, group_by, group_by_size, &value_size)
+                     : NULL;
+    if (value) {
+        tcxstrcat(group, "\1", 1);
+        tcxstrcat(group, value, value_size);
+    }
+    else {
+        tcxstrcat(group, "\0", 1);
+    }
+    value = tcmapget(groups, tcxstrptr(group), tcxstrsize(group), &value_size);
+    if (value) {
+        memcpy(stats, value, stats_size);
+    }
+    else {
+        memset(stats, 0, stats_size);
+    }
+    stats[0].n++;
+    for (i = 0; i < ncolumns; i++) {
+        value = tclistval(columns, i, &value_size);
+        /* TCMAP values are always NUL-terminated */
+        column_value = tcmapget(record, value, value_size, &value_size);
+        if (!column_value) {
+            continue;
+        }
+        number = strtod(column_value, &end);
+        if (end == column_value) {
+            continue; /* not a number */
+        }
+        if (!stats[i + 1].n || number < stats[i + 1].min) {
+            stats[i + 1].min = number;
+        }
+        if (!stats[i + 1].n || number > stats[i + 1].max) {
+            stats[i + 1].max = number;
+        }
+        stats[i + 1].sum += number;
+        stats[i + 1].n++;
+    }
+    tcmapput(groups, tcxstrptr(group), tcxstrsize(group), stats,
+             (int)stats_size);
+}
+
+
+/* convert the aggregated values of a group to a dict */
+static PyObject *
+aggregate_to_dict(const TDBAggStat *stats, bool count, TCLIST **lists,
+                  TCMAP *indices)
+{
+    static const char *names[] = {"sum", "min", "max", "avg"};
+    const TDBAggStat *stat;
+    const void *column;
+    PyObject *pyresult, *pystats, *pycolumn, *pyvalue;
+    int column_size, index, size, i, j;
+
+    pyresult = PyDict_New();
+    if (!pyresult) {
+        return NULL;
+    }
+    if (count) {
+        pyvalue = PyLong_FromLongLong((long long)stats[0].n);
+        if (!pyvalue || PyDict_SetItemString(pyresult, "count", pyvalue)) {
+            Py_XDECREF(pyvalue);
+            Py_DECREF(pyresult);
+            return NULL;
+        }
+        Py_DECREF(pyvalue);
+    }
+    for (i = 0; i < 4; i++) {
+        if (!tclistnum(lists[i])) {
+            continue;
+        }
+        pystats = PyDict_New();
+        if (!pystats || PyDict_SetItemString(pyresult, names[i], pystats)) {
+            Py_XDECREF(pystats);
+            Py_DECREF(pyresult);
+            return NULL;
+        }
+        Py_DECREF(pystats);
+        for (j = 0; j < tclistnum(lists[i]); j++) {
+            column = tclistval(lists[i], j, &column_size);
+            memcpy(&index, tcmapget(indices, column, column_size, &size),
+                   sizeof(int));
+            stat = &stats[index];
+            if (i == 0) {
+                pyvalue = PyFloat_FromDouble(stat->sum);
+            }
+            else if (!stat->n) {
+                Py_INCREF(Py_None);
+                pyvalue = Py_None;
+            }
+            else {
+                pyvalue = PyFloat_FromDouble(
+                    (i == 1) ? stat->min :
+                    (i == 2) ? stat->max : stat->sum / stat->n);
+            }
+            pycolumn = void_to_bytes(column, column_size);
+            if (!(pycolumn && pyvalue) ||
+                PyDict_SetItem(pystats, pycolumn, pyvalue)) {
+                Py_XDECREF(pycolumn);
+                Py_XDECREF(pyvalue);
+                Py_DECREF(pyresult);
+                return NULL;
+            }
+            Py_DECREF(pycolumn);
+            Py_DECREF(pyvalue);
+        }
+    }
+    return pyresult;
+}
+
+
+/* convert the aggregation groups to a dict of dicts keyed by group value */
+static PyObject *
+groups_to_dict(TCMAP *groups, bool count, TCLIST **lists, TCMAP *indices)
+{
+    const char *group;
+    const void *stats;
+    int group_size, stats_size;
+    PyObject *pyresult, *pygroup, *pystats;
+
+    pyresult = PyDict_New();
+    if (!pyresult) {
+        return NULL;
+    }
+    tcmapiterinit(groups);
+    while ((group = tcmapiternext(groups, &group_size))) {
+        stats = tcmapget(groups, group, group_size, &stats_size);
+        if (group[0]) {
+            pygroup = void_to_bytes(group + 1, group_size - 1);
+        }
+        else {
+            Py_INCREF(Py_None);
+            pygroup = Py_None;
+        }
+        pystats = aggregate_to_dict(stats, count, lists, indices);
+        if (!(pygroup && pystats) ||
+            PyDict_SetItem(pyresult, pygroup, pystats)) {
+            Py_XDECREF(pygroup);
+            Py_XDECREF(pystats);
+            Py_DECREF(pyresult);
+            return NULL;
+        }
+        Py_DECREF(pygroup);
+        Py_DECREF(pystats);
+    }
+    return pyresult;
+}
+
+
 /* new_TDBQuery */
 TDBQuery *
 new_TDBQuery(PyTypeObject *type, TDB *tdb)
@@ -123,10 +1280,64 @@ new_TDBQuery(PyTypeObject *type, TDB *tdb)
     /* self->tdb */
     Py_INCREF(tdb);
     self->tdb = tdb;
+    /* self->columns, self->ops, self->exprs */
+    self->columns = tclistnew();
+    self->ops = tcxstrnew();
+    self->exprs = tclistnew();
+    if (!self->columns || !self->ops || !self->exprs) {
+        set_error(Error, "could not create TDBQuery, memory issue?");
+        Py_DECREF(self);
+        return NULL;
+    }
+    self->max = -1;
     return self;
 }
 
 
+/* record an executed query if the profiler of its TDB is enabled */
+static void
+TDBQuery_profile(TDBQuery *self, double start, int returned)
+{
+    if (self->tdb->profile) {
+        profile_query(self->tdb, self->columns,
+                      (const int *)tcxstrptr(self->ops), self->order,
+                      self->order_type, tctdbqryhint(self->qry),
+                      tctime() - start, returned);
+    }
+}
+
+
+/* record a search answered by the query cache if the profiler of its TDB is
+   enabled */
+static void
+TDBQuery_profile_cached(TDBQuery *self, double start, int returned)
+{
+    if (self->tdb->profile) {
+        profile_query(self->tdb, self->columns,
+                      (const int *)tcxstrptr(self->ops), self->order,
+                      self->order_type, NULL, tctime() - start, returned);
+    }
+}
+
+
+/* return the query cache key of a query, NULL if the query cache of its TDB is
+   disabled */
+static TCXSTR *
+TDBQuery_cache_key(TDBQuery *self)
+{
+    TCXSTR *key;
+
+    if (!self->tdb->query_cache) {
+        return NULL;
+    }
+    key = tcxstrnew();
+    query_cache_key(key, self->columns, (const int *)tcxstrptr(self->ops),
+                    self->exprs, self->order, self->order_type, self->max,
+                    self->skip);
+    return key;
+}
+
+
 /* TDBQueryType.tp_traverse */
 static int
 TDBQuery_tp_traverse(TDBQuery *self, visitproc visit, void *arg)
@@ -152,29 +1363,203 @@ TDBQuery_tp_dealloc(TDBQuery *self)
     if (self->qry) {
         tctdbqrydel(self->qry);
     }
-    TDBQuery_tp_clear(self);
-    Py_TYPE(self)->tp_free((PyObject *)self);
+    if (self->columns) {
+        tclistdel(self->columns);
+    }
+    if (self->ops) {
+        tcxstrdel(self->ops);
+    }
+    if (self->exprs) {
+        tclistdel(self->exprs);
+    }
+    tcfree(self->order);
+    TDBQuery_tp_clear(self);
+    Py_TYPE(self)->tp_free((PyObject *)self);
+}
+
+
+/* TDBQuery.search() */
+PyDoc_STRVAR(TDBQuery_search_doc,
+"search()\n\
+\n\
+Execute the query.");
+
+static PyObject *
+TDBQuery_search(TDBQuery *self)
+{
+    TCLIST *result = NULL;
+    TCXSTR *key;
+    PyObject *pyresult;
+    unsigned long long version = self->tdb->version;
+    double start = tctime();
+
+    key = TDBQuery_cache_key(self);
+    if (key) {
+        result = query_cache_get(self->tdb, key);
+    }
+    if (!result) {
+        Py_BEGIN_ALLOW_THREADS
+        result = tctdbqrysearch(self->qry);
+        Py_END_ALLOW_THREADS
+        TDBQuery_profile(self, start, tclistnum(result));
+        if (key) {
+            query_cache_put(self->tdb, key, result, version);
+        }
+    }
+    else {
+        TDBQuery_profile_cached(self, start, tclistnum(result));
+    }
+    if (key) {
+        tcxstrdel(key);
+    }
+    pyresult = tclist_to_tuple(result);
+    tclistdel(result);
+    return pyresult;
+}
+
+
+/* keep only the given columns of a record, the record is freed */
+static TCMAP *
+tcmap_project(TCMAP *record, TCLIST *columns)
+{
+    TCMAP *projection;
+    const void *column, *value;
+    int column_size, value_size, i;
+
+    projection = tcmapnew2(tclistnum(columns) + 1);
+    for (i = 0; i < tclistnum(columns); i++) {
+        column = tclistval(columns, i, &column_size);
+        value = tcmapget(record, column, column_size, &value_size);
+        if (value) {
+            tcmapput(projection, column, column_size, value, value_size);
+        }
+    }
+    tcmapdel(record);
+    return projection;
+}
+
+
+/* TDBQuery.searchitems([columns=None]) -> tuple */
+PyDoc_STRVAR(TDBQuery_searchitems_doc,
+"searchitems([columns=None]) -> tuple\n\
+\n\
+Execute the query and return a tuple of (key, value) pairs. If columns is not\n\
+None, only these columns are included in the values.");
+
+static PyObject *
+TDBQuery_searchitems(TDBQuery *self, PyObject *args, PyObject *kwargs)
+{
+    PyObject *pycolumns = Py_None, *pyresult = NULL;
+    PyObject *pykey, *pyvalue, *pyitem;
+    TCLIST *columns = NULL, *result;
+    TCMAP **values;
+    const void *key;
+    int key_size, len, count = 0, i;
+    double start = tctime();
+
+    static char *kwlist[] = {"columns", NULL};
+
+    if (!PyArg_ParseTupleAndKeywords(args, kwargs, "|O:searchitems", kwlist,
+                                     &pycolumns)) {
+        return NULL;
+    }
+    if (pycolumns != Py_None) {
+        columns = seq_to_tclist(pycolumns);
+        if (!columns) {
+            return NULL;
+        }
+    }
+    Py_BEGIN_ALLOW_THREADS
+    result = tctdbqrysearch(self->qry);
+    Py_END_ALLOW_THREADS
+    len = tclistnum(result);
+    TDBQuery_profile(self, start, len);
+    values = PyMem_New(TCMAP *, len);
+    if (!values) {
+        PyErr_NoMemory();
+        goto finish;
+    }
+    Py_BEGIN_ALLOW_THREADS
+    for (i = 0; i < len; i++) {
+        key = tclistval(result, i, &key_size);
+        values[i] = tctdbget(self->tdb->tdb, key, key_size);
+        if (values[i]) {
+            if (columns) {
+                values[i] = tcmap_project(values[i], columns);
+            }
+            count++;
+        }
+        else if (tctdbecode(self->tdb->tdb) != TCENOREC) {
+            break;
+        }
+    }
+    Py_END_ALLOW_THREADS
+    if (i < len) {
+        set_tdb_error(self->tdb->tdb, NULL);
+        len = i;
+    }
+    else {
+        /* records removed since the query was executed are skipped */
+        pyresult = PyTuple_New((Py_ssize_t)count);
+    }
+    for (i = 0, count = 0; i < len; i++) {
+        if (!values[i]) {
+            continue;
+        }
+        if (pyresult) {
+            key = tclistval(result, i, &key_size);
+            pykey = void_to_bytes(key, key_size);
+            pyvalue = tcmap_to_dict(values[i]);
+            pyitem = NULL;
+            if (pykey && pyvalue) {
+                pyitem = PyTuple_Pack(2, pykey, pyvalue);
+            }
+            Py_XDECREF(pykey);
+            Py_XDECREF(pyvalue);
+            if (pyitem) {
+                PyTuple_SET_ITEM(pyresult, (Py_ssize_t)count++, pyitem);
+            }
+            else {
+                Py_CLEAR(pyresult);
+            }
+        }
+        tcmapdel(values[i]);
+    }
+    PyMem_Free(values);
+finish:
+    tclistdel(result);
+    if (columns) {
+        tclistdel(columns);
+    }
+    return pyresult;
 }
 
 
-/* TDBQuery.search() */
-PyDoc_STRVAR(TDBQuery_search_doc,
-"search()\n\
+/* TDBQuery.iter([values=False]) */
+PyDoc_STRVAR(TDBQuery_iter_doc,
+"iter([values=False])\n\
 \n\
-Execute the query.");
+Execute the query and return an iterator over the primary keys found, keys are\n\
+converted one at a time as the iterator is consumed. If values is True, the\n\
+iterator yields (key, value) tuples, each record being read from the database\n\
+when it is reached (records removed in the meantime are skipped).");
 
 static PyObject *
-TDBQuery_search(TDBQuery *self)
+TDBQuery_iter(TDBQuery *self, PyObject *args, PyObject *kwargs)
 {
     TCLIST *result;
-    PyObject *pyresult;
+    bool values;
+    double start = tctime();
 
+    if (parse_query_iter_values(args, kwargs, "|O:iter", &values)) {
+        return NULL;
+    }
     Py_BEGIN_ALLOW_THREADS
     result = tctdbqrysearch(self->qry);
     Py_END_ALLOW_THREADS
-    pyresult = tclist_to_tuple(result);
-    tclistdel(result);
-    return pyresult;
+    TDBQuery_profile(self, start, tclistnum(result));
+    return new_QueryIter(&TDBQueryIterType, (PyObject *)self->tdb, result,
+                         values);
 }
 
 
@@ -188,13 +1573,16 @@ static PyObject *
 TDBQuery_remove(TDBQuery *self)
 {
     bool result;
+    double start = tctime();
 
     Py_BEGIN_ALLOW_THREADS
     result = tctdbqrysearchout(self->qry);
     Py_END_ALLOW_THREADS
+    self->tdb->version++;
     if (!result) {
         return set_tdb_error(self->tdb->tdb, NULL);
     }
+    TDBQuery_profile(self, start, tctdbqrycount(self->qry));
     Py_RETURN_NONE;
 }
 
@@ -210,6 +1598,7 @@ TDBQuery_process(TDBQuery *self, PyObject *args)
 {
     PyObject *callback;
     bool result;
+    double start = tctime();
 
     if (!PyArg_ParseTuple(args, "O:process", &callback)) {
         return NULL;
@@ -218,16 +1607,221 @@ TDBQuery_process(TDBQuery *self, PyObject *args)
         return set_error(PyExc_TypeError, "a callable is required");
     }
     result = tctdbqryproc(self->qry, TDBQuery_process_cb, (void *)callback);
+    self->tdb->version++;
     if (!result) {
         return set_tdb_error(self->tdb->tdb, NULL);
     }
     if (PyErr_Occurred()) {
         return NULL;
     }
+    TDBQuery_profile(self, start, tctdbqrycount(self->qry));
     Py_RETURN_NONE;
 }
 
 
+/* TDBQuery.update([set=None[, incr=None[, unset=None]]]) -> int */
+PyDoc_STRVAR(TDBQuery_update_doc,
+"update([set=None[, incr=None[, unset=None]]]) -> int\n\
+\n\
+Update the records corresponding to the query, without calling into Python\n\
+for each record. set is a dict of columns to store, incr a dict of numbers to\n\
+add to columns and unset a sequence of columns to remove, they are applied in\n\
+this order. An int added to a column which does not hold an int is added as a\n\
+float. Return the number of records updated.");
+
+static PyObject *
+TDBQuery_update(TDBQuery *self, PyObject *args, PyObject *kwargs)
+{
+    PyObject *pyset = Py_None, *pyincr = Py_None, *pyunset = Py_None;
+    PyObject *pyresult = NULL;
+    TDBQueryUpdate update = {NULL, NULL, NULL, 0};
+    bool result;
+    double start = tctime();
+
+    static char *kwlist[] = {"set", "incr", "unset", NULL};
+
+    if (!PyArg_ParseTupleAndKeywords(args, kwargs, "|OOO:update", kwlist,
+                                     &pyset, &pyincr, &pyunset)) {
+        return NULL;
+    }
+    update.set = (pyset == Py_None) ? tcmapnew() : dict_to_tcmap(pyset);
+    if (!update.set) {
+        goto finish;
+    }
+    update.incr = (pyincr == Py_None) ? tcmapnew() : dict_to_incr_tcmap(pyincr);
+    if (!update.incr) {
+        goto finish;
+    }
+    update.unset = (pyunset == Py_None) ? tclistnew() : seq_to_tclist(pyunset);
+    if (!update.unset) {
+        goto finish;
+    }
+    Py_BEGIN_ALLOW_THREADS
+    result = tctdbqryproc(self->qry, TDBQuery_update_cb, (void *)&update);
+    Py_END_ALLOW_THREADS
+    self->tdb->version++;
+    if (!result) {
+        set_tdb_error(self->tdb->tdb, NULL);
+    }
+    else {
+        TDBQuery_profile(self, start, update.count);
+        pyresult = PyInt_FromLong((long)update.count);
+    }
+
+finish:
+    if (update.set) {
+        tcmapdel(update.set);
+    }
+    if (update.incr) {
+        tcmapdel(update.incr);
+    }
+    if (update.unset) {
+        tclistdel(update.unset);
+    }
+    return pyresult;
+}
+
+
+/* TDBQuery.aggregate([group_by=None[, count=True[, sum=None[, min=None[, max=None[, avg=None]]]]]]) -> dict */
+PyDoc_STRVAR(TDBQuery_aggregate_doc,
+"aggregate([group_by=None[, count=True[, sum=None[, min=None[, max=None[, avg=None]]]]]]) -> dict\n\
+\n\
+Compute the number of records corresponding to the query and the sum, minimum,\n\
+maximum and average of the numeric columns listed in sum, min, max and avg.\n\
+If group_by is not None, return a dict of these results keyed by the values of\n\
+the group_by column.");
+
+static PyObject *
+TDBQuery_aggregate(TDBQuery *self, PyObject *args, PyObject *kwargs)
+{
+    PyObject *pygroup_by = Py_None, *pycount = Py_True, *pyresult = NULL;
+    PyObject *pylists[4] = {Py_None, Py_None, Py_None, Py_None};
+    TCLIST *lists[4] = {NULL, NULL, NULL, NULL};
+    TCLIST *columns = NULL, *group_by = NULL, *result = NULL;
+    TCMAP *indices = NULL, *groups = NULL, *record;
+    TCXSTR *group = NULL;
+    TDBAggStat *stats = NULL;
+    const void *key, *column, *group_by_column = NULL, *group_stats;
+    int key_size, column_size, group_by_size = 0, group_stats_size, index, len;
+    int i, j;
+    double start = tctime();
+
+    static char *kwlist[] = {"group_by", "count", "sum", "min", "max", "avg",
+                             NULL};
+
+    if (!PyArg_ParseTupleAndKeywords(args, kwargs, "|OOOOOO:aggregate", kwlist,
+                                     &pygroup_by, &pycount, &pylists[0],
+                                     &pylists[1], &pylists[2], &pylists[3])) {
+        return NULL;
+    }
+    if (!PyBool_Check(pycount)) {
+        return set_error(PyExc_TypeError, "a boolean is required");
+    }
+    columns = tclistnew();
+    indices = tcmapnew();
+    groups = tcmapnew();
+    group = tcxstrnew();
+    if (!columns || !indices || !groups || !group) {
+        set_error(Error, "could not create TCLIST/TCMAP, memory issue?");
+        goto finish;
+    }
+    if (pygroup_by != Py_None) {
+        group_by = tclistnew();
+        if (!group_by || tclist_push_bytes(group_by, pygroup_by)) {
+            goto finish;
+        }
+        group_by_column = tclistval(group_by, 0, &group_by_size);
+    }
+    /* columns lists the distinct columns to aggregate, indices maps them to
+       their index in the stats array */
+    for (i = 0; i < 4; i++) {
+        lists[i] = (pylists[i] == Py_None) ? tclistnew()
+                                          : seq_to_tclist(pylists[i]);
+        if (!lists[i]) {
+            goto finish;
+        }
+        for (j = 0; j < tclistnum(lists[i]); j++) {
+            column = tclistval(lists[i], j, &column_size);
+            index = tclistnum(columns) + 1;
+            if (tcmapputkeep(indices, column, column_size, &index,
+                             sizeof(int))) {
+                tclistpush(columns, column, column_size);
+            }
+        }
+    }
+    stats = PyMem_New(TDBAggStat, tclistnum(columns) + 1);
+    if (!stats) {
+        PyErr_NoMemory();
+        goto finish;
+    }
+    /* read the records with tctdbget() rather than tctdbqryproc() that
+       requires a database opened as a writer */
+    Py_BEGIN_ALLOW_THREADS
+    result = tctdbqrysearch(self->qry);
+    len = tclistnum(result);
+    for (i = 0; i < len; i++) {
+        key = tclistval(result, i, &key_size);
+        record = tctdbget(self->tdb->tdb, key, key_size);
+        if (record) {
+            aggregate_record(groups, record, group_by_column, group_by_size,
+                             columns, stats, group);
+            tcmapdel(record);
+        }
+        else if (tctdbecode(self->tdb->tdb) != TCENOREC) {
+            break;
+        }
+    }
+    Py_END_ALLOW_THREADS
+    if (i < len) {
+        set_tdb_error(self->tdb->tdb, NULL);
+        goto finish;
+    }
+    TDBQuery_profile(self, start, len);
+    if (group_by) {
+        pyresult = groups_to_dict(groups, (pycount == Py_True), lists,
+                                  indices);
+    }
+    else {
+        group_stats = tcmapget(groups, "\0", 1, &group_stats_size);
+        if (group_stats) {
+            memcpy(stats, group_stats, group_stats_size);
+        }
+        else {
+            memset(stats, 0, sizeof(TDBAggStat) * (tclistnum(columns) + 1));
+        }
+        pyresult = aggregate_to_dict(stats, (pycount == Py_True), lists,
+                                     indices);
+    }
+
+finish:
+    PyMem_Free(stats);
+    if (result) {
+        tclistdel(result);
+    }
+    for (i = 0; i < 4; i++) {
+        if (lists[i]) {
+            tclistdel(lists[i]);
+        }
+    }
+    if (group_by) {
+        tclistdel(group_by);
+    }
+    if (group) {
+        tcxstrdel(group);
+    }
+    if (groups) {
+        tcmapdel(groups);
+    }
+    if (indices) {
+        tcmapdel(indices);
+    }
+    if (columns) {
+        tclistdel(columns);
+    }
+    return pyresult;
+}
+
+
 /* TDBQuery.sort(column, type) */
 PyDoc_STRVAR(TDBQuery_sort_doc,
 "sort(column, type)\n\
@@ -249,6 +1843,9 @@ TDBQuery_sort(TDBQuery *self, PyObject *args)
         return NULL;
     }
     tctdbqrysetorder(self->qry, column, type);
+    tcfree(self->order);
+    self->order = tcmemdup(column, strlen(column));
+    self->order_type = type;
     Py_RETURN_NONE;
 }
 
@@ -268,6 +1865,8 @@ TDBQuery_limit(TDBQuery *self, PyObject *args)
         return NULL;
     }
     tctdbqrysetlimit(self->qry, max, skip);
+    self->max = max;
+    self->skip = skip;
     Py_RETURN_NONE;
 }
 
@@ -293,6 +1892,9 @@ TDBQuery_filter(TDBQuery *self, PyObject *args)
         return NULL;
     }
     tctdbqryaddcond(self->qry, column, condition, expr);
+    tclistpush2(self->columns, column);
+    tcxstrcat(self->ops, &condition, sizeof(int));
+    tclistpush2(self->exprs, expr);
     Py_RETURN_NONE;
 }
 
@@ -311,9 +1913,17 @@ TDBQuery_count(TDBQuery *self)
 /* TDBQueryType.tp_methods */
 static PyMethodDef TDBQuery_tp_methods[] = {
     {"search", (PyCFunction)TDBQuery_search, METH_NOARGS, TDBQuery_search_doc},
+    {"searchitems", (PyCFunction)TDBQuery_searchitems,
+     METH_VARARGS | METH_KEYWORDS, TDBQuery_searchitems_doc},
+    {"iter", (PyCFunction)TDBQuery_iter, METH_VARARGS | METH_KEYWORDS,
+     TDBQuery_iter_doc},
     {"remove", (PyCFunction)TDBQuery_remove, METH_NOARGS, TDBQuery_remove_doc},
     {"process", (PyCFunction)TDBQuery_process, METH_VARARGS,
      TDBQuery_process_doc},
+    {"update", (PyCFunction)TDBQuery_update, METH_VARARGS | METH_KEYWORDS,
+     TDBQuery_update_doc},
+    {"aggregate", (PyCFunction)TDBQuery_aggregate,
+     METH_VARARGS | METH_KEYWORDS, TDBQuery_aggregate_doc},
     {"sort", (PyCFunction)TDBQuery_sort, METH_VARARGS, TDBQuery_sort_doc},
     {"limit", (PyCFunction)TDBQuery_limit, METH_VARARGS, TDBQuery_limit_doc},
     {"filter", (PyCFunction)TDBQuery_filter, METH_VARARGS, TDBQuery_filter_doc},
@@ -326,27 +1936,363 @@ static PyMethodDef TDBQuery_tp_methods[] = {
 PyDoc_STRVAR(TDBQuery_hint_doc,
 "TODO.");
 
-static PyObject *
-TDBQuery_hint_get(TDBQuery *self, void *closure)
-{
-    return PyString_FromString(tctdbqryhint(self->qry));
+static PyObject *
+TDBQuery_hint_get(TDBQuery *self, void *closure)
+{
+    return PyString_FromString(tctdbqryhint(self->qry));
+}
+
+
+/* TDBQueryType.tp_getsets */
+static PyGetSetDef TDBQuery_tp_getsets[] = {
+    {"hint", (getter)TDBQuery_hint_get, NULL, TDBQuery_hint_doc, NULL},
+    {NULL}  /* Sentinel */
+};
+
+
+/* TDBQueryType */
+static PyTypeObject TDBQueryType = {
+    PyVarObject_HEAD_INIT(NULL, 0)
+    "tokyo.cabinet.TDBQuery",                 /*tp_name*/
+    sizeof(TDBQuery),                         /*tp_basicsize*/
+    0,                                        /*tp_itemsize*/
+    (destructor)TDBQuery_tp_dealloc,          /*tp_dealloc*/
+    0,                                        /*tp_print*/
+    0,                                        /*tp_getattr*/
+    0,                                        /*tp_setattr*/
+    0,                                        /*tp_compare*/
+    0,                                        /*tp_repr*/
+    0,                                        /*tp_as_number*/
+    0,                                        /*tp_as_sequence*/
+    0,                                        /*tp_as_mapping*/
+    0,                                        /*tp_hash */
+    0,                                        /*tp_call*/
+    0,                                        /*tp_str*/
+    0,                                        /*tp_getattro*/
+    0,                                        /*tp_setattro*/
+    0,                                        /*tp_as_buffer*/
+    Py_TPFLAGS_DEFAULT | Py_TPFLAGS_HAVE_GC,  /*tp_flags*/
+    0,                                        /*tp_doc*/
+    (traverseproc)TDBQuery_tp_traverse,       /*tp_traverse*/
+    (inquiry)TDBQuery_tp_clear,               /*tp_clear*/
+    0,                                        /*tp_richcompare*/
+    0,                                        /*tp_weaklistoffset*/
+    0,                                        /*tp_iter*/
+    0,                                        /*tp_iternext*/
+    TDBQuery_tp_methods,                      /*tp_methods*/
+    0,                                        /*tp_members*/
+    TDBQuery_tp_getsets,                      /*tp_getsets*/
+};
+
+
+/*******************************************************************************
+* TDBQueryTemplateType
+*******************************************************************************/
+
+/* is pyexpr the "?" placeholder */
+static bool
+is_query_placeholder(PyObject *pyexpr)
+{
+#if PY_MAJOR_VERSION >= 3
+    if (PyUnicode_Check(pyexpr)) {
+        return (PyUnicode_CompareWithASCIIString(pyexpr, "?") == 0);
+    }
+#endif
+    return (PyBytes_Check(pyexpr) && PyBytes_GET_SIZE(pyexpr) == 1 &&
+            PyBytes_AS_STRING(pyexpr)[0] == '?');
+}
+
+
+/* add a (column, condition, expr) triple to a template */
+static int
+TDBQueryTemplate_add_condition(TDBQueryTemplate *self, PyObject *pycondition,
+                               int i)
+{
+    const char *msg = "conditions must be (column, condition, expr) triples";
+    PyObject *pyseq, *pyexpr;
+    long condition;
+
+    pyseq = PySequence_Fast(pycondition, msg);
+    if (!pyseq) {
+        return -1;
+    }
+    if (PySequence_Fast_GET_SIZE(pyseq) != 3) {
+        Py_DECREF(pyseq);
+        set_error(PyExc_ValueError, msg);
+        return -1;
+    }
+    if (tclist_push_bytes(self->columns, PySequence_Fast_GET_ITEM(pyseq, 0))) {
+        Py_DECREF(pyseq);
+        return -1;
+    }
+    condition = PyLong_AsLong(PySequence_Fast_GET_ITEM(pyseq, 1));
+    if (condition == -1 && PyErr_Occurred()) {
+        Py_DECREF(pyseq);
+        return -1;
+    }
+    self->conditions[i] = (int)condition;
+    pyexpr = PySequence_Fast_GET_ITEM(pyseq, 2);
+    if (is_query_placeholder(pyexpr)) {
+        self->params[i] = self->nparams++;
+        tclistpush(self->exprs, "", 0);
+    }
+    else {
+        self->params[i] = -1;
+        if (tclist_push_bytes(self->exprs, pyexpr)) {
+            Py_DECREF(pyseq);
+            return -1;
+        }
+    }
+    Py_DECREF(pyseq);
+    return 0;
+}
+
+
+/* set the (column, type) sort order of a template */
+static int
+TDBQueryTemplate_set_sort(TDBQueryTemplate *self, PyObject *pysort)
+{
+    const char *msg = "sort must be a (column, type) pair";
+    PyObject *pyseq;
+    TCLIST *column;
+    const void *sort_column;
+    int sort_column_size;
+    long sort_type;
+
+    pyseq = PySequence_Fast(pysort, msg);
+    if (!pyseq) {
+        return -1;
+    }
+    if (PySequence_Fast_GET_SIZE(pyseq) != 2) {
+        Py_DECREF(pyseq);
+        set_error(PyExc_ValueError, msg);
+        return -1;
+    }
+    sort_type = PyLong_AsLong(PySequence_Fast_GET_ITEM(pyseq, 1));
+    if (sort_type == -1 && PyErr_Occurred()) {
+        Py_DECREF(pyseq);
+        return -1;
+    }
+    column = tclistnew2(1);
+    if (tclist_push_bytes(column, PySequence_Fast_GET_ITEM(pyseq, 0))) {
+        tclistdel(column);
+        Py_DECREF(pyseq);
+        return -1;
+    }
+    sort_column = tclistval(column, 0, &sort_column_size);
+    self->sort_column = tcmemdup(sort_column, sort_column_size);
+    self->sort_type = (int)sort_type;
+    tclistdel(column);
+    Py_DECREF(pyseq);
+    return 0;
+}
+
+
+/* new_TDBQueryTemplate */
+TDBQueryTemplate *
+new_TDBQueryTemplate(PyTypeObject *type, TDB *tdb, PyObject *pyconditions,
+                     PyObject *pysort, int max, int skip)
+{
+    PyObject *pyseq;
+    Py_ssize_t len, i;
+
+    TDBQueryTemplate *self = (TDBQueryTemplate *)type->tp_alloc(type, 0);
+    if (!self) {
+        return NULL;
+    }
+    /* self->tdb */
+    Py_INCREF(tdb);
+    self->tdb = tdb;
+    self->max = max;
+    self->skip = skip;
+    /* self->columns, self->exprs, self->conditions, self->params */
+    pyseq = PySequence_Fast(pyconditions, "a sequence is required");
+    if (!pyseq) {
+        goto fail;
+    }
+    len = PySequence_Fast_GET_SIZE(pyseq);
+    if (check_py_ssize_t_len(len, pyseq)) {
+        Py_DECREF(pyseq);
+        goto fail;
+    }
+    self->columns = tclistnew2((int)len);
+    self->exprs = tclistnew2((int)len);
+    self->conditions = PyMem_New(int, len);
+    self->params = PyMem_New(int, len);
+    if (!self->columns || !self->exprs || !self->conditions || !self->params) {
+        Py_DECREF(pyseq);
+        PyErr_NoMemory();
+        goto fail;
+    }
+    for (i = 0; i < len; i++) {
+        if (TDBQueryTemplate_add_condition(self,
+                                           PySequence_Fast_GET_ITEM(pyseq, i),
+                                           (int)i)) {
+            Py_DECREF(pyseq);
+            goto fail;
+        }
+    }
+    Py_DECREF(pyseq);
+    /* self->sort_column, self->sort_type */
+    if (pysort != Py_None && TDBQueryTemplate_set_sort(self, pysort)) {
+        goto fail;
+    }
+    return self;
+
+fail:
+    Py_DECREF(self);
+    return NULL;
+}
+
+
+/* TDBQueryTemplateType.tp_traverse */
+static int
+TDBQueryTemplate_tp_traverse(TDBQueryTemplate *self, visitproc visit,
+                             void *arg)
+{
+    Py_VISIT(self->tdb);
+    return 0;
+}
+
+
+/* TDBQueryTemplateType.tp_clear */
+static int
+TDBQueryTemplate_tp_clear(TDBQueryTemplate *self)
+{
+    Py_CLEAR(self->tdb);
+    return 0;
+}
+
+
+/* TDBQueryTemplateType.tp_dealloc */
+static void
+TDBQueryTemplate_tp_dealloc(TDBQueryTemplate *self)
+{
+    if (self->columns) {
+        tclistdel(self->columns);
+    }
+    if (self->exprs) {
+        tclistdel(self->exprs);
+    }
+    PyMem_Free(self->conditions);
+    PyMem_Free(self->params);
+    tcfree(self->sort_column);
+    TDBQueryTemplate_tp_clear(self);
+    Py_TYPE(self)->tp_free((PyObject *)self);
+}
+
+
+/* TDBQueryTemplate.search([params]) -> tuple */
+PyDoc_STRVAR(TDBQueryTemplate_search_doc,
+"search([params]) -> tuple\n\
+\n\
+Bind params to the placeholders of the template, execute the query and return\n\
+the result set as a tuple of keys.");
+
+static PyObject *
+TDBQueryTemplate_search(TDBQueryTemplate *self, PyObject *args)
+{
+    PyObject *pyparams = NULL, *pyresult = NULL;
+    TCLIST *params, *exprs, *result = NULL;
+    TCXSTR *key = NULL;
+    TDBQRY *qry;
+    const void *expr;
+    int expr_size, i;
+    unsigned long long version = self->tdb->version;
+    double start = tctime();
+
+    if (!PyArg_ParseTuple(args, "|O:search", &pyparams)) {
+        return NULL;
+    }
+    params = pyparams ? seq_to_tclist(pyparams) : tclistnew();
+    if (!params) {
+        return NULL;
+    }
+    if (tclistnum(params) != self->nparams) {
+        PyErr_Format(PyExc_ValueError, "%d parameters expected, got %d",
+                     self->nparams, tclistnum(params));
+        tclistdel(params);
+        return NULL;
+    }
+    /* bind the parameters */
+    exprs = tclistnew2(tclistnum(self->columns));
+    for (i = 0; i < tclistnum(self->columns); i++) {
+        if (self->params[i] < 0) {
+            expr = tclistval(self->exprs, i, &expr_size);
+        }
+        else {
+            expr = tclistval(params, self->params[i], &expr_size);
+        }
+        tclistpush(exprs, expr, expr_size);
+    }
+    tclistdel(params);
+    if (self->tdb->query_cache) {
+        key = tcxstrnew();
+        query_cache_key(key, self->columns, self->conditions, exprs,
+                        self->sort_column, self->sort_type, self->max,
+                        self->skip);
+        result = query_cache_get(self->tdb, key);
+    }
+    if (!result) {
+        qry = tctdbqrynew(self->tdb->tdb);
+        if (!qry) {
+            set_error(Error, "could not create TDBQuery, memory issue?");
+            goto finish;
+        }
+        Py_BEGIN_ALLOW_THREADS
+        for (i = 0; i < tclistnum(self->columns); i++) {
+            tctdbqryaddcond(qry, tclistval2(self->columns, i),
+                            self->conditions[i], tclistval2(exprs, i));
+        }
+        if (self->sort_column) {
+            tctdbqrysetorder(qry, self->sort_column, self->sort_type);
+        }
+        tctdbqrysetlimit(qry, self->max, self->skip);
+        result = tctdbqrysearch(qry);
+        Py_END_ALLOW_THREADS
+        if (self->tdb->profile) {
+            profile_query(self->tdb, self->columns, self->conditions,
+                          self->sort_column, self->sort_type,
+                          tctdbqryhint(qry), tctime() - start,
+                          tclistnum(result));
+        }
+        tctdbqrydel(qry);
+        if (key) {
+            query_cache_put(self->tdb, key, result, version);
+        }
+    }
+    else if (self->tdb->profile) {
+        profile_query(self->tdb, self->columns, self->conditions,
+                      self->sort_column, self->sort_type, NULL,
+                      tctime() - start, tclistnum(result));
+    }
+    pyresult = tclist_to_tuple(result);
+    tclistdel(result);
+
+finish:
+    if (key) {
+        tcxstrdel(key);
+    }
+    tclistdel(exprs);
+    return pyresult;
 }
 
 
-/* TDBQueryType.tp_getsets */
-static PyGetSetDef TDBQuery_tp_getsets[] = {
-    {"hint", (getter)TDBQuery_hint_get, NULL, TDBQuery_hint_doc, NULL},
+/* TDBQueryTemplateType.tp_methods */
+static PyMethodDef TDBQueryTemplate_tp_methods[] = {
+    {"search", (PyCFunction)TDBQueryTemplate_search, METH_VARARGS,
+     TDBQueryTemplate_search_doc},
     {NULL}  /* Sentinel */
 };
 
 
-/* TDBQueryType */
-static PyTypeObject TDBQueryType = {
+/* TDBQueryTemplateType */
+static PyTypeObject TDBQueryTemplateType = {
     PyVarObject_HEAD_INIT(NULL, 0)
-    "tokyo.cabinet.TDBQuery",                 /*tp_name*/
-    sizeof(TDBQuery),                         /*tp_basicsize*/
+    "tokyo.cabinet.TDBQueryTemplate",         /*tp_name*/
+    sizeof(TDBQueryTemplate),                 /*tp_basicsize*/
     0,                                        /*tp_itemsize*/
-    (destructor)TDBQuery_tp_dealloc,          /*tp_dealloc*/
+    (destructor)TDBQueryTemplate_tp_dealloc,  /*tp_dealloc*/
     0,                                        /*tp_print*/
     0,                                        /*tp_getattr*/
     0,                                        /*tp_setattr*/
@@ -363,15 +2309,13 @@ static PyTypeObject TDBQueryType = {
     0,                                        /*tp_as_buffer*/
     Py_TPFLAGS_DEFAULT | Py_TPFLAGS_HAVE_GC,  /*tp_flags*/
     0,                                        /*tp_doc*/
-    (traverseproc)TDBQuery_tp_traverse,       /*tp_traverse*/
-    (inquiry)TDBQuery_tp_clear,               /*tp_clear*/
+    (traverseproc)TDBQueryTemplate_tp_traverse, /*tp_traverse*/
+    (inquiry)TDBQueryTemplate_tp_clear,       /*tp_clear*/
     0,                                        /*tp_richcompare*/
     0,                                        /*tp_weaklistoffset*/
     0,                                        /*tp_iter*/
     0,                                        /*tp_iternext*/
-    TDBQuery_tp_methods,                      /*tp_methods*/
-    0,                                        /*tp_members*/
-    TDBQuery_tp_getsets,                      /*tp_getsets*/
+    TDBQueryTemplate_tp_methods,              /*tp_methods*/
 };
 
 
@@ -383,11 +2327,15 @@ static PyTypeObject TDBQueryType = {
 static PyObject *
 new_TDBIter(TDB *self, PyTypeObject *type)
 {
+    bool result;
     PyObject *iter = DBIter_tp_new(type, (PyObject *)self);
     if (!iter) {
         return NULL;
     }
-    if (!tctdbiterinit(self->tdb)) {
+    Py_BEGIN_ALLOW_THREADS
+    result = tctdbiterinit(self->tdb);
+    Py_END_ALLOW_THREADS
+    if (!result) {
         Py_DECREF(iter);
         return set_tdb_error(self->tdb, NULL);
     }
@@ -408,7 +2356,9 @@ TDBIterKeys_tp_iternext(DBIter *self)
     if (tdb->changed) {
         return set_error(Error, "TDB changed during iteration");
     }
+    Py_BEGIN_ALLOW_THREADS
     key = tctdbiternext(tdb->tdb, &key_size);
+    Py_END_ALLOW_THREADS
     if (!key) {
         if (tctdbecode(tdb->tdb) == TCENOREC) {
             return set_stopiteration_error();
@@ -459,22 +2409,24 @@ static PyObject *
 TDBIterValues_tp_iternext(DBIter *self)
 {
     TDB *tdb = (TDB *)self->db;
+    TCXSTR *key, *buffer;
     TCMAP *value;
-    PyObject *pyvalue;
 
     if (tdb->changed) {
         return set_error(Error, "TDB changed during iteration");
     }
-    value = pytctdbiternext3(tdb->tdb);
+    DBIter_borrow_buffers(self, &key, &buffer);
+    Py_BEGIN_ALLOW_THREADS
+    value = pytctdbiternext3(tdb->tdb, key, buffer);
+    Py_END_ALLOW_THREADS
+    DBIter_return_buffers(self, key, buffer);
     if (!value) {
         if (tctdbecode(tdb->tdb) == TCENOREC) {
             return set_stopiteration_error();
         }
         return set_tdb_error(tdb->tdb, NULL);
     }
-    pyvalue = tcmap_to_dict(value);
-    tcmapdel(value);
-    return pyvalue;
+    return tcmap_to_record(value, self->view);
 }
 
 
@@ -516,15 +2468,17 @@ static PyObject *
 TDBIterItems_tp_iternext(DBIter *self)
 {
     TDB *tdb = (TDB *)self->db;
-    TCXSTR *key;
+    TCXSTR *key, *buffer;
     TCMAP *value;
     PyObject *pykey, *pyvalue, *pyresult = NULL;
 
     if (tdb->changed) {
         return set_error(Error, "TDB changed during iteration");
     }
-    key = tcxstrnew();
-    value = pytctdbiternext4(tdb->tdb, key);
+    DBIter_borrow_buffers(self, &key, &buffer);
+    Py_BEGIN_ALLOW_THREADS
+    value = pytctdbiternext3(tdb->tdb, key, buffer);
+    Py_END_ALLOW_THREADS
     if (!value) {
         if (tctdbecode(tdb->tdb) == TCENOREC) {
             set_stopiteration_error();
@@ -535,15 +2489,14 @@ TDBIterItems_tp_iternext(DBIter *self)
     }
     else {
         pykey = tcxstr_to_bytes(key);
-        pyvalue = tcmap_to_dict(value);
+        pyvalue = tcmap_to_record(value, self->view);
         if (pykey && pyvalue) {
             pyresult = PyTuple_Pack(2, pykey, pyvalue);
         }
-        tcmapdel(value);
         Py_XDECREF(pykey);
         Py_XDECREF(pyvalue);
     }
-    tcxstrdel(key);
+    DBIter_return_buffers(self, key, buffer);
     return pyresult;
 }
 
@@ -586,6 +2539,7 @@ static PyObject *
 TDBIterValuesKeys_tp_iternext(DBIter *self)
 {
     TDB *tdb = (TDB *)self->db;
+    TCXSTR *key, *buffer;
     TCMAP *value;
     TCLIST *valuekeys;
     PyObject *pyvaluekeys;
@@ -593,7 +2547,11 @@ TDBIterValuesKeys_tp_iternext(DBIter *self)
     if (tdb->changed) {
         return set_error(Error, "TDB changed during iteration");
     }
-    value = pytctdbiternext3(tdb->tdb);
+    DBIter_borrow_buffers(self, &key, &buffer);
+    Py_BEGIN_ALLOW_THREADS
+    value = pytctdbiternext3(tdb->tdb, key, buffer);
+    Py_END_ALLOW_THREADS
+    DBIter_return_buffers(self, key, buffer);
     if (!value) {
         if (tctdbecode(tdb->tdb) == TCENOREC) {
             return set_stopiteration_error();
@@ -646,6 +2604,7 @@ static PyObject *
 TDBIterValuesVals_tp_iternext(DBIter *self)
 {
     TDB *tdb = (TDB *)self->db;
+    TCXSTR *key, *buffer;
     TCMAP *value;
     TCLIST *valuevals;
     PyObject *pyvaluevals;
@@ -653,7 +2612,11 @@ TDBIterValuesVals_tp_iternext(DBIter *self)
     if (tdb->changed) {
         return set_error(Error, "TDB changed during iteration");
     }
-    value = pytctdbiternext3(tdb->tdb);
+    DBIter_borrow_buffers(self, &key, &buffer);
+    Py_BEGIN_ALLOW_THREADS
+    value = pytctdbiternext3(tdb->tdb, key, buffer);
+    Py_END_ALLOW_THREADS
+    DBIter_return_buffers(self, key, buffer);
     if (!value) {
         if (tctdbecode(tdb->tdb) == TCENOREC) {
             return set_stopiteration_error();
@@ -701,6 +2664,169 @@ static PyTypeObject TDBIterValuesValsType = {
 };
 
 
+/* TDBIterKeysBatchType.tp_iternext */
+static PyObject *
+TDBIterKeysBatch_tp_iternext(DBIter *self)
+{
+    TDB *tdb = (TDB *)self->db;
+    TCLIST *keys;
+    void *key;
+    int key_size, len;
+    PyObject *pykeys = NULL;
+
+    if (tdb->changed) {
+        return set_error(Error, "TDB changed during iteration");
+    }
+    keys = tclistnew2(self->batch);
+    Py_BEGIN_ALLOW_THREADS
+    for (len = 0; len < self->batch; len++) {
+        key = tctdbiternext(tdb->tdb, &key_size);
+        if (!key) {
+            break;
+        }
+        tclistpushmalloc(keys, key, key_size);
+    }
+    Py_END_ALLOW_THREADS
+    if (len < self->batch && tctdbecode(tdb->tdb) != TCENOREC) {
+        set_tdb_error(tdb->tdb, NULL);
+    }
+    else if (!len) {
+        set_stopiteration_error();
+    }
+    else {
+        pykeys = tclist_to_list(keys);
+    }
+    tclistdel(keys);
+    return pykeys;
+}
+
+
+/* TDBIterKeysBatchType */
+static PyTypeObject TDBIterKeysBatchType = {
+    PyVarObject_HEAD_INIT(NULL, 0)
+    "tokyo.cabinet.TDBIterKeysBatch",         /*tp_name*/
+    sizeof(DBIter),                           /*tp_basicsize*/
+    0,                                        /*tp_itemsize*/
+    (destructor)DBIter_tp_dealloc,            /*tp_dealloc*/
+    0,                                        /*tp_print*/
+    0,                                        /*tp_getattr*/
+    0,                                        /*tp_setattr*/
+    0,                                        /*tp_compare*/
+    0,                                        /*tp_repr*/
+    0,                                        /*tp_as_number*/
+    0,                                        /*tp_as_sequence*/
+    0,                                        /*tp_as_mapping*/
+    0,                                        /*tp_hash */
+    0,                                        /*tp_call*/
+    0,                                        /*tp_str*/
+    0,                                        /*tp_getattro*/
+    0,                                        /*tp_setattro*/
+    0,                                        /*tp_as_buffer*/
+    Py_TPFLAGS_DEFAULT | Py_TPFLAGS_HAVE_GC,  /*tp_flags*/
+    0,                                        /*tp_doc*/
+    (traverseproc)DBIter_tp_traverse,         /*tp_traverse*/
+    (inquiry)DBIter_tp_clear,                 /*tp_clear*/
+    0,                                        /*tp_richcompare*/
+    0,                                        /*tp_weaklistoffset*/
+    PyObject_SelfIter,                        /*tp_iter*/
+    (iternextfunc)TDBIterKeysBatch_tp_iternext, /*tp_iternext*/
+    DBIterBatch_tp_methods,                   /*tp_methods*/
+};
+
+
+/* TDBIterItemsBatchType.tp_iternext */
+static PyObject *
+TDBIterItemsBatch_tp_iternext(DBIter *self)
+{
+    TDB *tdb = (TDB *)self->db;
+    TCLIST *keys, *values;
+    TCXSTR *key, *value;
+    TCMAP *map;
+    const void *tmp;
+    int tmp_size, len, i;
+    PyObject *pyitems = NULL, *pykey, *pyvalue, *pyitem;
+
+    if (tdb->changed) {
+        return set_error(Error, "TDB changed during iteration");
+    }
+    keys = tclistnew2(self->batch);
+    values = tclistnew2(self->batch);
+    DBIter_borrow_buffers(self, &key, &value);
+    Py_BEGIN_ALLOW_THREADS
+    for (len = 0; len < self->batch; len++) {
+        if (!tchdbiternext3(tdb->tdb->hdb, key, value)) {
+            break;
+        }
+        tclistpush(keys, tcxstrptr(key), tcxstrsize(key));
+        tclistpush(values, tcxstrptr(value), tcxstrsize(value));
+    }
+    Py_END_ALLOW_THREADS
+    if (len < self->batch && tctdbecode(tdb->tdb) != TCENOREC) {
+        set_tdb_error(tdb->tdb, NULL);
+    }
+    else if (!len) {
+        set_stopiteration_error();
+    }
+    else if ((pyitems = PyList_New((Py_ssize_t)len))) {
+        for (i = 0; i < len; i++) {
+            tmp = tclistval(keys, i, &tmp_size);
+            pykey = void_to_bytes(tmp, tmp_size);
+            tmp = tclistval(values, i, &tmp_size);
+            map = tcmapload(tmp, tmp_size);
+            pyvalue = tcmap_to_record(map, self->view);
+            pyitem = NULL;
+            if (pykey && pyvalue) {
+                pyitem = PyTuple_Pack(2, pykey, pyvalue);
+            }
+            Py_XDECREF(pykey);
+            Py_XDECREF(pyvalue);
+            if (!pyitem) {
+                Py_CLEAR(pyitems);
+                break;
+            }
+            PyList_SET_ITEM(pyitems, (Py_ssize_t)i, pyitem);
+        }
+    }
+    DBIter_return_buffers(self, key, value);
+    tclistdel(keys);
+    tclistdel(values);
+    return pyitems;
+}
+
+
+/* TDBIterItemsBatchType */
+static PyTypeObject TDBIterItemsBatchType = {
+    PyVarObject_HEAD_INIT(NULL, 0)
+    "tokyo.cabinet.TDBIterItemsBatch",        /*tp_name*/
+    sizeof(DBIter),                           /*tp_basicsize*/
+    0,                                        /*tp_itemsize*/
+    (destructor)DBIter_tp_dealloc,            /*tp_dealloc*/
+    0,                                        /*tp_print*/
+    0,                                        /*tp_getattr*/
+    0,                                        /*tp_setattr*/
+    0,                                        /*tp_compare*/
+    0,                                        /*tp_repr*/
+    0,                                        /*tp_as_number*/
+    0,                                        /*tp_as_sequence*/
+    0,                                        /*tp_as_mapping*/
+    0,                                        /*tp_hash */
+    0,                                        /*tp_call*/
+    0,                                        /*tp_str*/
+    0,                                        /*tp_getattro*/
+    0,                                        /*tp_setattro*/
+    0,                                        /*tp_as_buffer*/
+    Py_TPFLAGS_DEFAULT | Py_TPFLAGS_HAVE_GC,  /*tp_flags*/
+    0,                                        /*tp_doc*/
+    (traverseproc)DBIter_tp_traverse,         /*tp_traverse*/
+    (inquiry)DBIter_tp_clear,                 /*tp_clear*/
+    0,                                        /*tp_richcompare*/
+    0,                                        /*tp_weaklistoffset*/
+    PyObject_SelfIter,                        /*tp_iter*/
+    (iternextfunc)TDBIterItemsBatch_tp_iternext, /*tp_iternext*/
+    DBIterBatch_tp_methods,                   /*tp_methods*/
+};
+
+
 /*******************************************************************************
 * TDBType
 *******************************************************************************/
@@ -723,6 +2849,11 @@ TDB_tp_dealloc(TDB *self)
     if (self->tdb) {
         tctdbdel(self->tdb);
     }
+    if (self->profile) {
+        tcmapdel(self->profile);
+        tcmapdel(self->advice);
+    }
+    DBCache_del(self->query_cache);
     Py_TYPE(self)->tp_free((PyObject *)self);
 }
 
@@ -755,14 +2886,18 @@ TDB_tp_new(PyTypeObject *type, PyObject *args, PyObject *kwargs)
 static int
 TDB_Contains(TDB *self, PyObject *pykey)
 {
+    Py_buffer key_view;
     void *key;
     int key_size;
     TCMAP *value;
 
-    if (bytes_to_void(pykey, &key, &key_size)) {
+    if (bytes_to_void(pykey, &key_view, &key, &key_size)) {
         return -1;
     }
+    Py_BEGIN_ALLOW_THREADS
     value = tctdbget(self->tdb, key, key_size);
+    Py_END_ALLOW_THREADS
+    PyBuffer_Release(&key_view);
     if (!value) {
         if (tctdbecode(self->tdb) == TCENOREC) {
             return 0;
@@ -792,29 +2927,48 @@ static PySequenceMethods TDB_tp_as_sequence = {
 static Py_ssize_t
 TDB_Length(TDB *self)
 {
-    return DB_Length(tctdbrnum(self->tdb));
+    uint64_t len;
+
+    /* the GIL must be released around any call taking the lock of the
+       database, the callback of process() holds it while running Python
+       code */
+    Py_BEGIN_ALLOW_THREADS
+    len = tctdbrnum(self->tdb);
+    Py_END_ALLOW_THREADS
+    return DB_Length(len);
 }
 
 
-/* TDB_tp_as_mapping.mp_subscript */
+/* retrieve a record, as a RecordMap if view is true */
 static PyObject *
-TDB_GetItem(TDB *self, PyObject *pykey)
+TDB_Get(TDB *self, PyObject *pykey, bool view)
 {
+    Py_buffer key_view;
     void *key;
     int key_size;
     TCMAP *value;
-    PyObject *pyvalue;
 
-    if (bytes_to_void(pykey, &key, &key_size)) {
+    if (bytes_to_key(pykey, &key_view, &key, &key_size)) {
         return NULL;
     }
+    Py_BEGIN_ALLOW_THREADS
     value = tctdbget(self->tdb, key, key_size);
+    Py_END_ALLOW_THREADS
     if (!value) {
-        return set_tdb_error(self->tdb, key);
+        set_tdb_error(self->tdb, key);
+        PyBuffer_Release(&key_view);
+        return NULL;
     }
-    pyvalue = tcmap_to_dict(value);
-    tcmapdel(value);
-    return pyvalue;
+    PyBuffer_Release(&key_view);
+    return tcmap_to_record(value, view);
+}
+
+
+/* TDB_tp_as_mapping.mp_subscript */
+static PyObject *
+TDB_GetItem(TDB *self, PyObject *pykey)
+{
+    return TDB_Get(self, pykey, false);
 }
 
 
@@ -822,32 +2976,45 @@ TDB_GetItem(TDB *self, PyObject *pykey)
 static int
 TDB_SetItem(TDB *self, PyObject *pykey, PyObject *pyvalue)
 {
+    Py_buffer key_view;
     void *key;
     int key_size;
     TCMAP *value;
+    bool result;
 
-    if (bytes_to_void(pykey, &key, &key_size)) {
+    if (bytes_to_key(pykey, &key_view, &key, &key_size)) {
         return -1;
     }
     if (pyvalue) {
         value = dict_to_tcmap(pyvalue);
         if (!value) {
+            PyBuffer_Release(&key_view);
             return -1;
         }
-        if (!tctdbput(self->tdb, key, key_size, value)) {
+        Py_BEGIN_ALLOW_THREADS
+        result = tctdbput(self->tdb, key, key_size, value);
+        Py_END_ALLOW_THREADS
+        if (!result) {
             tcmapdel(value);
             set_tdb_error(self->tdb, NULL);
+            PyBuffer_Release(&key_view);
             return -1;
         }
         tcmapdel(value);
     }
     else {
-        if (!tctdbout(self->tdb, key, key_size)) {
+        Py_BEGIN_ALLOW_THREADS
+        result = tctdbout(self->tdb, key, key_size);
+        Py_END_ALLOW_THREADS
+        if (!result) {
             set_tdb_error(self->tdb, key);
+            PyBuffer_Release(&key_view);
             return -1;
         }
     }
     self->changed = true;
+    self->version++;
+    PyBuffer_Release(&key_view);
     return 0;
 }
 
@@ -881,11 +3048,16 @@ TDB_open(TDB *self, PyObject *args)
 {
     const char *path;
     int mode;
+    bool result;
 
     if (!PyArg_ParseTuple(args, "si:open", &path, &mode)) {
         return NULL;
     }
-    if (!tctdbopen(self->tdb, path, mode)) {
+    Py_BEGIN_ALLOW_THREADS
+    result = tctdbopen(self->tdb, path, mode);
+    Py_END_ALLOW_THREADS
+    self->version++;
+    if (!result) {
         return set_tdb_error(self->tdb, NULL);
     }
     Py_RETURN_NONE;
@@ -904,7 +3076,13 @@ TDBs are closed when garbage-collected.");
 static PyObject *
 TDB_close(TDB *self)
 {
-    if (!tctdbclose(self->tdb)) {
+    bool result;
+
+    Py_BEGIN_ALLOW_THREADS
+    result = tctdbclose(self->tdb);
+    Py_END_ALLOW_THREADS
+    self->version++;
+    if (!result) {
         return set_tdb_error(self->tdb, NULL);
     }
     Py_RETURN_NONE;
@@ -920,10 +3098,16 @@ Remove all records from the database.");
 static PyObject *
 TDB_clear(TDB *self)
 {
-    if (!tctdbvanish(self->tdb)) {
+    bool result;
+
+    Py_BEGIN_ALLOW_THREADS
+    result = tctdbvanish(self->tdb);
+    Py_END_ALLOW_THREADS
+    if (!result) {
         return set_tdb_error(self->tdb, NULL);
     }
     self->changed = true;
+    self->version++;
     Py_RETURN_NONE;
 }
 
@@ -939,6 +3123,7 @@ static PyObject *
 TDB_copy(TDB *self, PyObject *args)
 {
     const char *path;
+    bool result;
 
     if (!PyArg_ParseTuple(args, "s:copy", &path)) {
         return NULL;
@@ -948,7 +3133,10 @@ TDB_copy(TDB *self, PyObject *args)
         return set_error(PyExc_NotImplementedError,
                          "this feature is not supported");
     }
-    if (!tctdbcopy(self->tdb, path)) {
+    Py_BEGIN_ALLOW_THREADS
+    result = tctdbcopy(self->tdb, path);
+    Py_END_ALLOW_THREADS
+    if (!result) {
         return set_tdb_error(self->tdb, NULL);
     }
     Py_RETURN_NONE;
@@ -964,7 +3152,12 @@ Begin a transaction.");
 static PyObject *
 TDB_begin(TDB *self)
 {
-    if (!tctdbtranbegin(self->tdb)) {
+    bool result;
+
+    Py_BEGIN_ALLOW_THREADS
+    result = tctdbtranbegin(self->tdb);
+    Py_END_ALLOW_THREADS
+    if (!result) {
         return set_tdb_error(self->tdb, NULL);
     }
     Py_RETURN_NONE;
@@ -980,7 +3173,12 @@ Commit a transaction.");
 static PyObject *
 TDB_commit(TDB *self)
 {
-    if (!tctdbtrancommit(self->tdb)) {
+    bool result;
+
+    Py_BEGIN_ALLOW_THREADS
+    result = tctdbtrancommit(self->tdb);
+    Py_END_ALLOW_THREADS
+    if (!result) {
         return set_tdb_error(self->tdb, NULL);
     }
     Py_RETURN_NONE;
@@ -996,28 +3194,116 @@ Abort a transaction.");
 static PyObject *
 TDB_abort(TDB *self)
 {
-    if (!tctdbtranabort(self->tdb)) {
+    bool result;
+
+    Py_BEGIN_ALLOW_THREADS
+    result = tctdbtranabort(self->tdb);
+    Py_END_ALLOW_THREADS
+    self->version++;
+    if (!result) {
         return set_tdb_error(self->tdb, NULL);
     }
     Py_RETURN_NONE;
 }
 
 
-/* TDB.get(key) */
+/* TDB.get(key[, view=False]) */
 PyDoc_STRVAR(TDB_get_doc,
-"get(key)\n\
+"get(key[, view=False])\n\
 \n\
-Retrieve a record from the database.");
+Retrieve a record from the database. If view is True, return a read-only\n\
+RecordMap converting the columns to bytes only when they are accessed instead\n\
+of a dict.");
 
 static PyObject *
-TDB_get(TDB *self, PyObject *args)
+TDB_get(TDB *self, PyObject *args, PyObject *kwargs)
 {
-    PyObject *pykey;
+    PyObject *pykey, *view = Py_False;
+
+    static char *kwlist[] = {"key", "view", NULL};
+
+    if (!PyArg_ParseTupleAndKeywords(args, kwargs, "O|O:get", kwlist,
+                                     &pykey, &view)) {
+        return NULL;
+    }
+    if (!PyBool_Check(view)) {
+        return set_error(PyExc_TypeError, "a boolean is required");
+    }
+    return TDB_Get(self, pykey, view == Py_True);
+}
+
+
+/* TDB.getmany(keys[, default=None]) -> list */
+PyDoc_STRVAR(TDB_getmany_doc,
+"getmany(keys[, default=None]) -> list\n\
+\n\
+Retrieve several records at once. Return a list of values in the same order as\n\
+keys, missing records are replaced by default.");
+
+static PyObject *
+TDB_getmany(TDB *self, PyObject *args, PyObject *kwargs)
+{
+    PyObject *pykeys, *pydefault = Py_None, *pyresult = NULL, *pyvalue;
+    TCLIST *keys;
+    const void *key;
+    TCMAP **values;
+    int key_size, len, i;
+
+    static char *kwlist[] = {"keys", "default", NULL};
 
-    if (!PyArg_ParseTuple(args, "O:get", &pykey)) {
+    if (!PyArg_ParseTupleAndKeywords(args, kwargs, "O|O:getmany", kwlist,
+                                     &pykeys, &pydefault)) {
         return NULL;
     }
-    return TDB_GetItem(self, pykey);
+    keys = seq_to_tclist(pykeys);
+    if (!keys) {
+        return NULL;
+    }
+    len = tclistnum(keys);
+    values = PyMem_New(TCMAP *, len);
+    if (!values) {
+        tclistdel(keys);
+        return PyErr_NoMemory();
+    }
+    Py_BEGIN_ALLOW_THREADS
+    for (i = 0; i < len; i++) {
+        key = tclistval(keys, i, &key_size);
+        values[i] = tctdbget(self->tdb, key, key_size);
+        if (!values[i] && tctdbecode(self->tdb) != TCENOREC) {
+            break;
+        }
+    }
+    Py_END_ALLOW_THREADS
+    if (i < len) {
+        set_tdb_error(self->tdb, NULL);
+        len = i;
+    }
+    else {
+        pyresult = PyList_New((Py_ssize_t)len);
+    }
+    for (i = 0; i < len; i++) {
+        if (pyresult) {
+            if (values[i]) {
+                pyvalue = tcmap_to_dict(values[i]);
+            }
+            else {
+                Py_INCREF(pydefault);
+                pyvalue = pydefault;
+            }
+            if (pyvalue) {
+                PyList_SET_ITEM(pyresult, (Py_ssize_t)i, pyvalue);
+            }
+            else {
+                Py_CLEAR(pyresult);
+            }
+        }
+        if (values[i]) {
+            tcmapdel(values[i]);
+        }
+    }
+    PyMem_Free(values);
+    tclistdel(keys);
+    return pyresult;
 }
 
 
@@ -1035,10 +3321,69 @@ TDB_remove(TDB *self, PyObject *args)
     if (!PyArg_ParseTuple(args, "O:remove", &pykey)) {
         return NULL;
     }
-    if (TDB_SetItem(self, pykey, NULL)) {
+    if (TDB_SetItem(self, pykey, NULL)) {
+        return NULL;
+    }
+    Py_RETURN_NONE;
+}
+
+
+/* TDB.removemany(keys[, missing_ok=True]) -> int */
+PyDoc_STRVAR(TDB_removemany_doc,
+"removemany(keys[, missing_ok=True]) -> int\n\
+\n\
+Remove several records at once and return the number of records removed.\n\
+If missing_ok is False, this method raises KeyError on the first key that is\n\
+not in the database (records removed before it stay removed).");
+
+static PyObject *
+TDB_removemany(TDB *self, PyObject *args, PyObject *kwargs)
+{
+    PyObject *pykeys, *pymissing_ok = Py_True;
+    TCLIST *keys;
+    const void *key;
+    int key_size, len, i;
+    long count = 0;
+    bool missing_ok, result;
+
+    static char *kwlist[] = {"keys", "missing_ok", NULL};
+
+    if (!PyArg_ParseTupleAndKeywords(args, kwargs, "O|O:removemany", kwlist,
+                                     &pykeys, &pymissing_ok)) {
+        return NULL;
+    }
+    if (!PyBool_Check(pymissing_ok)) {
+        return set_error(PyExc_TypeError, "a boolean is required");
+    }
+    missing_ok = (pymissing_ok == Py_True);
+    keys = seq_to_tclist(pykeys);
+    if (!keys) {
+        return NULL;
+    }
+    len = tclistnum(keys);
+    Py_BEGIN_ALLOW_THREADS
+    for (i = 0; i < len; i++) {
+        key = tclistval(keys, i, &key_size);
+        result = tctdbout(self->tdb, key, key_size);
+        if (result) {
+            count++;
+        }
+        else if (!missing_ok || tctdbecode(self->tdb) != TCENOREC) {
+            break;
+        }
+    }
+    Py_END_ALLOW_THREADS
+    if (count) {
+        self->changed = true;
+        self->version++;
+    }
+    if (i < len) {
+        set_tdb_error(self->tdb, (const char *)key);
+        tclistdel(keys);
         return NULL;
     }
-    Py_RETURN_NONE;
+    tclistdel(keys);
+    return PyInt_FromLong(count);
 }
 
 
@@ -1068,6 +3413,126 @@ TDB_put(TDB *self, PyObject *args, PyObject *kwargs)
 }
 
 
+/* TDB.putmany(items[, mode="put"[, transaction=False]]) -> int */
+PyDoc_STRVAR(TDB_putmany_doc,
+"putmany(items[, mode=\"put\"[, transaction=False]]) -> int\n\
+\n\
+Store several records at once and return the number of records stored.\n\
+'items': a dict or an iterable of (key, value) pairs, values being dicts.\n\
+'mode': one of \"put\", \"keep\" or \"cat\". In \"keep\" mode, records whose\n\
+        key is already in the database are skipped.\n\
+'transaction': if True, the records are stored in a single transaction which\n\
+               is aborted if any of them fails.");
+
+static PyObject *
+TDB_putmany(TDB *self, PyObject *args, PyObject *kwargs)
+{
+    PyObject *pyitems, *pyiter, *transaction = Py_False;
+    const char *smode = "put";
+    const void *key;
+    int key_size, mode, len, i;
+    long count = 0;
+    TCLIST *keys;
+    TCMAP **values;
+    bool result;
+
+    static char *kwlist[] = {"items", "mode", "transaction", NULL};
+
+    if (!PyArg_ParseTupleAndKeywords(args, kwargs, "O|sO:putmany", kwlist,
+                                     &pyitems, &smode, &transaction)) {
+        return NULL;
+    }
+    if (!PyBool_Check(transaction)) {
+        return set_error(PyExc_TypeError, "a boolean is required");
+    }
+    mode = str_to_put_mode(smode);
+    if (mode < 0) {
+        return NULL;
+    }
+    pyiter = items_to_iter(pyitems);
+    if (!pyiter) {
+        return NULL;
+    }
+    values = PyMem_New(TCMAP *, TK_PY_BATCH_SIZE);
+    if (!values) {
+        Py_DECREF(pyiter);
+        return PyErr_NoMemory();
+    }
+    keys = tclistnew2(TK_PY_BATCH_SIZE);
+    if (transaction == Py_True) {
+        Py_BEGIN_ALLOW_THREADS
+        result = tctdbtranbegin(self->tdb);
+        Py_END_ALLOW_THREADS
+        if (!result) {
+            Py_DECREF(pyiter);
+            tclistdel(keys);
+            PyMem_Free(values);
+            return set_tdb_error(self->tdb, NULL);
+        }
+    }
+    while ((len = iter_to_tcmaps(pyiter, keys, values,
+                                 TK_PY_BATCH_SIZE)) > 0) {
+        Py_BEGIN_ALLOW_THREADS
+        for (i = 0; i < len; i++) {
+            key = tclistval(keys, i, &key_size);
+            if (mode == TK_PY_PUTKEEP) {
+                result = tctdbputkeep(self->tdb, key, key_size, values[i]);
+                if (!result && tctdbecode(self->tdb) == TCEKEEP) {
+                    continue;
+                }
+            }
+            else if (mode == TK_PY_PUTCAT) {
+                result = tctdbputcat(self->tdb, key, key_size, values[i]);
+            }
+            else {
+                result = tctdbput(self->tdb, key, key_size, values[i]);
+            }
+            if (!result) {
+                break;
+            }
+            count++;
+        }
+        Py_END_ALLOW_THREADS
+        if (i < len) {
+            set_tdb_error(self->tdb, NULL);
+        }
+        for (i = 0; i < len; i++) {
+            tcmapdel(values[i]);
+        }
+        tclistclear(keys);
+        if (PyErr_Occurred()) {
+            len = -1;
+            break;
+        }
+    }
+    if (count) {
+        self->changed = true;
+        self->version++;
+    }
+    if (transaction == Py_True) {
+        Py_BEGIN_ALLOW_THREADS
+        if (len < 0) {
+            result = tctdbtranabort(self->tdb);
+        }
+        else {
+            result = tctdbtrancommit(self->tdb);
+        }
+        Py_END_ALLOW_THREADS
+        if (len >= 0 && !result) {
+            set_tdb_error(self->tdb, NULL);
+            len = -1;
+        }
+    }
+    Py_DECREF(pyiter);
+    tclistdel(keys);
+    PyMem_Free(values);
+    if (len < 0) {
+        return NULL;
+    }
+    return PyInt_FromLong(count);
+}
+
+
 /* TDB.putkeep(key, value) */
 PyDoc_STRVAR(TDB_putkeep_doc,
 "putkeep(key, value)\n\
@@ -1078,9 +3543,11 @@ put), this method raises KeyError if key is already in the database.");
 static PyObject *
 TDB_putkeep(TDB *self, PyObject *args, PyObject *kwargs)
 {
+    Py_buffer key_view;
     void *key;
     int key_size;
     TCMAP *value;
+    bool result;
     PyObject *pykey, *pyvalue = NULL;
 
     if (!PyArg_ParseTuple(args, "O|O;putkeep() takes at least 2 arguments",
@@ -1091,19 +3558,27 @@ TDB_putkeep(TDB *self, PyObject *args, PyObject *kwargs)
     if (!pyvalue) {
         return NULL;
     }
-    if (bytes_to_void(pykey, &key, &key_size)) {
+    if (bytes_to_key(pykey, &key_view, &key, &key_size)) {
         return NULL;
     }
     value = dict_to_tcmap(pyvalue);
     if (!value) {
+        PyBuffer_Release(&key_view);
         return NULL;
     }
-    if (!tctdbputkeep(self->tdb, key, key_size, value)) {
+    Py_BEGIN_ALLOW_THREADS
+    result = tctdbputkeep(self->tdb, key, key_size, value);
+    Py_END_ALLOW_THREADS
+    if (!result) {
         tcmapdel(value);
-        return set_tdb_error(self->tdb, key);
+        set_tdb_error(self->tdb, key);
+        PyBuffer_Release(&key_view);
+        return NULL;
     }
     tcmapdel(value);
     self->changed = true;
+    self->version++;
+    PyBuffer_Release(&key_view);
     Py_RETURN_NONE;
 }
 
@@ -1118,9 +3593,11 @@ value. If there is no corresponding record, a new record is stored.");
 static PyObject *
 TDB_putcat(TDB *self, PyObject *args, PyObject *kwargs)
 {
+    Py_buffer key_view;
     void *key;
     int key_size;
     TCMAP *value;
+    bool result;
     PyObject *pykey, *pyvalue = NULL;
 
     if (!PyArg_ParseTuple(args, "O|O;putcat() takes at least 2 arguments",
@@ -1131,19 +3608,25 @@ TDB_putcat(TDB *self, PyObject *args, PyObject *kwargs)
     if (!pyvalue) {
         return NULL;
     }
-    if (bytes_to_void(pykey, &key, &key_size)) {
+    if (bytes_to_void(pykey, &key_view, &key, &key_size)) {
         return NULL;
     }
     value = dict_to_tcmap(pyvalue);
     if (!value) {
+        PyBuffer_Release(&key_view);
         return NULL;
     }
-    if (!tctdbputcat(self->tdb, key, key_size, value)) {
+    Py_BEGIN_ALLOW_THREADS
+    result = tctdbputcat(self->tdb, key, key_size, value);
+    Py_END_ALLOW_THREADS
+    PyBuffer_Release(&key_view);
+    if (!result) {
         tcmapdel(value);
         return set_tdb_error(self->tdb, NULL);
     }
     tcmapdel(value);
     self->changed = true;
+    self->version++;
     Py_RETURN_NONE;
 }
 
@@ -1157,7 +3640,12 @@ Flush modifications to the database file?");
 static PyObject *
 TDB_sync(TDB *self)
 {
-    if (!tctdbsync(self->tdb)) {
+    bool result;
+
+    Py_BEGIN_ALLOW_THREADS
+    result = tctdbsync(self->tdb);
+    Py_END_ALLOW_THREADS
+    if (!result) {
         return set_tdb_error(self->tdb, NULL);
     }
     Py_RETURN_NONE;
@@ -1175,6 +3663,7 @@ is applied.");
 static PyObject *
 TDB_searchkeys(TDB *self, PyObject *args)
 {
+    Py_buffer prefix_view;
     void *prefix;
     int prefix_size, max = -1;
     TCLIST *result;
@@ -1183,12 +3672,13 @@ TDB_searchkeys(TDB *self, PyObject *args)
     if (!PyArg_ParseTuple(args, "O|i:searchkeys", &pyprefix, &max)) {
         return NULL;
     }
-    if (bytes_to_void(pyprefix, &prefix, &prefix_size)) {
+    if (bytes_to_void(pyprefix, &prefix_view, &prefix, &prefix_size)) {
         return NULL;
     }
     Py_BEGIN_ALLOW_THREADS
     result = tctdbfwmkeys(self->tdb, prefix, prefix_size, max);
     Py_END_ALLOW_THREADS
+    PyBuffer_Release(&prefix_view);
     pyresult = tclist_to_frozenset(result);
     tclistdel(result);
     return pyresult;
@@ -1216,6 +3706,7 @@ TDB_optimize(TDB *self, PyObject *args, PyObject *kwargs)
     int iapow = -1, ifpow = -1;
     char apow, fpow;
     unsigned char opts = UINT8_MAX;
+    bool result;
 
     static char *kwlist[] = {"bnum", "apow", "fpow", "opts", NULL};
 
@@ -1228,7 +3719,10 @@ TDB_optimize(TDB *self, PyObject *args, PyObject *kwargs)
     if ((apow == -1 || fpow == -1) && PyErr_Occurred()) {
         return NULL;
     }
-    if (!tctdboptimize(self->tdb, bnum, apow, fpow, opts)) {
+    Py_BEGIN_ALLOW_THREADS
+    result = tctdboptimize(self->tdb, bnum, apow, fpow, opts);
+    Py_END_ALLOW_THREADS
+    if (!result) {
         return set_tdb_error(self->tdb, NULL);
     }
     Py_RETURN_NONE;
@@ -1371,11 +3865,15 @@ TDB_setindex(TDB *self, PyObject *args)
 #endif
     const char *column;
     int type;
+    bool result;
 
     if (!PyArg_ParseTuple(args, format, &column, &type)) {
         return NULL;
     }
-    if (!tctdbsetindex(self->tdb, column, type)) {
+    Py_BEGIN_ALLOW_THREADS
+    result = tctdbsetindex(self->tdb, column, type);
+    Py_END_ALLOW_THREADS
+    if (!result) {
         return set_tdb_error(self->tdb, NULL);
     }
     Py_RETURN_NONE;
@@ -1393,7 +3891,9 @@ TDB_uid(TDB *self)
 {
     long long uid;
 
+    Py_BEGIN_ALLOW_THREADS
     uid = tctdbgenuid(self->tdb);
+    Py_END_ALLOW_THREADS
     if (uid == -1) {
         return set_tdb_error(self->tdb, NULL);
     }
@@ -1401,6 +3901,259 @@ TDB_uid(TDB *self)
 }
 
 
+/* TDB.column() dtypes */
+enum {
+    TDB_COLUMN_F8,
+    TDB_COLUMN_I8,
+    TDB_COLUMN_BYTES
+};
+
+
+/* values of a column collected by TDB.column() */
+typedef struct {
+    const void *name;
+    int name_size;
+    int dtype;
+    double missing_f8;
+    int64_t missing_i8;
+    TCXSTR *data; /* f8/i8 values */
+    TCLIST *values; /* bytes values */
+    TCXSTR *present; /* bytes values, 1 if the column exists, 0 otherwise */
+} TDBColumn;
+
+
+/* add the column of a serialized record to a TDBColumn */
+static bool
+TDBColumn_add(const void *key, int key_size, const void *record,
+              int record_size, void *op)
+{
+    TDBColumn *column = op;
+    char *value, *end;
+    int value_size;
+    double f8;
+    int64_t i8;
+
+    value = tcmaploadone(record, record_size, column->name, column->name_size,
+                         &value_size);
+    /* tcmaploadone() values are NUL-terminated */
+    switch (column->dtype) {
+        case TDB_COLUMN_F8:
+            f8 = value ? strtod(value, &end) : 0.0;
+            if (!value || end == value) {
+                f8 = column->missing_f8;
+            }
+            tcxstrcat(column->data, &f8, sizeof(double));
+            break;
+        case TDB_COLUMN_I8:
+            i8 = value ? strtoll(value, &end, 10) : 0;
+            if (!value || end == value) {
+                i8 = column->missing_i8;
+            }
+            tcxstrcat(column->data, &i8, sizeof(int64_t));
+            break;
+        default:
+            tclistpush(column->values, value ? value : "",
+                       value ? value_size : 0);
+            tcxstrcat(column->present, value ? "\1" : "\0", 1);
+            break;
+    }
+    tcfree(value);
+    return true;
+}
+
+
+/* convert the values of a TDBColumn to an array.array (f8/i8) or a list */
+static PyObject *
+TDBColumn_to_object(TDBColumn *column, PyObject *pymissing)
+{
+    PyObject *pyarray_module, *pyresult, *pydata, *pyvalue;
+    const char *present, *value;
+    const char *typecode = (column->dtype == TDB_COLUMN_F8) ? "d" : "q";
+    int value_size, len, i;
+
+    if (column->dtype == TDB_COLUMN_BYTES) {
+        len = tclistnum(column->values);
+        present = tcxstrptr(column->present);
+        pyresult = PyList_New((Py_ssize_t)len);
+        if (!pyresult) {
+            return NULL;
+        }
+        for (i = 0; i < len; i++) {
+            if (present[i]) {
+                value = tclistval(column->values, i, &value_size);
+                pyvalue = void_to_bytes(value, value_size);
+                if (!pyvalue) {
+                    Py_DECREF(pyresult);
+                    return NULL;
+                }
+            }
+            else {
+                Py_INCREF(pymissing);
+                pyvalue = pymissing;
+            }
+            PyList_SET_ITEM(pyresult, (Py_ssize_t)i, pyvalue);
+        }
+        return pyresult;
+    }
+#if PY_MAJOR_VERSION < 3
+    if (column->dtype == TDB_COLUMN_I8) {
+        if (sizeof(long) != sizeof(int64_t)) {
+            return set_error(PyExc_ValueError,
+                             "dtype 'i8' is not supported on this platform");
+        }
+        typecode = "l";
+    }
+#endif
+    pyarray_module = PyImport_ImportModule("array");
+    if (!pyarray_module) {
+        return NULL;
+    }
+    pyresult = PyObject_CallMethod(pyarray_module, "array", "s", typecode);
+    Py_DECREF(pyarray_module);
+    if (!pyresult) {
+        return NULL;
+    }
+    /* wrap the values without copying them, array.array copies them once */
+#if PY_MAJOR_VERSION >= 3
+    pydata = PyMemoryView_FromMemory((char *)tcxstrptr(column->data),
+                                     (Py_ssize_t)tcxstrsize(column->data),
+                                     PyBUF_READ);
+#else
+    pydata = PyBuffer_FromMemory((void *)tcxstrptr(column->data),
+                                 (Py_ssize_t)tcxstrsize(column->data));
+#endif
+    if (!pydata) {
+        Py_DECREF(pyresult);
+        return NULL;
+    }
+#if PY_MAJOR_VERSION >= 3
+    pyvalue = PyObject_CallMethod(pyresult, "frombytes", "O", pydata);
+#else
+    pyvalue = PyObject_CallMethod(pyresult, "fromstring", "O", pydata);
+#endif
+    Py_DECREF(pydata);
+    if (!pyvalue) {
+        Py_DECREF(pyresult);
+        return NULL;
+    }
+    Py_DECREF(pyvalue);
+    return pyresult;
+}
+
+
+/* TDB.column(name[, dtype="f8"[, query=None[, missing]]]) */
+PyDoc_STRVAR(TDB_column_doc,
+"column(name[, dtype=\"f8\"[, query=None[, missing]]])\n\
+\n\
+Return the values of the column name for all records, or for the records in the\n\
+result set of query (a TDBQuery). dtype is \"f8\" (an array.array of doubles,\n\
+missing defaults to NaN), \"i8\" (an array.array of 64-bit integers, missing\n\
+defaults to 0) or \"bytes\" (a list of bytes, missing defaults to None).\n\
+missing replaces the records without this column (or a numeric value).");
+
+static PyObject *
+TDB_column(TDB *self, PyObject *args, PyObject *kwargs)
+{
+    PyObject *pyname, *pyquery = Py_None, *pymissing = NULL;
+    PyObject *pyresult = NULL;
+    TDBQuery *query = NULL;
+    TDBColumn column;
+    Py_buffer name_view;
+    const char *dtype = "f8";
+    void *name;
+    const void *key;
+    char *record;
+    int key_size, record_size, len = 0, i = 0;
+    TCLIST *result = NULL;
+    bool success = true;
+    double start = tctime();
+
+    static char *kwlist[] = {"name", "dtype", "query", "missing", NULL};
+
+    if (!PyArg_ParseTupleAndKeywords(args, kwargs, "O|sOO:column", kwlist,
+                                     &pyname, &dtype, &pyquery, &pymissing)) {
+        return NULL;
+    }
+    memset(&column, 0, sizeof(TDBColumn));
+    if (!strcmp(dtype, "f8")) {
+        column.dtype = TDB_COLUMN_F8;
+        column.missing_f8 = pymissing ? PyFloat_AsDouble(pymissing) : Py_NAN;
+    }
+    else if (!strcmp(dtype, "i8")) {
+        column.dtype = TDB_COLUMN_I8;
+        column.missing_i8 = pymissing ? PyLong_AsLongLong(pymissing) : 0;
+    }
+    else if (!strcmp(dtype, "bytes")) {
+        column.dtype = TDB_COLUMN_BYTES;
+        if (!pymissing) {
+            pymissing = Py_None;
+        }
+    }
+    else {
+        return set_error(PyExc_ValueError,
+                         "dtype must be 'f8', 'i8' or 'bytes'");
+    }
+    if (PyErr_Occurred()) {
+        return NULL;
+    }
+    if (pyquery != Py_None) {
+        if (!PyObject_TypeCheck(pyquery, &TDBQueryType)) {
+            return set_error(PyExc_TypeError, "a TDBQuery is required");
+        }
+        query = (TDBQuery *)pyquery;
+        if (query->tdb != self) {
+            return set_error(PyExc_ValueError,
+                             "query belongs to another database");
+        }
+    }
+    if (bytes_to_void(pyname, &name_view, &name, &column.name_size)) {
+        return NULL;
+    }
+    column.name = name;
+    column.data = tcxstrnew();
+    column.values = tclistnew();
+    column.present = tcxstrnew();
+    Py_BEGIN_ALLOW_THREADS
+    if (query) {
+        result = tctdbqrysearch(query->qry);
+        len = tclistnum(result);
+        for (i = 0; i < len; i++) {
+            key = tclistval(result, i, &key_size);
+            record = tchdbget(self->tdb->hdb, key, key_size, &record_size);
+            if (record) {
+                TDBColumn_add(key, key_size, record, record_size, &column);
+                tcfree(record);
+            }
+            else if (tctdbecode(self->tdb) != TCENOREC) {
+                break;
+            }
+        }
+        success = (i == len);
+    }
+    else {
+        success = tchdbforeach(self->tdb->hdb, TDBColumn_add, &column);
+    }
+    Py_END_ALLOW_THREADS
+    PyBuffer_Release(&name_view);
+    if (!success) {
+        set_tdb_error(self->tdb, NULL);
+    }
+    else {
+        if (query) {
+            TDBQuery_profile(query, start, len);
+        }
+        pyresult = TDBColumn_to_object(&column, pymissing);
+    }
+    if (result) {
+        tclistdel(result);
+    }
+    tcxstrdel(column.data);
+    tclistdel(column.values);
+    tcxstrdel(column.present);
+    return pyresult;
+}
+
+
 /* TDB.query() */
 PyDoc_STRVAR(TDB_query_doc,
 "query()\n\
@@ -1414,25 +4167,201 @@ TDB_query(TDB *self)
 }
 
 
-/* TDB.metasearch(queries, type) */
+/* TDB.prepare(conditions[, sort=None[, limit=-1[, skip=0]]]) */
+PyDoc_STRVAR(TDB_prepare_doc,
+"prepare(conditions[, sort=None[, limit=-1[, skip=0]]])\n\
+\n\
+Compile a query template. conditions is a sequence of (column, condition, expr)\n\
+triples where expr can be the \"?\" placeholder, sort an optional (column, type)\n\
+pair.");
+
+static PyObject *
+TDB_prepare(TDB *self, PyObject *args, PyObject *kwargs)
+{
+    PyObject *pyconditions, *pysort = Py_None;
+    int max = -1, skip = 0;
+
+    static char *kwlist[] = {"conditions", "sort", "limit", "skip", NULL};
+
+    if (!PyArg_ParseTupleAndKeywords(args, kwargs, "O|Oii:prepare", kwlist,
+                                     &pyconditions, &pysort, &max, &skip)) {
+        return NULL;
+    }
+    return (PyObject *)new_TDBQueryTemplate(&TDBQueryTemplateType, self,
+                                            pyconditions, pysort, max, skip);
+}
+
+
+/* TDB.setprofiler(enabled) */
+PyDoc_STRVAR(TDB_setprofiler_doc,
+"setprofiler(enabled)\n\
+\n\
+If enabled is True, start recording the queries executed on this database,\n\
+see profile() and indexadvice(). If it is False (the default), stop recording\n\
+queries and discard the profile.");
+
+static PyObject *
+TDB_setprofiler(TDB *self, PyObject *args)
+{
+    PyObject *enabled;
+
+    if (!PyArg_ParseTuple(args, "O:setprofiler", &enabled)) {
+        return NULL;
+    }
+    if (!PyBool_Check(enabled)) {
+        return set_error(PyExc_TypeError, "a boolean is required");
+    }
+    if (enabled == Py_False) {
+        if (self->profile) {
+            tcmapdel(self->profile);
+            tcmapdel(self->advice);
+            self->profile = NULL;
+            self->advice = NULL;
+        }
+    }
+    else if (!self->profile) {
+        self->profile = tcmapnew();
+        self->advice = tcmapnew();
+        if (!self->profile || !self->advice) {
+            if (self->profile) {
+                tcmapdel(self->profile);
+                self->profile = NULL;
+            }
+            if (self->advice) {
+                tcmapdel(self->advice);
+                self->advice = NULL;
+            }
+            return set_error(Error, "could not create TCMAP, memory issue?");
+        }
+    }
+    Py_RETURN_NONE;
+}
+
+
+/* TDB.profile() -> dict */
+PyDoc_STRVAR(TDB_profile_doc,
+"profile() -> dict\n\
+\n\
+Return the statistics recorded for each query shape, or None if the profiler is\n\
+disabled.");
+
+static PyObject *
+TDB_profile(TDB *self)
+{
+    if (!self->profile) {
+        Py_RETURN_NONE;
+    }
+    return profile_to_dict(self->profile);
+}
+
+
+/* TDB.indexadvice() -> list */
+PyDoc_STRVAR(TDB_indexadvice_doc,
+"indexadvice() -> list\n\
+\n\
+Return a list of (column, type, scanned, calls) tuples for the columns that\n\
+profiled queries could not look up through an index, the columns with the most\n\
+rows scanned first, or None if the profiler is disabled.");
+
+static PyObject *
+TDB_indexadvice(TDB *self)
+{
+    if (!self->advice) {
+        Py_RETURN_NONE;
+    }
+    return advice_to_list(self->advice);
+}
+
+
+/* TDB.setquerycache(max_bytes) */
+PyDoc_STRVAR(TDB_setquerycache_doc,
+"setquerycache(max_bytes)\n\
+\n\
+Set the size of an in-process cache of the results of TDBQuery.search() and\n\
+TDBQueryTemplate.search(), keyed by the conditions, order and limit of the\n\
+queries.\n\
+'max_bytes': the maximum total size of the cached results, least recently used\n\
+             results are evicted beyond it. 0 (the default) disables the\n\
+             cache and frees its results.\n\
+If the cache is already enabled, it is resized and keeps its results.\n\
+\n\
+Note:\n\
+The cache is invalidated by writes made through this object only, it is not\n\
+aware of other connections to the same database file.");
+
+static PyObject *
+TDB_setquerycache(TDB *self, PyObject *args, PyObject *kwargs)
+{
+    unsigned long long max_bytes;
+
+    if (parse_cache_max_bytes(args, kwargs, "L:setquerycache", &max_bytes)) {
+        return NULL;
+    }
+    if (!max_bytes) {
+        DBCache_del(self->query_cache);
+        self->query_cache = NULL;
+    }
+    else if (self->query_cache) {
+        self->query_cache->max_bytes = max_bytes;
+        DBCache_trim(self->query_cache);
+    }
+    else {
+        self->query_cache = DBCache_new(max_bytes, NULL);
+        if (!self->query_cache) {
+            return NULL;
+        }
+        self->query_cache_version = self->version;
+    }
+    Py_RETURN_NONE;
+}
+
+
+/* TDB.querycachestats() -> dict */
+PyDoc_STRVAR(TDB_querycachestats_doc,
+"querycachestats() -> dict\n\
+\n\
+Return the statistics of the cache set by setquerycache() as a dict with the\n\
+following keys: 'hits', 'misses', 'evictions', 'records', 'bytes' and\n\
+'max_bytes'. Return None if the cache is disabled.");
+
+static PyObject *
+TDB_querycachestats(TDB *self)
+{
+    return DBCache_stats(self->query_cache);
+}
+
+
+/* TDB.metasearch(queries, type[, parallel=False[, limit=-1]]) */
 PyDoc_STRVAR(TDB_metasearch_doc,
-"metasearch(queries, type)\n\
+"metasearch(queries, type[, parallel=False[, limit=-1]])\n\
 \n\
-Combine queries.");
+Combine queries. If parallel is True, each query is searched by its own thread\n\
+and their results are combined with the same semantics. If limit is not\n\
+negative, at most limit keys are returned.");
 
 static PyObject *
-TDB_metasearch(TDB *notused, PyObject *args)
+TDB_metasearch(TDB *notused, PyObject *args, PyObject *kwargs)
 {
-    PyObject *pyqueries, *pyseq, *pyquery, *pyresult;
-    int type;
+    PyObject *pyqueries, *pyseq, *pyquery, *pyresult, *pyparallel = Py_False;
+    int type, limit = -1, size;
     const char *msg = "a sequence of TDBQuery's is required";
     Py_ssize_t len, i;
     TDBQRY **queries;
+    TDBQuery **pyqueriesv;
     TCLIST *result;
+    static char *kwlist[] = {"queries", "type", "parallel", "limit", NULL};
 
-    if (!PyArg_ParseTuple(args, "Oi:metasearch", &pyqueries, &type)) {
+    if (!PyArg_ParseTupleAndKeywords(args, kwargs, "Oi|Oi:metasearch", kwlist,
+                                     &pyqueries, &type, &pyparallel, &limit)) {
         return NULL;
     }
+    if (!PyBool_Check(pyparallel)) {
+        return set_error(PyExc_TypeError, "a boolean is required");
+    }
+    if (pyparallel == Py_True && type != TDBMSUNION && type != TDBMSISECT &&
+        type != TDBMSDIFF) {
+        return set_error(PyExc_ValueError, "invalid metasearch type");
+    }
     pyseq = PySequence_Fast(pyqueries, msg);
     if (!pyseq) {
         return NULL;
@@ -1442,8 +4371,11 @@ TDB_metasearch(TDB *notused, PyObject *args)
         Py_DECREF(pyseq);
         return NULL;
     }
-    queries = (TDBQRY **)tcmalloc((size_t)len * sizeof(TDBQRY *));
-    if (!queries) {
+    queries = (TDBQRY **)tcmalloc((size_t)(len ? len : 1) * sizeof(TDBQRY *));
+    pyqueriesv = PyMem_New(TDBQuery *, len ? len : 1);
+    if (!queries || !pyqueriesv) {
+        tcfree(queries);
+        PyMem_Free(pyqueriesv);
         Py_DECREF(pyseq);
         return PyErr_NoMemory();
     }
@@ -1452,57 +4384,116 @@ TDB_metasearch(TDB *notused, PyObject *args)
         if (!PyObject_TypeCheck(pyquery, &TDBQueryType)) {
             Py_DECREF(pyseq);
             tcfree(queries);
+            PyMem_Free(pyqueriesv);
             return set_error(PyExc_TypeError, msg);
         }
         queries[i] = ((TDBQuery *)pyquery)->qry;
+        pyqueriesv[i] = (TDBQuery *)pyquery;
     }
-    Py_DECREF(pyseq);
     Py_BEGIN_ALLOW_THREADS
-    result = tctdbmetasearch(queries, (int)len, type);
+    if (pyparallel == Py_True) {
+        result = len ? metasearch_parallel(pyqueriesv, (int)len, type, limit)
+                     : tclistnew();
+    }
+    else {
+        result = tctdbmetasearch(queries, (int)len, type);
+        while (limit >= 0 && tclistnum(result) > limit) {
+            tcfree(tclistpop(result, &size));
+        }
+    }
     tcfree(queries);
     Py_END_ALLOW_THREADS
+    /* the queries are kept alive by pyseq until the search is done */
+    PyMem_Free(pyqueriesv);
+    Py_DECREF(pyseq);
     pyresult = tclist_to_tuple(result);
     tclistdel(result);
     return pyresult;
 }
 
 
-/* TDB.iterkeys() */
+/* TDB.iterkeys([batch=0]) */
 PyDoc_STRVAR(TDB_iterkeys_doc,
-"iterkeys()\n\
+"iterkeys([batch=0])\n\
 \n\
-Return an iterator over the database's keys.");
+Return an iterator over the database's keys. If batch is greater than 0,\n\
+the iterator yields lists of up to batch keys at a time.");
 
 static PyObject *
-TDB_iterkeys(TDB *self)
+TDB_iterkeys(TDB *self, PyObject *args, PyObject *kwargs)
 {
+    int batch = 0;
+
+    if (parse_batch(args, kwargs, "|i:iterkeys", &batch)) {
+        return NULL;
+    }
+    if (batch) {
+        return DBIter_set_batch(new_TDBIter(self, &TDBIterKeysBatchType),
+                                batch);
+    }
     return new_TDBIter(self, &TDBIterKeysType);
 }
 
 
-/* TDB.itervalues() */
+/* TDB.itervalues([view=False]) */
 PyDoc_STRVAR(TDB_itervalues_doc,
-"itervalues()\n\
+"itervalues([view=False])\n\
 \n\
-Return an iterator over the database's values.");
+Return an iterator over the database's values. If view is True, the values\n\
+are read-only RecordMaps instead of dicts.");
 
 static PyObject *
-TDB_itervalues(TDB *self)
+TDB_itervalues(TDB *self, PyObject *args, PyObject *kwargs)
 {
-    return new_TDBIter(self, &TDBIterValuesType);
+    PyObject *view = Py_False;
+
+    static char *kwlist[] = {"view", NULL};
+
+    if (!PyArg_ParseTupleAndKeywords(args, kwargs, "|O:itervalues", kwlist,
+                                     &view)) {
+        return NULL;
+    }
+    if (!PyBool_Check(view)) {
+        return set_error(PyExc_TypeError, "a boolean is required");
+    }
+    return DBIter_set_view(new_TDBIter(self, &TDBIterValuesType),
+                           view == Py_True);
 }
 
 
-/* TDB.iteritems() */
+/* TDB.iteritems([batch=0[, view=False]]) */
 PyDoc_STRVAR(TDB_iteritems_doc,
-"iteritems()\n\
+"iteritems([batch=0[, view=False]])\n\
 \n\
-Return an iterator over the database's items.");
+Return an iterator over the database's items. If batch is greater than 0,\n\
+the iterator yields lists of up to batch items at a time. If view is True,\n\
+the values are read-only RecordMaps instead of dicts.");
 
 static PyObject *
-TDB_iteritems(TDB *self)
+TDB_iteritems(TDB *self, PyObject *args, PyObject *kwargs)
 {
-    return new_TDBIter(self, &TDBIterItemsType);
+    int batch = 0;
+    PyObject *view = Py_False;
+
+    static char *kwlist[] = {"batch", "view", NULL};
+
+    if (!PyArg_ParseTupleAndKeywords(args, kwargs, "|iO:iteritems", kwlist,
+                                     &batch, &view)) {
+        return NULL;
+    }
+    if (check_batch(batch)) {
+        return NULL;
+    }
+    if (!PyBool_Check(view)) {
+        return set_error(PyExc_TypeError, "a boolean is required");
+    }
+    if (batch) {
+        return DBIter_set_view(
+            DBIter_set_batch(new_TDBIter(self, &TDBIterItemsBatchType), batch),
+            view == Py_True);
+    }
+    return DBIter_set_view(new_TDBIter(self, &TDBIterItemsType),
+                           view == Py_True);
 }
 
 
@@ -1541,9 +4532,15 @@ static PyMethodDef TDB_tp_methods[] = {
     {"begin", (PyCFunction)TDB_begin, METH_NOARGS, TDB_begin_doc},
     {"commit", (PyCFunction)TDB_commit, METH_NOARGS, TDB_commit_doc},
     {"abort", (PyCFunction)TDB_abort, METH_NOARGS, TDB_abort_doc},
-    {"get", (PyCFunction)TDB_get, METH_VARARGS, TDB_get_doc},
+    {"get", (PyCFunction)TDB_get, METH_VARARGS | METH_KEYWORDS, TDB_get_doc},
+    {"getmany", (PyCFunction)TDB_getmany, METH_VARARGS | METH_KEYWORDS,
+     TDB_getmany_doc},
     {"remove", (PyCFunction)TDB_remove, METH_VARARGS, TDB_remove_doc},
+    {"removemany", (PyCFunction)TDB_removemany, METH_VARARGS | METH_KEYWORDS,
+     TDB_removemany_doc},
     {"put", (PyCFunction)TDB_put, METH_VARARGS | METH_KEYWORDS, TDB_put_doc},
+    {"putmany", (PyCFunction)TDB_putmany, METH_VARARGS | METH_KEYWORDS,
+     TDB_putmany_doc},
     {"putkeep", (PyCFunction)TDB_putkeep, METH_VARARGS | METH_KEYWORDS,
      TDB_putkeep_doc},
     {"putcat", (PyCFunction)TDB_putcat, METH_VARARGS | METH_KEYWORDS,
@@ -1559,12 +4556,28 @@ static PyMethodDef TDB_tp_methods[] = {
     {"setdfunit", (PyCFunction)TDB_setdfunit, METH_VARARGS, TDB_setdfunit_doc},
     {"setindex", (PyCFunction)TDB_setindex, METH_VARARGS, TDB_setindex_doc},
     {"uid", (PyCFunction)TDB_uid, METH_NOARGS, TDB_uid_doc},
+    {"column", (PyCFunction)TDB_column, METH_VARARGS | METH_KEYWORDS,
+     TDB_column_doc},
     {"query", (PyCFunction)TDB_query, METH_NOARGS, TDB_query_doc},
-    {"metasearch", (PyCFunction)TDB_metasearch, METH_VARARGS | METH_STATIC,
-     TDB_metasearch_doc},
-    {"iterkeys", (PyCFunction)TDB_iterkeys, METH_NOARGS, TDB_iterkeys_doc},
-    {"itervalues", (PyCFunction)TDB_itervalues, METH_NOARGS, TDB_itervalues_doc},
-    {"iteritems", (PyCFunction)TDB_iteritems, METH_NOARGS, TDB_iteritems_doc},
+    {"prepare", (PyCFunction)TDB_prepare, METH_VARARGS | METH_KEYWORDS,
+     TDB_prepare_doc},
+    {"setprofiler", (PyCFunction)TDB_setprofiler, METH_VARARGS,
+     TDB_setprofiler_doc},
+    {"profile", (PyCFunction)TDB_profile, METH_NOARGS, TDB_profile_doc},
+    {"indexadvice", (PyCFunction)TDB_indexadvice, METH_NOARGS,
+     TDB_indexadvice_doc},
+    {"setquerycache", (PyCFunction)TDB_setquerycache,
+     METH_VARARGS | METH_KEYWORDS, TDB_setquerycache_doc},
+    {"querycachestats", (PyCFunction)TDB_querycachestats, METH_NOARGS,
+     TDB_querycachestats_doc},
+    {"metasearch", (PyCFunction)TDB_metasearch,
+     METH_VARARGS | METH_KEYWORDS | METH_STATIC, TDB_metasearch_doc},
+    {"iterkeys", (PyCFunction)TDB_iterkeys, METH_VARARGS | METH_KEYWORDS,
+     TDB_iterkeys_doc},
+    {"itervalues", (PyCFunction)TDB_itervalues, METH_VARARGS | METH_KEYWORDS,
+     TDB_itervalues_doc},
+    {"iteritems", (PyCFunction)TDB_iteritems, METH_VARARGS | METH_KEYWORDS,
+     TDB_iteritems_doc},
     {"itervalueskeys", (PyCFunction)TDB_itervalueskeys, METH_NOARGS,
      TDB_itervalueskeys_doc},
     {"itervaluesvals", (PyCFunction)TDB_itervaluesvals, METH_NOARGS,
@@ -1582,7 +4595,9 @@ TDB_path_get(TDB *self, void *closure)
 {
     const char *path;
 
+    Py_BEGIN_ALLOW_THREADS
     path = tctdbpath(self->tdb);
+    Py_END_ALLOW_THREADS
     if (path) {
         return PyString_FromString(path);
     }
@@ -1597,7 +4612,12 @@ PyDoc_STRVAR(TDB_size_doc,
 static PyObject *
 TDB_size_get(TDB *self, void *closure)
 {
-    return PyLong_FromUnsignedLongLong(tctdbfsiz(self->tdb));
+    uint64_t size;
+
+    Py_BEGIN_ALLOW_THREADS
+    size = tctdbfsiz(self->tdb);
+    Py_END_ALLOW_THREADS
+    return PyLong_FromUnsignedLongLong(size);
 }
 
 
@@ -26,16 +26,35 @@
 #include <tcfdb.h>
 #include <tctdb.h>
 
+#include <pthread.h>
+
 
 /*******************************************************************************
 * objects
 *******************************************************************************/
 
+/* RecordView */
+typedef struct {
+    PyObject_HEAD
+    void *value; /* allocated by tokyo cabinet, freed with tcfree */
+    int value_size;
+} RecordView;
+
+
+/* RecordMap */
+typedef struct {
+    PyObject_HEAD
+    TCMAP *map; /* a table record, freed with tcmapdel */
+} RecordMap;
+
+
 /* HDB */
 typedef struct {
     PyObject_HEAD
     TCHDB *hdb;
     bool changed;
+    DBCache *cache; /* NULL unless setreadcache() enabled it */
+    unsigned long long version; /* bumped by every cache invalidation */
 } HDB;
 
 
@@ -61,6 +80,8 @@ typedef struct {
     TCBDB *bdb;
     BDBCUR *cur; /* for iteration over self */
     bool changed;
+    DBCache *cache; /* NULL unless setreadcache() enabled it */
+    unsigned long long version; /* bumped by every write */
 } BDB;
 
 /* BDBCursor */
@@ -70,6 +91,33 @@ typedef struct {
     BDB *bdb;
 } BDBCursor;
 
+/* BDBScan */
+typedef struct {
+    PyObject_HEAD
+    BDB *bdb;
+    BDBCUR *cur;
+    void *start; /* bounds, NULL if not given */
+    int start_size;
+    bool start_inclusive;
+    void *stop;
+    int stop_size;
+    bool stop_inclusive;
+    void *prefix; /* NULL if not given */
+    int prefix_size;
+    bool reverse;
+    bool keys_only;
+    bool values_only;
+    int skip; /* records left to skip before the first one yielded */
+    int limit; /* records left to yield, -1 if unlimited */
+    bool positioned;
+    bool done;
+    bool busy;
+    int ecode; /* error raised after the records read before it */
+    TCLIST *keys; /* current batch */
+    TCLIST *values;
+    int pos;
+} BDBScan;
+
 
 /* NDB */
 typedef struct {
@@ -92,6 +140,11 @@ typedef struct {
     PyObject_HEAD
     TCTDB *tdb;
     bool changed;
+    TCMAP *profile;
+    TCMAP *advice;
+    DBCache *query_cache;
+    unsigned long long version; /* incremented by every write */
+    unsigned long long query_cache_version;
 } TDB;
 
 /* TDBQuery */
@@ -99,8 +152,32 @@ typedef struct {
     PyObject_HEAD
     TDBQRY *qry;
     TDB *tdb;
+    /* the query as built by filter(), sort() and limit(), for the profiler
+       and the query cache */
+    TCLIST *columns;
+    TCXSTR *ops;
+    TCLIST *exprs;
+    char *order;
+    int order_type;
+    int max;
+    int skip;
 } TDBQuery;
 
+/* TDBQueryTemplate */
+typedef struct {
+    PyObject_HEAD
+    TDB *tdb;
+    TCLIST *columns;
+    TCLIST *exprs;
+    int *conditions;
+    int *params; /* index of the parameter bound to each condition or -1 */
+    int nparams;
+    char *sort_column;
+    int sort_type;
+    int max;
+    int skip;
+} TDBQueryTemplate;
+
 
 /*******************************************************************************
 * utilities
@@ -122,6 +199,433 @@ int_to_char(int value)
 }
 
 
+/*******************************************************************************
+* RecordViewType
+*******************************************************************************/
+
+/* RecordViewType.tp_doc */
+PyDoc_STRVAR(RecordView_tp_doc,
+"Read-only view of a record value, supports the buffer protocol.");
+
+
+/* RecordViewType.tp_dealloc */
+static void
+RecordView_tp_dealloc(RecordView *self)
+{
+    if (self->value) {
+        tcfree(self->value);
+    }
+    Py_TYPE(self)->tp_free((PyObject *)self);
+}
+
+
+/* RecordView_tp_as_buffer.bf_getbuffer */
+static int
+RecordView_getbuffer(RecordView *self, Py_buffer *view, int flags)
+{
+    return PyBuffer_FillInfo(view, (PyObject *)self, self->value,
+                             (Py_ssize_t)self->value_size, 1, flags);
+}
+
+
+/* RecordView_tp_as_sequence.sq_length */
+static Py_ssize_t
+RecordView_Length(RecordView *self)
+{
+    return (Py_ssize_t)self->value_size;
+}
+
+
+/* RecordView_tp_as_buffer */
+static PyBufferProcs RecordView_tp_as_buffer = {
+#if PY_MAJOR_VERSION < 3
+    0,                                        /*bf_getreadbuffer*/
+    0,                                        /*bf_getwritebuffer*/
+    0,                                        /*bf_getsegcount*/
+    0,                                        /*bf_getcharbuffer*/
+#endif
+    (getbufferproc)RecordView_getbuffer,      /*bf_getbuffer*/
+    0,                                        /*bf_releasebuffer*/
+};
+
+
+/* RecordView_tp_as_sequence */
+static PySequenceMethods RecordView_tp_as_sequence = {
+    (lenfunc)RecordView_Length,               /*sq_length*/
+};
+
+
+/* RecordViewType */
+static PyTypeObject RecordViewType = {
+    PyVarObject_HEAD_INIT(NULL, 0)
+    "tokyo.cabinet.RecordView",               /*tp_name*/
+    sizeof(RecordView),                       /*tp_basicsize*/
+    0,                                        /*tp_itemsize*/
+    (destructor)RecordView_tp_dealloc,        /*tp_dealloc*/
+    0,                                        /*tp_print*/
+    0,                                        /*tp_getattr*/
+    0,                                        /*tp_setattr*/
+    0,                                        /*tp_compare*/
+    0,                                        /*tp_repr*/
+    0,                                        /*tp_as_number*/
+    &RecordView_tp_as_sequence,               /*tp_as_sequence*/
+    0,                                        /*tp_as_mapping*/
+    0,                                        /*tp_hash */
+    0,                                        /*tp_call*/
+    0,                                        /*tp_str*/
+    0,                                        /*tp_getattro*/
+    0,                                        /*tp_setattro*/
+    &RecordView_tp_as_buffer,                 /*tp_as_buffer*/
+#if PY_MAJOR_VERSION < 3
+    Py_TPFLAGS_DEFAULT | Py_TPFLAGS_HAVE_NEWBUFFER, /*tp_flags*/
+#else
+    Py_TPFLAGS_DEFAULT,                       /*tp_flags*/
+#endif
+    RecordView_tp_doc,                        /*tp_doc*/
+};
+
+
+/* convert a value allocated by tokyo cabinet to a RecordView, the view takes
+   ownership of value (it is freed on failure) */
+PyObject *
+void_to_view(void *value, int value_size)
+{
+    RecordView *self;
+
+    self = PyObject_New(RecordView, &RecordViewType);
+    if (!self) {
+        tcfree(value);
+        return NULL;
+    }
+    self->value = value;
+    self->value_size = value_size;
+    return (PyObject *)self;
+}
+
+
+/* convert a record found in a DBCache to bytes, or to a RecordView holding a
+   copy of it if view is true */
+PyObject *
+DBCache_to_value(const void *value, int value_size, bool view)
+{
+    if (view) {
+        return void_to_view(tcmemdup(value, value_size), value_size);
+    }
+    return void_to_bytes(value, value_size);
+}
+
+
+/*******************************************************************************
+* RecordMapType
+*******************************************************************************/
+
+#define RECORDMAP_KEYS 0
+#define RECORDMAP_VALUES 1
+#define RECORDMAP_ITEMS 2
+
+
+/* RecordMapType.tp_doc */
+PyDoc_STRVAR(RecordMap_tp_doc,
+"Read-only mapping of the columns of a table record, a column is converted to\n\
+bytes only when it is accessed.");
+
+
+/* RecordMapType.tp_dealloc */
+static void
+RecordMap_tp_dealloc(RecordMap *self)
+{
+    if (self->map) {
+        tcmapdel(self->map);
+    }
+    Py_TYPE(self)->tp_free((PyObject *)self);
+}
+
+
+/* look up a column, if it is missing raise KeyError when raise is true or
+   return NULL without setting an exception */
+static PyObject *
+RecordMap_Get(RecordMap *self, PyObject *pykey, bool raise)
+{
+    Py_buffer key_view;
+    void *key;
+    const void *value;
+    int key_size, value_size;
+    PyObject *pyvalue = NULL;
+
+    if (bytes_to_key(pykey, &key_view, &key, &key_size)) {
+        return NULL;
+    }
+    value = tcmapget(self->map, key, key_size, &value_size);
+    if (value) {
+        pyvalue = void_to_bytes(value, value_size);
+    }
+    else if (raise) {
+        set_key_error(key);
+    }
+    PyBuffer_Release(&key_view);
+    return pyvalue;
+}
+
+
+/* list the keys, values or items of a RecordMap */
+static PyObject *
+RecordMap_List(RecordMap *self, int what)
+{
+    const void *key, *value;
+    int key_size, value_size;
+    Py_ssize_t i = 0;
+    PyObject *pyresult, *pykey, *pyvalue, *pyitem;
+
+    pyresult = PyList_New(DB_Length(tcmaprnum(self->map)));
+    if (!pyresult) {
+        return NULL;
+    }
+    tcmapiterinit(self->map);
+    while ((key = tcmapiternext(self->map, &key_size)) != NULL) {
+        value = tcmapget(self->map, key, key_size, &value_size);
+        switch (what) {
+            case RECORDMAP_KEYS:
+                pyitem = void_to_bytes(key, key_size);
+                break;
+            case RECORDMAP_VALUES:
+                pyitem = void_to_bytes(value, value_size);
+                break;
+            default:
+                pyitem = NULL;
+                pykey = void_to_bytes(key, key_size);
+                pyvalue = void_to_bytes(value, value_size);
+                if (pykey && pyvalue) {
+                    pyitem = PyTuple_Pack(2, pykey, pyvalue);
+                }
+                Py_XDECREF(pykey);
+                Py_XDECREF(pyvalue);
+                break;
+        }
+        if (!pyitem) {
+            Py_DECREF(pyresult);
+            return NULL;
+        }
+        PyList_SET_ITEM(pyresult, i++, pyitem);
+    }
+    return pyresult;
+}
+
+
+/* RecordMapType.tp_iter */
+static PyObject *
+RecordMap_tp_iter(RecordMap *self)
+{
+    PyObject *pykeys, *pyiter;
+
+    pykeys = RecordMap_List(self, RECORDMAP_KEYS);
+    if (!pykeys) {
+        return NULL;
+    }
+    pyiter = PyObject_GetIter(pykeys);
+    Py_DECREF(pykeys);
+    return pyiter;
+}
+
+
+/* RecordMap_tp_as_sequence.sq_contains */
+static int
+RecordMap_Contains(RecordMap *self, PyObject *pykey)
+{
+    Py_buffer key_view;
+    void *key;
+    int key_size, value_size;
+    bool result;
+
+    if (bytes_to_void(pykey, &key_view, &key, &key_size)) {
+        return -1;
+    }
+    result = tcmapget(self->map, key, key_size, &value_size) != NULL;
+    PyBuffer_Release(&key_view);
+    return result;
+}
+
+
+/* RecordMap_tp_as_sequence */
+static PySequenceMethods RecordMap_tp_as_sequence = {
+    0,                                        /*sq_length*/
+    0,                                        /*sq_concat*/
+    0,                                        /*sq_repeat*/
+    0,                                        /*sq_item*/
+    0,                                        /*was_sq_slice*/
+    0,                                        /*sq_ass_item*/
+    0,                                        /*was_sq_ass_slice*/
+    (objobjproc)RecordMap_Contains,           /*sq_contains*/
+};
+
+
+/* RecordMap_tp_as_mapping.mp_length */
+static Py_ssize_t
+RecordMap_Length(RecordMap *self)
+{
+    return DB_Length(tcmaprnum(self->map));
+}
+
+
+/* RecordMap_tp_as_mapping.mp_subscript */
+static PyObject *
+RecordMap_GetItem(RecordMap *self, PyObject *pykey)
+{
+    return RecordMap_Get(self, pykey, true);
+}
+
+
+/* RecordMap_tp_as_mapping */
+static PyMappingMethods RecordMap_tp_as_mapping = {
+    (lenfunc)RecordMap_Length,                /*mp_length*/
+    (binaryfunc)RecordMap_GetItem,            /*mp_subscript*/
+    0,                                        /*mp_ass_subscript*/
+};
+
+
+/* RecordMap.get(key[, default=None]) */
+PyDoc_STRVAR(RecordMap_get_doc,
+"get(key[, default=None])\n\
+\n\
+Return the value of a column, or default if the record has no such column.");
+
+static PyObject *
+RecordMap_get(RecordMap *self, PyObject *args)
+{
+    PyObject *pykey, *pydefault = Py_None, *pyvalue;
+
+    if (!PyArg_ParseTuple(args, "O|O:get", &pykey, &pydefault)) {
+        return NULL;
+    }
+    pyvalue = RecordMap_Get(self, pykey, false);
+    if (!pyvalue && !PyErr_Occurred()) {
+        Py_INCREF(pydefault);
+        pyvalue = pydefault;
+    }
+    return pyvalue;
+}
+
+
+/* RecordMap.keys() -> list */
+PyDoc_STRVAR(RecordMap_keys_doc,
+"keys() -> list\n\
+\n\
+Return a list of the record's column names.");
+
+static PyObject *
+RecordMap_keys(RecordMap *self)
+{
+    return RecordMap_List(self, RECORDMAP_KEYS);
+}
+
+
+/* RecordMap.values() -> list */
+PyDoc_STRVAR(RecordMap_values_doc,
+"values() -> list\n\
+\n\
+Return a list of the record's column values.");
+
+static PyObject *
+RecordMap_values(RecordMap *self)
+{
+    return RecordMap_List(self, RECORDMAP_VALUES);
+}
+
+
+/* RecordMap.items() -> list */
+PyDoc_STRVAR(RecordMap_items_doc,
+"items() -> list\n\
+\n\
+Return a list of the record's (name, value) pairs.");
+
+static PyObject *
+RecordMap_items(RecordMap *self)
+{
+    return RecordMap_List(self, RECORDMAP_ITEMS);
+}
+
+
+/* RecordMap.todict() -> dict */
+PyDoc_STRVAR(RecordMap_todict_doc,
+"todict() -> dict\n\
+\n\
+Return the record as a dict (what TDB.get() returns when view is False).");
+
+static PyObject *
+RecordMap_todict(RecordMap *self)
+{
+    return tcmap_to_dict(self->map);
+}
+
+
+/* RecordMapType.tp_methods */
+static PyMethodDef RecordMap_tp_methods[] = {
+    {"get", (PyCFunction)RecordMap_get, METH_VARARGS, RecordMap_get_doc},
+    {"keys", (PyCFunction)RecordMap_keys, METH_NOARGS, RecordMap_keys_doc},
+    {"values", (PyCFunction)RecordMap_values, METH_NOARGS,
+     RecordMap_values_doc},
+    {"items", (PyCFunction)RecordMap_items, METH_NOARGS, RecordMap_items_doc},
+    {"todict", (PyCFunction)RecordMap_todict, METH_NOARGS,
+     RecordMap_todict_doc},
+    {NULL}  /* Sentinel */
+};
+
+
+/* RecordMapType */
+static PyTypeObject RecordMapType = {
+    PyVarObject_HEAD_INIT(NULL, 0)
+    "tokyo.cabinet.RecordMap",                /*tp_name*/
+    sizeof(RecordMap),                        /*tp_basicsize*/
+    0,                                        /*tp_itemsize*/
+    (destructor)RecordMap_tp_dealloc,         /*tp_dealloc*/
+    0,                                        /*tp_print*/
+    0,                                        /*tp_getattr*/
+    0,                                        /*tp_setattr*/
+    0,                                        /*tp_compare*/
+    0,                                        /*tp_repr*/
+    0,                                        /*tp_as_number*/
+    &RecordMap_tp_as_sequence,                /*tp_as_sequence*/
+    &RecordMap_tp_as_mapping,                 /*tp_as_mapping*/
+    0,                                        /*tp_hash */
+    0,                                        /*tp_call*/
+    0,                                        /*tp_str*/
+    0,                                        /*tp_getattro*/
+    0,                                        /*tp_setattro*/
+    0,                                        /*tp_as_buffer*/
+    Py_TPFLAGS_DEFAULT,                       /*tp_flags*/
+    RecordMap_tp_doc,                         /*tp_doc*/
+    0,                                        /*tp_traverse*/
+    0,                                        /*tp_clear*/
+    0,                                        /*tp_richcompare*/
+    0,                                        /*tp_weaklistoffset*/
+    (getiterfunc)RecordMap_tp_iter,           /*tp_iter*/
+    0,                                        /*tp_iternext*/
+    RecordMap_tp_methods,                     /*tp_methods*/
+};
+
+
+/* convert a record to a dict, or to a RecordMap if view is true, the map is
+   freed or owned by the RecordMap in any case */
+PyObject *
+tcmap_to_record(TCMAP *map, bool view)
+{
+    RecordMap *self;
+    PyObject *pyresult;
+
+    if (!view) {
+        pyresult = tcmap_to_dict(map);
+        tcmapdel(map);
+        return pyresult;
+    }
+    self = PyObject_New(RecordMap, &RecordMapType);
+    if (!self) {
+        tcmapdel(map);
+        return NULL;
+    }
+    self->map = map;
+    return (PyObject *)self;
+}
+
+
 /*******************************************************************************
 * types
 *******************************************************************************/
@@ -189,34 +693,51 @@ init_cabinet(void)
 
     /* checking types */
     if (
+        PyType_Ready(&RecordViewType) ||
+        PyType_Ready(&RecordMapType) ||
         PyType_Ready(&HDBType) ||
         PyType_Ready(&HDBIterKeysType) ||
         PyType_Ready(&HDBIterValuesType) ||
         PyType_Ready(&HDBIterItemsType) ||
+        PyType_Ready(&HDBIterKeysBatchType) ||
+        PyType_Ready(&HDBIterItemsBatchType) ||
         PyType_Ready(&MDBType) ||
         PyType_Ready(&MDBIterKeysType) ||
         PyType_Ready(&MDBIterValuesType) ||
         PyType_Ready(&MDBIterItemsType) ||
+        PyType_Ready(&MDBIterKeysBatchType) ||
+        PyType_Ready(&MDBIterItemsBatchType) ||
         PyType_Ready(&BDBType) ||
         PyType_Ready(&BDBCursorType) ||
+        PyType_Ready(&BDBScanType) ||
         PyType_Ready(&BDBIterKeysType) ||
         PyType_Ready(&BDBIterValuesType) ||
         PyType_Ready(&BDBIterItemsType) ||
+        PyType_Ready(&BDBIterKeysBatchType) ||
+        PyType_Ready(&BDBIterItemsBatchType) ||
         PyType_Ready(&NDBType) ||
         PyType_Ready(&NDBIterKeysType) ||
         PyType_Ready(&NDBIterValuesType) ||
         PyType_Ready(&NDBIterItemsType) ||
+        PyType_Ready(&NDBIterKeysBatchType) ||
+        PyType_Ready(&NDBIterItemsBatchType) ||
         PyType_Ready(&FDBType) ||
         PyType_Ready(&FDBIterKeysType) ||
         PyType_Ready(&FDBIterValuesType) ||
         PyType_Ready(&FDBIterItemsType) ||
+        PyType_Ready(&FDBIterKeysBatchType) ||
+        PyType_Ready(&FDBIterItemsBatchType) ||
         PyType_Ready(&TDBType) ||
         PyType_Ready(&TDBIterKeysType) ||
         PyType_Ready(&TDBIterValuesType) ||
         PyType_Ready(&TDBIterItemsType) ||
+        PyType_Ready(&TDBIterKeysBatchType) ||
+        PyType_Ready(&TDBIterItemsBatchType) ||
         PyType_Ready(&TDBIterValuesKeysType) ||
         PyType_Ready(&TDBIterValuesValsType) ||
-        PyType_Ready(&TDBQueryType)
+        PyType_Ready(&TDBQueryIterType) ||
+        PyType_Ready(&TDBQueryType) ||
+        PyType_Ready(&TDBQueryTemplateType)
        ) {
         return NULL;
     }
@@ -32,6 +32,13 @@
 #define TK_PY_MAX_DB_LEN ((unsigned long long)PY_SSIZE_T_MAX)
 #define TK_PY_MAX_ID ((unsigned long long)INT64_MAX)
 
+/* number of records converted at once by the *many methods */
+#define TK_PY_BATCH_SIZE 1024
+
+/* maximum number of records yielded at once by the batch iterators, their
+   buffers are allocated upfront */
+#define TK_PY_MAX_BATCH_SIZE (1 << 20)
+
 #if SIZEOF_SIZE_T > SIZEOF_INT
 #define TK_PY_SIZE_T_BIGGER_THAN_INT
 #define TK_PY_MAX_LEN ((Py_ssize_t)INT_MAX)
@@ -132,17 +139,30 @@ check_py_ssize_t_len(Py_ssize_t len, PyObject *obj)
 }
 
 
-/* convert a bytes object to a void ptr */
+/* get a pointer to the contents of a bytes-like object (bytes or any object
+   supporting the buffer protocol with contiguous data) without copying it,
+   view must be released with PyBuffer_Release() once the pointer is not
+   needed anymore (on failure there is nothing to release) */
 int
-bytes_to_void(PyObject *pyvalue, void **value, int *value_len)
+bytes_to_void(PyObject *pyvalue, Py_buffer *view, void **value, int *value_len)
 {
     char *tmp;
     Py_ssize_t tmp_len;
 
-    if (PyBytes_AsStringAndSize(pyvalue, &tmp, &tmp_len)) {
+    view->obj = NULL;
+    if (PyObject_CheckBuffer(pyvalue)) {
+        if (PyObject_GetBuffer(pyvalue, view, PyBUF_SIMPLE)) {
+            view->obj = NULL;
+            return -1;
+        }
+        tmp = (char *)view->buf;
+        tmp_len = view->len;
+    }
+    else if (PyBytes_AsStringAndSize(pyvalue, &tmp, &tmp_len)) {
         return -1;
     }
     if (check_py_ssize_t_len(tmp_len, pyvalue)) {
+        PyBuffer_Release(view);
         return -1;
     }
     *value = (void *)tmp;
@@ -151,6 +171,49 @@ bytes_to_void(PyObject *pyvalue, void **value, int *value_len)
 }
 
 
+/* same as bytes_to_void() but the key is guaranteed to be NUL terminated
+   (it ends up in KeyError messages), objects other than bytes and bytearray
+   are copied */
+int
+bytes_to_key(PyObject *pykey, Py_buffer *view, void **key, int *key_len)
+{
+    PyObject *pycopy;
+    int result;
+
+    if (bytes_to_void(pykey, view, key, key_len)) {
+        return -1;
+    }
+    if (!view->obj || PyBytes_Check(pykey) || PyByteArray_Check(pykey)) {
+        return 0;
+    }
+    pycopy = PyBytes_FromStringAndSize((const char *)*key, *key_len);
+    PyBuffer_Release(view);
+    if (!pycopy) {
+        return -1;
+    }
+    result = bytes_to_void(pycopy, view, key, key_len);
+    Py_DECREF(pycopy);
+    return result;
+}
+
+
+/* append the contents of a bytes-like object to a TCLIST */
+int
+tclist_push_bytes(TCLIST *list, PyObject *pyvalue)
+{
+    Py_buffer view;
+    void *value;
+    int value_size;
+
+    if (bytes_to_void(pyvalue, &view, &value, &value_size)) {
+        return -1;
+    }
+    tclistpush(list, value, value_size);
+    PyBuffer_Release(&view);
+    return 0;
+}
+
+
 /* convert a void ptr to a bytes object */
 PyObject *
 void_to_bytes(const void *value, int value_size)
@@ -224,6 +287,242 @@ tclist_to_tuple(TCLIST *result)
 }
 
 
+/* convert a TCLIST to a list */
+PyObject *
+tclist_to_list(TCLIST *result)
+{
+    const void *value;
+    int len, i, value_size;
+    PyObject *pyresult, *pyvalue;
+
+    len = tclistnum(result);
+    pyresult = PyList_New((Py_ssize_t)len);
+    if (!pyresult) {
+        return NULL;
+    }
+    for (i = 0; i < len; i++) {
+        value = tclistval(result, i, &value_size);
+        pyvalue = void_to_bytes(value, value_size);
+        if (!pyvalue) {
+            Py_DECREF(pyresult);
+            return NULL;
+        }
+        PyList_SET_ITEM(pyresult, (Py_ssize_t)i, pyvalue);
+    }
+    return pyresult;
+}
+
+
+/* convert two TCLISTs to a list of (key, value) tuples */
+PyObject *
+tclists_to_items(TCLIST *keys, TCLIST *values)
+{
+    const void *key, *value;
+    int len, i, key_size, value_size;
+    PyObject *pyresult, *pykey, *pyvalue, *pyitem;
+
+    len = tclistnum(keys);
+    pyresult = PyList_New((Py_ssize_t)len);
+    if (!pyresult) {
+        return NULL;
+    }
+    for (i = 0; i < len; i++) {
+        key = tclistval(keys, i, &key_size);
+        value = tclistval(values, i, &value_size);
+        pykey = void_to_bytes(key, key_size);
+        pyvalue = void_to_bytes(value, value_size);
+        pyitem = NULL;
+        if (pykey && pyvalue) {
+            pyitem = PyTuple_Pack(2, pykey, pyvalue);
+        }
+        Py_XDECREF(pykey);
+        Py_XDECREF(pyvalue);
+        if (!pyitem) {
+            Py_DECREF(pyresult);
+            return NULL;
+        }
+        PyList_SET_ITEM(pyresult, (Py_ssize_t)i, pyitem);
+    }
+    return pyresult;
+}
+
+
+/* convert a Python sequence to a TCLIST */
+TCLIST *
+seq_to_tclist(PyObject *pyvalues)
+{
+    const char *msg = "a sequence is required";
+    PyObject *pyseq;
+    Py_ssize_t len, i;
+    TCLIST *values;
+
+    if (PyBytes_Check(pyvalues) || PyUnicode_Check(pyvalues)) {
+        set_error(PyExc_TypeError, msg);
+        return NULL;
+    }
+    pyseq = PySequence_Fast(pyvalues, msg);
+    if (!pyseq) {
+        return NULL;
+    }
+    len = PySequence_Fast_GET_SIZE(pyseq);
+    if (check_py_ssize_t_len(len, pyseq)) {
+        Py_DECREF(pyseq);
+        return NULL;
+    }
+    values = tclistnew2((int)len);
+    if (!values) {
+        set_error(Error, "could not create TCLIST, memory issue?");
+        Py_DECREF(pyseq);
+        return NULL;
+    }
+    for (i = 0; i < len; i++) {
+        if (tclist_push_bytes(values, PySequence_Fast_GET_ITEM(pyseq, i))) {
+            Py_DECREF(pyseq);
+            tclistdel(values);
+            return NULL;
+        }
+    }
+    Py_DECREF(pyseq);
+    return values;
+}
+
+
+/* convert a list of records to a list, missing records (NULL) are replaced by
+   pydefault, records are freed in all cases */
+PyObject *
+values_to_list(void **values, int *value_sizes, int len, PyObject *pydefault)
+{
+    int i;
+    PyObject *pyresult, *pyvalue;
+
+    pyresult = PyList_New((Py_ssize_t)len);
+    for (i = 0; i < len; i++) {
+        if (pyresult) {
+            if (values[i]) {
+                pyvalue = void_to_bytes(values[i], value_sizes[i]);
+            }
+            else {
+                Py_INCREF(pydefault);
+                pyvalue = pydefault;
+            }
+            if (pyvalue) {
+                PyList_SET_ITEM(pyresult, (Py_ssize_t)i, pyvalue);
+            }
+            else {
+                Py_CLEAR(pyresult);
+            }
+        }
+        if (values[i]) {
+            tcfree(values[i]);
+        }
+    }
+    return pyresult;
+}
+
+
+/* *DB.putmany() modes */
+enum {
+    TK_PY_PUT,
+    TK_PY_PUTKEEP,
+    TK_PY_PUTCAT
+};
+
+int
+str_to_put_mode(const char *mode)
+{
+    if (!strcmp(mode, "put")) {
+        return TK_PY_PUT;
+    }
+    else if (!strcmp(mode, "keep")) {
+        return TK_PY_PUTKEEP;
+    }
+    else if (!strcmp(mode, "cat")) {
+        return TK_PY_PUTCAT;
+    }
+    PyErr_Format(PyExc_ValueError, "unknown mode: '%s'", mode);
+    return -1;
+}
+
+
+/* return an iterator over the (key, value) pairs of a dict or an iterable */
+PyObject *
+items_to_iter(PyObject *pyitems)
+{
+    PyObject *pyiter, *pyseq;
+
+    if (PyDict_Check(pyitems)) {
+        pyseq = PyDict_Items(pyitems);
+        if (!pyseq) {
+            return NULL;
+        }
+        pyiter = PyObject_GetIter(pyseq);
+        Py_DECREF(pyseq);
+        return pyiter;
+    }
+    return PyObject_GetIter(pyitems);
+}
+
+
+/* get the next (key, value) pair from an iterator, return 1 on success, 0 when
+   the iterator is exhausted and -1 on error (new references) */
+int
+iter_next_pair(PyObject *pyiter, PyObject **pykey, PyObject **pyvalue)
+{
+    PyObject *pyitem, *pyseq;
+
+    pyitem = PyIter_Next(pyiter);
+    if (!pyitem) {
+        return PyErr_Occurred() ? -1 : 0;
+    }
+    pyseq = PySequence_Fast(pyitem, "items must be (key, value) pairs");
+    Py_DECREF(pyitem);
+    if (!pyseq) {
+        return -1;
+    }
+    if (PySequence_Fast_GET_SIZE(pyseq) != 2) {
+        Py_DECREF(pyseq);
+        set_error(PyExc_ValueError, "items must be (key, value) pairs");
+        return -1;
+    }
+    *pykey = PySequence_Fast_GET_ITEM(pyseq, 0);
+    *pyvalue = PySequence_Fast_GET_ITEM(pyseq, 1);
+    Py_INCREF(*pykey);
+    Py_INCREF(*pyvalue);
+    Py_DECREF(pyseq);
+    return 1;
+}
+
+
+/* fill keys and values with at most max (key, value) pairs from an iterator,
+   return the number of pairs read or -1 on error */
+int
+iter_to_tclists(PyObject *pyiter, TCLIST *keys, TCLIST *values, int max)
+{
+    PyObject *pykey, *pyvalue;
+    int len = 0, next;
+
+    while (len < max) {
+        next = iter_next_pair(pyiter, &pykey, &pyvalue);
+        if (next < 0) {
+            return -1;
+        }
+        else if (!next) {
+            break;
+        }
+        if (tclist_push_bytes(keys, pykey) ||
+            tclist_push_bytes(values, pyvalue)) {
+            Py_DECREF(pykey);
+            Py_DECREF(pyvalue);
+            return -1;
+        }
+        Py_DECREF(pykey);
+        Py_DECREF(pyvalue);
+        len++;
+    }
+    return len;
+}
+
+
 /* convert a TCMAP to a dict */
 PyObject *
 tcmap_to_dict(TCMAP *result)
@@ -267,6 +566,7 @@ dict_to_tcmap(PyObject *pyitems)
     TCMAP *items;
     PyObject *pykey, *pyvalue;
     Py_ssize_t pos = 0;
+    Py_buffer key_view, value_view;
     void *key, *value;
     int key_size, value_size;
 
@@ -280,12 +580,18 @@ dict_to_tcmap(PyObject *pyitems)
         return NULL;
     }
     while (PyDict_Next(pyitems, &pos, &pykey, &pyvalue)) {
-        if (bytes_to_void(pykey, &key, &key_size) ||
-            bytes_to_void(pyvalue, &value, &value_size)) {
+        if (bytes_to_void(pykey, &key_view, &key, &key_size)) {
+            tcmapdel(items);
+            return NULL;
+        }
+        if (bytes_to_void(pyvalue, &value_view, &value, &value_size)) {
+            PyBuffer_Release(&key_view);
             tcmapdel(items);
             return NULL;
         }
         tcmapput(items, key, key_size, value, value_size);
+        PyBuffer_Release(&key_view);
+        PyBuffer_Release(&value_view);
     }
     return items;
 }
@@ -380,6 +686,14 @@ ids_to_frozenset(uint64_t *result, int result_size)
 typedef struct {
     PyObject_HEAD
     PyObject *db;
+    int batch;
+    bool view; /* TDB iterators yield RecordMaps instead of dicts */
+    TCXSTR *key;
+    TCXSTR *value;
+    bool resumable; /* carry on instead of failing when the database changes */
+    TCXSTR *last; /* last key yielded by a resumable BDB iterator */
+    long last_count; /* number of times in a row it was yielded */
+    unsigned long long version; /* write counter of the BDB at the last step */
 } DBIter;
 
 
@@ -405,6 +719,15 @@ DBIter_tp_clear(DBIter *self)
 static void
 DBIter_tp_dealloc(DBIter *self)
 {
+    if (self->key) {
+        tcxstrdel(self->key);
+    }
+    if (self->value) {
+        tcxstrdel(self->value);
+    }
+    if (self->last) {
+        tcxstrdel(self->last);
+    }
     DBIter_tp_clear(self);
     Py_TYPE(self)->tp_free((PyObject *)self);
 }
@@ -425,6 +748,36 @@ DBIter_tp_new(PyTypeObject *type, PyObject *db)
 }
 
 
+/* take the key/value scratch buffers of an iterator, they are reused across
+   next() calls (a concurrent call on the same iterator gets new ones) */
+static void
+DBIter_borrow_buffers(DBIter *self, TCXSTR **key, TCXSTR **value)
+{
+    *key = self->key ? self->key : tcxstrnew();
+    *value = self->value ? self->value : tcxstrnew();
+    self->key = self->value = NULL;
+}
+
+
+/* give the scratch buffers back to the iterator */
+static void
+DBIter_return_buffers(DBIter *self, TCXSTR *key, TCXSTR *value)
+{
+    if (self->key) {
+        tcxstrdel(key);
+    }
+    else {
+        self->key = key;
+    }
+    if (self->value) {
+        tcxstrdel(value);
+    }
+    else {
+        self->value = value;
+    }
+}
+
+
 /* DBIter.__length_hint__ */
 PyDoc_STRVAR(DBIter_length_hint_doc,
 "Private method returning an estimate of len(list(db)).");
@@ -448,4 +801,420 @@ static PyMethodDef DBIter_tp_methods[] = {
 };
 
 
+/* check the batch argument of the iterkeys()/iteritems() methods */
+int
+check_batch(int batch)
+{
+    if (batch < 0) {
+        set_error(PyExc_ValueError, "batch must be positive or 0");
+        return -1;
+    }
+    if (batch > TK_PY_MAX_BATCH_SIZE) {
+        PyErr_Format(PyExc_ValueError, "batch must not be greater than %d",
+                     TK_PY_MAX_BATCH_SIZE);
+        return -1;
+    }
+    return 0;
+}
+
+
+/* parse the batch argument of the iterkeys()/iteritems() methods */
+int
+parse_batch(PyObject *args, PyObject *kwargs, const char *format, int *batch)
+{
+    static char *kwlist[] = {"batch", NULL};
+
+    if (!PyArg_ParseTupleAndKeywords(args, kwargs, format, kwlist, batch)) {
+        return -1;
+    }
+    return check_batch(*batch);
+}
+
+
+/* set the number of records a batch iterator yields at once */
+static PyObject *
+DBIter_set_batch(PyObject *iter, int batch)
+{
+    if (iter) {
+        ((DBIter *)iter)->batch = batch;
+    }
+    return iter;
+}
+
+
+/* make a TDB iterator yield RecordMaps */
+static PyObject *
+DBIter_set_view(PyObject *iter, bool view)
+{
+    if (iter) {
+        ((DBIter *)iter)->view = view;
+    }
+    return iter;
+}
+
+
+/* make an iterator resumable: it carries on instead of failing when the
+   database changes */
+static PyObject *
+DBIter_set_resumable(PyObject *iter, bool resumable)
+{
+    if (iter) {
+        ((DBIter *)iter)->resumable = resumable;
+    }
+    return iter;
+}
+
+
+/* DBIterBatch.__length_hint__ */
+PyDoc_STRVAR(DBIterBatch_length_hint_doc,
+"Private method returning an estimate of len(list(iterator)).");
+
+static PyObject *
+DBIterBatch_length_hint(DBIter *self)
+{
+    Py_ssize_t len = PyMapping_Length(self->db);
+    if (len < 0) {
+        return NULL;
+    }
+    return PyLong_FromSsize_t((len + self->batch - 1) / self->batch);
+}
+
+
+/* DBIterBatch_tp_methods */
+static PyMethodDef DBIterBatch_tp_methods[] = {
+    {"__length_hint__", (PyCFunction)DBIterBatch_length_hint, METH_NOARGS,
+     DBIterBatch_length_hint_doc},
+    {NULL}  /* Sentinel */
+};
+
+
+/*******************************************************************************
+* QueryIter
+*******************************************************************************/
+
+/* QueryIter, iterates over the primary keys found by a table query */
+typedef struct {
+    PyObject_HEAD
+    PyObject *db;
+    TCLIST *result; /* keys are shifted out of it as they are yielded */
+    bool values;
+} QueryIter;
+
+
+/* QueryIter_tp_traverse */
+static int
+QueryIter_tp_traverse(QueryIter *self, visitproc visit, void *arg)
+{
+    Py_VISIT(self->db);
+    return 0;
+}
+
+
+/* QueryIter_tp_clear */
+static int
+QueryIter_tp_clear(QueryIter *self)
+{
+    Py_CLEAR(self->db);
+    return 0;
+}
+
+
+/* QueryIter_tp_dealloc */
+static void
+QueryIter_tp_dealloc(QueryIter *self)
+{
+    if (self->result) {
+        tclistdel(self->result);
+    }
+    QueryIter_tp_clear(self);
+    Py_TYPE(self)->tp_free((PyObject *)self);
+}
+
+
+/* new_QueryIter, takes ownership of result (it is freed on failure) */
+static PyObject *
+new_QueryIter(PyTypeObject *type, PyObject *db, TCLIST *result, bool values)
+{
+    QueryIter *self = (QueryIter *)type->tp_alloc(type, 0);
+    if (!self) {
+        tclistdel(result);
+        return NULL;
+    }
+    /* self->db */
+    Py_INCREF(db);
+    self->db = db;
+    self->result = result;
+    self->values = values;
+    return (PyObject *)self;
+}
+
+
+/* parse the values argument of the *Query.iter() methods */
+int
+parse_query_iter_values(PyObject *args, PyObject *kwargs, const char *format,
+                        bool *values)
+{
+    PyObject *pyvalues = Py_False;
+
+    static char *kwlist[] = {"values", NULL};
+
+    if (!PyArg_ParseTupleAndKeywords(args, kwargs, format, kwlist,
+                                     &pyvalues)) {
+        return -1;
+    }
+    if (!PyBool_Check(pyvalues)) {
+        set_error(PyExc_TypeError, "a boolean is required");
+        return -1;
+    }
+    *values = (pyvalues == Py_True);
+    return 0;
+}
+
+
+/* QueryIter.__length_hint__ */
+PyDoc_STRVAR(QueryIter_length_hint_doc,
+"Private method returning the number of keys left.");
+
+static PyObject *
+QueryIter_length_hint(QueryIter *self)
+{
+    return PyLong_FromLong((long)tclistnum(self->result));
+}
+
+
+/* QueryIter_tp_methods */
+static PyMethodDef QueryIter_tp_methods[] = {
+    {"__length_hint__", (PyCFunction)QueryIter_length_hint, METH_NOARGS,
+     QueryIter_length_hint_doc},
+    {NULL}  /* Sentinel */
+};
+
+
+/*******************************************************************************
+* DBCache
+*******************************************************************************/
+
+/* in-process read-through record cache (HDB/BDB.setreadcache()), records are
+   kept in LRU order, least recently used first */
+typedef struct {
+    TCMAP *records;
+    unsigned long long *version; /* write counter of the database, bumped by
+                                    every invalidation (NULL if none) */
+    unsigned long long max_bytes;
+    unsigned long long bytes; /* sum of the key and value sizes */
+    unsigned long long hits;
+    unsigned long long misses;
+    unsigned long long evictions;
+} DBCache;
+
+
+/* parse the max_bytes argument of HDB/BDB.setreadcache() and
+   TDB.setquerycache(), 0 disables the cache */
+int
+parse_cache_max_bytes(PyObject *args, PyObject *kwargs, const char *format,
+                      unsigned long long *max_bytes)
+{
+    long long lmax_bytes;
+
+    static char *kwlist[] = {"max_bytes", NULL};
+
+    if (!PyArg_ParseTupleAndKeywords(args, kwargs, format, kwlist,
+                                     &lmax_bytes)) {
+        return -1;
+    }
+    if (lmax_bytes < 0) {
+        set_error(PyExc_ValueError, "max_bytes must be positive or 0");
+        return -1;
+    }
+    *max_bytes = (unsigned long long)lmax_bytes;
+    return 0;
+}
+
+
+/* create a cache, version is the write counter of the database (or NULL) */
+DBCache *
+DBCache_new(unsigned long long max_bytes, unsigned long long *version)
+{
+    DBCache *cache;
+
+    cache = PyMem_New(DBCache, 1);
+    if (!cache) {
+        PyErr_NoMemory();
+        return NULL;
+    }
+    cache->records = tcmapnew();
+    if (!cache->records) {
+        PyMem_Free(cache);
+        set_error(Error, "could not create TCMAP, memory issue?");
+        return NULL;
+    }
+    cache->version = version;
+    cache->max_bytes = max_bytes;
+    cache->bytes = cache->hits = cache->misses = cache->evictions = 0;
+    return cache;
+}
+
+
+/* delete a cache (does nothing if cache is NULL) */
+void
+DBCache_del(DBCache *cache)
+{
+    if (cache) {
+        tcmapdel(cache->records);
+        PyMem_Free(cache);
+    }
+}
+
+
+/* evict the least recently used records until the cache fits in max_bytes */
+void
+DBCache_trim(DBCache *cache)
+{
+    const void *key;
+    int key_size, value_size;
+
+    while (cache->bytes > cache->max_bytes) {
+        tcmapiterinit(cache->records);
+        key = tcmapiternext(cache->records, &key_size);
+        if (!key) {
+            break;
+        }
+        tcmapget(cache->records, key, key_size, &value_size);
+        cache->bytes -= key_size + value_size;
+        tcmapcutfront(cache->records, 1);
+        cache->evictions++;
+    }
+}
+
+
+/* look up a record, the returned pointer is only valid until the next call
+   modifying the cache (returns NULL if cache is NULL) */
+const void *
+DBCache_get(DBCache *cache, const void *key, int key_size, int *value_size)
+{
+    const void *value;
+
+    if (!cache) {
+        return NULL;
+    }
+    value = tcmapget(cache->records, key, key_size, value_size);
+    if (value) {
+        tcmapmove(cache->records, key, key_size, false);
+        cache->hits++;
+    }
+    else {
+        cache->misses++;
+    }
+    return value;
+}
+
+
+/* bump the write counter of the database of a cache */
+static void
+DBCache_invalidate(DBCache *cache)
+{
+    if (cache->version) {
+        (*cache->version)++;
+    }
+}
+
+
+/* remove a record from the cache */
+static void
+DBCache_remove(DBCache *cache, const void *key, int key_size)
+{
+    int value_size;
+
+    if (tcmapget(cache->records, key, key_size, &value_size)) {
+        cache->bytes -= key_size + value_size;
+        tcmapout(cache->records, key, key_size);
+    }
+}
+
+
+/* drop a record from the cache after a write (does nothing if cache is
+   NULL) */
+void
+DBCache_out(DBCache *cache, const void *key, int key_size)
+{
+    if (cache) {
+        DBCache_invalidate(cache);
+        DBCache_remove(cache, key, key_size);
+    }
+}
+
+
+/* drop the first num keys of a TCLIST from the cache (does nothing if cache is
+   NULL) */
+void
+DBCache_out_tclist(DBCache *cache, TCLIST *keys, int num)
+{
+    const void *key;
+    int key_size, i;
+
+    if (cache) {
+        for (i = 0; i < num; i++) {
+            key = tclistval(keys, i, &key_size);
+            DBCache_out(cache, key, key_size);
+        }
+    }
+}
+
+
+/* store a record in the cache (does nothing if cache is NULL) */
+void
+DBCache_put(DBCache *cache, const void *key, int key_size, const void *value,
+            int value_size)
+{
+    if (!cache || (unsigned long long)key_size + value_size > cache->max_bytes) {
+        return;
+    }
+    DBCache_remove(cache, key, key_size);
+    tcmapput(cache->records, key, key_size, value, value_size);
+    cache->bytes += key_size + value_size;
+    DBCache_trim(cache);
+}
+
+
+/* drop all records from the cache (does nothing if cache is NULL) */
+void
+DBCache_clear(DBCache *cache)
+{
+    if (cache) {
+        DBCache_invalidate(cache);
+        tcmapclear(cache->records);
+        cache->bytes = 0;
+    }
+}
+
+
+/* store a record read with the GIL released, unless the write counter of the
+   database moved from version (the value read may be stale then) */
+void
+DBCache_fill(DBCache *cache, unsigned long long version, const void *key,
+             int key_size, const void *value, int value_size)
+{
+    if (cache && cache->version && *cache->version == version) {
+        DBCache_put(cache, key, key_size, value, value_size);
+    }
+}
+
+
+/* return the cache statistics as a dict (None if cache is NULL) */
+PyObject *
+DBCache_stats(DBCache *cache)
+{
+    if (!cache) {
+        Py_RETURN_NONE;
+    }
+    return Py_BuildValue("{sKsKsKsKsKsK}",
+                         "hits", cache->hits,
+                         "misses", cache->misses,
+                         "evictions", cache->evictions,
+                         "records", (unsigned long long)tcmaprnum(cache->records),
+                         "bytes", cache->bytes,
+                         "max_bytes", cache->max_bytes);
+}
+
+
 #endif /* _TOKYO_PYTHON_H */
@@ -134,6 +134,7 @@ init_tyrant(void)
         PyType_Ready(&RTDBIterItemsType) ||
         PyType_Ready(&RTDBIterValuesKeysType) ||
         PyType_Ready(&RTDBIterValuesValsType) ||
+        PyType_Ready(&RTDBQueryIterType) ||
         PyType_Ready(&RTDBQueryType)
        ) {
         return NULL;
@@ -0,0 +1,87 @@
+"""Threaded throughput benchmark: reads and writes records of HDB, BDB, FDB
+and TDB databases from 1, 2, 4 and 8 threads and prints the number of
+operations per second, which should grow with the number of threads now that
+the GIL is released around the Tokyo Cabinet calls.
+
+usage: python bench_threads.py [records]"""
+
+
+import sys
+import os
+import tempfile
+import threading
+import time
+
+from tokyo.cabinet import (HDBOWRITER, HDBOCREAT, BDBOWRITER, BDBOCREAT,
+                           FDBOWRITER, FDBOCREAT, TDBOWRITER, TDBOCREAT,
+                           HDB, BDB, FDB, TDB)
+
+
+THREADS = (1, 2, 4, 8)
+
+
+def hdb_key(i):
+    return str(i).encode()
+
+
+def hdb_value(i):
+    return str(i).encode() * 16
+
+
+def fdb_key(i):
+    return i + 1
+
+
+def tdb_value(i):
+    return {b"name": str(i).encode(), b"value": str(i).encode() * 16}
+
+
+DATABASES = (
+    ("HDB", HDB, HDBOWRITER | HDBOCREAT, "tch", hdb_key, hdb_value),
+    ("BDB", BDB, BDBOWRITER | BDBOCREAT, "tcb", hdb_key, hdb_value),
+    ("FDB", FDB, FDBOWRITER | FDBOCREAT, "tcf", fdb_key, hdb_value),
+    ("TDB", TDB, TDBOWRITER | TDBOCREAT, "tct", hdb_key, tdb_value),
+)
+
+
+def run(nthreads, records, work):
+    per_thread = records // nthreads
+    threads = [threading.Thread(target=work,
+                                args=(n * per_thread, (n + 1) * per_thread))
+               for n in range(nthreads)]
+    start = time.time()
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    return (per_thread * nthreads) / (time.time() - start)
+
+
+def bench(name, type, mode, ext, key, value, records):
+    path = os.path.join(tempfile.gettempdir(), "tmp_bench_threads." + ext)
+    db = type()
+    db.open(path, mode)
+    try:
+        def write(first, last):
+            for i in range(first, last):
+                db[key(i)] = value(i)
+
+        def read(first, last):
+            for i in range(first, last):
+                db[key(i)]
+
+        for nthreads in THREADS:
+            db.clear()
+            writes = run(nthreads, records, write)
+            reads = run(nthreads, records, read)
+            print("{0} {1} thread(s): {2:.0f} writes/s, "
+                  "{3:.0f} reads/s".format(name, nthreads, writes, reads))
+    finally:
+        db.close()
+        os.remove(path)
+
+
+if __name__ == "__main__":
+    records = int(sys.argv[1]) if len(sys.argv) > 1 else 100000
+    for database in DATABASES:
+        bench(*database, records=records)
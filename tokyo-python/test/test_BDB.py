@@ -2,6 +2,8 @@ import unittest
 import sys
 import os
 import tempfile
+import threading
+import struct
 
 from tokyo.cabinet import (BDBOREADER, BDBOWRITER, BDBOCREAT, BDB,
                            BDBCPBEFORE, BDBCPAFTER, Error, INT_MAX, INT_MIN)
@@ -132,6 +134,73 @@ class BDBTestIter(BDBTest):
         self.assertEqual({b"a": b"1", b"b": b"2", b"c": b"3"},
                          dict(self.db.iteritems()))
 
+    def test_iteritems_sizes(self):
+        items = dict((str(i).encode(), b"x" * (i * 37 % 101))
+                     for i in range(100))
+        self.db.putmany(items)
+        self.assertEqual(items, dict(self.db.iteritems()))
+        self.assertEqual(sorted(items.values()),
+                         sorted(self.db.itervalues()))
+
+    def test_iterkeys_batch(self):
+        self.db[b"a"] = b"1"
+        self.db[b"b"] = b"2"
+        self.db[b"c"] = b"3"
+        batches = list(self.db.iterkeys(batch=2))
+        self.assertEqual([2, 1], [len(batch) for batch in batches])
+        self.assertEqual([b"a", b"b", b"c"],
+                         [key for batch in batches for key in batch])
+        self.assertEqual([[b"a", b"b", b"c"]],
+                         [batch for batch in self.db.iterkeys(batch=3)])
+        self.assertRaises(ValueError, self.db.iterkeys, -1)
+        self.assertRaises(ValueError, self.db.iterkeys, 2 ** 31 - 1)
+        self.assertRaises(ValueError, self.db.iteritems, 2 ** 31 - 1)
+        i = self.db.iterkeys(batch=1)
+        next(i)
+        self.db[b"d"] = b"4"
+        self.assertRaises(Error, next, i)
+
+    def test_iterkeys_resumable(self):
+        self.assertRaises(TypeError, self.db.iterkeys, resumable=1)
+        for key in (b"a", b"b", b"c", b"d"):
+            self.db[key] = key
+        self.db.putdup(b"b", [b"bb"])
+        seen = []
+        for key in self.db.iterkeys(resumable=True):
+            seen.append(key)
+            if len(key) == 1:
+                self.db[key + b"x"] = key
+            if key == b"c":
+                del self.db[b"c"]
+        self.assertEqual(seen, [b"a", b"ax", b"b", b"b", b"bx", b"c", b"cx",
+                                b"d", b"dx"])
+        i = self.db.iterkeys(batch=2, resumable=True)
+        self.assertEqual(next(i), [b"a", b"ax"])
+        self.db.clear()
+        self.db[b"z"] = b"1"
+        self.assertEqual(next(i), [b"z"])
+        self.assertRaises(StopIteration, next, i)
+
+    def test_iterkeys_resumable_duplicates(self):
+        self.db.putdup(b"a", (str(i).encode() for i in range(5000)))
+        i = self.db.iterkeys(batch=100, resumable=True)
+        keys = next(i)
+        self.db[b"b"] = b"1"
+        for batch in i:
+            keys.extend(batch)
+        self.assertEqual(keys, [b"a"] * 5000 + [b"b"])
+
+    def test_iteritems_batch(self):
+        self.db[b"a"] = b"1"
+        self.db[b"b"] = b"2"
+        self.db[b"c"] = b"3"
+        items = []
+        for batch in self.db.iteritems(batch=2):
+            self.assertTrue(isinstance(batch, list))
+            items.extend(batch)
+        self.assertEqual([(b"a", b"1"), (b"b", b"2"), (b"c", b"3")],
+                         sorted(items))
+
     def test_iterkeys_duplicate(self):
         self.db[b"a"] = b"1"
         self.db[b"b"] = b"21"
@@ -319,6 +388,7 @@ class BDBTestDuplicate(BDBTest):
         self.db.putdup(b"a", [b"1", b"2"])
         self.assertEqual(self.db.get(b"a"), b"1")
         self.assertEqual(self.db.get(b"a", True), (b"1", b"2"))
+        self.assertRaises(ValueError, self.db.get, b"a", True, True)
 
     def test_remove(self):
         self.db.putdup(b"a", [b"1", b"2"])
@@ -330,6 +400,51 @@ class BDBTestDuplicate(BDBTest):
         self.db.remove(b"a", True)
         self.assertEqual(len(self.db), 0)
 
+    def test_putdup_iterable(self):
+        self.assertRaises(TypeError, self.db.putdup, b"a", b"12")
+        self.assertRaises(TypeError, self.db.putdup, b"a", 1)
+        self.assertRaises(TypeError, self.db.putdup, b"a", [b"1", 2])
+        self.assertEqual(len(self.db), 0)
+        self.db.putdup(b"a", (str(i).encode() for i in range(3000)))
+        self.assertEqual(len(self.db), 3000)
+        self.db.putdup(b"b", iter([]))
+        self.assertTrue(b"b" not in self.db)
+
+    def test_putdup_partial(self):
+        # the first two batches (TK_PY_BATCH_SIZE values each) are stored
+        # before the third one fails
+        values = [str(i).encode() for i in range(2500)]
+        values[2100] = 1
+        self.assertRaises(TypeError, self.db.putdup, b"a", values)
+        self.assertEqual(self.db.countdup(b"a"), 2048)
+        self.assertEqual(list(self.db.iterdup(b"a")), values[:2048])
+        self.db.begin()
+        self.assertRaises(TypeError, self.db.putdup, b"b", values)
+        self.db.abort()
+        self.assertTrue(b"b" not in self.db)
+
+    def test_countdup(self):
+        self.assertEqual(self.db.countdup(b"a"), 0)
+        self.db.putdup(b"a", [b"1", b"2", b"3"])
+        self.db[b"b"] = b"4"
+        self.assertEqual(self.db.countdup(b"a"), 3)
+        self.assertEqual(self.db.countdup(b"b"), 1)
+
+    def test_iterdup(self):
+        self.assertRaises(ValueError, self.db.iterdup, b"a", -1)
+        self.assertRaises(ValueError, self.db.iterdup, b"a", limit=-1)
+        self.assertEqual(list(self.db.iterdup(b"a")), [])
+        values = [str(i).encode() for i in range(1000)]
+        self.db[b"0"] = b"before"
+        self.db.putdup(b"a", values)
+        self.db[b"b"] = b"after"
+        self.assertEqual(list(self.db.iterdup(b"a")), values)
+        self.assertEqual(list(self.db.iterdup(b"a", 10, 5)), values[10:15])
+        self.assertEqual(list(self.db.iterdup(b"a", skip=990)), values[990:])
+        self.assertEqual(list(self.db.iterdup(b"a", limit=0)), [])
+        self.assertEqual(list(self.db.iterdup(b"b")), [b"after"])
+        self.assertEqual(list(self.db.iterdup(b"c")), [])
+
     def test_put(self):
         self.db.put(b"a", b"1")
         self.assertEqual(len(self.db), 1)
@@ -434,6 +549,332 @@ class BDBTestCursor(BDBTest):
         self.assertRaises(Error, c.item)
 
 
+class BDBTestScan(BDBTest):
+
+    def setUp(self):
+        BDBTest.setUp(self)
+        for key in (b"a", b"b", b"ba", b"bb", b"c", b"d"):
+            self.db[key] = key.upper()
+
+    def test_scan(self):
+        self.assertEqual(list(self.db.scan(keys_only=True)),
+                         [b"a", b"b", b"ba", b"bb", b"c", b"d"])
+        self.assertEqual(list(self.db.scan(b"b", b"c")),
+                         [(b"b", b"B"), (b"ba", b"BA"), (b"bb", b"BB")])
+        self.assertEqual(list(self.db.scan(stop=b"b", keys_only=True)), [b"a"])
+        self.assertEqual(list(self.db.scan(b"bz", keys_only=True)),
+                         [b"c", b"d"])
+        self.assertEqual(list(self.db.scan(b"e")), [])
+
+    def test_scan_inclusive(self):
+        self.assertEqual(list(self.db.scan(b"b", b"c", keys_only=True,
+                                           inclusive=(False, True))),
+                         [b"ba", b"bb", b"c"])
+        self.assertEqual(list(self.db.scan(b"b", b"c", keys_only=True,
+                                           reverse=True,
+                                           inclusive=(False, True))),
+                         [b"c", b"bb", b"ba"])
+        self.assertRaises(TypeError, self.db.scan, inclusive=True)
+        self.assertRaises(TypeError, self.db.scan, inclusive=(1, 0))
+
+    def test_scan_reverse(self):
+        self.assertEqual(list(self.db.scan(reverse=True, keys_only=True)),
+                         [b"d", b"c", b"bb", b"ba", b"b", b"a"])
+        self.assertEqual(list(self.db.scan(b"b", b"c", reverse=True)),
+                         [(b"bb", b"BB"), (b"ba", b"BA"), (b"b", b"B")])
+        self.assertEqual(list(self.db.scan(stop=b"bz", reverse=True,
+                                           keys_only=True)),
+                         [b"bb", b"ba", b"b", b"a"])
+
+    def test_scan_prefix(self):
+        self.assertEqual(list(self.db.scan(prefix=b"b", keys_only=True)),
+                         [b"b", b"ba", b"bb"])
+        self.assertEqual(list(self.db.scan(prefix=b"b", reverse=True,
+                                           keys_only=True)),
+                         [b"bb", b"ba", b"b"])
+        self.assertEqual(list(self.db.scan(b"ba", prefix=b"b",
+                                           keys_only=True)),
+                         [b"ba", b"bb"])
+        self.assertEqual(list(self.db.scan(prefix=b"x")), [])
+
+    def test_scan_limit(self):
+        self.assertEqual(list(self.db.scan(limit=2, keys_only=True)),
+                         [b"a", b"b"])
+        self.assertEqual(list(self.db.scan(limit=2, reverse=True,
+                                           keys_only=True)),
+                         [b"d", b"c"])
+        self.assertEqual(list(self.db.scan(limit=0)), [])
+        self.assertRaises(ValueError, self.db.scan, limit=-1)
+
+    def test_scan_batches(self):
+        self.db.clear()
+        keys = [("%04d" % i).encode() for i in range(1000)]
+        for key in keys:
+            self.db[key] = key
+        scan = self.db.scan(keys_only=True)
+        self.assertEqual(next(scan), b"0000")
+        self.assertEqual(list(scan), keys[1:])
+        self.assertEqual(list(self.db.scan(keys[300], keys[700])),
+                         [(key, key) for key in keys[300:700]])
+
+
+class BDBTestCmpFunc(BDBTest):
+
+    def setUp(self):
+        self.path = os.path.join(tempfile.gettempdir(), "tmp_tc_test.tcb")
+        self.db = BDB()
+
+    def open(self, cmp):
+        self.db.setcmpfunc(cmp)
+        self.db.open(self.path, BDBOWRITER | BDBOCREAT)
+
+    def test_int32be(self):
+        self.open("int32be")
+        for num in (3, -1, 256, 0):
+            self.db[struct.pack(">i", num)] = b""
+        self.assertEqual([struct.unpack(">i", key)[0] for key in self.db],
+                         [-1, 0, 3, 256])
+
+    def test_int64le(self):
+        self.open("int64le")
+        for num in (3, -(2 ** 40), 2 ** 40, 0):
+            self.db[struct.pack("<q", num)] = b""
+        self.assertEqual([struct.unpack("<q", key)[0] for key in self.db],
+                         [-(2 ** 40), 0, 3, 2 ** 40])
+
+    def test_reverse(self):
+        self.open("reverse_lexical")
+        for key in (b"b", b"a", b"c"):
+            self.db[key] = key
+        self.assertEqual(list(self.db), [b"c", b"b", b"a"])
+        self.assertEqual(list(self.db.scan(b"c", b"a", keys_only=True)),
+                         [b"c", b"b"])
+
+    def test_scan_prefix(self):
+        self.open("lexical")
+        for key in (b"a", b"ab", b"b"):
+            self.db[key] = key
+        self.assertEqual(list(self.db.scan(prefix=b"a", keys_only=True)),
+                         [b"a", b"ab"])
+        self.db.close()
+        os.remove(self.path)
+        for cmp in ("reverse_lexical", "int32",
+                    lambda a, b: (a > b) - (a < b)):
+            self.db = BDB()
+            self.open(cmp)
+            self.assertRaises(ValueError, self.db.scan, prefix=b"a")
+            self.assertEqual(list(self.db.scan()), [])
+            self.db.close()
+            os.remove(self.path)
+        self.db = BDB()
+        self.db.open(self.path, BDBOWRITER | BDBOCREAT)
+
+    def test_unknown(self):
+        self.assertRaises(ValueError, self.db.setcmpfunc, "int16")
+        self.assertRaises(TypeError, self.db.setcmpfunc, 1.5)
+        self.db.open(self.path, BDBOWRITER | BDBOCREAT)
+
+
+class BDBTestBatch(BDBTest):
+
+    def test_getmany(self):
+        self.assertRaises(TypeError, self.db.getmany)
+        self.assertRaises(TypeError, self.db.getmany, b"ab")
+        self.assertRaises(TypeError, self.db.getmany, [1])
+        self.db[b"a"] = b"1"
+        self.db[b"b"] = b"2"
+        self.assertEqual(self.db.getmany([]), [])
+        self.assertEqual(self.db.getmany([b"b", b"a", b"c"]),
+                         [b"2", b"1", None])
+        self.assertEqual(self.db.getmany((b"c", b"a"), b""), [b"", b"1"])
+        self.assertEqual(self.db.getmany([b"c"], default=0), [0])
+
+    def test_putmany(self):
+        self.assertRaises(TypeError, self.db.putmany)
+        self.assertRaises(TypeError, self.db.putmany, 1)
+        self.assertRaises(TypeError, self.db.putmany, [(b"a", 1)])
+        self.assertRaises(ValueError, self.db.putmany, [(b"a",)])
+        self.assertRaises(ValueError, self.db.putmany, [], "dup")
+        self.assertEqual(self.db.putmany([]), 0)
+        self.assertEqual(self.db.putmany([(b"a", b"1"), (b"b", b"2")]), 2)
+        self.assertEqual(self.db.putmany({b"c": b"3"}), 1)
+        self.assertEqual(self.db.putmany((k, k) for k in (b"d", b"e")), 2)
+        self.assertEqual(self.db.putmany([(b"a", b"3"), (b"f", b"4")], "keep"),
+                         1)
+        self.assertEqual(self.db.putmany([(b"a", b"2")], mode="cat"), 1)
+        self.assertEqual(self.db.getmany([b"a", b"b", b"c", b"d", b"e", b"f"]),
+                         [b"12", b"2", b"3", b"d", b"e", b"4"])
+
+    def test_putmany_transaction(self):
+        self.assertRaises(TypeError, self.db.putmany, [], transaction=1)
+        self.assertEqual(self.db.putmany([(b"a", b"1"), (b"b", b"2")],
+                                         transaction=True), 2)
+        self.assertEqual(len(self.db), 2)
+        self.assertRaises(TypeError, self.db.putmany,
+                          [(b"c", b"3"), (b"d", 4)], transaction=True)
+        self.assertEqual(len(self.db), 2)
+        self.assertTrue(b"c" not in self.db)
+
+        # the first batch is stored before the second one fails, the
+        # transaction must roll it back
+        items = [(str(i).encode(), b"x") for i in range(1500)]
+        items.append((b"bad", 1))
+        self.assertRaises(TypeError, self.db.putmany, items, transaction=True)
+        self.assertEqual(len(self.db), 2)
+        self.assertTrue(b"0" not in self.db)
+        self.assertTrue(b"1023" not in self.db)
+        self.assertRaises(TypeError, self.db.putmany, items)
+        self.assertEqual(len(self.db), 1026)
+        self.assertTrue(b"1023" in self.db)
+
+    def test_putmany_check_order(self):
+        self.assertRaises(TypeError, self.db.putmany, [], check_order=1)
+        self.assertEqual(self.db.putmany([], check_order=True), 0)
+        items = [(struct.pack(">I", i), str(i).encode()) for i in range(3000)]
+        self.assertEqual(self.db.putmany(iter(items), check_order=True), 3000)
+        self.assertEqual(list(self.db.iteritems()), items)
+        self.db.clear()
+        self.db[b"a"] = b"0"
+        self.assertEqual(self.db.putmany([(b"a", b"1"), (b"a", b"2"),
+                                          (b"b", b"3")], check_order=True), 3)
+        self.assertEqual(self.db.get(b"a", duplicate=True), (b"2",))
+        self.assertEqual(len(self.db), 2)
+        self.assertRaises(ValueError, self.db.putmany,
+                          [(b"c", b"4"), (b"d", b"5"), (b"a", b"6")],
+                          check_order=True)
+        self.assertEqual(len(self.db), 4)
+        self.assertEqual(self.db[b"a"], b"2")
+        self.assertRaises(ValueError, self.db.putmany,
+                          [(b"e", b"7"), (b"a", b"8")], transaction=True,
+                          check_order=True)
+        self.assertTrue(b"e" not in self.db)
+        items = [(struct.pack(">I", i), b"") for i in range(2000)]
+        items.append((b"", b""))
+        self.db.clear()
+        self.assertRaises(ValueError, self.db.putmany, items, check_order=True)
+        self.assertEqual(len(self.db), 2000)
+        self.assertEqual(self.db.putmany([(b"f", b"9"), (b"e", b"10")]), 2)
+
+    def test_removemany(self):
+        self.assertRaises(TypeError, self.db.removemany)
+        self.assertRaises(TypeError, self.db.removemany, [b"a"], 1)
+        self.db[b"a"] = b"1"
+        self.db[b"b"] = b"2"
+        self.db[b"c"] = b"3"
+        self.assertEqual(self.db.removemany([]), 0)
+        self.assertEqual(self.db.removemany([b"a", b"d", b"b"]), 2)
+        self.assertEqual(len(self.db), 1)
+        self.assertRaises(KeyError, self.db.removemany, [b"c", b"d"],
+                          missing_ok=False)
+        self.assertEqual(len(self.db), 0)
+
+
+class BDBTestCache(BDBTest):
+
+    def test_setreadcache(self):
+        self.assertEqual(self.db.cachestats(), None)
+        self.assertRaises(TypeError, self.db.setreadcache)
+        self.assertRaises(ValueError, self.db.setreadcache, -1)
+        self.db.setreadcache(0)
+        self.assertEqual(self.db.cachestats(), None)
+        self.db.setreadcache(1024)
+        self.assertEqual(self.db.cachestats(),
+                         {"hits": 0, "misses": 0, "evictions": 0,
+                          "records": 0, "bytes": 0, "max_bytes": 1024})
+        self.db.setreadcache(0)
+        self.assertEqual(self.db.cachestats(), None)
+
+    def test_hits(self):
+        self.db.setreadcache(1024)
+        self.db[b"a"] = b"1"
+        self.assertEqual(self.db[b"a"], b"1")
+        self.assertEqual(self.db.get(b"a"), b"1")
+        self.assertEqual(bytes(self.db.get(b"a", view=True)), b"1")
+        self.assertRaises(KeyError, self.db.__getitem__, b"b")
+        stats = self.db.cachestats()
+        self.assertEqual((stats["hits"], stats["misses"]), (2, 2))
+        self.assertEqual((stats["records"], stats["bytes"]), (1, 2))
+
+    def test_invalidation(self):
+        self.db.setreadcache(1024)
+        self.db[b"a"] = b"1"
+        self.assertEqual(self.db[b"a"], b"1")
+        self.db.put(b"a", b"2")
+        self.assertEqual(self.db[b"a"], b"2")
+        self.db.putcat(b"a", b"3")
+        self.assertEqual(self.db[b"a"], b"23")
+        self.db.remove(b"a")
+        self.assertRaises(KeyError, self.db.__getitem__, b"a")
+        self.db.addint(b"b", 1)
+        self.assertEqual(self.db[b"b"], b"\x01\x00\x00\x00")
+        self.db.addint(b"b", 1)
+        self.assertEqual(self.db[b"b"], b"\x02\x00\x00\x00")
+        self.db.putmany([(b"b", b"4")])
+        self.assertEqual(self.db[b"b"], b"4")
+        self.db.removemany([b"b"])
+        self.assertTrue(b"b" not in self.db)
+        self.db[b"c"] = b"5"
+        self.assertEqual(self.db[b"c"], b"5")
+        self.db.begin()
+        self.db[b"c"] = b"6"
+        self.assertEqual(self.db[b"c"], b"6")
+        self.db.abort()
+        self.assertEqual(self.db[b"c"], b"5")
+        self.db.clear()
+        self.assertEqual(self.db.cachestats()["records"], 0)
+        self.assertRaises(KeyError, self.db.__getitem__, b"c")
+
+    def test_evictions(self):
+        self.db.setreadcache(4)
+        self.db.putmany([(b"a", b"1"), (b"b", b"2"), (b"c", b"3")])
+        self.assertEqual(self.db[b"a"], b"1")
+        self.assertEqual(self.db[b"b"], b"2")
+        self.assertEqual(self.db[b"a"], b"1")
+        self.assertEqual(self.db[b"c"], b"3")
+        stats = self.db.cachestats()
+        self.assertEqual((stats["hits"], stats["evictions"]), (1, 1))
+        self.assertEqual((stats["records"], stats["bytes"]), (2, 4))
+        self.assertEqual(self.db[b"a"], b"1")
+        self.assertEqual(self.db.cachestats()["hits"], 2)
+        self.db.setreadcache(2)
+        stats = self.db.cachestats()
+        self.assertEqual((stats["records"], stats["evictions"]), (1, 2))
+        self.assertEqual(self.db[b"a"], b"1")
+        self.assertEqual(self.db.cachestats()["hits"], 3)
+
+    def test_concurrent_writes(self):
+        # a read racing a write must not leave a stale value in the cache
+        self.db.setreadcache(1 << 20)
+        keys = [str(i).encode() for i in range(8)]
+        for key in keys:
+            self.db[key] = b"0"
+        done = []
+
+        def write():
+            try:
+                for i in range(1, 2001):
+                    for key in keys:
+                        self.db[key] = str(i).encode()
+            finally:
+                done.append(True)
+
+        def read():
+            while not done:
+                for key in keys:
+                    self.db.get(key)
+
+        threads = [threading.Thread(target=write)]
+        threads.extend(threading.Thread(target=read) for i in range(3))
+        for thread in threads:
+            thread.daemon = True
+            thread.start()
+        for thread in threads:
+            thread.join(60)
+            self.assertFalse(thread.is_alive())
+        for key in keys:
+            self.assertEqual(self.db[key], b"2000")
+
+
 class BDBTestNullBytes(BDBTest):
 
     def test_iterkeys(self):
@@ -477,6 +918,18 @@ class BDBTestNullBytes(BDBTest):
         self.assertEqual(b"ab", self.db.get(b"a\0b"))
         self.assertEqual(b"c\0d", self.db.get(b"cd"))
 
+    def test_get_view(self):
+        self.db[b"cd"] = b"c\0d"
+        view = self.db.get(b"cd", view=True)
+        self.assertEqual(3, len(view))
+        m = memoryview(view)
+        self.assertTrue(m.readonly)
+        self.assertEqual(b"c\0d", m.tobytes())
+        del view
+        self.assertEqual(b"c\0d", bytes(m))
+        self.assertRaises(TypeError, self.db.get, b"cd", view=1)
+        self.assertRaises(KeyError, self.db.get, b"ef", view=True)
+
     def test_remove(self):
         self.db[b"a\0b"] = b"ab"
         self.db[b"cd"] = b"c\0d"
@@ -528,6 +981,15 @@ class BDBTestNullBytes(BDBTest):
     def test_adddouble(self):
         self.assertEqual(self.db.adddouble(b"a\0b", 1.0), 1.0)
 
+    def test_buffer_objects(self):
+        self.db[bytearray(b"a\0b")] = memoryview(b"ab")
+        self.db.put(memoryview(b"cd"), bytearray(b"c\0d"))
+        self.assertEqual(b"ab", self.db[b"a\0b"])
+        self.assertEqual(b"c\0d", self.db.get(bytearray(b"cd")))
+        self.assertTrue(memoryview(b"a\0b") in self.db)
+        self.assertRaises(KeyError, self.db.__getitem__, memoryview(b"ef"))
+        self.assertRaises(TypeError, self.db.__getitem__, 1)
+
 
 class BDBTestNullBytesCursor(BDBTest):
 
@@ -583,6 +1045,76 @@ class BDBTestNullBytesCursor(BDBTest):
         self.assertEqual(c.item(), (b"c\0d", b"ab"))
 
 
+class BDBTestThreads(BDBTest):
+
+    def setUp(self):
+        self.path = os.path.join(tempfile.gettempdir(), "tmp_tc_test.tcb")
+        self.db = BDB()
+        self.db.setcmpfunc(lambda a, b: (a > b) - (a < b))
+        self.db.open(self.path, BDBOWRITER | BDBOCREAT)
+
+    def test_concurrent_access(self):
+        # assertions fail silently in a thread, mismatches are collected and
+        # checked here
+        errors = []
+
+        def worker(prefix):
+            try:
+                for i in range(1000):
+                    key = prefix + str(i).encode()
+                    self.db[key] = key
+                    value = self.db[key]
+                    if value != key:
+                        errors.append((key, value))
+            except Exception as e:
+                errors.append(e)
+
+        threads = [threading.Thread(target=worker,
+                                    args=(str(i).encode() + b"-",))
+                   for i in range(4)]
+        for thread in threads:
+            thread.daemon = True
+            thread.start()
+        for thread in threads:
+            thread.join(60)
+            self.assertFalse(thread.is_alive())
+        self.assertEqual(errors, [])
+        self.assertEqual(len(self.db), 4000)
+        self.assertEqual(list(self.db), sorted(self.db))
+
+    def test_concurrent_metadata(self):
+        # len(), path, size, cursors and scans must not wait for the lock of
+        # the database while holding the GIL (the compare callback of a
+        # concurrent write holds the lock while waiting for the GIL)
+        done = []
+
+        def write():
+            try:
+                for i in range(2000):
+                    key = str(i).encode()
+                    self.db[key] = key
+            finally:
+                done.append(True)
+
+        def read():
+            while not done:
+                len(self.db)
+                self.db.path
+                self.db.size
+                self.db.cursor()
+                next(self.db.scan(limit=1), None)
+
+        threads = [threading.Thread(target=write)]
+        threads.extend(threading.Thread(target=read) for i in range(2))
+        for thread in threads:
+            thread.daemon = True
+            thread.start()
+        for thread in threads:
+            thread.join(60)
+            self.assertFalse(thread.is_alive())
+        self.assertEqual(len(self.db), 2000)
+
+
 all_tests = (
              "BDBTestDict",
              "BDBTestIter",
@@ -591,8 +1123,13 @@ all_tests = (
              "BDBTestMisc",
              "BDBTestDuplicate",
              "BDBTestCursor",
+             "BDBTestScan",
+             "BDBTestCmpFunc",
+             "BDBTestBatch",
+             "BDBTestCache",
              "BDBTestNullBytes",
              "BDBTestNullBytesCursor",
+             "BDBTestThreads",
             )
 
 suite = unittest.TestLoader().loadTestsFromNames(all_tests,
@@ -130,6 +130,26 @@ class FDBTestIter(FDBTest):
         self.db[3] = b"c"
         self.assertEqual({1: b"a", 2: b"b", 3: b"c"}, dict(self.db.iteritems()))
 
+    def test_iterkeys_batch(self):
+        self.db[1] = b"a"
+        self.db[2] = b"b"
+        self.db[3] = b"c"
+        self.assertEqual([[1, 2], [3]], list(self.db.iterkeys(batch=2)))
+        self.assertRaises(ValueError, self.db.iterkeys, -1)
+        self.assertRaises(ValueError, self.db.iterkeys, 2 ** 31 - 1)
+        self.assertRaises(ValueError, self.db.iteritems, 2 ** 31 - 1)
+        i = self.db.iterkeys(batch=1)
+        next(i)
+        self.db[4] = b"d"
+        self.assertRaises(Error, next, i)
+
+    def test_iteritems_batch(self):
+        self.db[1] = b"a"
+        self.db[2] = b"b"
+        self.db[3] = b"c"
+        self.assertEqual([[(1, b"a"), (2, b"b")], [(3, b"c")]],
+                         list(self.db.iteritems(batch=2)))
+
 
 class FDBTestPut(FDBTest):
 
@@ -252,6 +272,70 @@ class FDBTestMisc(FDBTest):
         self.assertRaises(KeyError, self.db.adddouble, 200, 1.0)
 
 
+class FDBTestBatch(FDBTest):
+
+    def test_getmany(self):
+        self.assertRaises(TypeError, self.db.getmany)
+        self.assertRaises(TypeError, self.db.getmany, [b"a"])
+        self.db[1] = b"1"
+        self.db[2] = b"2"
+        self.assertEqual(self.db.getmany([]), [])
+        self.assertEqual(self.db.getmany([2, 1, 3]), [b"2", b"1", None])
+        self.assertEqual(self.db.getmany((3, 1), b""), [b"", b"1"])
+        self.assertEqual(self.db.getmany([3], default=0), [0])
+
+    def test_putmany(self):
+        self.assertRaises(TypeError, self.db.putmany)
+        self.assertRaises(TypeError, self.db.putmany, 1)
+        self.assertRaises(TypeError, self.db.putmany, [(b"a", b"1")])
+        self.assertRaises(ValueError, self.db.putmany, [], "dup")
+        self.assertEqual(self.db.putmany([]), 0)
+        self.assertEqual(self.db.putmany([(1, b"1"), (2, b"2")]), 2)
+        self.assertEqual(self.db.putmany({3: b"3"}), 1)
+        self.assertEqual(self.db.putmany([(1, b"3"), (4, b"4")], "keep"), 1)
+        self.assertEqual(self.db.putmany([(1, b"2")], mode="cat"), 1)
+        self.assertEqual(self.db.getmany([1, 2, 3, 4]),
+                         [b"12", b"2", b"3", b"4"])
+
+    def test_putmany_transaction(self):
+        self.assertEqual(self.db.putmany([(1, b"1"), (2, b"2")],
+                                         transaction=True), 2)
+        self.assertEqual(len(self.db), 2)
+        self.assertRaises(TypeError, self.db.putmany,
+                          [(3, b"3"), (4, 4)], transaction=True)
+        self.assertEqual(len(self.db), 2)
+        self.assertTrue(3 not in self.db)
+        # 3 is stored before 0 (an invalid id) fails, the transaction must
+        # roll it back
+        self.assertRaises(Error, self.db.putmany, [(3, b"3"), (0, b"0")],
+                          transaction=True)
+        self.assertEqual(len(self.db), 2)
+        self.assertTrue(3 not in self.db)
+        self.assertRaises(Error, self.db.putmany, [(3, b"3"), (0, b"0")])
+        self.assertEqual(len(self.db), 3)
+        self.assertTrue(3 in self.db)
+        # same with a first batch stored before the second one fails
+        items = [(i, b"x") for i in range(10, 1510)]
+        items.append((1510, 1))
+        self.assertRaises(TypeError, self.db.putmany, items, transaction=True)
+        self.assertEqual(len(self.db), 3)
+        self.assertTrue(10 not in self.db)
+        self.assertTrue(1033 not in self.db)
+
+    def test_removemany(self):
+        self.assertRaises(TypeError, self.db.removemany)
+        self.assertRaises(TypeError, self.db.removemany, [b"a"])
+        self.db[1] = b"1"
+        self.db[2] = b"2"
+        self.db[3] = b"3"
+        self.assertEqual(self.db.removemany([]), 0)
+        self.assertEqual(self.db.removemany([1, 4, 2]), 2)
+        self.assertEqual(len(self.db), 1)
+        self.assertRaises(KeyError, self.db.removemany, [3, 4],
+                          missing_ok=False)
+        self.assertEqual(len(self.db), 0)
+
+
 class FDBTestNullBytes(FDBTest):
 
     def test_itervalues(self):
@@ -280,6 +364,16 @@ class FDBTestNullBytes(FDBTest):
         self.db[2] = b"c\0d"
         self.assertEqual(b"c\0d", self.db.get(2))
 
+    def test_get_view(self):
+        self.db[2] = b"c\0d"
+        view = self.db.get(2, view=True)
+        self.assertEqual(3, len(view))
+        m = memoryview(view)
+        self.assertTrue(m.readonly)
+        self.assertEqual(b"c\0d", m.tobytes())
+        self.assertRaises(TypeError, self.db.get, 2, 1)
+        self.assertRaises(KeyError, self.db.get, 3, view=True)
+
     def test_put(self):
         self.db.put(1, b"ab")
         self.db.put(2, b"c\0d")
@@ -295,6 +389,12 @@ class FDBTestNullBytes(FDBTest):
         self.db.putcat(1, b"c\0d")
         self.assertEqual(self.db[1], b"abc\0d")
 
+    def test_buffer_objects(self):
+        self.db[1] = memoryview(b"ab")
+        self.db.put(2, bytearray(b"c\0d"))
+        self.assertEqual(b"ab", self.db[1])
+        self.assertEqual(b"c\0d", self.db[2])
+
 
 all_tests = (
              "FDBTestDict",
@@ -302,6 +402,7 @@ all_tests = (
              "FDBTestPut",
              "FDBTestTransaction",
              "FDBTestMisc",
+             "FDBTestBatch",
              "FDBTestNullBytes",
             )
 
@@ -2,6 +2,7 @@ import unittest
 import sys
 import os
 import tempfile
+import threading
 
 from tokyo.cabinet import (HDBOREADER, HDBOWRITER, HDBOCREAT, HDB, Error,
                            INT_MAX, INT_MIN)
@@ -132,6 +133,76 @@ class HDBTestIter(HDBTest):
         self.assertEqual({b"a": b"1", b"b": b"2", b"c": b"3"},
                          dict(self.db.iteritems()))
 
+    def test_iteritems_sizes(self):
+        items = dict((str(i).encode(), b"x" * (i * 37 % 101))
+                     for i in range(100))
+        self.db.putmany(items)
+        self.assertEqual(items, dict(self.db.iteritems()))
+        self.assertEqual(sorted(items.values()),
+                         sorted(self.db.itervalues()))
+
+    def test_iterkeys_batch(self):
+        self.db[b"a"] = b"1"
+        self.db[b"b"] = b"2"
+        self.db[b"c"] = b"3"
+        batches = list(self.db.iterkeys(batch=2))
+        self.assertEqual([2, 1], [len(batch) for batch in batches])
+        self.assertEqual([b"a", b"b", b"c"],
+                         sorted(key for batch in batches for key in batch))
+        self.assertEqual([[b"a", b"b", b"c"]],
+                         [sorted(batch) for batch in self.db.iterkeys(batch=3)])
+        self.assertRaises(ValueError, self.db.iterkeys, -1)
+        self.assertRaises(ValueError, self.db.iterkeys, 2 ** 31 - 1)
+        self.assertRaises(ValueError, self.db.iteritems, 2 ** 31 - 1)
+        i = self.db.iterkeys(batch=1)
+        next(i)
+        self.db[b"d"] = b"4"
+        self.assertRaises(Error, next, i)
+
+    def test_iterkeys_resumable(self):
+        self.assertRaises(TypeError, self.db.iterkeys, resumable=1)
+        keys = [str(i).encode() for i in range(10)]
+        for key in keys:
+            self.db[key] = key
+        seen = []
+        for key in self.db.iterkeys(resumable=True):
+            seen.append(key)
+            self.db[key] = b"-" * len(key)
+            if key == keys[0]:
+                del self.db[keys[1]]
+        self.assertEqual(len(seen), len(set(seen)))
+        self.assertTrue(set(keys) - set([keys[1]]) <= set(seen))
+        seen = []
+        for batch in self.db.iterkeys(batch=3, resumable=True):
+            seen.extend(batch)
+            for key in batch:
+                del self.db[key]
+        self.assertEqual(len(self.db), 0)
+        self.assertEqual(len(seen), len(set(seen)))
+
+    def test_iterkeys_resumable_grow(self):
+        keys = [str(i).encode() for i in range(100)]
+        for key in keys:
+            self.db[key] = b"x"
+        seen = []
+        for key in self.db.iterkeys(resumable=True):
+            seen.append(key)
+            if self.db[key] == b"x":
+                self.db[key] = b"x" * 1000
+        self.assertEqual(set(seen), set(keys))
+        self.assertEqual(set(self.db.itervalues()), set([b"x" * 1000]))
+
+    def test_iteritems_batch(self):
+        self.db[b"a"] = b"1"
+        self.db[b"b"] = b"2"
+        self.db[b"c"] = b"3"
+        items = []
+        for batch in self.db.iteritems(batch=2):
+            self.assertTrue(isinstance(batch, list))
+            items.extend(batch)
+        self.assertEqual([(b"a", b"1"), (b"b", b"2"), (b"c", b"3")],
+                         sorted(items))
+
 
 class HDBTestPut(HDBTest):
 
@@ -266,6 +337,178 @@ class HDBTestMisc(HDBTest):
         self.assertRaises(KeyError, self.db.adddouble, b"kfloat", 1.0)
 
 
+class HDBTestBatch(HDBTest):
+
+    def test_getmany(self):
+        self.assertRaises(TypeError, self.db.getmany)
+        self.assertRaises(TypeError, self.db.getmany, b"ab")
+        self.assertRaises(TypeError, self.db.getmany, [1])
+        self.db[b"a"] = b"1"
+        self.db[b"b"] = b"2"
+        self.assertEqual(self.db.getmany([]), [])
+        self.assertEqual(self.db.getmany([b"b", b"a", b"c"]),
+                         [b"2", b"1", None])
+        self.assertEqual(self.db.getmany((b"c", b"a"), b""), [b"", b"1"])
+        self.assertEqual(self.db.getmany([b"c"], default=0), [0])
+
+    def test_putmany(self):
+        self.assertRaises(TypeError, self.db.putmany)
+        self.assertRaises(TypeError, self.db.putmany, 1)
+        self.assertRaises(TypeError, self.db.putmany, [(b"a", 1)])
+        self.assertRaises(ValueError, self.db.putmany, [(b"a",)])
+        self.assertRaises(ValueError, self.db.putmany, [], "dup")
+        self.assertEqual(self.db.putmany([]), 0)
+        self.assertEqual(self.db.putmany([(b"a", b"1"), (b"b", b"2")]), 2)
+        self.assertEqual(self.db.putmany({b"c": b"3"}), 1)
+        self.assertEqual(self.db.putmany((k, k) for k in (b"d", b"e")), 2)
+        self.assertEqual(self.db.putmany([(b"a", b"3"), (b"f", b"4")], "keep"),
+                         1)
+        self.assertEqual(self.db.putmany([(b"a", b"2")], mode="cat"), 1)
+        self.assertEqual(self.db.getmany([b"a", b"b", b"c", b"d", b"e", b"f"]),
+                         [b"12", b"2", b"3", b"d", b"e", b"4"])
+
+    def test_putmany_transaction(self):
+        self.assertRaises(TypeError, self.db.putmany, [], transaction=1)
+        self.assertEqual(self.db.putmany([(b"a", b"1"), (b"b", b"2")],
+                                         transaction=True), 2)
+        self.assertEqual(len(self.db), 2)
+        self.assertRaises(TypeError, self.db.putmany,
+                          [(b"c", b"3"), (b"d", 4)], transaction=True)
+        self.assertEqual(len(self.db), 2)
+        self.assertTrue(b"c" not in self.db)
+
+        # the first batch is stored before the second one fails, the
+        # transaction must roll it back
+        items = [(str(i).encode(), b"x") for i in range(1500)]
+        items.append((b"bad", 1))
+        self.assertRaises(TypeError, self.db.putmany, items, transaction=True)
+        self.assertEqual(len(self.db), 2)
+        self.assertTrue(b"0" not in self.db)
+        self.assertTrue(b"1023" not in self.db)
+        self.assertRaises(TypeError, self.db.putmany, items)
+        self.assertEqual(len(self.db), 1026)
+        self.assertTrue(b"1023" in self.db)
+
+    def test_removemany(self):
+        self.assertRaises(TypeError, self.db.removemany)
+        self.assertRaises(TypeError, self.db.removemany, [b"a"], 1)
+        self.db[b"a"] = b"1"
+        self.db[b"b"] = b"2"
+        self.db[b"c"] = b"3"
+        self.assertEqual(self.db.removemany([]), 0)
+        self.assertEqual(self.db.removemany([b"a", b"d", b"b"]), 2)
+        self.assertEqual(len(self.db), 1)
+        self.assertRaises(KeyError, self.db.removemany, [b"c", b"d"],
+                          missing_ok=False)
+        self.assertEqual(len(self.db), 0)
+
+
+class HDBTestCache(HDBTest):
+
+    def test_setreadcache(self):
+        self.assertEqual(self.db.cachestats(), None)
+        self.assertRaises(TypeError, self.db.setreadcache)
+        self.assertRaises(ValueError, self.db.setreadcache, -1)
+        self.db.setreadcache(0)
+        self.assertEqual(self.db.cachestats(), None)
+        self.db.setreadcache(1024)
+        self.assertEqual(self.db.cachestats(),
+                         {"hits": 0, "misses": 0, "evictions": 0,
+                          "records": 0, "bytes": 0, "max_bytes": 1024})
+        self.db.setreadcache(0)
+        self.assertEqual(self.db.cachestats(), None)
+
+    def test_hits(self):
+        self.db.setreadcache(1024)
+        self.db[b"a"] = b"1"
+        self.assertEqual(self.db[b"a"], b"1")
+        self.assertEqual(self.db.get(b"a"), b"1")
+        self.assertEqual(bytes(self.db.get(b"a", view=True)), b"1")
+        self.assertRaises(KeyError, self.db.__getitem__, b"b")
+        stats = self.db.cachestats()
+        self.assertEqual((stats["hits"], stats["misses"]), (2, 2))
+        self.assertEqual((stats["records"], stats["bytes"]), (1, 2))
+
+    def test_invalidation(self):
+        self.db.setreadcache(1024)
+        self.db[b"a"] = b"1"
+        self.assertEqual(self.db[b"a"], b"1")
+        self.db.put(b"a", b"2")
+        self.assertEqual(self.db[b"a"], b"2")
+        self.db.putcat(b"a", b"3")
+        self.assertEqual(self.db[b"a"], b"23")
+        self.db.remove(b"a")
+        self.assertRaises(KeyError, self.db.__getitem__, b"a")
+        self.db.addint(b"b", 1)
+        self.assertEqual(self.db[b"b"], b"\x01\x00\x00\x00")
+        self.db.addint(b"b", 1)
+        self.assertEqual(self.db[b"b"], b"\x02\x00\x00\x00")
+        self.db.putmany([(b"b", b"4")])
+        self.assertEqual(self.db[b"b"], b"4")
+        self.db.removemany([b"b"])
+        self.assertTrue(b"b" not in self.db)
+        self.db[b"c"] = b"5"
+        self.assertEqual(self.db[b"c"], b"5")
+        self.db.begin()
+        self.db[b"c"] = b"6"
+        self.assertEqual(self.db[b"c"], b"6")
+        self.db.abort()
+        self.assertEqual(self.db[b"c"], b"5")
+        self.db.clear()
+        self.assertEqual(self.db.cachestats()["records"], 0)
+        self.assertRaises(KeyError, self.db.__getitem__, b"c")
+
+    def test_evictions(self):
+        self.db.setreadcache(4)
+        self.db.putmany([(b"a", b"1"), (b"b", b"2"), (b"c", b"3")])
+        self.assertEqual(self.db[b"a"], b"1")
+        self.assertEqual(self.db[b"b"], b"2")
+        self.assertEqual(self.db[b"a"], b"1")
+        self.assertEqual(self.db[b"c"], b"3")
+        stats = self.db.cachestats()
+        self.assertEqual((stats["hits"], stats["evictions"]), (1, 1))
+        self.assertEqual((stats["records"], stats["bytes"]), (2, 4))
+        self.assertEqual(self.db[b"a"], b"1")
+        self.assertEqual(self.db.cachestats()["hits"], 2)
+        self.db.setreadcache(2)
+        stats = self.db.cachestats()
+        self.assertEqual((stats["records"], stats["evictions"]), (1, 2))
+        self.assertEqual(self.db[b"a"], b"1")
+        self.assertEqual(self.db.cachestats()["hits"], 3)
+
+    def test_concurrent_writes(self):
+        # a read racing a write must not leave a stale value in the cache
+        self.db.setreadcache(1 << 20)
+        keys = [str(i).encode() for i in range(8)]
+        for key in keys:
+            self.db[key] = b"0"
+        done = []
+
+        def write():
+            try:
+                for i in range(1, 2001):
+                    for key in keys:
+                        self.db[key] = str(i).encode()
+            finally:
+                done.append(True)
+
+        def read():
+            while not done:
+                for key in keys:
+                    self.db.get(key)
+
+        threads = [threading.Thread(target=write)]
+        threads.extend(threading.Thread(target=read) for i in range(3))
+        for thread in threads:
+            thread.daemon = True
+            thread.start()
+        for thread in threads:
+            thread.join(60)
+            self.assertFalse(thread.is_alive())
+        for key in keys:
+            self.assertEqual(self.db[key], b"2000")
+
+
 class HDBTestNullBytes(HDBTest):
 
     def test_iterkeys(self):
@@ -309,6 +552,18 @@ class HDBTestNullBytes(HDBTest):
         self.assertEqual(b"ab", self.db.get(b"a\0b"))
         self.assertEqual(b"c\0d", self.db.get(b"cd"))
 
+    def test_get_view(self):
+        self.db[b"cd"] = b"c\0d"
+        view = self.db.get(b"cd", view=True)
+        self.assertEqual(3, len(view))
+        m = memoryview(view)
+        self.assertTrue(m.readonly)
+        self.assertEqual(b"c\0d", m.tobytes())
+        del view
+        self.assertEqual(b"c\0d", bytes(m))
+        self.assertRaises(TypeError, self.db.get, b"cd", view=1)
+        self.assertRaises(KeyError, self.db.get, b"ef", view=True)
+
     def test_remove(self):
         self.db[b"a\0b"] = b"ab"
         self.db[b"cd"] = b"c\0d"
@@ -352,6 +607,46 @@ class HDBTestNullBytes(HDBTest):
     def test_adddouble(self):
         self.assertEqual(self.db.adddouble(b"a\0b", 1.0), 1.0)
 
+    def test_buffer_objects(self):
+        self.db[bytearray(b"a\0b")] = memoryview(b"ab")
+        self.db.put(memoryview(b"cd"), bytearray(b"c\0d"))
+        self.assertEqual(b"ab", self.db[b"a\0b"])
+        self.assertEqual(b"c\0d", self.db.get(bytearray(b"cd")))
+        self.assertTrue(memoryview(b"a\0b") in self.db)
+        self.assertRaises(KeyError, self.db.__getitem__, memoryview(b"ef"))
+        self.assertRaises(TypeError, self.db.__getitem__, 1)
+
+
+class HDBTestThreads(HDBTest):
+
+    def test_concurrent_access(self):
+        # assertions fail silently in a thread, mismatches are collected and
+        # checked here
+        errors = []
+
+        def worker(prefix):
+            try:
+                for i in range(1000):
+                    key = prefix + str(i).encode()
+                    self.db[key] = key
+                    value = self.db[key]
+                    if value != key:
+                        errors.append((key, value))
+            except Exception as e:
+                errors.append(e)
+
+        threads = [threading.Thread(target=worker,
+                                    args=(str(i).encode() + b"-",))
+                   for i in range(4)]
+        for thread in threads:
+            thread.daemon = True
+            thread.start()
+        for thread in threads:
+            thread.join(60)
+            self.assertFalse(thread.is_alive())
+        self.assertEqual(errors, [])
+        self.assertEqual(len(self.db), 4000)
+
 
 all_tests = (
              "HDBTestDict",
@@ -359,7 +654,10 @@ all_tests = (
              "HDBTestPut",
              "HDBTestTransaction",
              "HDBTestMisc",
+             "HDBTestBatch",
+             "HDBTestCache",
              "HDBTestNullBytes",
+             "HDBTestThreads",
             )
 
 suite = unittest.TestLoader().loadTestsFromNames(all_tests,
@@ -125,6 +125,35 @@ class MDBTestIter(MDBTest):
         self.assertEqual({b"a": b"1", b"b": b"2", b"c": b"3"},
                          dict(self.db.iteritems()))
 
+    def test_iterkeys_batch(self):
+        self.db[b"a"] = b"1"
+        self.db[b"b"] = b"2"
+        self.db[b"c"] = b"3"
+        batches = list(self.db.iterkeys(batch=2))
+        self.assertEqual([2, 1], [len(batch) for batch in batches])
+        self.assertEqual([b"a", b"b", b"c"],
+                         sorted(key for batch in batches for key in batch))
+        self.assertEqual([[b"a", b"b", b"c"]],
+                         [sorted(batch) for batch in self.db.iterkeys(batch=3)])
+        self.assertRaises(ValueError, self.db.iterkeys, -1)
+        self.assertRaises(ValueError, self.db.iterkeys, 2 ** 31 - 1)
+        self.assertRaises(ValueError, self.db.iteritems, 2 ** 31 - 1)
+        i = self.db.iterkeys(batch=1)
+        next(i)
+        self.db[b"d"] = b"4"
+        self.assertRaises(Error, next, i)
+
+    def test_iteritems_batch(self):
+        self.db[b"a"] = b"1"
+        self.db[b"b"] = b"2"
+        self.db[b"c"] = b"3"
+        items = []
+        for batch in self.db.iteritems(batch=2):
+            self.assertTrue(isinstance(batch, list))
+            items.extend(batch)
+        self.assertEqual([(b"a", b"1"), (b"b", b"2"), (b"c", b"3")],
+                         sorted(items))
+
 
 class MDBTestPut(MDBTest):
 
@@ -163,6 +192,34 @@ class MDBTestMisc(MDBTest):
         self.assertEqual(self.db.searchkeys(b"a"), frozenset((b"akey",)))
 
 
+class MDBTestBatch(MDBTest):
+
+    def test_getmany(self):
+        self.assertRaises(TypeError, self.db.getmany)
+        self.assertRaises(TypeError, self.db.getmany, b"ab")
+        self.assertRaises(TypeError, self.db.getmany, [1])
+        self.db[b"a"] = b"1"
+        self.db[b"b"] = b"2"
+        self.assertEqual(self.db.getmany([]), [])
+        self.assertEqual(self.db.getmany([b"b", b"a", b"c"]),
+                         [b"2", b"1", None])
+        self.assertEqual(self.db.getmany((b"c", b"a"), b""), [b"", b"1"])
+        self.assertEqual(self.db.getmany([b"c"], default=0), [0])
+
+    def test_removemany(self):
+        self.assertRaises(TypeError, self.db.removemany)
+        self.assertRaises(TypeError, self.db.removemany, [b"a"], 1)
+        self.db[b"a"] = b"1"
+        self.db[b"b"] = b"2"
+        self.db[b"c"] = b"3"
+        self.assertEqual(self.db.removemany([]), 0)
+        self.assertEqual(self.db.removemany([b"a", b"d", b"b"]), 2)
+        self.assertEqual(len(self.db), 1)
+        self.assertRaises(KeyError, self.db.removemany, [b"c", b"d"],
+                          missing_ok=False)
+        self.assertEqual(len(self.db), 0)
+
+
 class MDBTestNullBytes(MDBTest):
 
     def test_iterkeys(self):
@@ -206,6 +263,18 @@ class MDBTestNullBytes(MDBTest):
         self.assertEqual(b"ab", self.db.get(b"a\0b"))
         self.assertEqual(b"c\0d", self.db.get(b"cd"))
 
+    def test_get_view(self):
+        self.db[b"cd"] = b"c\0d"
+        view = self.db.get(b"cd", view=True)
+        self.assertEqual(3, len(view))
+        m = memoryview(view)
+        self.assertTrue(m.readonly)
+        self.assertEqual(b"c\0d", m.tobytes())
+        del view
+        self.assertEqual(b"c\0d", bytes(m))
+        self.assertRaises(TypeError, self.db.get, b"cd", view=1)
+        self.assertRaises(KeyError, self.db.get, b"ef", view=True)
+
     def test_remove(self):
         self.db[b"a\0b"] = b"ab"
         self.db[b"cd"] = b"c\0d"
@@ -235,12 +304,22 @@ class MDBTestNullBytes(MDBTest):
         self.assertEqual(self.db.searchkeys(b"a"), frozenset((b"a\0b",)))
         self.assertEqual(self.db.searchkeys(b"a\0"), frozenset((b"a\0b",)))
 
+    def test_buffer_objects(self):
+        self.db[bytearray(b"a\0b")] = memoryview(b"ab")
+        self.db.put(memoryview(b"cd"), bytearray(b"c\0d"))
+        self.assertEqual(b"ab", self.db[b"a\0b"])
+        self.assertEqual(b"c\0d", self.db.get(bytearray(b"cd")))
+        self.assertTrue(memoryview(b"a\0b") in self.db)
+        self.assertRaises(KeyError, self.db.__getitem__, memoryview(b"ef"))
+        self.assertRaises(TypeError, self.db.__getitem__, 1)
+
 
 all_tests = (
              "MDBTestDict",
              "MDBTestIter",
              "MDBTestPut",
              "MDBTestMisc",
+             "MDBTestBatch",
              "MDBTestNullBytes",
             )
 
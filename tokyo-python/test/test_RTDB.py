@@ -241,6 +241,28 @@ class RTDBTestQuery(RTDBTest):
         self.assertEqual(q.count(), 4)
         self.assertEqual(q.search(), (b"key1", b"key2", b"key3", b"akey"))
 
+
+    def test_iter(self):
+        self.db[b"key1"] = {b"test": b"1"}
+        self.db[b"key2"] = {b"test": b"2"}
+        self.db[b"key3"] = {b"test": b"3"}
+        self.db[b"akey"] = {b"test": b"a"}
+        q = self.db.query()
+        q.filter(b"", TDBQCSTRBW, b"ke")
+        i = q.iter()
+        self.assertEqual(i.__length_hint__(), 3)
+        self.assertEqual(next(i), b"key1")
+        self.assertEqual(i.__length_hint__(), 2)
+        self.assertEqual(list(i), [b"key2", b"key3"])
+        self.assertEqual(list(q.iter(values=True)),
+                         [(b"key1", {b"test": b"1"}), (b"key2", {b"test": b"2"}),
+                          (b"key3", {b"test": b"3"})])
+        i = q.iter(values=True)
+        del self.db[b"key2"]
+        self.assertEqual(list(i), [(b"key1", {b"test": b"1"}),
+                                   (b"key3", {b"test": b"3"})])
+        self.assertRaises(TypeError, q.iter, 1)
+
     def test_filter_key(self):
         self.db[b"key1"] = {b"test": b"1"}
         self.db[b"key2"] = {b"test": b"2"}
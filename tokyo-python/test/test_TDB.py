@@ -2,10 +2,15 @@ import unittest
 import sys
 import os
 import tempfile
+import array
+import math
+import threading
+import time
 
 from tokyo.cabinet import (TDBOREADER, TDBOWRITER, TDBOCREAT, TDB, Error,
-                           TDBQCSTRBW, TDBQCNUMGE, TDBQOSTRASC, TDBQONUMDESC,
-                           TDBQPPUT)
+                           TDBQCSTRBW, TDBQCSTREQ, TDBQCNUMGE, TDBQOSTRASC,
+                           TDBQONUMDESC, TDBQPPUT, TDBITLEXICAL, TDBITDECIMAL,
+                           TDBMSUNION, TDBMSISECT, TDBMSDIFF)
 
 
 class TDBTest(unittest.TestCase):
@@ -53,6 +58,30 @@ class TDBTestDict(TDBTest):
         self.assertEqual(self.db[b"c"], {b"test": b"c"})
         self.assertEqual(self.db[b"a"], {b"test": b"d"})
 
+    def test_get_view(self):
+        self.db[b"a"] = {b"x": b"1", b"y": b"2"}
+        self.assertEqual(self.db.get(b"a", view=False),
+                         {b"x": b"1", b"y": b"2"})
+        record = self.db.get(b"a", view=True)
+        self.assertFalse(isinstance(record, dict))
+        self.assertEqual(len(record), 2)
+        self.assertEqual(record[b"x"], b"1")
+        self.assertRaises(KeyError, record.__getitem__, b"z")
+        self.assertEqual(record.get(b"y"), b"2")
+        self.assertEqual(record.get(b"z"), None)
+        self.assertEqual(record.get(b"z", b"3"), b"3")
+        self.assertTrue(b"x" in record)
+        self.assertFalse(b"z" in record)
+        self.assertEqual(sorted(record.keys()), [b"x", b"y"])
+        self.assertEqual(sorted(record), [b"x", b"y"])
+        self.assertEqual(sorted(record.values()), [b"1", b"2"])
+        self.assertEqual(sorted(record.items()), [(b"x", b"1"), (b"y", b"2")])
+        self.assertEqual(record.todict(), {b"x": b"1", b"y": b"2"})
+        self.assertEqual(dict(record), {b"x": b"1", b"y": b"2"})
+        self.assertRaises(TypeError, record.__setitem__, b"x", b"2")
+        self.assertRaises(KeyError, self.db.get, b"b", view=True)
+        self.assertRaises(TypeError, self.db.get, b"a", view=1)
+
     def test_setitem(self):
         self.assertRaises(TypeError, self.db.__setitem__)
         self.assertRaises(TypeError, self.db.__setitem__, b"a")
@@ -115,6 +144,24 @@ class TDBTestIter(TDBTest):
         self.db[b"d"] = {b"test": b"e"}
         self.assertRaises(Error, next, i)
 
+
+    def test_searchitems(self):
+        self.db[b"key1"] = {b"test": b"1", b"other": b"a"}
+        self.db[b"key2"] = {b"test": b"2", b"other": b"b"}
+        self.db[b"key3"] = {b"test": b"3"}
+        q = self.db.query()
+        q.filter(b"test", TDBQCNUMGE, b"2")
+        self.assertEqual(q.searchitems(),
+                         ((b"key2", {b"test": b"2", b"other": b"b"}),
+                          (b"key3", {b"test": b"3"})))
+        self.assertEqual(q.searchitems([b"other"]),
+                         ((b"key2", {b"other": b"b"}), (b"key3", {})))
+        self.assertEqual(q.searchitems(columns=[]),
+                         ((b"key2", {}), (b"key3", {})))
+        q.filter(b"test", TDBQCNUMGE, b"4")
+        self.assertEqual(q.searchitems(), ())
+        self.assertRaises(TypeError, q.searchitems, b"other")
+
     def test_iterkeys(self):
         self.db[b"a"] = {b"test": b"a"}
         self.db[b"b"] = {b"test": b"b"}
@@ -137,6 +184,53 @@ class TDBTestIter(TDBTest):
                           b"c": {b"test": b"c"}},
                          dict(self.db.iteritems()))
 
+    def test_iteritems_sizes(self):
+        items = dict((str(i).encode(), {b"test": b"x" * (i * 37 % 101 + 1)})
+                     for i in range(100))
+        self.db.putmany(items)
+        self.assertEqual(items, dict(self.db.iteritems()))
+
+    def test_iterkeys_batch(self):
+        self.db[b"a"] = {b"test": b"a"}
+        self.db[b"b"] = {b"test": b"b"}
+        self.db[b"c"] = {b"test": b"c"}
+        batches = list(self.db.iterkeys(batch=2))
+        self.assertEqual([2, 1], [len(batch) for batch in batches])
+        self.assertEqual([b"a", b"b", b"c"],
+                         sorted(key for batch in batches for key in batch))
+        self.assertRaises(ValueError, self.db.iterkeys, -1)
+        self.assertRaises(ValueError, self.db.iterkeys, 2 ** 31 - 1)
+        self.assertRaises(ValueError, self.db.iteritems, 2 ** 31 - 1)
+        i = self.db.iterkeys(batch=1)
+        next(i)
+        self.db[b"d"] = {b"test": b"d"}
+        self.assertRaises(Error, next, i)
+
+    def test_iteritems_batch(self):
+        self.db[b"a"] = {b"test": b"a"}
+        self.db[b"b"] = {b"test": b"b"}
+        self.db[b"c"] = {b"test": b"c"}
+        items = {}
+        for batch in self.db.iteritems(batch=2):
+            self.assertTrue(isinstance(batch, list))
+            items.update(batch)
+        self.assertEqual({b"a": {b"test": b"a"}, b"b": {b"test": b"b"},
+                          b"c": {b"test": b"c"}}, items)
+
+    def test_iter_view(self):
+        self.db[b"a"] = {b"test": b"a"}
+        self.db[b"b"] = {b"test": b"b"}
+        self.assertEqual([b"a", b"b"],
+                         [v[b"test"] for v in self.db.itervalues(view=True)])
+        self.assertEqual({b"a": {b"test": b"a"}, b"b": {b"test": b"b"}},
+                         dict((k, v.todict())
+                              for k, v in self.db.iteritems(view=True)))
+        items = [item for batch in self.db.iteritems(batch=1, view=True)
+                 for item in batch]
+        self.assertEqual([(b"a", b"a"), (b"b", b"b")],
+                         [(k, v[b"test"]) for k, v in items])
+        self.assertRaises(TypeError, self.db.itervalues, view=1)
+
     def test_itervalueskeys(self):
         self.db[b"A"] = {b"test": b"a", b"a": b"1"}
         self.db[b"B"] = {b"test": b"b", b"b": b"2"}
@@ -273,6 +367,28 @@ class TDBTestQuery(TDBTest):
         self.assertEqual(q.search(), (b"key1", b"key2", b"key3", b"akey"))
         self.assertEqual(q.count(), 4)
 
+
+    def test_iter(self):
+        self.db[b"key1"] = {b"test": b"1"}
+        self.db[b"key2"] = {b"test": b"2"}
+        self.db[b"key3"] = {b"test": b"3"}
+        self.db[b"akey"] = {b"test": b"a"}
+        q = self.db.query()
+        q.filter(b"", TDBQCSTRBW, b"ke")
+        i = q.iter()
+        self.assertEqual(i.__length_hint__(), 3)
+        self.assertEqual(next(i), b"key1")
+        self.assertEqual(i.__length_hint__(), 2)
+        self.assertEqual(list(i), [b"key2", b"key3"])
+        self.assertEqual(list(q.iter(values=True)),
+                         [(b"key1", {b"test": b"1"}), (b"key2", {b"test": b"2"}),
+                          (b"key3", {b"test": b"3"})])
+        i = q.iter(values=True)
+        del self.db[b"key2"]
+        self.assertEqual(list(i), [(b"key1", {b"test": b"1"}),
+                                   (b"key3", {b"test": b"3"})])
+        self.assertRaises(TypeError, q.iter, 1)
+
     def test_filter_key(self):
         self.db[b"key1"] = {b"test": b"1"}
         self.db[b"key2"] = {b"test": b"2"}
@@ -366,6 +482,414 @@ class TDBTestQuery(TDBTest):
                           b"key3": {b"test": b"key3"}, b"akey": {b"test": b"a"}},
                          dict(self.db.iteritems()))
 
+    def test_update(self):
+        self.db[b"key1"] = {b"test": b"1", b"n": b"1", b"x": b"a"}
+        self.db[b"key2"] = {b"test": b"2", b"n": b"2", b"x": b"b"}
+        self.db[b"key3"] = {b"test": b"3"}
+        self.db[b"akey"] = {b"test": b"a", b"x": b"c"}
+        q = self.db.query()
+        q.filter(b"", TDBQCSTRBW, b"ke")
+        self.assertEqual(q.update(set={b"stale": b"1"}, incr={b"n": 10},
+                                  unset=[b"x"]), 3)
+        self.assertEqual({b"key1": {b"test": b"1", b"n": b"11", b"stale": b"1"},
+                          b"key2": {b"test": b"2", b"n": b"12", b"stale": b"1"},
+                          b"key3": {b"test": b"3", b"n": b"10", b"stale": b"1"},
+                          b"akey": {b"test": b"a", b"x": b"c"}},
+                         dict(self.db.iteritems()))
+        self.assertEqual(q.update(incr={b"n": 0.5}), 3)
+        self.assertEqual(self.db[b"key1"][b"n"], b"11.5")
+        self.assertEqual(q.update(incr={b"n": 1}), 3)
+        self.assertEqual(self.db[b"key1"][b"n"], b"12.5")
+        self.assertEqual(self.db[b"key3"][b"n"], b"11.5")
+        self.db[b"key2"] = {b"test": b"2", b"n": b"1e3"}
+        self.assertEqual(q.update(incr={b"n": -1}), 3)
+        self.assertEqual(self.db[b"key1"][b"n"], b"11.5")
+        self.assertEqual(self.db[b"key2"][b"n"], b"999")
+        self.db[b"key2"] = {b"test": b"2", b"n": b"-7"}
+        self.assertEqual(q.update(incr={b"n": 2}), 3)
+        self.assertEqual(self.db[b"key2"][b"n"], b"-5")
+        self.assertEqual(q.update(), 3)
+        self.assertRaises(TypeError, q.update, incr={b"n": b"1"})
+        self.assertRaises(TypeError, q.update, set=[b"n"])
+
+
+    def test_aggregate(self):
+        self.db[b"key1"] = {b"cat": b"a", b"price": b"1", b"qty": b"2"}
+        self.db[b"key2"] = {b"cat": b"b", b"price": b"2.5", b"qty": b"x"}
+        self.db[b"key3"] = {b"cat": b"a", b"price": b"3"}
+        self.db[b"key4"] = {b"price": b"4"}
+        q = self.db.query()
+        self.assertEqual(q.aggregate(), {"count": 4})
+        self.assertEqual(q.aggregate(sum=[b"price"], min=[b"price", b"qty"],
+                                     max=[b"price"], avg=[b"price", b"none"]),
+                         {"count": 4, "sum": {b"price": 10.5},
+                          "min": {b"price": 1.0, b"qty": 2.0},
+                          "max": {b"price": 4.0},
+                          "avg": {b"price": 2.625, b"none": None}})
+        self.assertEqual(q.aggregate(b"cat", sum=[b"price"]),
+                         {b"a": {"count": 2, "sum": {b"price": 4.0}},
+                          b"b": {"count": 1, "sum": {b"price": 2.5}},
+                          None: {"count": 1, "sum": {b"price": 4.0}}})
+        self.assertEqual(q.aggregate(b"cat", count=False, max=[b"qty"]),
+                         {b"a": {"max": {b"qty": 2.0}}, b"b": {"max": {b"qty": None}},
+                          None: {"max": {b"qty": None}}})
+        q.filter(b"price", TDBQCNUMGE, b"5")
+        self.assertEqual(q.aggregate(sum=[b"price"], min=[b"price"]),
+                         {"count": 0, "sum": {b"price": 0.0},
+                          "min": {b"price": None}})
+        self.assertEqual(q.aggregate(b"cat"), {})
+        self.assertRaises(TypeError, q.aggregate, count=1)
+
+
+    def test_prepare(self):
+        self.db[b"key1"] = {b"test": b"1", b"cat": b"a"}
+        self.db[b"key2"] = {b"test": b"2", b"cat": b"b"}
+        self.db[b"key3"] = {b"test": b"3", b"cat": b"a"}
+        self.db[b"akey"] = {b"test": b"a", b"cat": b"a"}
+        tpl = self.db.prepare([(b"", TDBQCSTRBW, b"ke"),
+                               (b"cat", TDBQCSTREQ, "?")],
+                              sort=(b"test", TDBQONUMDESC))
+        self.assertEqual(tpl.search([b"a"]), (b"key3", b"key1"))
+        self.assertEqual(tpl.search([b"b"]), (b"key2",))
+        self.assertEqual(tpl.search([b"c"]), ())
+        tpl = self.db.prepare([(b"test", TDBQCNUMGE, "?")], limit=1, skip=1)
+        self.assertEqual(tpl.search((b"1",)), (b"key2",))
+        self.assertEqual(self.db.prepare([]).search(),
+                         (b"key1", b"key2", b"key3", b"akey"))
+        self.assertRaises(ValueError, tpl.search)
+        self.assertRaises(ValueError, tpl.search, [b"1", b"2"])
+        self.assertRaises(TypeError, tpl.search, b"1")
+        self.assertRaises(ValueError, self.db.prepare, [(b"test", TDBQCNUMGE)])
+        self.assertRaises(ValueError, self.db.prepare, [], sort=(b"test",))
+
+
+
+    def test_metasearch(self):
+        for i in range(10):
+            self.db[str(i).encode()] = {b"n": str(i).encode(),
+                                        b"odd": str(i % 2).encode()}
+        q1 = self.db.query()
+        q1.filter(b"n", TDBQCNUMGE, b"6")
+        q2 = self.db.query()
+        q2.filter(b"odd", TDBQCSTREQ, b"1")
+        for parallel in (False, True):
+            self.assertEqual(set(TDB.metasearch([q1, q2], TDBMSUNION,
+                                                parallel=parallel)),
+                             set([b"1", b"3", b"5", b"6", b"7", b"8", b"9"]))
+            self.assertEqual(set(TDB.metasearch([q1, q2], TDBMSISECT,
+                                                parallel=parallel)),
+                             set([b"7", b"9"]))
+            self.assertEqual(set(TDB.metasearch([q1, q2], TDBMSDIFF,
+                                                parallel=parallel)),
+                             set([b"6", b"8"]))
+        q1.sort(b"n", TDBQONUMDESC)
+        self.assertEqual(TDB.metasearch([q1, q2], TDBMSUNION, parallel=True),
+                         (b"9", b"8", b"7", b"6", b"5", b"3", b"1"))
+        self.assertEqual(TDB.metasearch([q1, q2], TDBMSUNION, parallel=True,
+                                        limit=3),
+                         (b"9", b"8", b"7"))
+        self.assertEqual(TDB.metasearch([q1, q1], TDBMSISECT, parallel=True),
+                         (b"9", b"8", b"7", b"6"))
+        q1.limit(2, 1)
+        self.assertEqual(TDB.metasearch([q1, q2], TDBMSUNION, parallel=True),
+                         (b"8", b"7"))
+        self.assertEqual(q1.search(), (b"8", b"7"))
+        self.assertEqual(TDB.metasearch([], TDBMSUNION, parallel=True), ())
+        self.assertRaises(ValueError, TDB.metasearch, [q1], 42, parallel=True)
+        self.assertRaises(TypeError, TDB.metasearch, [q1], TDBMSUNION,
+                          parallel=1)
+
+
+class TDBTestProfiler(TDBTest):
+
+    def test_profile(self):
+        self.assertEqual(self.db.profile(), None)
+        self.assertEqual(self.db.indexadvice(), None)
+        self.assertRaises(TypeError, self.db.setprofiler, 1)
+        self.db.setprofiler(True)
+        self.assertEqual(self.db.profile(), {})
+        self.assertEqual(self.db.indexadvice(), [])
+        for i in range(10):
+            self.db[str(i).encode()] = {b"cat": b"ab"[i % 2:i % 2 + 1],
+                                        b"n": str(i).encode()}
+        q = self.db.query()
+        q.filter(b"cat", TDBQCSTREQ, b"a")
+        self.assertEqual(len(q.search()), 5)
+        self.assertEqual(len(q.search()), 5)
+        stats = self.db.profile()['"cat" STREQ']
+        self.assertEqual(stats["calls"], 2)
+        self.assertEqual(stats["indexed"], 0)
+        self.assertEqual(stats["full_scans"], 2)
+        self.assertEqual(stats["scanned"], 20)
+        self.assertEqual(stats["returned"], 10)
+        self.assertEqual(stats["cached"], 0)
+        self.assertTrue(stats["max_time"] <= stats["time"])
+        self.assertEqual(self.db.indexadvice(), [(b"cat", TDBITLEXICAL, 20, 2)])
+        self.db.setindex(b"cat", TDBITLEXICAL)
+        q.search()
+        stats = self.db.profile()['"cat" STREQ']
+        self.assertEqual(stats["calls"], 3)
+        self.assertEqual(stats["indexed"], 1)
+        self.assertEqual(self.db.indexadvice(), [(b"cat", TDBITLEXICAL, 20, 2)])
+        self.db.setprofiler(False)
+        self.assertEqual(self.db.profile(), None)
+
+    def test_shapes(self):
+        for i in range(10):
+            self.db[str(i).encode()] = {b"n": str(i).encode()}
+        self.db.setprofiler(True)
+        tpl = self.db.prepare([(b"n", TDBQCNUMGE, "?")],
+                              sort=(b"n", TDBQONUMDESC))
+        self.assertEqual(tpl.search([b"8"]), (b"9", b"8"))
+        q = self.db.query()
+        q.filter(b"", TDBQCSTRBW, b"1")
+        q.search()
+        q = self.db.query()
+        q.search()
+        self.assertEqual(sorted(self.db.profile()),
+                         ['"" STRBW', '"n" NUMGE ORDER BY "n" NUMDESC', 'ALL'])
+        self.assertEqual(self.db.indexadvice(), [(b"n", TDBITDECIMAL, 10, 1)])
+
+
+class TDBTestColumn(TDBTest):
+
+    def test_column(self):
+        self.db[b"a"] = {b"n": b"1", b"x": b"1.5", b"s": b"foo"}
+        self.db[b"b"] = {b"n": b"2", b"x": b"abc"}
+        self.db[b"c"] = {b"n": b"3", b"x": b"-2"}
+        keys = list(self.db.iterkeys())
+        values = self.db.column(b"n", dtype="i8")
+        self.assertTrue(isinstance(values, array.array))
+        self.assertEqual(values.itemsize, 8)
+        self.assertEqual(list(values),
+                         [{b"a": 1, b"b": 2, b"c": 3}[k] for k in keys])
+        values = self.db.column(b"x")
+        self.assertEqual(values.typecode, "d")
+        self.assertEqual(values[keys.index(b"a")], 1.5)
+        self.assertEqual(values[keys.index(b"c")], -2.0)
+        self.assertTrue(math.isnan(values[keys.index(b"b")]))
+        values = self.db.column(b"x", missing=-1.0)
+        self.assertEqual(values[keys.index(b"b")], -1.0)
+        values = self.db.column(b"s", dtype="bytes")
+        self.assertEqual(values, [{b"a": b"foo"}.get(k) for k in keys])
+        values = self.db.column(b"s", dtype="i8", missing=-1)
+        self.assertEqual(list(values), [-1, -1, -1])
+        self.assertRaises(ValueError, self.db.column, b"n", dtype="f4")
+        self.assertRaises(TypeError, self.db.column, b"n", query=1)
+
+    def test_column_query(self):
+        self.db[b"a"] = {b"n": b"1"}
+        self.db[b"b"] = {b"n": b"2"}
+        self.db[b"c"] = {b"n": b"3"}
+        q = self.db.query()
+        q.filter(b"n", TDBQCNUMGE, b"2")
+        q.sort(b"n", TDBQONUMDESC)
+        self.assertEqual(list(self.db.column(b"n", query=q)), [3.0, 2.0])
+        self.assertEqual(self.db.column(b"n", "bytes", q), [b"3", b"2"])
+
+
+class TDBTestQueryCache(TDBTest):
+
+    def test_setquerycache(self):
+        self.assertEqual(self.db.querycachestats(), None)
+        self.assertRaises(TypeError, self.db.setquerycache)
+        self.assertRaises(ValueError, self.db.setquerycache, -1)
+        self.db.setquerycache(0)
+        self.assertEqual(self.db.querycachestats(), None)
+        self.db.setquerycache(1024)
+        self.assertEqual(self.db.querycachestats(),
+                         {"hits": 0, "misses": 0, "evictions": 0,
+                          "records": 0, "bytes": 0, "max_bytes": 1024})
+        self.db.setquerycache(0)
+        self.assertEqual(self.db.querycachestats(), None)
+
+    def test_hits(self):
+        self.db[b"key1"] = {b"test": b"1"}
+        self.db[b"key2"] = {b"test": b"2"}
+        self.db.setquerycache(1024)
+        q = self.db.query()
+        q.filter(b"test", TDBQCNUMGE, b"2")
+        self.assertEqual(q.search(), (b"key2",))
+        self.assertEqual(q.search(), (b"key2",))
+        q = self.db.query()
+        q.filter(b"test", TDBQCNUMGE, b"2")
+        self.assertEqual(q.search(), (b"key2",))
+        q.limit(0)
+        self.assertEqual(q.search(), ())
+        q = self.db.query()
+        q.filter(b"test", TDBQCNUMGE, b"1")
+        self.assertEqual(q.search(), (b"key1", b"key2"))
+        tpl = self.db.prepare([(b"test", TDBQCNUMGE, "?")])
+        self.assertEqual(tpl.search([b"2"]), (b"key2",))
+        self.assertEqual(tpl.search([b"2"]), (b"key2",))
+        stats = self.db.querycachestats()
+        self.assertEqual((stats["hits"], stats["misses"]), (4, 3))
+        self.assertEqual(stats["records"], 3)
+
+    def test_invalidation(self):
+        self.db.setquerycache(1024)
+        q = self.db.query()
+        q.filter(b"test", TDBQCNUMGE, b"2")
+        self.assertEqual(q.search(), ())
+        self.db[b"key2"] = {b"test": b"2"}
+        self.assertEqual(q.search(), (b"key2",))
+        self.db.putcat(b"key3", {b"test": b"3"})
+        self.assertEqual(q.search(), (b"key2", b"key3"))
+        self.db.putkeep(b"key4", {b"test": b"4"})
+        self.assertEqual(q.search(), (b"key2", b"key3", b"key4"))
+        self.db.remove(b"key4")
+        self.assertEqual(q.search(), (b"key2", b"key3"))
+        self.db.putmany([(b"key4", {b"test": b"4"})])
+        self.assertEqual(q.search(), (b"key2", b"key3", b"key4"))
+        self.db.removemany([b"key4"])
+        self.assertEqual(q.search(), (b"key2", b"key3"))
+        self.db.begin()
+        del self.db[b"key2"]
+        self.assertEqual(q.search(), (b"key3",))
+        self.db.abort()
+        self.assertEqual(q.search(), (b"key2", b"key3"))
+        q2 = self.db.query()
+        q2.filter(b"test", TDBQCNUMGE, b"3")
+        q2.update(set={b"test": b"1"})
+        self.assertEqual(q.search(), (b"key2",))
+        q2.remove()
+        self.db.clear()
+        self.assertEqual(q.search(), ())
+        self.assertEqual(self.db.querycachestats()["hits"], 0)
+
+    def test_evictions(self):
+        self.db[b"key1"] = {b"test": b"1"}
+        self.db.setquerycache(1)
+        q = self.db.query()
+        self.assertEqual(q.search(), (b"key1",))
+        self.assertEqual(q.search(), (b"key1",))
+        stats = self.db.querycachestats()
+        self.assertEqual((stats["hits"], stats["records"]), (0, 0))
+
+    def test_profiler(self):
+        # searches answered by the cache are profiled, without scanning
+        for i in range(10):
+            self.db[str(i).encode()] = {b"test": str(i).encode()}
+        self.db.setquerycache(1024)
+        self.db.setprofiler(True)
+        q = self.db.query()
+        q.filter(b"test", TDBQCNUMGE, b"8")
+        self.assertEqual(q.search(), (b"8", b"9"))
+        self.assertEqual(q.search(), (b"8", b"9"))
+        tpl = self.db.prepare([(b"test", TDBQCNUMGE, "?")])
+        self.assertEqual(tpl.search([b"8"]), (b"8", b"9"))
+        stats = self.db.profile()['"test" NUMGE']
+        self.assertEqual((stats["calls"], stats["cached"]), (3, 2))
+        self.assertEqual((stats["full_scans"], stats["scanned"]), (1, 10))
+        self.assertEqual(stats["returned"], 6)
+        self.assertEqual(self.db.indexadvice(),
+                         [(b"test", TDBITDECIMAL, 10, 1)])
+
+
+class TDBTestBatch(TDBTest):
+
+    def test_getmany(self):
+        self.assertRaises(TypeError, self.db.getmany)
+        self.assertRaises(TypeError, self.db.getmany, b"ab")
+        self.db[b"a"] = {b"x": b"1"}
+        self.db[b"b"] = {b"x": b"2"}
+        self.assertEqual(self.db.getmany([]), [])
+        self.assertEqual(self.db.getmany([b"b", b"a", b"c"]),
+                         [{b"x": b"2"}, {b"x": b"1"}, None])
+        self.assertEqual(self.db.getmany([b"c"], default={}), [{}])
+
+    def test_putmany(self):
+        self.assertRaises(TypeError, self.db.putmany)
+        self.assertRaises(TypeError, self.db.putmany, [(b"a", b"1")])
+        self.assertRaises(ValueError, self.db.putmany, [], "dup")
+        self.assertEqual(self.db.putmany([]), 0)
+        self.assertEqual(self.db.putmany([(b"a", {b"x": b"1"}),
+                                          (b"b", {b"x": b"2"})]), 2)
+        self.assertEqual(self.db.putmany({b"c": {b"x": b"3"}}), 1)
+        self.assertEqual(self.db.putmany([(b"a", {b"x": b"3"}),
+                                          (b"d", {b"x": b"4"})], "keep"), 1)
+        self.assertEqual(self.db.putmany([(b"a", {b"y": b"2"})], mode="cat"),
+                         1)
+        self.assertEqual(self.db.getmany([b"a", b"b", b"c", b"d"]),
+                         [{b"x": b"1", b"y": b"2"}, {b"x": b"2"}, {b"x": b"3"},
+                          {b"x": b"4"}])
+
+    def test_putmany_transaction(self):
+        self.assertEqual(self.db.putmany([(b"a", {b"x": b"1"})],
+                                         transaction=True), 1)
+        self.assertRaises(TypeError, self.db.putmany,
+                          [(b"b", {b"x": b"2"}), (b"c", 3)], transaction=True)
+        self.assertEqual(len(self.db), 1)
+        self.assertTrue(b"b" not in self.db)
+
+        # the first batch is stored before the second one fails, the
+        # transaction must roll it back
+        items = [(str(i).encode(), {b"x": b"y"}) for i in range(1500)]
+        items.append((b"bad", 1))
+        self.assertRaises(TypeError, self.db.putmany, items, transaction=True)
+        self.assertEqual(len(self.db), 1)
+        self.assertTrue(b"0" not in self.db)
+        self.assertTrue(b"1023" not in self.db)
+        self.assertRaises(TypeError, self.db.putmany, items)
+        self.assertEqual(len(self.db), 1025)
+        self.assertTrue(b"1023" in self.db)
+
+    def test_removemany(self):
+        self.assertRaises(TypeError, self.db.removemany)
+        self.assertRaises(TypeError, self.db.removemany, [b"a"], 1)
+        self.db[b"a"] = {b"x": b"1"}
+        self.db[b"b"] = {b"x": b"2"}
+        self.db[b"c"] = {b"x": b"3"}
+        self.assertEqual(self.db.removemany([]), 0)
+        self.assertEqual(self.db.removemany([b"a", b"d", b"b"]), 2)
+        self.assertEqual(len(self.db), 1)
+        self.assertRaises(KeyError, self.db.removemany, [b"c", b"d"],
+                          missing_ok=False)
+        self.assertEqual(len(self.db), 0)
+
+
+class TDBTestThreads(TDBTest):
+
+    def test_concurrent_process(self):
+        # len(), path, size, uid() and profiled queries must not wait for the
+        # lock of the database while holding the GIL (the callback of
+        # process() holds the lock while running Python code)
+        self.db.setprofiler(True)
+        for i in range(200):
+            self.db[str(i).encode()] = {b"n": str(i).encode()}
+        done = []
+
+        def callback(key, value):
+            time.sleep(0.001)
+            value[b"seen"] = b"1"
+            return TDBQPPUT
+
+        def process():
+            try:
+                self.db.query().process(callback)
+            finally:
+                done.append(True)
+
+        def read():
+            while not done:
+                len(self.db)
+                self.db.path
+                self.db.size
+                self.db.uid()
+                self.db.query().count()
+
+        threads = [threading.Thread(target=process)]
+        threads.extend(threading.Thread(target=read) for i in range(2))
+        for thread in threads:
+            thread.daemon = True
+            thread.start()
+        for thread in threads:
+            thread.join(60)
+            self.assertFalse(thread.is_alive())
+        self.assertEqual(len(self.db), 200)
+        self.assertTrue(all(value[b"seen"] == b"1"
+                            for value in self.db.itervalues()))
+
 
 class TDBTestNullBytes(TDBTest):
 
@@ -450,6 +974,11 @@ class TDBTestNullBytes(TDBTest):
         self.assertEqual(self.db.searchkeys(b"a"), frozenset((b"a\0b",)))
         self.assertEqual(self.db.searchkeys(b"a\0"), frozenset((b"a\0b",)))
 
+    def test_buffer_objects(self):
+        self.db[bytearray(b"a\0b")] = {memoryview(b"ab"): bytearray(b"a\0b")}
+        self.assertEqual({b"ab": b"a\0b"}, self.db[memoryview(b"a\0b")])
+        self.assertRaises(KeyError, self.db.__getitem__, memoryview(b"ef"))
+
 
 all_tests = (
              "TDBTestDict",
@@ -458,6 +987,11 @@ all_tests = (
              "TDBTestTransaction",
              "TDBTestMisc",
              "TDBTestQuery",
+             "TDBTestProfiler",
+             "TDBTestColumn",
+             "TDBTestQueryCache",
+             "TDBTestBatch",
+             "TDBTestThreads",
              "TDBTestNullBytes",
             )
 
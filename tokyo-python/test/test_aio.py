@@ -0,0 +1,164 @@
+import unittest
+import sys
+import os
+import tempfile
+import asyncio
+
+from tokyo.cabinet import (HDBOWRITER, HDBOCREAT, BDBOWRITER, BDBOCREAT,
+                           FDBOWRITER, FDBOCREAT, TDBOWRITER, TDBOCREAT,
+                           TDBQCSTREQ, HDB)
+from tokyo.aio import AsyncHDB, AsyncBDB, AsyncFDB, AsyncTDB, AsyncTDBQuery
+
+
+class AsyncTest(unittest.TestCase):
+
+    def setUp(self):
+        self.path = os.path.join(tempfile.gettempdir(),
+                                 "tmp_aio_test.{0}".format(self._ext))
+        self.loop = asyncio.new_event_loop()
+        self.db = self._type(loop=self.loop, batch=2)
+        self._run(self.db.open(self.path, self._mode))
+
+    def tearDown(self):
+        self._run(self.db.close())
+        self.loop.close()
+        os.remove(self.path)
+        self.db = None
+
+    def _run(self, coro):
+        return self.loop.run_until_complete(coro)
+
+    async def collect(self, aiter):
+        return [item async for item in aiter]
+
+
+class AsyncHDBTest(AsyncTest):
+
+    _type = AsyncHDB
+    _ext = "tch"
+    _mode = HDBOWRITER | HDBOCREAT
+
+    def test_wrap(self):
+        db = AsyncHDB(HDB(), loop=self.loop)
+        self.assertTrue(isinstance(db.db, HDB))
+        self.assertRaises(ValueError, AsyncHDB, batch=0)
+
+    def test_get(self):
+        self._run(self.db.put(b"a", b"1"))
+        self.assertEqual(self._run(self.db.get(b"a")), b"1")
+        self.assertEqual(self._run(self.db.get(bytearray(b"a"))), b"1")
+        self.assertRaises(KeyError, self._run, self.db.get(b"b"))
+
+    def test_get_coalesced(self):
+        self._run(self.db.putmany([(b"a", b"1"), (b"b", b"2"), (b"c", b"3")]))
+        results = self._run(asyncio.gather(self.db.get(b"a"),
+                                          self.db.get(b"b"),
+                                          self.db.get(b"a"),
+                                          self.db.get(b"c"),
+                                          self.db.get(b"d"),
+                                          return_exceptions=True))
+        self.assertEqual(results[:4], [b"1", b"2", b"1", b"3"])
+        self.assertTrue(isinstance(results[4], KeyError))
+
+    def test_get_coalesced_invalid_key(self):
+        self._run(self.db.putmany([(b"a", b"1"), (b"b", b"2")]))
+        results = self._run(asyncio.gather(self.db.get(b"a"),
+                                           self.db.get("b"),
+                                           self.db.get(b"b"),
+                                           self.db.get(b"c"),
+                                           return_exceptions=True))
+        self.assertEqual(results[0], b"1")
+        self.assertTrue(isinstance(results[1], TypeError))
+        self.assertEqual(results[2], b"2")
+        self.assertTrue(isinstance(results[3], KeyError))
+
+    def test_methods(self):
+        self._run(self.db.put(b"a", b"1"))
+        self._run(self.db.putcat(b"a", b"2"))
+        self.assertEqual(self._run(self.db.getmany([b"a", b"b"])), [b"12", None])
+        self.assertTrue(self._run(self.db.contains(b"a")))
+        self.assertEqual(self._run(self.db.length()), 1)
+        self.assertEqual(self._run(self.db.addint(b"b", 1)), 1)
+        self._run(self.db.remove(b"a"))
+        self.assertEqual(self._run(self.db.length()), 1)
+
+    def test_iter(self):
+        self._run(self.db.putmany([(b"a", b"1"), (b"b", b"2"), (b"c", b"3")]))
+        self.assertEqual(sorted(self._run(self.collect(self.db))),
+                         [b"a", b"b", b"c"])
+        self.assertEqual(sorted(self._run(self.collect(self.db.itervalues()))),
+                         [b"1", b"2", b"3"])
+        self.assertEqual(dict(self._run(self.collect(self.db.iteritems()))),
+                         {b"a": b"1", b"b": b"2", b"c": b"3"})
+
+
+class AsyncBDBTest(AsyncTest):
+
+    _type = AsyncBDB
+    _ext = "tcb"
+    _mode = BDBOWRITER | BDBOCREAT
+
+    def test_get(self):
+        self._run(self.db.put(b"a", b"1"))
+        self._run(self.db.putdup(b"a", [b"2"]))
+        self.assertEqual(self._run(self.db.get(b"a")), b"1")
+        self.assertRaises(KeyError, self._run, self.db.get(b"b"))
+
+    def test_iter(self):
+        self._run(self.db.putmany([(b"b", b"2"), (b"a", b"1"), (b"c", b"3")]))
+        self.assertEqual(self._run(self.collect(self.db.iteritems())),
+                         [(b"a", b"1"), (b"b", b"2"), (b"c", b"3")])
+
+
+class AsyncFDBTest(AsyncTest):
+
+    _type = AsyncFDB
+    _ext = "tcf"
+    _mode = FDBOWRITER | FDBOCREAT
+
+    def test_get(self):
+        self._run(self.db.put(1, b"1"))
+        results = self._run(asyncio.gather(self.db.get(1), self.db.get(2),
+                                          return_exceptions=True))
+        self.assertEqual(results[0], b"1")
+        self.assertTrue(isinstance(results[1], KeyError))
+
+    def test_iter(self):
+        self._run(self.db.putmany([(1, b"1"), (2, b"2"), (3, b"3")]))
+        self.assertEqual(self._run(self.collect(self.db)), [1, 2, 3])
+
+
+class AsyncTDBTest(AsyncTest):
+
+    _type = AsyncTDB
+    _ext = "tct"
+    _mode = TDBOWRITER | TDBOCREAT
+
+    def test_get(self):
+        self._run(self.db.put(b"a", {b"name": b"alice"}))
+        self.assertEqual(self._run(self.db.get(b"a")), {b"name": b"alice"})
+
+    def test_query(self):
+        self._run(self.db.putmany([(b"a", {b"name": b"alice"}),
+                                  (b"b", {b"name": b"bob"})]))
+        q = self.db.query()
+        self.assertTrue(isinstance(q, AsyncTDBQuery))
+        q.filter(b"name", TDBQCSTREQ, b"bob")
+        self.assertEqual(self._run(q.search()), (b"b",))
+        self.assertEqual(self._run(q.count()), 1)
+        self._run(q.remove())
+        self.assertEqual(self._run(self.db.length()), 1)
+
+
+all_tests = (
+             "AsyncHDBTest",
+             "AsyncBDBTest",
+             "AsyncFDBTest",
+             "AsyncTDBTest",
+            )
+
+suite = unittest.TestLoader().loadTestsFromNames(all_tests,
+                                                 sys.modules[__name__])
+
+if __name__ == "__main__":
+    unittest.TextTestRunner(verbosity=2).run(suite)
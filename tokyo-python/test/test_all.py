@@ -1,11 +1,15 @@
 import unittest
+import sys
 
 import test_cabinet
 import test_dbm
+import test_keys
 
 
-all_tests = [test_cabinet, test_dbm]
+all_tests = [test_cabinet, test_dbm, test_keys]
 opts_tests = ("test_tyrant", "test_dystopia")
+if sys.version_info >= (3, 5):
+    opts_tests += ("test_aio",)
 
 for name in opts_tests:
     try:
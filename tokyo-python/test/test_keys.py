@@ -0,0 +1,51 @@
+import unittest
+import sys
+
+from tokyo.keys import encode, decode
+
+
+class KeysTest(unittest.TestCase):
+
+    items = [None, b"", b"a", b"a\0", b"a\0b", b"ab", u"", u"a", u"a\0",
+             u"\xe9", 0, 1, -1, 255, 256, -255, -256, 2 ** 63, 2 ** 64,
+             2 ** 70, -2 ** 64, -2 ** 70, -1.5, 0.5, 1.5, 1e300, -1e300]
+
+    def test_roundtrip(self):
+        for item in self.items:
+            self.assertEqual(decode(encode((item,))), (item,))
+        self.assertEqual(decode(encode((u"user", 42, b"\0", 1.5, None))),
+                         (u"user", 42, b"\0", 1.5, None))
+        self.assertEqual(decode(encode(())), ())
+
+    def test_order(self):
+        def order(item):
+            types = (type(None), bytes, type(u""), int, float)
+            if sys.version_info < (3,) and isinstance(item, long):
+                return (3, item)
+            return ([isinstance(item, t) for t in types].index(True),
+                    item if item is not None else 0)
+        items = [(a, b) for a in self.items for b in self.items[::3]]
+        self.assertEqual(sorted(items, key=encode),
+                         sorted(items, key=lambda t: [order(i) for i in t]))
+
+    def test_prefix(self):
+        self.assertTrue(encode((u"a", 1)).startswith(encode((u"a",))))
+        self.assertFalse(encode((u"ab", 1)).startswith(encode((u"a",))))
+
+    def test_errors(self):
+        self.assertRaises(TypeError, encode, u"a")
+        self.assertRaises(TypeError, encode, (object(),))
+        self.assertRaises(ValueError, decode, b"\x02ab")
+        self.assertRaises(ValueError, decode, b"\x16\x01")
+        self.assertRaises(ValueError, decode, b"\xff")
+
+
+all_tests = (
+             "KeysTest",
+            )
+
+suite = unittest.TestLoader().loadTestsFromNames(all_tests,
+                                                 sys.modules[__name__])
+
+if __name__ == "__main__":
+    unittest.TextTestRunner(verbosity=2).run(suite)
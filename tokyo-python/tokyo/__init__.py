@@ -19,7 +19,7 @@
 ################################################################################
 
 
-from . import cabinet, dbm
+from . import cabinet, dbm, keys
 try:
     from . import tyrant
 except ImportError:
@@ -0,0 +1,281 @@
+################################################################################
+#
+# Copyright (c) 2010, Malek Hadj-Ali
+# All rights reserved.
+#
+# This program is free software; you can redistribute it and/or
+# modify it under the terms of the GNU General Public License
+# as published by the Free Software Foundation; version 2 of the License.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program; if not, write to the Free Software Foundation, Inc.,
+# 51 Franklin Street, Fifth Floor, Boston, MA  02110-1301, USA.
+#
+################################################################################
+
+
+"""Provide an asyncio interface to tokyo.cabinet (requires Python >= 3.5)."""
+
+
+import asyncio
+import functools
+from concurrent.futures import ThreadPoolExecutor
+import tokyo.cabinet as tc
+
+
+_missing = object()
+
+
+def _async_method(name, target="db"):
+    def method(self, *args, **kwargs):
+        return self._run(getattr(getattr(self, target), name), *args, **kwargs)
+    method.__name__ = name
+    method.__doc__ = "Awaitable version of {0}().".format(name)
+    return method
+
+
+class AsyncIter(object):
+    """Asynchronous iterator over a batch iterator, the batches are fetched in
+    the executor and their elements are yielded one by one."""
+
+    def __init__(self, adb, iterator, transform=None):
+        self._adb = adb
+        self._iterator = iterator
+        self._transform = transform
+        self._batch = []
+        self._pos = 0
+
+    def __aiter__(self):
+        return self
+
+    async def __anext__(self):
+        if self._pos >= len(self._batch):
+            self._batch = await self._adb._run(next, self._iterator, None)
+            self._pos = 0
+            if not self._batch:
+                self._batch = []
+                raise StopAsyncIteration
+        item = self._batch[self._pos]
+        self._pos += 1
+        if self._transform:
+            return self._transform(item)
+        return item
+
+
+class AsyncDB(object):
+    """Base class of the asynchronous database wrappers.
+    'db': the database to wrap, a new one is created if it is None.
+    'executor': the concurrent.futures.Executor running the database calls, a
+                ThreadPoolExecutor with max_workers threads is created (and shut
+                down by close()) if it is None.
+    'batch': the maximum number of keys read by a single getmany() call when
+             concurrent get() calls are coalesced, and the number of records
+             fetched at once by the iterators."""
+
+    _db_type = None
+
+    def __init__(self, db=None, executor=None, max_workers=4, batch=256,
+                 loop=None):
+        if batch <= 0:
+            raise ValueError("batch must be positive")
+        self.db = self._db_type() if db is None else db
+        self._own_executor = executor is None
+        if executor is None:
+            executor = ThreadPoolExecutor(max_workers)
+        self._executor = executor
+        self._batch = batch
+        self._loop = loop
+        self._pending = {}
+        self._flushing = False
+
+    def _get_loop(self):
+        return self._loop or asyncio.get_event_loop()
+
+    def _run(self, func, *args, **kwargs):
+        if kwargs:
+            func = functools.partial(func, **kwargs)
+        return self._get_loop().run_in_executor(self._executor, func, *args)
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, exc_type, exc_value, traceback):
+        await self.close()
+
+    async def close(self):
+        """Close the database and shut down the executor if it was created by
+        this object."""
+        try:
+            await self._run(self.db.close)
+        finally:
+            if self._own_executor:
+                self._executor.shutdown(wait=False)
+
+    def get(self, key):
+        """Retrieve a record. Concurrent calls are coalesced into getmany()
+        calls of up to batch keys."""
+        loop = self._get_loop()
+        try:
+            waiters = self._pending.setdefault(key, [])
+        except TypeError:  # unhashable key (bytearray, ...)
+            return self._run(self.db.get, key)
+        future = loop.create_future()
+        waiters.append(future)
+        if not self._flushing:
+            self._flushing = True
+            loop.call_soon(self._flush)
+        return future
+
+    def _flush(self):
+        pending, self._pending = self._pending, {}
+        self._flushing = False
+        keys = list(pending)
+        for i in range(0, len(keys), self._batch):
+            chunk = keys[i:i + self._batch]
+            future = self._run(self.db.getmany, chunk, _missing)
+            future.add_done_callback(functools.partial(self._dispatch, chunk,
+                                                       pending))
+
+    def _dispatch(self, keys, pending, future):
+        if future.cancelled():
+            for key in keys:
+                for waiter in pending[key]:
+                    waiter.cancel()
+            return
+        exc = future.exception()
+        if exc and len(keys) > 1:
+            # a single invalid key fails the whole getmany(), retry the keys
+            # one by one so that only the callers of that key get the error
+            for key in keys:
+                retry = self._run(self.db.getmany, [key], _missing)
+                retry.add_done_callback(functools.partial(self._dispatch,
+                                                          [key], pending))
+            return
+        values = None if exc else future.result()
+        for i, key in enumerate(keys):
+            for waiter in pending[key]:
+                if waiter.done():
+                    continue
+                if exc:
+                    waiter.set_exception(exc)
+                elif values[i] is _missing:
+                    waiter.set_exception(KeyError(key))
+                else:
+                    waiter.set_result(values[i])
+
+    def iterkeys(self):
+        """Return an asynchronous iterator over the database's keys."""
+        return AsyncIter(self, self.db.iterkeys(batch=self._batch))
+
+    def itervalues(self):
+        """Return an asynchronous iterator over the database's values."""
+        return AsyncIter(self, self.db.iteritems(batch=self._batch),
+                         lambda item: item[1])
+
+    def iteritems(self):
+        """Return an asynchronous iterator over the database's items."""
+        return AsyncIter(self, self.db.iteritems(batch=self._batch))
+
+    def __aiter__(self):
+        return self.iterkeys()
+
+    open = _async_method("open")
+    clear = _async_method("clear")
+    copy = _async_method("copy")
+    begin = _async_method("begin")
+    commit = _async_method("commit")
+    abort = _async_method("abort")
+    getmany = _async_method("getmany")
+    remove = _async_method("remove")
+    removemany = _async_method("removemany")
+    put = _async_method("put")
+    putmany = _async_method("putmany")
+    putkeep = _async_method("putkeep")
+    putcat = _async_method("putcat")
+    sync = _async_method("sync")
+    optimize = _async_method("optimize")
+    contains = _async_method("__contains__")
+    length = _async_method("__len__")
+
+
+class AsyncHDB(AsyncDB):
+    """Asynchronous wrapper of tokyo.cabinet.HDB."""
+
+    _db_type = tc.HDB
+
+    putasync = _async_method("putasync")
+    searchkeys = _async_method("searchkeys")
+    addint = _async_method("addint")
+    adddouble = _async_method("adddouble")
+
+
+class AsyncBDB(AsyncDB):
+    """Asynchronous wrapper of tokyo.cabinet.BDB."""
+
+    _db_type = tc.BDB
+
+    putdup = _async_method("putdup")
+    countdup = _async_method("countdup")
+    searchkeys = _async_method("searchkeys")
+    range = _async_method("range")
+    addint = _async_method("addint")
+    adddouble = _async_method("adddouble")
+
+
+class AsyncFDB(AsyncDB):
+    """Asynchronous wrapper of tokyo.cabinet.FDB."""
+
+    _db_type = tc.FDB
+
+    range = _async_method("range")
+    addint = _async_method("addint")
+    adddouble = _async_method("adddouble")
+
+
+class AsyncTDBQuery(object):
+    """Asynchronous wrapper of tokyo.cabinet.TDBQuery, the methods building the
+    query (filter(), sort(), limit()), iter() and the hint attribute are
+    forwarded as is."""
+
+    def __init__(self, adb, query):
+        self._adb = adb
+        self.query = query
+
+    def __getattr__(self, name):
+        return getattr(self.query, name)
+
+    def _run(self, func, *args, **kwargs):
+        return self._adb._run(func, *args, **kwargs)
+
+    search = _async_method("search", "query")
+    searchitems = _async_method("searchitems", "query")
+    remove = _async_method("remove", "query")
+    process = _async_method("process", "query")
+    update = _async_method("update", "query")
+    aggregate = _async_method("aggregate", "query")
+    count = _async_method("count", "query")
+
+
+class AsyncTDB(AsyncDB):
+    """Asynchronous wrapper of tokyo.cabinet.TDB."""
+
+    _db_type = tc.TDB
+
+    searchkeys = _async_method("searchkeys")
+    setindex = _async_method("setindex")
+    uid = _async_method("uid")
+
+    def query(self):
+        """Create an AsyncTDBQuery."""
+        return AsyncTDBQuery(self, self.db.query())
+
+    def metasearch(self, queries, type, **kwargs):
+        """Awaitable version of metasearch(), queries can be AsyncTDBQuery or
+        TDBQuery objects."""
+        queries = [getattr(q, "query", q) for q in queries]
+        return self._run(self.db.metasearch, queries, type, **kwargs)
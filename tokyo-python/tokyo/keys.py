@@ -0,0 +1,190 @@
+################################################################################
+#
+# Copyright (c) 2010, Malek Hadj-Ali
+# All rights reserved.
+#
+# This program is free software; you can redistribute it and/or
+# modify it under the terms of the GNU General Public License
+# as published by the Free Software Foundation; version 2 of the License.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program; if not, write to the Free Software Foundation, Inc.,
+# 51 Franklin Street, Fifth Floor, Boston, MA  02110-1301, USA.
+#
+################################################################################
+
+
+"""Encode tuples into keys sorting like the tuples under the default (lexical)
+BDB comparator."""
+
+
+import binascii
+import struct
+
+
+try:
+    _text_type = unicode
+    _int_types = (int, long)
+except NameError:
+    _text_type = str
+    _int_types = (int,)
+
+
+_NONE = 0x00
+_BYTES = 0x01
+_TEXT = 0x02
+_NEG_BIG_INT = 0x0b
+_INT_ZERO = 0x14
+_POS_BIG_INT = 0x1d
+_FLOAT = 0x21
+
+
+def _int_to_bytes(num, size):
+    return binascii.unhexlify("{0:0{1}x}".format(num, size * 2).encode())
+
+
+def _bytes_to_int(value):
+    return int(binascii.hexlify(value), 16) if value else 0
+
+
+def _escape(value):
+    return bytes(value).replace(b"\x00", b"\x00\xff") + b"\x00"
+
+
+def _encode_int(num, out):
+    if num == 0:
+        out.append(_INT_ZERO)
+        return
+    size = (abs(num).bit_length() + 7) // 8
+    if size > 8:
+        if size > 255:
+            raise ValueError("int too large to encode")
+        if num > 0:
+            out.append(_POS_BIG_INT)
+            out.append(size)
+            out.extend(_int_to_bytes(num, size))
+        else:
+            out.append(_NEG_BIG_INT)
+            out.append(size ^ 0xff)
+            out.extend(_int_to_bytes(num + (1 << (size * 8)) - 1, size))
+    elif num > 0:
+        out.append(_INT_ZERO + size)
+        out.extend(_int_to_bytes(num, size))
+    else:
+        out.append(_INT_ZERO - size)
+        out.extend(_int_to_bytes(num + (1 << (size * 8)) - 1, size))
+
+
+def _encode_float(num, out):
+    value = bytearray(struct.pack(">d", num))
+    if value[0] & 0x80:
+        value = bytearray(byte ^ 0xff for byte in value)
+    else:
+        value[0] ^= 0x80
+    out.append(_FLOAT)
+    out.extend(value)
+
+
+def encode(items):
+    """Encode a tuple of None, bytes, str, int and float items into a key. The
+    keys sort like the tuples (items of different types sort by type, in the
+    order listed above) and the key of a tuple is a prefix of the keys of the
+    tuples it starts, so encode(items[:n]) can be used as BDB.scan()'s
+    prefix."""
+    if not isinstance(items, (tuple, list)):
+        raise TypeError("a tuple is required")
+    out = bytearray()
+    for item in items:
+        if item is None:
+            out.append(_NONE)
+        elif isinstance(item, _text_type):
+            out.append(_TEXT)
+            out.extend(_escape(item.encode("utf-8")))
+        elif isinstance(item, (bytes, bytearray)):
+            out.append(_BYTES)
+            out.extend(_escape(item))
+        elif isinstance(item, _int_types):
+            _encode_int(item, out)
+        elif isinstance(item, float):
+            _encode_float(item, out)
+        else:
+            raise TypeError("cannot encode {0!r}".format(type(item)))
+    return bytes(out)
+
+
+def _truncated():
+    return ValueError("invalid key: truncated")
+
+
+def _decode_escaped(key, pos):
+    value = bytearray()
+    while True:
+        try:
+            end = key.index(b"\x00", pos)
+        except ValueError:
+            raise _truncated()
+        value.extend(key[pos:end])
+        if end + 1 < len(key) and key[end + 1] == 0xff:
+            value.append(0)
+            pos = end + 2
+        else:
+            return bytes(value), end + 1
+
+
+def _decode_int(key, pos, size, negative):
+    value = bytes(key[pos:pos + size])
+    if len(value) != size:
+        raise _truncated()
+    num = _bytes_to_int(value)
+    if negative:
+        num -= (1 << (size * 8)) - 1
+    return num, pos + size
+
+
+def decode(key):
+    """Decode a key created by encode() back into a tuple."""
+    key = bytearray(key)
+    items = []
+    pos = 0
+    while pos < len(key):
+        code = key[pos]
+        pos += 1
+        if code == _NONE:
+            items.append(None)
+        elif code == _BYTES:
+            value, pos = _decode_escaped(key, pos)
+            items.append(value)
+        elif code == _TEXT:
+            value, pos = _decode_escaped(key, pos)
+            items.append(value.decode("utf-8"))
+        elif _INT_ZERO - 8 <= code <= _INT_ZERO + 8:
+            num, pos = _decode_int(key, pos, abs(code - _INT_ZERO),
+                                   code < _INT_ZERO)
+            items.append(num)
+        elif code in (_NEG_BIG_INT, _POS_BIG_INT):
+            if pos >= len(key):
+                raise _truncated()
+            size = key[pos]
+            if code == _NEG_BIG_INT:
+                size ^= 0xff
+            num, pos = _decode_int(key, pos + 1, size, code == _NEG_BIG_INT)
+            items.append(num)
+        elif code == _FLOAT:
+            value = key[pos:pos + 8]
+            if len(value) != 8:
+                raise _truncated()
+            if value[0] & 0x80:
+                value[0] ^= 0x80
+            else:
+                value = bytearray(byte ^ 0xff for byte in value)
+            items.append(struct.unpack(">d", bytes(value))[0])
+            pos += 8
+        else:
+            raise ValueError("invalid key: unknown type code "
+                             "0x{0:02x}".format(code))
+    return tuple(items)